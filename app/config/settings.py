@@ -64,12 +64,114 @@ class ChatHistoryConfig(BaseModel):
         extra = "allow"
 
 
+class SharedStateConfig(BaseModel):
+    provider: str = "in_memory"  # in_memory (single worker) or sqlite (multi-worker)
+    sqlite_path: str = "deg_agents_state.db"
+    poll_interval_seconds: float = 0.05
+    cache_size: int = 10000  # Keys each worker caches reads of (sqlite provider)
+
+
+class WebSocketConfig(BaseModel):
+    send_queue_size: int = 256  # Outbound frames buffered per connection
+    slow_consumer_policy: str = "drop_oldest"  # drop_oldest or disconnect
+    send_timeout_seconds: float = 10.0  # A single send taking longer evicts the connection
+    heartbeat_interval_seconds: float = 30.0  # How often every connection is pinged
+    heartbeat_timeout_seconds: float = 90.0  # Silence longer than this evicts the connection
+    heartbeat_concurrency: int = 500  # Pings queued per batch before yielding to the event loop
+    heartbeat_require_pong: bool = False  # true: also evict silent clients that have never answered a ping
+    resume_buffer_size: int = 64  # Frames kept per client for replay after a reconnect
+    resume_window_seconds: float = 300.0  # How long a disconnected client can resume
+    batch_max_window_ms: float = 250.0  # Upper bound for a client's requested batch_ms
+    batch_max_frames: int = 100  # Frames coalesced into one batch at most
+
+
+class LifecycleConfig(BaseModel):
+    drain_timeout_seconds: float = 20.0  # How long in-flight queries may run once draining starts
+    reconnect_min_delay_ms: int = 1000  # Clients are told to reconnect after a random delay
+    reconnect_max_delay_ms: int = 15000  # in this range, so they do not all return at once
+    snapshot_enabled: bool = True
+    snapshot_path: str = "deg_agents_snapshot.json"
+    snapshot_max_age_seconds: float = 3600.0  # Older snapshots are ignored on startup
+
+
+class HTTPClientConfig(BaseModel):
+    timeout_seconds: float = 10.0  # Default per-request timeout; callers may pass their own
+    connect_timeout_seconds: float = 5.0
+    max_connections_per_host: int = 100  # Each upstream host has its own pool
+    max_keepalive_per_host: int = 20
+    keepalive_expiry_seconds: float = 30.0  # Idle pooled connections are closed after this
+    breaker_failure_threshold: int = 5  # Consecutive failures that open a host's circuit
+    breaker_reset_seconds: float = 30.0  # How long an open circuit fails fast before a trial call
+    retry_attempts: int = 2  # Extra attempts for retryable failures
+    retry_base_delay_ms: float = 100.0  # Full-jitter exponential backoff between attempts
+    retry_max_delay_ms: float = 2000.0
+    bulkhead_max_concurrent: int = 50  # Calls in flight per host
+    bulkhead_max_wait_seconds: float = 2.0  # Wait for a free slot before failing fast
+    query_deadline_seconds: float = 45.0  # Upstream calls made for one user query must finish within this
+
+
+class BecknConfig(BaseModel):
+    callback_base_url: Optional[str] = None  # Public URL of this service; with network_url, enables on_* callbacks
+    network_url: Optional[str] = None  # Gateway or BPP base URL that callback-mode requests are posted to
+    search_window_seconds: float = 5.0  # How long on_search responses are collected
+    search_max_responses: int = 0  # Stop collecting once this many BPPs answered (0 = wait out the window)
+    callback_timeout_seconds: float = 15.0  # How long select/init/confirm wait for their on_* callback
+
+
+class DERDispatchConfig(BaseModel):
+    batch_size: int = 50  # Most DER IDs sent in one switch-off request
+    concurrency: int = 4  # Switch-off requests in flight at once per upstream
+    batch_wait_ms: float = 20.0  # How long a partly filled batch waits for more commands before it is sent
+    progress_interval_seconds: float = 0.5  # Least time between two progress updates of a dispatch
+    max_split_requests: int = 16  # Extra requests one rejected batch may spend finding the refused devices
+    history: int = 100  # Finished dispatches kept for status lookups
+
+
+class DERInventoryConfig(BaseModel):
+    ttl_seconds: float = 300.0  # Older inventories are refetched on read
+    refresh_interval_seconds: float = 60.0  # How often inventories halfway to expiry are refreshed in the background
+    idle_eviction_seconds: float = 3600.0  # Meters not read for this long are dropped from the cache
+
+
+class ConsumerAlertsConfig(BaseModel):
+    subscription_meters_ttl_seconds: float = 300.0  # How long the meters enrolled in a DFP order are cached
+    delivery_ttl_seconds: float = 3600.0  # How long an alert's delivery stats are kept
+    delivery_evict_interval_seconds: float = 300.0  # How often expired delivery stats are looked for
+
+
+class BreachForecastConfig(BaseModel):
+    interval_seconds: float = 60.0  # How often every transformer's breach time is re-forecast
+    window: int = 36  # Most recent samples the trends are fitted over
+    horizon_minutes: float = 1440.0  # Breaches further out than this are reported as none expected
+    max_age_seconds: float = 1800.0  # Transformers whose latest sample is older than this get no forecast
+    z: float = 1.645  # Width of the confidence band, in standard errors of the fitted trend (1.645 ~ 90%)
+
+
+class BreachScanConfig(BaseModel):
+    enabled: bool = True  # false: only alert on posted alerts, not on the forecast alone
+    horizon_minutes: float = 45.0  # Alert when a breach is forecast within this many minutes
+    prepare_minutes: float = 90.0  # Prefetch DFP options and prepare recommendations within this many minutes
+    cooldown_seconds: float = 1800.0  # A transformer is alerted at most once per this many seconds
+    edr_minutes: float = 15.0  # Closer breaches get Emergency Demand Reduction rather than Dynamic Demand Response
+    dfp_prefetch_max_age_seconds: float = 60.0  # Older DFP options are refreshed before recommendations are prepared
+
+
 class AppConfig(BaseModel):
     llms: Dict[str, LLMConfig]
     query_router: QueryRouterConfig
     handlers: Dict[str, HandlerConfig]
     tools: Dict[str, ToolConfig]
     chat_history: ChatHistoryConfig
+    shared_state: SharedStateConfig = Field(default_factory=SharedStateConfig)
+    websocket: WebSocketConfig = Field(default_factory=WebSocketConfig)
+    lifecycle: LifecycleConfig = Field(default_factory=LifecycleConfig)
+    http_client: HTTPClientConfig = Field(default_factory=HTTPClientConfig)
+    beckn: BecknConfig = Field(default_factory=BecknConfig)
+    der_dispatch: DERDispatchConfig = Field(default_factory=DERDispatchConfig)
+    der_inventory: DERInventoryConfig = Field(default_factory=DERInventoryConfig)
+    consumer_alerts: ConsumerAlertsConfig = Field(default_factory=ConsumerAlertsConfig)
+    breach_forecast: BreachForecastConfig = Field(default_factory=BreachForecastConfig)
+    breach_scan: BreachScanConfig = Field(default_factory=BreachScanConfig)
     # knowledge_bases: Optional[Dict[str, Any]] = None # For future KB stubs
 
 
@@ -130,3 +232,33 @@ if __name__ == "__main__":
 
     print("\nChat History:")
     print(f"  {settings.chat_history.model_dump_json(indent=2)}")
+
+    print("\nShared State:")
+    print(f"  {settings.shared_state.model_dump_json(indent=2)}")
+
+    print("\nWebSocket:")
+    print(f"  {settings.websocket.model_dump_json(indent=2)}")
+
+    print("\nLifecycle:")
+    print(f"  {settings.lifecycle.model_dump_json(indent=2)}")
+
+    print("\nHTTP Client:")
+    print(f"  {settings.http_client.model_dump_json(indent=2)}")
+
+    print("\nBeckn:")
+    print(f"  {settings.beckn.model_dump_json(indent=2)}")
+
+    print("\nDER Dispatch:")
+    print(f"  {settings.der_dispatch.model_dump_json(indent=2)}")
+
+    print("\nDER Inventory:")
+    print(f"  {settings.der_inventory.model_dump_json(indent=2)}")
+
+    print("\nConsumer Alerts:")
+    print(f"  {settings.consumer_alerts.model_dump_json(indent=2)}")
+
+    print("\nBreach Forecast:")
+    print(f"  {settings.breach_forecast.model_dump_json(indent=2)}")
+
+    print("\nBreach Scan:")
+    print(f"  {settings.breach_scan.model_dump_json(indent=2)}")
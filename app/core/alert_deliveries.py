@@ -0,0 +1,122 @@
+from typing import Any, Dict, Optional
+import asyncio
+import logging
+import time
+import uuid
+from app.config.settings import ConsumerAlertsConfig, settings
+from app.core.shared_state import SharedStateBackend, shared_state
+
+logger = logging.getLogger(__name__)
+
+
+class AlertDeliveryLog:
+    """
+    Delivery stats of consumer grid alerts, keyed by ``alert_id``.
+
+    The worker that receives an alert records the meter lookup and its
+    outcome; every worker then records how many connections and meters it
+    queued the alert for. Entries live in the shared state backend, so an
+    alert's stats can be read from any worker. Expired entries are dropped
+    by a background task.
+
+    An alert is "queued" until its meters are looked up, then "dispatched"
+    to the workers; its final status follows from the deliveries recorded:
+    "delivered" once every enrolled meter was reached, "partially_delivered"
+    while only some were. Lookups end in "no_meters" or "failed".
+    """
+
+    def __init__(
+        self,
+        state: Optional[SharedStateBackend] = None,
+        config: Optional[ConsumerAlertsConfig] = None,
+    ):
+        state = state or shared_state
+        self.alerts = state.namespace("consumer_alerts")  # alert_id -> alert
+        self.deliveries = state.namespace("consumer_alert_deliveries")  # "alert_id:worker_id" -> delivery
+        self.config = config or settings.consumer_alerts
+        self._evict_task: Optional[asyncio.Task] = None
+
+    def begin(self, order_id: str) -> str:
+        """Records a received alert and returns its alert_id."""
+        alert_id = str(uuid.uuid4())
+        self.alerts[alert_id] = {"order_id": order_id, "status": "queued", "received_at": time.time()}
+        return alert_id
+
+    def update(self, alert_id: str, **fields: Any):
+        alert = self.alerts.get(alert_id)
+        if alert is not None:
+            alert.update(fields)
+            # Write back so other workers see the change
+            self.alerts[alert_id] = alert
+
+    def record_delivery(self, alert_id: str, worker_id: str, connections: int, meters_reached: int):
+        """Records what one worker queued the alert for."""
+        alert = self.alerts.get(alert_id)
+        received_at = alert["received_at"] if alert else time.time()
+        self.deliveries[f"{alert_id}:{worker_id}"] = {
+            "connections": connections,
+            "meters_reached": meters_reached,
+            "queued_ms": round((time.time() - received_at) * 1000, 1),
+        }
+
+    def get(self, alert_id: str) -> Optional[Dict[str, Any]]:
+        """An alert's status with per-worker and total delivery counts."""
+        alert = self.alerts.get(alert_id)
+        if alert is None:
+            return None
+        prefix = f"{alert_id}:"
+        workers = {key[len(prefix):]: delivery for key, delivery in self.deliveries.items() if key.startswith(prefix)}
+        meters_reached = sum(delivery["meters_reached"] for delivery in workers.values())
+        status = alert["status"]
+        if status == "dispatched" and meters_reached:
+            status = "delivered" if meters_reached >= alert.get("meters_count", 0) else "partially_delivered"
+        return {
+            "alert_id": alert_id,
+            **alert,
+            "status": status,
+            "connections": sum(delivery["connections"] for delivery in workers.values()),
+            "meters_reached": meters_reached,
+            "workers": workers,
+        }
+
+    def evict_expired(self) -> int:
+        """
+        Drops alerts received more than the TTL ago, with their deliveries.
+
+        Returns:
+            The number of alerts dropped
+        """
+        cutoff = time.time() - self.config.delivery_ttl_seconds
+        expired = [alert_id for alert_id, alert in list(self.alerts.items()) if alert.get("received_at", 0) < cutoff]
+        for alert_id in expired:
+            self.alerts.pop(alert_id, None)
+        if expired:
+            expired = set(expired)
+            for key in list(self.deliveries.keys()):
+                if key.split(":", 1)[0] in expired:
+                    self.deliveries.pop(key, None)
+        return len(expired)
+
+    async def start(self):
+        """Starts the background task that drops expired delivery stats."""
+        if self._evict_task is None:
+            self._evict_task = asyncio.create_task(self._evict_loop())
+
+    async def stop(self):
+        """Stops the eviction task."""
+        if self._evict_task is not None:
+            self._evict_task.cancel()
+            self._evict_task = None
+
+    async def _evict_loop(self):
+        while True:
+            await asyncio.sleep(self.config.delivery_evict_interval_seconds)
+            try:
+                evicted = self.evict_expired()
+                if evicted:
+                    logger.info(f"Dropped delivery stats of {evicted} expired consumer alerts")
+            except Exception as e:
+                logger.error(f"Error dropping expired consumer alert stats: {str(e)}")
+
+# Create a singleton instance
+alert_deliveries = AlertDeliveryLog()
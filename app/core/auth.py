@@ -39,24 +39,30 @@ async def verify_otp(meter_id: str, otp: str) -> bool:
     logger.warning(f"Invalid OTP format for meter ID: {meter_id}")
     return False
 
-async def authenticate_user(meter_id: str, otp: str) -> Tuple[bool, Optional[str]]:
+async def authenticate_user(
+    meter_id: str, otp: str, meter_data: Optional[Dict[str, Any]] = None
+) -> Tuple[bool, Optional[str]]:
     """
     Authenticates a user with meter ID and OTP.
     
     Args:
         meter_id: The meter ID
         otp: The OTP
+        meter_data: Meter data from an earlier validation of the same meter ID.
+            When omitted, the (cached) validation result is used.
         
     Returns:
         Tuple of (is_authenticated, token)
     """
     logger.info(f"Authenticating user with meter ID: {meter_id}")
     
-    # Validate meter ID
-    is_valid, meter_data = await validate_meter_id(meter_id)
-    if not is_valid:
-        logger.warning(f"Invalid meter ID during authentication: {meter_id}")
-        return False, None
+    # Validate meter ID unless the caller already did; validate_meter_id
+    # serves the result of the meter ID step from its cache
+    if meter_data is None:
+        is_valid, meter_data = await validate_meter_id(meter_id)
+        if not is_valid:
+            logger.warning(f"Invalid meter ID during authentication: {meter_id}")
+            return False, None
     
     # Verify OTP - accept any 6-digit number
     if not (len(otp) == 6 and otp.isdigit()):
@@ -95,4 +101,27 @@ def get_user_data(token: str) -> Optional[Dict[str, Any]]:
     Returns:
         User data or None if not authenticated
     """
-    return session_manager.get_session_data(token) 
\ No newline at end of file
+    return session_manager.get_session_data(token) 
+def logout(token: str) -> bool:
+    """
+    Logs out a session by revoking its token.
+    
+    Args:
+        token: The session token
+        
+    Returns:
+        True if the token was revoked, False if it was already invalid
+    """
+    return session_manager.end_session(token)
+
+def get_meter_id(token: str) -> Optional[str]:
+    """
+    Gets the meter ID a token was issued for.
+    
+    Args:
+        token: The session token
+        
+    Returns:
+        Meter ID or None if the token is invalid
+    """
+    return session_manager.get_meter_id_from_token(token)
@@ -0,0 +1,186 @@
+from typing import Any, Dict, Optional
+import json
+import logging
+import os
+import time
+import uuid
+import httpx
+from types import MappingProxyType
+from app.core.http_client import http_clients
+
+try:
+    import orjson
+except ImportError:  # optional speedup, see the websocket-speedups extra
+    orjson = None
+
+logger = logging.getLogger(__name__)
+
+# Request and response bodies are logged up to this many bytes
+BECKN_LOG_MAX_BYTES = int(os.getenv("BECKN_LOG_MAX_BYTES", "512"))
+
+JSON_HEADERS = MappingProxyType({"Content-Type": "application/json"})
+
+
+def _dumps(obj: Any) -> bytes:
+    if orjson is not None:
+        return orjson.dumps(obj)
+    return json.dumps(obj, separators=(",", ":"), ensure_ascii=False).encode("utf-8")
+
+
+def preview(body: bytes | str, limit: int = BECKN_LOG_MAX_BYTES) -> str:
+    """Returns at most ``limit`` bytes of a body for logging, noting how much was cut."""
+    if isinstance(body, str):
+        body = body.encode("utf-8")
+    if len(body) <= limit:
+        return body.decode("utf-8", "replace")
+    return f"{body[:limit].decode('utf-8', 'ignore')}... [{len(body) - limit} more bytes]"
+
+
+class BecknContext:
+    """
+    Immutable Beckn ``context`` template for one domain and action.
+
+    Everything except ``transaction_id``, ``message_id`` and ``timestamp`` is
+    fixed per network, so the static part is serialized once
+    when the template is created. Building a request then only serializes the
+    three per-request values and the ``message`` body.
+    """
+
+    __slots__ = ("fields", "_prefix")
+
+    def __init__(
+        self,
+        domain: str,
+        action: str,
+        *,
+        country_code: str,
+        city_code: str,
+        version: str,
+        bap_id: str,
+        bap_uri: str,
+        bpp_id: Optional[str] = None,
+        bpp_uri: Optional[str] = None,
+    ):
+        fields = {
+            "domain": domain,
+            "action": action,
+            "location": {"country": {"code": country_code}, "city": {"code": city_code}},
+            "version": version,
+            "bap_id": bap_id,
+            "bap_uri": bap_uri,
+        }
+        if bpp_id:
+            fields["bpp_id"] = bpp_id
+            fields["bpp_uri"] = bpp_uri
+        # '{"context":{...static fields' without the closing braces
+        self._prefix = b'{"context":' + _dumps(fields)[:-1]
+        fields["location"] = MappingProxyType(
+            {scope: MappingProxyType(code) for scope, code in fields["location"].items()}
+        )
+        self.fields = MappingProxyType(fields)
+
+    @property
+    def action(self) -> str:
+        return self.fields["action"]
+
+    def with_action(self, action: str) -> "BecknContext":
+        """Returns a template for another action on the same network."""
+        return self._copy(action=action)
+
+    def with_bap_uri(self, bap_uri: str) -> "BecknContext":
+        """Returns a template whose responses are posted back to ``bap_uri``."""
+        return self._copy(bap_uri=bap_uri)
+
+    def _copy(self, **changes: Any) -> "BecknContext":
+        fields = self.fields
+        options = {
+            "country_code": fields["location"]["country"]["code"],
+            "city_code": fields["location"]["city"]["code"],
+            "version": fields["version"],
+            "bap_id": fields["bap_id"],
+            "bap_uri": fields["bap_uri"],
+            "bpp_id": fields.get("bpp_id"),
+            "bpp_uri": fields.get("bpp_uri"),
+        }
+        options.update(changes)
+        return BecknContext(fields["domain"], options.pop("action", fields["action"]), **options)
+
+    def request(self, message: Dict[str, Any], transaction_id: Optional[str] = None) -> "BecknRequest":
+        """
+        Builds a request from this template.
+
+        Args:
+            message: The Beckn ``message`` body
+            transaction_id: Transaction to continue; a new one is started if omitted
+
+        Returns:
+            The serialized request
+        """
+        transaction_id = transaction_id or str(uuid.uuid4())
+        message_id = str(uuid.uuid4())
+        timestamp = str(int(time.time()))
+        body = b"".join((
+            self._prefix,
+            b',"transaction_id":', _dumps(transaction_id),
+            b',"message_id":"', message_id.encode("ascii"),
+            b'","timestamp":"', timestamp.encode("ascii"),
+            b'"},"message":', _dumps(message),
+            b"}",
+        ))
+        return BecknRequest(self.action, transaction_id, message_id, body)
+
+
+class BecknRequest:
+    """A serialized Beckn request and the ids needed to correlate its responses."""
+
+    __slots__ = ("action", "transaction_id", "message_id", "body")
+
+    def __init__(self, action: str, transaction_id: str, message_id: str, body: bytes):
+        self.action = action
+        self.transaction_id = transaction_id
+        self.message_id = message_id
+        self.body = body
+
+    def describe(self) -> str:
+        return f"action={self.action} transaction_id={self.transaction_id} message_id={self.message_id}"
+
+
+def _log_exchange(url: str, request: BecknRequest, response: httpx.Response, elapsed: float):
+    log = logger.info if response.status_code < 400 else logger.warning
+    log(
+        f"Beckn {request.describe()} url={url} status={response.status_code} "
+        f"sent={len(request.body)}B received={len(response.content)}B elapsed={elapsed * 1000:.0f}ms"
+    )
+    if logger.isEnabledFor(logging.DEBUG):
+        logger.debug(f"Beckn {request.action} request: {preview(request.body)}")
+        logger.debug(f"Beckn {request.action} response: {preview(response.content)}")
+
+
+async def send(
+    url: str, request: BecknRequest, timeout: float = 30, headers: Optional[Dict[str, str]] = None
+) -> httpx.Response:
+    """
+    Posts a Beckn request through the shared HTTP client pool and logs a
+    one-line summary (bodies are logged, size-capped, at DEBUG level).
+    ``headers`` are sent in addition to the JSON content type, e.g.
+    ``If-None-Match`` for conditional searches.
+    """
+    start = time.perf_counter()
+    # A repeated search is harmless; other actions change order state and are not retried
+    response = await http_clients.post(
+        url,
+        content=request.body,
+        headers={**JSON_HEADERS, **headers} if headers else JSON_HEADERS,
+        timeout=timeout,
+        idempotent=request.action == "search",
+    )
+    _log_exchange(url, request, response, time.perf_counter() - start)
+    return response
+
+
+def send_sync(url: str, request: BecknRequest, timeout: float = 30) -> httpx.Response:
+    """Blocking version of ``send`` for synchronous tool paths."""
+    start = time.perf_counter()
+    response = http_clients.request_sync("POST", url, content=request.body, headers=JSON_HEADERS, timeout=timeout)
+    _log_exchange(url, request, response, time.perf_counter() - start)
+    return response
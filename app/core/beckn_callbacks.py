@@ -0,0 +1,278 @@
+from typing import Any, AsyncIterator, Dict, List, Optional
+import asyncio
+import logging
+import time
+import httpx
+from app.config.settings import BecknConfig, settings
+from app.core import beckn
+from app.core.resilience import bounded_timeout
+from app.core.shared_state import SharedStateBackend, shared_state
+
+logger = logging.getLogger(__name__)
+
+# Callbacks received by one worker for a request sent by another
+CALLBACK_FORWARD_CHANNEL = "beckn_callbacks.forward"
+
+# Body of the synchronous acknowledgement to a Beckn request or callback
+ACK = {"message": {"ack": {"status": "ACK"}}}
+
+
+def nack(code: str, message: str) -> Dict[str, Any]:
+    return {"message": {"ack": {"status": "NACK"}}, "error": {"code": code, "message": message}}
+
+
+class BecknNack(httpx.HTTPError):
+    """The network refused a request instead of acknowledging it."""
+
+
+class CallbackTimeout(httpx.TimeoutException):
+    """No callback arrived for a request before its deadline."""
+
+
+class PendingCall:
+    """
+    Callbacks expected for one Beckn request (matched on its message_id).
+
+    Responses are kept in arrival order and can be read by several
+    consumers at once with ``stream()``, each seeing every response as soon
+    as it arrives. The call is complete once ``expected`` responses have
+    arrived or its deadline has passed.
+    """
+
+    def __init__(self, request: beckn.BecknRequest, timeout: float, expected: Optional[int] = None):
+        self.request = request
+        self.expected = expected
+        self.started_at = time.monotonic()
+        self.expires_at = self.started_at + timeout
+        self.responses: List[Dict[str, Any]] = []
+        self.arrival_seconds: List[float] = []  # time from the request to each response
+        self.closed = False
+        self._arrived = asyncio.Event()
+
+    @property
+    def complete(self) -> bool:
+        return self.closed or (self.expected is not None and len(self.responses) >= self.expected)
+
+    def _wake(self):
+        # Readers wait on the event they saw; replacing it rearms the next wait
+        arrived, self._arrived = self._arrived, asyncio.Event()
+        arrived.set()
+
+    def add(self, body: Dict[str, Any]):
+        self.responses.append(body)
+        self.arrival_seconds.append(time.monotonic() - self.started_at)
+        self._wake()
+
+    def close(self):
+        self.closed = True
+        self._wake()
+
+    async def stream(self) -> AsyncIterator[Dict[str, Any]]:
+        """Yields every callback, as it arrives, until the call is complete."""
+        index = 0
+        while True:
+            while index < len(self.responses):
+                yield self.responses[index]
+                index += 1
+            if self.complete:
+                return
+            left = self.expires_at - time.monotonic()
+            if left <= 0:
+                return
+            try:
+                await asyncio.wait_for(self._arrived.wait(), left)
+            except asyncio.TimeoutError:
+                return
+
+    async def collect(self) -> List[Dict[str, Any]]:
+        """Waits until the call is complete and returns every callback."""
+        async for _ in self.stream():
+            pass
+        return list(self.responses)
+
+    async def first(self) -> Dict[str, Any]:
+        """
+        Waits for the first callback.
+
+        Raises:
+            CallbackTimeout: If none arrives before the deadline
+        """
+        async for response in self.stream():
+            return response
+        raise CallbackTimeout(f"No on_{self.request.action} callback for {self.request.describe()}")
+
+
+class CallbackCorrelator:
+    """
+    Matches incoming ``on_*`` callbacks to the requests waiting for them.
+
+    Requests are registered before they are sent (a fast BPP can answer
+    before the acknowledgement returns) and indexed by message_id and by
+    transaction_id. Entries are dropped once complete or past their
+    deadline; callbacks arriving after that are counted as unmatched.
+
+    With several workers a BPP's callback can reach a worker other than the
+    one that sent the request. Every pending message_id is therefore also
+    recorded in the shared state with the worker that owns it, and
+    ``route()`` forwards such callbacks to that worker over pub/sub.
+    """
+
+    def __init__(self, state: Optional[SharedStateBackend] = None):
+        self.state = state or shared_state
+        self._pending: Dict[str, PendingCall] = {}  # message_id -> call
+        self._transactions: Dict[str, List[PendingCall]] = {}  # transaction_id -> calls in order
+        self.owners = self.state.namespace("beckn_pending_calls")  # message_id -> owning worker
+        self.expected = 0
+        self.delivered = 0
+        self.forwarded = 0
+        self.unmatched = 0
+        self.timed_out = 0
+
+    def expect(self, request: beckn.BecknRequest, timeout: float, expected: Optional[int] = None) -> PendingCall:
+        """Registers a request whose callbacks should be collected for ``timeout`` seconds."""
+        call = PendingCall(request, timeout, expected)
+        self._pending[request.message_id] = call
+        self._transactions.setdefault(request.transaction_id, []).append(call)
+        self.owners[request.message_id] = {
+            "worker_id": self.state.worker_id,
+            "action": request.action,
+            "expires_at": time.time() + timeout,
+        }
+        asyncio.get_running_loop().call_later(timeout, self._expire, call)
+        self.expected += 1
+        return call
+
+    def _match(self, action: str, message_id: Optional[str]) -> Optional[PendingCall]:
+        call = self._pending.get(message_id)
+        if call is None or action != f"on_{call.request.action}":
+            return None
+        return call
+
+    def _unmatched(self, action: str, message_id: Optional[str]) -> bool:
+        self.unmatched += 1
+        logger.warning(f"Unmatched Beckn {action} callback for message_id={message_id}")
+        return False
+
+    def deliver(self, action: str, body: Dict[str, Any]) -> bool:
+        """
+        Hands a callback to the request it answers, if this worker sent it.
+
+        Returns:
+            False if no request on this worker is waiting for it
+        """
+        message_id = (body.get("context") or {}).get("message_id")
+        call = self._match(action, message_id)
+        if call is None:
+            return self._unmatched(action, message_id)
+        self._add(call, body)
+        return True
+
+    async def route(self, action: str, body: Dict[str, Any]) -> bool:
+        """
+        Hands a callback to the request it answers, forwarding it to the
+        worker that sent the request if that is another worker.
+
+        Returns:
+            False if no request on any worker is waiting for it
+        """
+        message_id = (body.get("context") or {}).get("message_id")
+        call = self._match(action, message_id)
+        if call is not None:
+            self._add(call, body)
+            return True
+        owner = self.owners.get(message_id) if isinstance(message_id, str) else None
+        if (
+            owner is None
+            or owner["worker_id"] == self.state.worker_id
+            or action != f"on_{owner['action']}"
+            or owner["expires_at"] <= time.time()
+        ):
+            return self._unmatched(action, message_id)
+        await self.state.publish(
+            CALLBACK_FORWARD_CHANNEL, {"worker_id": owner["worker_id"], "action": action, "body": body}
+        )
+        self.forwarded += 1
+        return True
+
+    async def receive_forwarded(self, message: Dict[str, Any], origin: str):
+        """Delivers a callback another worker received for a request sent here."""
+        if message.get("worker_id") == self.state.worker_id:
+            self.deliver(message["action"], message["body"])
+
+    def _add(self, call: PendingCall, body: Dict[str, Any]):
+        call.add(body)
+        self.delivered += 1
+        if call.complete:
+            self.discard(call)
+
+    def discard(self, call: PendingCall):
+        """Stops collecting callbacks for a request."""
+        call.close()
+        if self._pending.get(call.request.message_id) is call:
+            del self._pending[call.request.message_id]
+            self.owners.pop(call.request.message_id, None)
+        calls = self._transactions.get(call.request.transaction_id)
+        if calls is not None and all(other.closed for other in calls):
+            del self._transactions[call.request.transaction_id]
+
+    def _expire(self, call: PendingCall):
+        if call.closed:
+            return
+        if not call.responses:
+            self.timed_out += 1
+        self.discard(call)
+
+    def calls_for(self, transaction_id: str) -> List[PendingCall]:
+        """Requests of a transaction that are still collecting callbacks."""
+        return list(self._transactions.get(transaction_id, ()))
+
+    def get_metrics(self) -> Dict[str, Any]:
+        return {
+            "pending": len(self._pending),
+            "expected": self.expected,
+            "delivered": self.delivered,
+            "forwarded": self.forwarded,
+            "unmatched": self.unmatched,
+            "timed_out": self.timed_out,
+        }
+
+
+def enabled(config: Optional[BecknConfig] = None) -> bool:
+    """True when Beckn requests should use on_* callbacks instead of the BAP client wrapper."""
+    config = config or settings.beckn
+    return bool(config.callback_base_url and config.network_url)
+
+
+def callback_context(template: beckn.BecknContext) -> beckn.BecknContext:
+    """Returns the template with bap_uri pointing at this service's callback router."""
+    return template.with_bap_uri(f"{settings.beckn.callback_base_url.rstrip('/')}/beckn")
+
+
+async def request(request: beckn.BecknRequest, timeout: float, expected: Optional[int] = None) -> PendingCall:
+    """
+    Sends a request to the configured network and returns the call that
+    collects its callbacks. The request must be built from a
+    ``callback_context`` template.
+
+    Raises:
+        BecknNack: If the network does not acknowledge the request
+        httpx.HTTPError: If the request cannot be sent
+    """
+    timeout = bounded_timeout(timeout)
+    call = correlator.expect(request, timeout, expected)
+    url = f"{settings.beckn.network_url.rstrip('/')}/{request.action}"
+    try:
+        response = await beckn.send(url, request, timeout=timeout)
+        response.raise_for_status()
+        ack = response.json().get("message", {}).get("ack", {}).get("status")
+        if ack != "ACK":
+            raise BecknNack(f"{request.action} was not acknowledged: {beckn.preview(response.content)}")
+    except BaseException:
+        correlator.discard(call)
+        raise
+    return call
+
+# Create a singleton instance
+correlator = CallbackCorrelator()
+
+shared_state.subscribe(CALLBACK_FORWARD_CHANNEL, correlator.receive_forwarded)
@@ -0,0 +1,142 @@
+from typing import Any, Dict, List, Optional
+import json
+import logging
+from app.core.transaction_store import transaction_store
+
+logger = logging.getLogger(__name__)
+
+
+def estimate_tokens(text: str) -> int:
+    """Rough LLM token count (about four characters per token for JSON)."""
+    return (len(text) + 3) // 4
+
+
+def _price(price: Optional[Dict[str, Any]]) -> Optional[str]:
+    if not price or price.get("value") is None:
+        return None
+    return f"{price['value']} {price.get('currency', '')}".rstrip()
+
+
+def _name(entity: Dict[str, Any]) -> Optional[str]:
+    return (entity.get("descriptor") or {}).get("name")
+
+
+def _compact(value: Dict[str, Any]) -> Dict[str, Any]:
+    """Drops empty fields so they cost no tokens."""
+    return {key: item for key, item in value.items() if item not in (None, "", [], {})}
+
+
+def _item(item: Dict[str, Any]) -> Dict[str, Any]:
+    return _compact({"id": item.get("id"), "name": _name(item), "price": _price(item.get("price"))})
+
+
+def _project_catalog(response: Dict[str, Any]) -> List[Dict[str, Any]]:
+    catalog = (response.get("message") or {}).get("catalog") or {}
+    bpp_id = (response.get("context") or {}).get("bpp_id")
+    return [
+        _compact({
+            "bpp_id": bpp_id,
+            "id": provider.get("id"),
+            "name": _name(provider),
+            "items": [_item(item) for item in provider.get("items") or []],
+        })
+        for provider in catalog.get("providers") or []
+    ]
+
+
+def _project_order(response: Dict[str, Any]) -> Dict[str, Any]:
+    order = (response.get("message") or {}).get("order") or {}
+    provider = order.get("provider") or {}
+    fulfillments = [
+        _compact({
+            "id": fulfillment.get("id"),
+            "type": fulfillment.get("type"),
+            "state": ((fulfillment.get("state") or {}).get("descriptor") or {}).get("code"),
+        })
+        for fulfillment in order.get("fulfillments") or []
+    ]
+    return _compact({
+        "bpp_id": (response.get("context") or {}).get("bpp_id"),
+        "order_id": order.get("id"),
+        "status": order.get("status"),
+        "provider_id": provider.get("id"),
+        "provider_name": _name(provider),
+        "items": [_item(item) for item in order.get("items") or []],
+        "quote_total": _price((order.get("quote") or {}).get("price")),
+        "fulfillments": fulfillments,
+    })
+
+
+def project(action: str, body: Dict[str, Any]) -> Dict[str, Any]:
+    """
+    Extracts what the agent needs from a BAP client response: provider and
+    item ids, names and prices for a search; order, provider, item,
+    fulfillment ids and the quote total for select/init/confirm.
+
+    Searches carry no transaction_id: one cached catalog is shown to every
+    user, and each user's order starts its own transaction at select.
+    """
+    responses = body.get("responses") or []
+    if action == "search":
+        providers = [provider for response in responses for provider in _project_catalog(response)]
+        return _compact({"providers": providers})
+    transaction_id = next(
+        ((response.get("context") or {}).get("transaction_id") for response in responses), None
+    )
+    return _compact({"transaction_id": transaction_id, "responses": [_project_order(response) for response in responses]})
+
+
+class ProjectionStats:
+    """Observation sizes before and after projection for one action."""
+
+    def __init__(self):
+        self.observations = 0
+        self.raw_tokens = 0
+        self.projected_tokens = 0
+        self.failures = 0
+
+    def snapshot(self) -> Dict[str, Any]:
+        return {
+            "observations": self.observations,
+            "raw_tokens": self.raw_tokens,
+            "projected_tokens": self.projected_tokens,
+            "saved_ratio": round(1 - self.projected_tokens / self.raw_tokens, 3) if self.raw_tokens else None,
+            "failures": self.failures,
+        }
+
+
+_stats: Dict[str, ProjectionStats] = {}
+
+
+def observe(action: str, raw: str, transaction_id: Optional[str] = None) -> str:
+    """
+    Turns a raw Beckn response into the tool observation for the agent.
+
+    The full payload is kept in the transaction store under its
+    transaction_id (searches have none) and the agent gets the compact
+    projection as JSON. If the response cannot be projected it is passed
+    through unchanged.
+    """
+    stats = _stats.setdefault(action, ProjectionStats())
+    stats.observations += 1
+    raw_tokens = estimate_tokens(raw)
+    stats.raw_tokens += raw_tokens
+    try:
+        projected = project(action, json.loads(raw))
+    except Exception as e:
+        stats.failures += 1
+        stats.projected_tokens += raw_tokens
+        logger.warning(f"Could not project Beckn {action} response, passing it through: {e}")
+        return raw
+
+    transaction_id = projected.get("transaction_id") or transaction_id
+    if transaction_id:
+        transaction_store.save_payload(transaction_id, action, raw)
+    observation = json.dumps(projected, separators=(",", ":"), ensure_ascii=False)
+    stats.projected_tokens += estimate_tokens(observation)
+    return observation
+
+
+def get_metrics() -> Dict[str, Any]:
+    """Estimated observation tokens per action before and after projection."""
+    return {action: stats.snapshot() for action, stats in _stats.items()}
@@ -0,0 +1,298 @@
+from typing import Any, Awaitable, Callable, Dict, List, Optional, Sequence
+import asyncio
+import logging
+import math
+import time
+import numpy as np
+from app.config.settings import BreachForecastConfig, settings
+from app.core.telemetry import TelemetryStore, telemetry_store
+from app.core.websocket_manager import LatencyHistogram
+
+logger = logging.getLogger(__name__)
+
+# Fewest samples a trend is fitted to
+MIN_SAMPLES = 3
+
+LINEAR = 0
+EXPONENTIAL = 1
+MODEL_NAMES = ("linear", "exponential")
+
+
+def _fit(t: np.ndarray, y: np.ndarray, weights: np.ndarray, n: np.ndarray):
+    """
+    Row-wise weighted least squares of y = intercept + slope * t.
+
+    Returns:
+        (intercept, slope, slope standard error, residual sum of squares)
+    """
+    t_mean = (weights * t).sum(axis=1) / n
+    y_mean = (weights * y).sum(axis=1) / n
+    dt = (t - t_mean[:, None]) * weights
+    sxx = (dt * dt).sum(axis=1)
+    slope = (dt * (y - y_mean[:, None])).sum(axis=1) / sxx
+    intercept = y_mean - slope * t_mean
+    residuals = (y - intercept[:, None] - slope[:, None] * t) * weights
+    ssr = (residuals * residuals).sum(axis=1)
+    slope_error = np.sqrt(ssr / np.maximum(n - 2, 1) / sxx)
+    return intercept, slope, slope_error, ssr
+
+
+def _minutes_until(level: np.ndarray, rate: np.ndarray, target: np.ndarray) -> np.ndarray:
+    """Minutes for a trend to reach a target: 0 if already there, inf if never."""
+    minutes = np.where(rate > 0, (target - level) / rate, np.inf)
+    return np.where(level >= target, 0.0, minutes)
+
+
+def forecast(
+    times: np.ndarray,
+    loads: np.ndarray,
+    valid: np.ndarray,
+    capacity: np.ndarray,
+    horizon: Optional[float] = None,
+    z: Optional[float] = None,
+    now: Optional[float] = None,
+    max_age: Optional[float] = None,
+) -> Dict[str, np.ndarray]:
+    """
+    Estimates minutes to a capacity breach for every row in one vectorized pass.
+
+    Each row is fitted with a linear trend of the load and a linear trend of
+    its logarithm (exponential growth); the fit with the smaller squared
+    error on the load is used. The band moves the fitted growth rate by
+    ``z`` standard errors: the faster rate gives the earliest breach, the
+    slower the latest (inf if it is not rising). Times are counted from each
+    row's latest sample. Rows whose latest sample is more than ``max_age``
+    seconds before ``now`` get no forecast: a transformer that stopped
+    reporting must not keep being projected forward. ``horizon``, ``z``
+    and ``max_age`` default to the ``breach_forecast`` settings.
+
+    Args:
+        times, loads: (rows, samples) matrices, oldest sample first
+        valid: False where a row has no sample
+        capacity: Capacity per row, NaN when unknown
+
+    Returns:
+        Arrays per row: minutes, lower, upper (NaN when no forecast could be
+        made, inf when no breach is expected within ``horizon``), model,
+        level (fitted current load) and rate (kW per minute now)
+    """
+    config = settings.breach_forecast
+    horizon = config.horizon_minutes if horizon is None else horizon
+    z = config.z if z is None else z
+    max_age = config.max_age_seconds if max_age is None else max_age
+    weights = valid.astype(float)
+    n = weights.sum(axis=1)
+    # Minutes relative to the latest sample, so the intercept is the current level
+    latest = np.where(valid, times, -np.inf).max(axis=1)
+    t = np.where(valid, (times - latest[:, None]) / 60, 0.0)
+    y = np.where(valid, loads, 0.0)
+    positive = np.where(valid, loads > 0, True).all(axis=1)
+
+    with np.errstate(divide="ignore", invalid="ignore", over="ignore"):
+        level, rate, rate_error, ssr = _fit(t, y, weights, n)
+        linear = _minutes_until(level, rate, capacity)
+        linear_lower = _minutes_until(level, rate + z * rate_error, capacity)
+        linear_upper = _minutes_until(level, rate - z * rate_error, capacity)
+
+        log_level, growth, growth_error, _ = _fit(t, np.log(np.where(positive[:, None] & valid, loads, 1.0)), weights, n)
+        log_capacity = np.log(capacity)
+        exponential = _minutes_until(log_level, growth, log_capacity)
+        exponential_lower = _minutes_until(log_level, growth + z * growth_error, log_capacity)
+        exponential_upper = _minutes_until(log_level, growth - z * growth_error, log_capacity)
+        residuals = (y - np.exp(log_level[:, None] + growth[:, None] * t)) * weights
+        exponential_ssr = np.where(positive, (residuals * residuals).sum(axis=1), np.inf)
+
+        use_exponential = exponential_ssr < ssr
+        model = np.where(use_exponential, EXPONENTIAL, LINEAR)
+        minutes = np.where(use_exponential, exponential, linear)
+        lower = np.where(use_exponential, exponential_lower, linear_lower)
+        upper = np.where(use_exponential, exponential_upper, linear_upper)
+        current_level = np.where(use_exponential, np.exp(log_level), level)
+        current_rate = np.where(use_exponential, growth * np.exp(log_level), rate)
+
+    now = time.time() if now is None else now
+    usable = (n >= MIN_SAMPLES) & (capacity > 0) & np.isfinite(level) & (now - latest <= max_age)
+    result = {}
+    for name, values in (("minutes", minutes), ("lower", lower), ("upper", upper)):
+        values = np.where(values > horizon, np.inf, values)
+        result[name] = np.where(usable, values, np.nan)
+    result["model"] = model
+    result["level"] = np.where(usable, current_level, np.nan)
+    result["rate"] = np.where(usable, current_rate, np.nan)
+    result["latest"] = latest
+    return result
+
+
+def _minutes(value: float) -> Optional[float]:
+    """A forecast value for JSON: None when unknown or beyond the horizon."""
+    return None if math.isnan(value) or math.isinf(value) else round(float(value), 1)
+
+
+class BreachForecast:
+    """The breach-time forecast of every transformer at one point in time."""
+
+    def __init__(
+        self,
+        transformer_ids: Sequence[str],
+        result: Dict[str, np.ndarray],
+        computed_at: float,
+        duration: float,
+        max_age: Optional[float] = None,
+    ):
+        self.transformer_ids = list(transformer_ids)
+        self._index = {transformer_id: index for index, transformer_id in enumerate(self.transformer_ids)}
+        self.result = result
+        self.computed_at = computed_at
+        self.duration = duration
+        self.max_age = settings.breach_forecast.max_age_seconds if max_age is None else max_age
+
+    def get(self, transformer_id: str, now: Optional[float] = None) -> Optional[Dict[str, Any]]:
+        """
+        A transformer's forecast with minutes counted from ``now``, or None
+        if it has too few samples, no known capacity or no sample within
+        ``max_age`` of ``now``.
+        """
+        index = self._index.get(str(transformer_id))
+        if index is None or math.isnan(self.result["minutes"][index]):
+            return None
+        age = float((now or time.time()) - self.result["latest"][index])
+        if age > self.max_age:
+            return None
+        elapsed = age / 60
+
+        def from_now(name: str) -> Optional[float]:
+            value = _minutes(self.result[name][index])
+            return None if value is None else max(0.0, round(value - elapsed, 1))
+
+        return {
+            "transformer_id": self.transformer_ids[index],
+            "minutes_to_breach": from_now("minutes"),
+            "lower_minutes": from_now("lower"),
+            "upper_minutes": from_now("upper"),
+            "model": MODEL_NAMES[int(self.result["model"][index])],
+            "level_kw": round(float(self.result["level"][index]), 2),
+            "rate_kw_per_min": round(float(self.result["rate"][index]), 4),
+            "computed_at": self.computed_at,
+        }
+
+    def at_risk(self, within_minutes: float, now: Optional[float] = None) -> List[Dict[str, Any]]:
+        """Transformers forecast to breach within the given minutes, soonest first."""
+        now = now or time.time()
+        age = now - self.result["latest"]
+        minutes = self.result["minutes"] - age / 60
+        with np.errstate(invalid="ignore"):
+            indices = np.flatnonzero((minutes <= within_minutes) & (age <= self.max_age))
+        indices = indices[np.argsort(minutes[indices])]
+        return [self.get(self.transformer_ids[index], now) for index in indices]
+
+    def snapshot(self) -> Dict[str, Any]:
+        minutes = self.result["minutes"]
+        return {
+            "transformers": len(self.transformer_ids),
+            "forecast": int(np.count_nonzero(~np.isnan(minutes))),
+            "breach_expected": int(np.count_nonzero(np.isfinite(minutes))),
+            "computed_at": self.computed_at,
+            "duration_ms": round(self.duration * 1000, 2),
+        }
+
+
+class BreachForecaster:
+    """
+    Re-forecasts every transformer's time to a capacity breach on a schedule.
+
+    Each tick copies the latest load window of the whole fleet out of the
+    telemetry store as stacked matrices (on the event loop, so no sample is
+    half-written) and fits them in a worker thread with ``forecast``. Readers
+    get the latest complete forecast without waiting.
+    """
+
+    def __init__(self, store: TelemetryStore, config: Optional[BreachForecastConfig] = None):
+        self.store = store
+        self.config = config or settings.breach_forecast
+        self.current: Optional[BreachForecast] = None
+        self.ticks = 0
+        self.failures = 0
+        self.tick_latency = LatencyHistogram()
+        self._listeners: List[Callable[[BreachForecast], Awaitable[None]]] = []
+        self._task: Optional[asyncio.Task] = None
+
+    def subscribe(self, listener: Callable[[BreachForecast], Awaitable[None]]):
+        """Registers a coroutine called with every new forecast."""
+        self._listeners.append(listener)
+
+    def _inputs(self, rows: Optional[np.ndarray] = None):
+        times, loads, valid = self.store.window(self.config.window, rows)
+        capacity = self.store.capacity[slice(0, len(self.store)) if rows is None else rows].copy()
+        return times, loads, valid, capacity
+
+    def _forecast(self, inputs, now: Optional[float] = None) -> Dict[str, np.ndarray]:
+        config = self.config
+        return forecast(*inputs, horizon=config.horizon_minutes, z=config.z, now=now, max_age=config.max_age_seconds)
+
+    async def run_once(self) -> BreachForecast:
+        """Forecasts every transformer and publishes the result."""
+        start = time.perf_counter()
+        transformer_ids = self.store.transformer_ids
+        inputs = self._inputs()
+        result = await asyncio.to_thread(self._forecast, inputs, time.time())
+        duration = time.perf_counter() - start
+        self.current = BreachForecast(transformer_ids, result, time.time(), duration, self.config.max_age_seconds)
+        self.ticks += 1
+        self.tick_latency.observe(duration)
+        latest = self.current
+        for listener in self._listeners:
+            try:
+                await listener(latest)
+            except Exception as e:
+                logger.error(f"Breach forecast listener failed: {str(e)}", exc_info=True)
+        return latest
+
+    def forecast_one(self, transformer_id: str) -> Optional[Dict[str, Any]]:
+        """
+        Forecasts one transformer from its latest samples right away, e.g.
+        for an alert that just added a sample.
+        """
+        rows = self.store.rows([transformer_id])
+        if not len(rows):
+            return None
+        result = self._forecast(self._inputs(rows))
+        return BreachForecast([str(transformer_id)], result, time.time(), 0.0, self.config.max_age_seconds).get(transformer_id)
+
+    def get(self, transformer_id: str) -> Optional[Dict[str, Any]]:
+        """The transformer's forecast from the latest tick."""
+        return self.current.get(transformer_id) if self.current else None
+
+    async def start(self):
+        """Start the forecast task."""
+        if self._task is None:
+            self._task = asyncio.create_task(self._forecast_loop())
+
+    async def stop(self):
+        """Stop the forecast task."""
+        if self._task is not None:
+            self._task.cancel()
+            self._task = None
+
+    async def _forecast_loop(self):
+        while True:
+            try:
+                if len(self.store):
+                    await self.run_once()
+            except asyncio.CancelledError:
+                raise
+            except Exception as e:
+                self.failures += 1
+                logger.error(f"Breach forecast failed: {str(e)}", exc_info=True)
+            await asyncio.sleep(self.config.interval_seconds)
+
+    def get_metrics(self) -> Dict[str, Any]:
+        """Latest forecast summary, tick count and tick duration."""
+        return {
+            "latest": self.current.snapshot() if self.current else None,
+            "ticks": self.ticks,
+            "failures": self.failures,
+            "tick_latency": self.tick_latency.snapshot(),
+        }
+
+# Create a singleton instance
+breach_forecaster = BreachForecaster(telemetry_store)
@@ -0,0 +1,149 @@
+from typing import Any, Awaitable, Callable, Dict, Optional
+import logging
+import time
+from app.config.settings import BreachScanConfig, settings
+from app.core.breach_forecast import BreachForecast, BreachForecaster, breach_forecaster
+from app.core.dfp_options import DFPOptionsStore, DFPSnapshot
+from app.tools.specific_tools.grid_tools.dfp_search import dfp_options
+
+logger = logging.getLogger(__name__)
+
+# Called with a transformer's forecast and its prepared recommendation
+AlertHandler = Callable[[Dict[str, Any], Dict[str, Any]], Awaitable[None]]
+
+
+def choose_dfp_option(snapshot: DFPSnapshot, breach: Dict[str, Any], edr_minutes: Optional[float] = None) -> Dict[str, Any]:
+    """
+    Picks the DFP option for a forecast breach: EDR when the breach is under
+    ``edr_minutes`` away (or already happening), DDR otherwise.
+    """
+    edr_minutes = settings.breach_scan.edr_minutes if edr_minutes is None else edr_minutes
+    minutes = breach.get("minutes_to_breach")
+    wanted = "EDR" if minutes is not None and minutes < edr_minutes else "DDR"
+    for index, option in enumerate(snapshot.options):
+        if option.get("id") == wanted:
+            break
+    else:
+        index = 1 if wanted == "EDR" and len(snapshot.options) > 1 else 0
+    return {
+        "option": snapshot.options[index],
+        "option_index": index,
+        "dfp_version": snapshot.version,
+        "prepared_at": time.time(),
+    }
+
+
+class BreachScanner:
+    """
+    Raises transformer stress alerts from the breach forecast, ahead of any
+    posted alert.
+
+    After every forecast tick, transformers forecast to breach within
+    ``prepare_minutes`` get their DFP options prefetched and a
+    recommendation chosen; those within ``horizon_minutes`` are alerted,
+    at most once per ``cooldown_seconds`` each. The alert carries the
+    prepared recommendation, so dashboards get it with the alert instead of
+    after an agent round trip. Recommendations are kept until the DFP
+    options version changes, so posted alerts can use them as well.
+    """
+
+    def __init__(
+        self,
+        forecaster: BreachForecaster,
+        options: DFPOptionsStore,
+        config: Optional[BreachScanConfig] = None,
+    ):
+        self.options = options
+        self.config = config or settings.breach_scan
+        self._handler: Optional[AlertHandler] = None
+        self._recommendations: Dict[str, Dict[str, Any]] = {}  # transformer_id -> prepared recommendation
+        self._alerted_at: Dict[str, float] = {}  # transformer_id -> epoch seconds of the last alert
+        self.scans = 0
+        self.alerts = 0
+        self.prefetches = 0
+        self._prefetched_at = 0.0  # epoch seconds of the last prefetch attempt
+        self.prefetch_failures = 0
+        self.last_lead_minutes: Optional[float] = None
+        forecaster.subscribe(self.scan)
+
+    def on_alert(self, handler: AlertHandler):
+        """Sets the coroutine that raises an alert."""
+        self._handler = handler
+
+    def mark_alerted(self, transformer_id: Any):
+        """Records an alert raised elsewhere (e.g. posted), so it is not repeated."""
+        self._alerted_at[str(transformer_id)] = time.time()
+
+    def recommendation_for(self, transformer_id: Any) -> Optional[Dict[str, Any]]:
+        """The prepared recommendation of a transformer, if made from the current DFP options."""
+        recommendation = self._recommendations.get(str(transformer_id))
+        if recommendation is None or recommendation["dfp_version"] != self.options.current.version:
+            return None
+        return recommendation
+
+    async def _prefetch(self) -> DFPSnapshot:
+        """Refreshes the DFP options now unless they were confirmed or tried recently."""
+        current = self.options.current
+        now = time.time()
+        if now - max(current.fetched_at or 0.0, self._prefetched_at) < self.config.dfp_prefetch_max_age_seconds:
+            return current
+        self._prefetched_at = now
+        self.prefetches += 1
+        try:
+            return await self.options.refresh()
+        except Exception as e:
+            self.prefetch_failures += 1
+            logger.warning(f"Prefetching DFP options failed, using version {current.version}: {e}")
+            return self.options.current
+
+    async def scan(self, forecast: BreachForecast):
+        """Prepares and raises alerts for the transformers in a forecast."""
+        config = self.config
+        if not config.enabled:
+            return
+        self.scans += 1
+        now = time.time()
+        upcoming = forecast.at_risk(max(config.prepare_minutes, config.horizon_minutes), now)
+        # Forget recommendations of transformers that are no longer at risk
+        at_risk = {breach["transformer_id"] for breach in upcoming}
+        for transformer_id in [key for key in self._recommendations if key not in at_risk]:
+            del self._recommendations[transformer_id]
+        if not upcoming:
+            return
+
+        snapshot = await self._prefetch()
+        for breach in upcoming:
+            transformer_id = breach["transformer_id"]
+            self._recommendations[transformer_id] = choose_dfp_option(snapshot, breach, config.edr_minutes)
+
+        if self._handler is None:
+            return
+        for breach in upcoming:
+            transformer_id = breach["transformer_id"]
+            if breach["minutes_to_breach"] > config.horizon_minutes:
+                break
+            if now - self._alerted_at.get(transformer_id, 0) < config.cooldown_seconds:
+                continue
+            self._alerted_at[transformer_id] = now
+            self.alerts += 1
+            self.last_lead_minutes = breach["minutes_to_breach"]
+            logger.info(f"Breach of transformer {transformer_id} forecast in {breach['minutes_to_breach']} minutes, raising alert")
+            try:
+                await self._handler(breach, self._recommendations[transformer_id])
+            except Exception as e:
+                logger.error(f"Raising forecast alert for transformer {transformer_id} failed: {str(e)}", exc_info=True)
+
+    def get_metrics(self) -> Dict[str, Any]:
+        """Scans, alerts raised, DFP prefetches and recommendations ready."""
+        return {
+            "enabled": self.config.enabled,
+            "scans": self.scans,
+            "alerts": self.alerts,
+            "last_lead_minutes": self.last_lead_minutes,
+            "prepared_recommendations": len(self._recommendations),
+            "dfp_prefetches": self.prefetches,
+            "dfp_prefetch_failures": self.prefetch_failures,
+        }
+
+# Create a singleton instance
+breach_scanner = BreachScanner(breach_forecaster, dfp_options)
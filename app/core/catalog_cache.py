@@ -0,0 +1,171 @@
+from typing import Any, Awaitable, Callable, Dict, Optional, Tuple
+import asyncio
+import logging
+import time
+from app.core.lifecycle import lifecycle
+
+logger = logging.getLogger(__name__)
+
+# After a failed refresh, wait this long (or the TTL, if shorter) before trying again
+FAILED_REFRESH_RETRY_SECONDS = 30.0
+
+# name -> cache, for metrics
+_caches: Dict[str, "CatalogCache"] = {}
+
+
+class CatalogCache:
+    """
+    Stale-while-revalidate cache for one catalog that does not depend on the
+    caller (e.g. the solar retail search, which always uses the same query).
+
+    The last good catalog is always served immediately. Once it is older than
+    ``ttl`` a background refresh is started; concurrent refreshes share one
+    upstream request. Only the very first read (or a read after every fetch
+    so far has failed) waits on the network. Failed refreshes keep serving
+    the previous catalog and are retried after a pause rather than on every
+    read. The catalog is kept in restart snapshots.
+    """
+
+    def __init__(
+        self,
+        name: str,
+        fetch: Callable[[], Awaitable[str]],
+        ttl: float,
+        fetch_sync: Optional[Callable[[], str]] = None,
+    ):
+        self.name = name
+        self.ttl = ttl
+        self._fetch = fetch
+        self._fetch_sync = fetch_sync
+        self._value: Optional[str] = None
+        self._fetched_at = 0.0  # epoch seconds, so ages survive restarts
+        self._next_refresh_at = 0.0
+        self._inflight: Optional[asyncio.Task] = None
+        self.hits = 0
+        self.stale_hits = 0
+        self.misses = 0
+        self.refreshes = 0
+        self.refresh_failures = 0
+        self.last_error: Optional[str] = None
+        _caches[name] = self
+        lifecycle.register_snapshot(f"catalog:{name}", self._export, self._restore)
+
+    @property
+    def age(self) -> Optional[float]:
+        """Seconds since the cached catalog was fetched, or None when empty."""
+        return None if self._value is None else time.time() - self._fetched_at
+
+    def _store(self, value: str):
+        self._value = value
+        self._fetched_at = time.time()
+        self._next_refresh_at = self._fetched_at + self.ttl
+        self.refreshes += 1
+        self.last_error = None
+
+    def _failed(self, error: Exception):
+        self.refresh_failures += 1
+        self.last_error = str(error).splitlines()[0] if str(error) else repr(error)
+        self._next_refresh_at = time.time() + min(self.ttl, FAILED_REFRESH_RETRY_SECONDS)
+        logger.warning(f"Refreshing catalog {self.name} failed: {error}")
+
+    async def _refresh(self) -> Optional[str]:
+        try:
+            self._store(await self._fetch())
+        except Exception as e:
+            self._failed(e)
+            if self._value is None:
+                raise
+        return self._value
+
+    def refresh(self) -> asyncio.Task:
+        """Starts (or joins) a refresh of the catalog."""
+        if self._inflight is None:
+            self._inflight = asyncio.create_task(self._refresh())
+            self._inflight.add_done_callback(self._refresh_done)
+        return self._inflight
+
+    def _refresh_done(self, task: asyncio.Task):
+        self._inflight = None
+        # Background refreshes are never awaited; retrieve their error so
+        # it is not reported as unhandled
+        if not task.cancelled():
+            task.exception()
+
+    def prefetch(self):
+        """Fetches the catalog in the background if it is missing or stale."""
+        if self._value is None or time.time() >= self._next_refresh_at:
+            self.refresh()
+
+    async def get(self) -> Tuple[str, float]:
+        """
+        Gets the catalog and its age in seconds.
+
+        Raises:
+            Exception: The fetch error, if no catalog has ever been fetched
+        """
+        if self._value is not None:
+            if self.age > self.ttl:
+                self.stale_hits += 1
+                if time.time() >= self._next_refresh_at:
+                    self.refresh()
+            else:
+                self.hits += 1
+            return self._value, self.age
+
+        self.misses += 1
+        # Shield so that a cancelled caller does not cancel the shared fetch
+        value = await asyncio.shield(self.refresh())
+        return value, self.age
+
+    def get_sync(self) -> Tuple[str, float]:
+        """
+        Blocking version of get() for synchronous callers. A stale catalog
+        is refreshed inline, since there is no event loop to do it later.
+        """
+        if self._value is not None and self.age <= self.ttl:
+            self.hits += 1
+            return self._value, self.age
+
+        if self._value is None:
+            self.misses += 1
+        else:
+            self.stale_hits += 1
+            if time.time() < self._next_refresh_at:
+                return self._value, self.age
+        try:
+            self._store(self._fetch_sync())
+        except Exception as e:
+            self._failed(e)
+            if self._value is None:
+                raise
+        return self._value, self.age
+
+    def _export(self) -> Optional[Dict[str, Any]]:
+        if self._value is None:
+            return None
+        return {"value": self._value, "fetched_at": self._fetched_at}
+
+    def _restore(self, state: Optional[Dict[str, Any]]):
+        if state and self._value is None:
+            self._value = state["value"]
+            self._fetched_at = state["fetched_at"]
+            self._next_refresh_at = self._fetched_at + self.ttl
+
+    def snapshot(self) -> Dict[str, Any]:
+        age = self.age
+        return {
+            "age_seconds": None if age is None else round(age, 1),
+            "ttl_seconds": self.ttl,
+            "refreshing": self._inflight is not None,
+            "hits": self.hits,
+            "stale_hits": self.stale_hits,
+            "misses": self.misses,
+            "refreshes": self.refreshes,
+            "refresh_failures": self.refresh_failures,
+            "last_error": self.last_error,
+        }
+
+
+def get_metrics() -> Dict[str, Any]:
+    """Age, hit counts and refresh outcomes of every catalog cache."""
+    return {name: cache.snapshot() for name, cache in _caches.items()}
@@ -0,0 +1,424 @@
+from typing import Any, Dict, Iterable, List, Optional, Sequence, Tuple
+import asyncio
+import logging
+import os
+import time
+import uuid
+from collections import OrderedDict
+from datetime import datetime
+from cachetools import TTLCache
+import httpx
+from dotenv import load_dotenv
+from app.config.settings import DERDispatchConfig, settings
+from app.core.der_inventory import der_inventory
+from app.core.http_client import http_clients
+from app.core.resilience import UpstreamUnavailable
+from app.core.shared_state import shared_state
+from app.core.websocket_manager import LatencyHistogram, connection_manager
+
+# Load environment variables
+load_dotenv()
+
+logger = logging.getLogger(__name__)
+
+DER_SWITCH_OFF_URL = os.getenv(
+    "DER_SWITCH_OFF_URL", "https://playground.becknprotocol.io/meter-data-simulator/ders/switch-off"
+)
+
+# Rejections that can be caused by individual device IDs; any other status
+# (auth, rate limiting, server errors) fails the whole batch without splitting
+PER_DEVICE_REJECTIONS = frozenset({400, 404, 422})
+
+# Devices rated above this are worth switching off during an event
+DISPATCHABLE_MIN_POWER_W = 500
+# Devices switched off per household
+DISPATCHABLE_DEVICES_PER_METER = 3
+
+# Pub/sub channel carrying progress to the dashboards on every worker
+DER_DISPATCH_PROGRESS_CHANNEL = "der_dispatch.progress"
+
+# Sent to a household once its devices are switched off for a DFP event
+DER_DISPATCH_DONE_TEXT = "✅ Your enrolled devices have been switched off for this Demand Flexibility event. Thank you for taking part!"
+
+# (event_id, meter_id) of the households already told, so a meter dispatched
+# again for the same event is not told twice
+_notified_meters: TTLCache = TTLCache(maxsize=100_000, ttl=24 * 3600)
+
+
+def dispatchable_devices(devices: Iterable[Dict[str, Any]], limit: int = DISPATCHABLE_DEVICES_PER_METER) -> List[Dict[str, Any]]:
+    """
+    Picks the switched-on appliances worth switching off from a meter's DER
+    inventory, highest power rating first.
+    """
+    candidates = [
+        device
+        for device in devices
+        if device.get("id") is not None
+        and device.get("switched_on", False)
+        and (device.get("appliance") or {}).get("powerRating", 0) > DISPATCHABLE_MIN_POWER_W
+    ]
+    candidates.sort(key=lambda device: device["appliance"]["powerRating"], reverse=True)
+    return candidates[:limit]
+
+
+def _power_kw(meter_id: str, der_id: Any) -> float:
+    """Power rating of a device from the cached inventory, 0 if unknown."""
+    for device in der_inventory.get_cached(meter_id) or []:
+        if device.get("id") == der_id:
+            return (device.get("appliance") or {}).get("powerRating", 0) / 1000
+    return 0.0
+
+
+class DERCommand:
+    """A switch-off command for one device, acknowledged individually."""
+
+    def __init__(self, job: "DispatchJob", meter_id: str, der_id: Any, kw: float, url: str):
+        self.job = job
+        self.meter_id = meter_id
+        self.der_id = der_id
+        self.kw = kw
+        self.url = url
+        self.state = "queued"  # queued -> sent -> acked | failed
+        self.error: Optional[str] = None
+        self.queued_at = time.perf_counter()
+
+
+class DispatchJob:
+    """The switch-off commands of one DFP event and their acknowledgements."""
+
+    def __init__(self, event_id: Optional[str]):
+        self.job_id = str(uuid.uuid4())
+        self.event_id = event_id
+        self.commands: List[DERCommand] = []
+        self.started_at = time.perf_counter()
+        self.finished_at: Optional[float] = None
+        self.done = asyncio.Event()
+        self._last_report = 0.0
+
+    def count(self, state: str) -> int:
+        return sum(1 for command in self.commands if command.state == state)
+
+    @property
+    def finished(self) -> bool:
+        return self.done.is_set()
+
+    def _settle(self):
+        if not self.finished and all(command.state in ("acked", "failed") for command in self.commands):
+            self.finished_at = time.perf_counter()
+            self.done.set()
+
+    async def wait(self, timeout: Optional[float] = None) -> "DispatchJob":
+        """Waits until every command is acknowledged or has failed."""
+        await asyncio.wait_for(self.done.wait(), timeout)
+        return self
+
+    def failed_ders(self) -> List[Any]:
+        return [command.der_id for command in self.commands if command.state == "failed"]
+
+    def snapshot(self, include_ders: bool = False) -> Dict[str, Any]:
+        elapsed = (self.finished_at or time.perf_counter()) - self.started_at
+        acked = self.count("acked")
+        snapshot = {
+            "job_id": self.job_id,
+            "event_id": self.event_id,
+            "status": "completed" if self.finished else "in_progress",
+            "ders": len(self.commands),
+            "meters": len({command.meter_id for command in self.commands}),
+            "queued": self.count("queued"),
+            "sent": self.count("sent"),
+            "acked": acked,
+            "failed": self.count("failed"),
+            "kw_target": round(sum(command.kw for command in self.commands), 2),
+            "kw_shed": round(sum(command.kw for command in self.commands if command.state == "acked"), 2),
+            "elapsed_ms": round(elapsed * 1000, 1),
+            "ders_per_second": round(acked / elapsed, 1) if elapsed > 0 else None,
+        }
+        if include_ders:
+            snapshot["der_states"] = [
+                {"meter_id": command.meter_id, "der_id": command.der_id, "state": command.state, "error": command.error}
+                for command in self.commands
+            ]
+        return snapshot
+
+
+class DERDispatcher:
+    """
+    Fleet-wide DER switch-off engine for DFP events.
+
+    Commands from every dispatch share one queue per upstream. A fixed
+    number of workers per upstream drain it, each packing up to
+    ``batch_size`` device IDs into one bulk switch-off
+    request, so an event enrolling hundreds of households costs a handful
+    of requests with bounded concurrency. A batch rejected with a status
+    that can point at individual devices (400/404/422) is split in halves
+    until the refused devices are isolated, spending at most
+    ``max_split_requests`` extra requests, so a blanket
+    rejection does not cost a request per device. Progress (kW shed so far)
+    is published to the utility dashboards on every worker.
+    """
+
+    def __init__(self, config: Optional[DERDispatchConfig] = None):
+        self.config = config or settings.der_dispatch
+        self._queues: Dict[str, asyncio.Queue] = {}  # upstream URL -> queued commands
+        self._workers: Dict[str, List[asyncio.Task]] = {}  # upstream URL -> batch senders
+        self._jobs: "OrderedDict[str, DispatchJob]" = OrderedDict()  # job_id -> dispatch
+        self.requests = 0
+        self.failed_requests = 0
+        self.acked = 0
+        self.failed = 0
+        self.batch_latency = LatencyHistogram()
+        self.ack_latency = LatencyHistogram()
+
+    def dispatch(
+        self,
+        households: Sequence[Tuple[str, Sequence[Any]]],
+        event_id: Optional[str] = None,
+        url: str = DER_SWITCH_OFF_URL,
+    ) -> DispatchJob:
+        """
+        Queues switch-off commands for the given devices and returns at once.
+
+        Args:
+            households: (meter_id, der_ids) pairs
+            event_id: The DFP event or order the dispatch belongs to
+            url: The switch-off endpoint of the devices' upstream
+
+        Returns:
+            The dispatch; ``await job.wait()`` for the acknowledgements
+        """
+        job = DispatchJob(event_id)
+        for meter_id, der_ids in households:
+            for der_id in dict.fromkeys(der_ids):
+                job.commands.append(DERCommand(job, str(meter_id), der_id, _power_kw(str(meter_id), der_id), url))
+        self._remember(job)
+
+        queue = self._queue(url)
+        for command in job.commands:
+            queue.put_nowait(command)
+        job._settle()
+        logger.info(
+            f"Queued DER dispatch {job.job_id} for event {event_id}: "
+            f"{len(job.commands)} devices on {len({command.meter_id for command in job.commands})} meters"
+        )
+        self._report(job, force=True)
+        return job
+
+    async def dispatch_meters(self, meter_ids: Iterable[Any], event_id: Optional[str] = None) -> DispatchJob:
+        """
+        Dispatches the switchable devices of enrolled meters, picked from
+        their DER inventories (fetched concurrently where not cached).
+        """
+        meter_ids = [str(meter_id) for meter_id in dict.fromkeys(meter_ids)]
+        inventories = await asyncio.gather(*(der_inventory.get(meter_id) for meter_id in meter_ids))
+        households = [
+            (meter_id, [device["id"] for device in dispatchable_devices(devices or [])])
+            for meter_id, devices in zip(meter_ids, inventories)
+        ]
+        return self.dispatch([household for household in households if household[1]], event_id)
+
+    def get_job(self, job_id: str) -> Optional[DispatchJob]:
+        return self._jobs.get(job_id)
+
+    def _remember(self, job: DispatchJob):
+        self._jobs[job.job_id] = job
+        while len(self._jobs) > self.config.history:
+            oldest = next(iter(self._jobs.values()))
+            if not oldest.finished:
+                break
+            self._jobs.popitem(last=False)
+
+    def _queue(self, url: str) -> asyncio.Queue:
+        """Gets the command queue of an upstream, starting its workers on first use."""
+        queue = self._queues.get(url)
+        if queue is None:
+            queue = self._queues[url] = asyncio.Queue()
+            self._workers[url] = [
+                asyncio.create_task(self._worker(url, queue)) for _ in range(self.config.concurrency)
+            ]
+        return queue
+
+    async def _next_batch(self, queue: asyncio.Queue) -> List[DERCommand]:
+        """Waits for a command, then gathers more for up to ``batch_wait_ms``."""
+        batch = [await queue.get()]
+        deadline = time.perf_counter() + self.config.batch_wait_ms / 1000
+        while len(batch) < self.config.batch_size:
+            if queue.empty():
+                left = deadline - time.perf_counter()
+                if left <= 0:
+                    break
+                try:
+                    batch.append(await asyncio.wait_for(queue.get(), left))
+                except asyncio.TimeoutError:
+                    break
+            else:
+                batch.append(queue.get_nowait())
+        return batch
+
+    async def _worker(self, url: str, queue: asyncio.Queue):
+        while True:
+            batch = await self._next_batch(queue)
+            try:
+                await self._send(url, batch)
+            except asyncio.CancelledError:
+                raise
+            except Exception as e:
+                logger.error(f"Unexpected error dispatching {len(batch)} DERs to {url}: {str(e)}", exc_info=True)
+                self._resolve(batch, None, str(e))
+            finally:
+                for _ in batch:
+                    queue.task_done()
+
+    async def _send(self, url: str, batch: List[DERCommand], split_budget: Optional[List[int]] = None):
+        """
+        Sends one bulk switch-off, splitting it if the upstream refuses
+        some of its devices. ``split_budget`` holds the extra requests the
+        original batch may still spend on splitting.
+        """
+        if split_budget is None:
+            split_budget = [self.config.max_split_requests]
+        for command in batch:
+            command.state = "sent"
+        start = time.perf_counter()
+        self.requests += 1
+        try:
+            response = await http_clients.put(
+                url,
+                headers={"Content-Type": "application/json"},
+                json={"der_ids": [command.der_id for command in batch]},
+                timeout=10,
+            )
+        except (UpstreamUnavailable, httpx.HTTPError) as e:
+            # The upstream is down or unreachable; splitting the batch would not help
+            self.failed_requests += 1
+            self.batch_latency.observe(time.perf_counter() - start)
+            logger.error(f"DER switch off failed for {len(batch)} devices: {e!r}")
+            self._resolve(batch, None, repr(e))
+            return
+        self.batch_latency.observe(time.perf_counter() - start)
+
+        if response.status_code == 200:
+            self._resolve(batch, start, None)
+            return
+        self.failed_requests += 1
+        if len(batch) == 1 or response.status_code not in PER_DEVICE_REJECTIONS or split_budget[0] < 2:
+            logger.error(f"DER switch off rejected for {len(batch)} devices: {response.status_code} - {response.text}")
+            self._resolve(batch, None, f"HTTP {response.status_code}")
+            return
+        # Find the devices the upstream refuses without failing the rest
+        split_budget[0] -= 2
+        middle = len(batch) // 2
+        await self._send(url, batch[:middle], split_budget)
+        await self._send(url, batch[middle:], split_budget)
+
+    def _resolve(self, batch: List[DERCommand], sent_at: Optional[float], error: Optional[str]):
+        """Records the outcome of a batch and updates the affected dispatches."""
+        now = time.perf_counter()
+        switched_off: Dict[str, List[Any]] = {}
+        for command in batch:
+            if error is None:
+                command.state = "acked"
+                self.acked += 1
+                self.ack_latency.observe(now - command.queued_at)
+                switched_off.setdefault(command.meter_id, []).append(command.der_id)
+            else:
+                command.state = "failed"
+                command.error = error
+                self.failed += 1
+
+        # Keep the cached inventories in sync with the devices switched off
+        for meter_id, der_ids in switched_off.items():
+            der_inventory.mark_switched_off(meter_id, der_ids)
+
+        for job in {command.job.job_id: command.job for command in batch}.values():
+            job._settle()
+            self._report(job, force=job.finished)
+            if job.finished:
+                snapshot = job.snapshot()
+                logger.info(
+                    f"DER dispatch {job.job_id} finished: {snapshot['acked']} acked, {snapshot['failed']} failed, "
+                    f"{snapshot['kw_shed']} kW shed in {snapshot['elapsed_ms']} ms"
+                )
+
+    def _report(self, job: DispatchJob, force: bool = False):
+        """Publishes a dispatch's progress, at most once per progress interval."""
+        now = time.monotonic()
+        if not force and now - job._last_report < self.config.progress_interval_seconds:
+            return
+        job._last_report = now
+        message = {
+            "type": "der_dispatch_progress",
+            "status": "success",
+            "dispatch": job.snapshot(),
+            "timestamp": datetime.now().isoformat(),
+        }
+        if job.finished:
+            # Households to tell that their devices are off
+            message["switched_off_meters"] = sorted({
+                str(command.meter_id) for command in job.commands if command.state == "acked"
+            })
+        task = asyncio.create_task(shared_state.publish(DER_DISPATCH_PROGRESS_CHANNEL, message))
+        task.add_done_callback(_log_publish_error)
+
+    async def stop(self):
+        """Stops the batch senders; queued commands are dropped."""
+        for workers in self._workers.values():
+            for worker in workers:
+                worker.cancel()
+        self._workers.clear()
+        self._queues.clear()
+
+    def get_metrics(self) -> Dict[str, Any]:
+        """
+        Devices acknowledged and failed, bulk request counts, batch and
+        queue-to-acknowledgement latency, and queue depth per upstream.
+        """
+        return {
+            "requests": self.requests,
+            "failed_requests": self.failed_requests,
+            "acked": self.acked,
+            "failed": self.failed,
+            "batch_latency": self.batch_latency.snapshot(),
+            "ack_latency": self.ack_latency.snapshot(),
+            "queued": {url: queue.qsize() for url, queue in self._queues.items()},
+            "active_dispatches": [job.snapshot() for job in self._jobs.values() if not job.finished],
+        }
+
+
+def _log_publish_error(task: asyncio.Task):
+    if not task.cancelled() and task.exception() is not None:
+        logger.error(f"Could not publish DER dispatch progress: {task.exception()}")
+
+
+async def _on_progress(message: Dict[str, Any], origin: str):
+    """
+    Forwards dispatch progress to the utility dashboards connected to this
+    worker. Once the dispatch is completed, the households whose devices
+    were switched off are told so, once per DFP event.
+    """
+    connection_manager.send_to_client_type("utility_dashboard", message)
+
+    event_id = message["dispatch"]["event_id"]
+    meter_ids = [
+        meter_id for meter_id in message.get("switched_off_meters", ())
+        if (event_id, meter_id) not in _notified_meters
+    ]
+    if not event_id or not meter_ids:
+        return
+    for meter_id in meter_ids:
+        _notified_meters[(event_id, meter_id)] = True
+    connection_manager.send_to_meters(
+        meter_ids,
+        {
+            "type": "dfp_event_update",
+            "status": "success",
+            "order_id": event_id,
+            "message": DER_DISPATCH_DONE_TEXT,
+            "timestamp": message["timestamp"],
+        }
+    )
+
+
+shared_state.subscribe(DER_DISPATCH_PROGRESS_CHANNEL, _on_progress)
+
+# Create a singleton instance
+der_dispatcher = DERDispatcher()
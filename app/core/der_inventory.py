@@ -0,0 +1,150 @@
+from typing import Dict, Any, List, Optional, Iterable
+import asyncio
+import logging
+import os
+import time
+from dotenv import load_dotenv
+from app.config.settings import DERInventoryConfig, settings
+from app.core.http_client import http_clients
+
+# Load environment variables
+load_dotenv()
+
+logger = logging.getLogger(__name__)
+
+DER_API_BASE_URL = os.getenv("DER_API_BASE_URL", "https://playground.becknprotocol.io/meter-data-simulator/der")
+
+
+class DERInventory:
+    """
+    Per-meter cache of DER (Distributed Energy Resource) devices.
+
+    Inventories are prefetched right after login and refreshed in the
+    background, so time-sensitive flows such as DFP participation can be
+    answered from memory. Entries older than the TTL are refetched on
+    read; the background task refreshes them before that, so reads normally
+    never wait on the network.
+    """
+
+    def __init__(self, config: Optional[DERInventoryConfig] = None):
+        self.config = config or settings.der_inventory
+        self._devices: Dict[str, List[Dict[str, Any]]] = {}  # meter_id -> DER devices
+        self._fetched_at: Dict[str, float] = {}  # meter_id -> monotonic fetch time
+        self._last_access: Dict[str, float] = {}  # meter_id -> monotonic read time
+        self._inflight: Dict[str, asyncio.Task] = {}
+        self._refresh_task: Optional[asyncio.Task] = None
+
+    def _is_fresh(self, meter_id: str) -> bool:
+        fetched_at = self._fetched_at.get(meter_id)
+        return fetched_at is not None and time.monotonic() - fetched_at < self.config.ttl_seconds
+
+    async def _fetch(self, meter_id: str) -> Optional[List[Dict[str, Any]]]:
+        try:
+            response = await http_clients.get(
+                f"{DER_API_BASE_URL}/{meter_id}",
+                headers={"Content-Type": "application/json"},
+            )
+            if response.status_code != 200:
+                logger.error(f"Failed to fetch DER data for meter ID {meter_id}: {response.status_code} - {response.text}")
+                return None
+
+            der_data = response.json()
+            devices = der_data if isinstance(der_data, list) else []
+            self._devices[meter_id] = devices
+            self._fetched_at[meter_id] = time.monotonic()
+            logger.info(f"Fetched {len(devices)} DER devices for meter ID {meter_id}")
+            return devices
+        except Exception as e:
+            logger.error(f"Error fetching DER data for meter ID {meter_id}: {str(e)}")
+            return None
+
+    def refresh(self, meter_id: str) -> asyncio.Task:
+        """
+        Starts (or joins) a fetch of the DER inventory for a meter.
+        Concurrent refreshes of the same meter share one request.
+        """
+        task = self._inflight.get(meter_id)
+        if task is None:
+            task = asyncio.create_task(self._fetch(meter_id))
+            self._inflight[meter_id] = task
+            task.add_done_callback(lambda _: self._inflight.pop(meter_id, None))
+        return task
+
+    def prefetch(self, meter_id: str):
+        """
+        Fetches a meter's DER inventory in the background, e.g. right after login.
+        """
+        self._last_access[meter_id] = time.monotonic()
+        if not self._is_fresh(meter_id):
+            self.refresh(meter_id)
+
+    def get_cached(self, meter_id: str) -> Optional[List[Dict[str, Any]]]:
+        """
+        Gets the cached DER inventory for a meter without touching the network.
+        """
+        self._last_access[meter_id] = time.monotonic()
+        return self._devices.get(meter_id)
+
+    async def get(self, meter_id: str) -> Optional[List[Dict[str, Any]]]:
+        """
+        Gets the DER inventory for a meter, fetching it only if it is not cached.
+        A stale entry is returned immediately and refreshed in the background.
+        """
+        devices = self.get_cached(meter_id)
+        if devices is not None:
+            if not self._is_fresh(meter_id):
+                self.refresh(meter_id)
+            return devices
+        return await asyncio.shield(self.refresh(meter_id))
+
+    def mark_switched_off(self, meter_id: str, der_ids: Iterable[Any]):
+        """
+        Updates the cached inventory after devices were switched off, so the
+        next read reflects the change without refetching.
+        """
+        der_ids = set(der_ids)
+        for device in self._devices.get(meter_id, []):
+            if device.get("id") in der_ids:
+                device["switched_on"] = False
+        logger.info(f"Marked DER devices {sorted(der_ids, key=str)} as switched off for meter ID {meter_id}")
+
+    async def start_refresh_task(self):
+        """Start a background task that keeps cached inventories fresh."""
+        if self._refresh_task is None:
+            self._refresh_task = asyncio.create_task(self._refresh_loop())
+
+    async def stop(self):
+        """Stop the refresh task."""
+        if self._refresh_task is not None:
+            self._refresh_task.cancel()
+            self._refresh_task = None
+
+    async def _refresh_loop(self):
+        """Periodically refresh inventories that are halfway to expiry."""
+        while True:
+            try:
+                await asyncio.sleep(self.config.refresh_interval_seconds)
+                now = time.monotonic()
+
+                # Drop meters nobody has asked about for a while
+                for meter_id, last_access in list(self._last_access.items()):
+                    if now - last_access > self.config.idle_eviction_seconds:
+                        self._last_access.pop(meter_id, None)
+                        self._devices.pop(meter_id, None)
+                        self._fetched_at.pop(meter_id, None)
+
+                stale = [
+                    meter_id
+                    for meter_id in self._last_access
+                    if now - self._fetched_at.get(meter_id, 0) > self.config.ttl_seconds / 2
+                ]
+                if stale:
+                    logger.info(f"Refreshing DER inventory for {len(stale)} meters")
+                    await asyncio.gather(*(self.refresh(meter_id) for meter_id in stale))
+            except asyncio.CancelledError:
+                raise
+            except Exception as e:
+                logger.error(f"Error in DER inventory refresh task: {str(e)}")
+
+# Create a singleton instance
+der_inventory = DERInventory()
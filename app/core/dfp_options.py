@@ -0,0 +1,173 @@
+from typing import Any, Awaitable, Callable, Dict, List, Optional, Tuple
+import asyncio
+import hashlib
+import json
+import logging
+import time
+from app.core.lifecycle import lifecycle
+
+logger = logging.getLogger(__name__)
+
+# After a failed refresh, wait this long (or the interval, if shorter) before trying again
+FAILED_REFRESH_RETRY_SECONDS = 30.0
+
+# A fetch returns None when the upstream reports the options unchanged,
+# otherwise (options, formatted text, ETag or None)
+FetchResult = Optional[Tuple[List[Dict[str, Any]], str, Optional[str]]]
+
+
+def _digest(options: List[Dict[str, Any]]) -> str:
+    encoded = json.dumps(options, sort_keys=True, separators=(",", ":"), default=str)
+    return hashlib.sha256(encoded.encode("utf-8")).hexdigest()[:16]
+
+
+class DFPSnapshot:
+    """
+    One immutable version of the DFP options.
+
+    ``options`` are the parsed options in catalog order and ``text`` is the
+    same list formatted for the agent. Readers keep a reference to the
+    snapshot they started with, so a concurrent refresh never changes the
+    options under them. Treat the option dicts as read-only.
+    """
+
+    __slots__ = ("version", "options", "text", "digest", "etag", "fetched_at")
+
+    def __init__(
+        self,
+        version: int,
+        options: Tuple[Dict[str, Any], ...],
+        text: str,
+        digest: str,
+        etag: Optional[str] = None,
+        fetched_at: Optional[float] = None,
+    ):
+        self.version = version
+        self.options = options
+        self.text = text
+        self.digest = digest
+        self.etag = etag
+        self.fetched_at = fetched_at  # epoch seconds of the last confirmation; None for the built-in options
+
+
+class DFPOptionsStore:
+    """
+    Versioned DFP options, refreshed by a background task.
+
+    Readers take ``current`` without locking or touching the network; a
+    refresh builds a new snapshot and swaps it in with a single assignment.
+    The version only increases when the options actually change: a 304
+    answer to the conditional request, or options that hash the same as the
+    current ones, keep the version. Until the first successful fetch the
+    built-in options are served. The latest snapshot is kept across restarts.
+    """
+
+    def __init__(
+        self,
+        fetch: Callable[[Optional[str]], Awaitable[FetchResult]],
+        default_options: List[Dict[str, Any]],
+        default_text: str,
+        interval: float,
+    ):
+        self.interval = interval
+        self._fetch = fetch
+        self.current = DFPSnapshot(0, tuple(default_options), default_text, _digest(default_options))
+        self._task: Optional[asyncio.Task] = None
+        self.refreshes = 0
+        self.unchanged = 0
+        self.refresh_failures = 0
+        self.last_checked_at: Optional[float] = None
+        self.last_error: Optional[str] = None
+        lifecycle.register_snapshot("dfp_options", self._export, self._restore)
+
+    async def refresh(self) -> DFPSnapshot:
+        """
+        Fetches the options once and installs them if they changed.
+
+        Raises:
+            Exception: The fetch error; the current snapshot is kept
+        """
+        current = self.current
+        result = await self._fetch(current.etag if current.fetched_at is not None else None)
+        checked_at = self.last_checked_at = time.time()
+        self.last_error = None
+        if result is None:
+            options, text, etag, digest = current.options, current.text, current.etag, current.digest
+        else:
+            options, text, etag = result
+            if not options:
+                raise ValueError("the DFP search returned no options")
+            digest = _digest(options)
+
+        if digest == current.digest:
+            # Same options; only record that they were confirmed
+            self.unchanged += 1
+            self.current = DFPSnapshot(current.version, current.options, current.text, digest, etag, checked_at)
+            return self.current
+
+        self.current = DFPSnapshot(current.version + 1, tuple(options), text, digest, etag, checked_at)
+        self.refreshes += 1
+        logger.info(
+            f"DFP options updated to version {self.current.version}: "
+            f"{', '.join(str(option.get('id')) for option in options)}"
+        )
+        return self.current
+
+    async def start(self):
+        """Start the background refresh task; the first fetch runs right away."""
+        if self._task is None:
+            self._task = asyncio.create_task(self._refresh_loop())
+
+    async def stop(self):
+        """Stop the refresh task."""
+        if self._task is not None:
+            self._task.cancel()
+            self._task = None
+
+    async def _refresh_loop(self):
+        while True:
+            delay = self.interval
+            try:
+                await self.refresh()
+            except asyncio.CancelledError:
+                raise
+            except Exception as e:
+                self.refresh_failures += 1
+                self.last_error = str(e).splitlines()[0] if str(e) else repr(e)
+                delay = min(self.interval, FAILED_REFRESH_RETRY_SECONDS)
+                logger.warning(f"Refreshing DFP options failed, keeping version {self.current.version}: {e}")
+            await asyncio.sleep(delay)
+
+    def _export(self) -> Optional[Dict[str, Any]]:
+        current = self.current
+        if current.fetched_at is None:
+            return None
+        return {
+            "version": current.version,
+            "options": list(current.options),
+            "text": current.text,
+            "etag": current.etag,
+            "fetched_at": current.fetched_at,
+        }
+
+    def _restore(self, state: Optional[Dict[str, Any]]):
+        # Snapshots written before options were versioned hold only the option list
+        if not isinstance(state, dict) or not state.get("options"):
+            return
+        options = state["options"]
+        self.current = DFPSnapshot(
+            state["version"], tuple(options), state["text"], _digest(options), state.get("etag"), state["fetched_at"]
+        )
+
+    def snapshot(self) -> Dict[str, Any]:
+        current = self.current
+        return {
+            "version": current.version,
+            "options": [option.get("id") for option in current.options],
+            "age_seconds": None if current.fetched_at is None else round(time.time() - current.fetched_at, 1),
+            "interval_seconds": self.interval,
+            "refreshes": self.refreshes,
+            "unchanged": self.unchanged,
+            "refresh_failures": self.refresh_failures,
+            "last_error": self.last_error,
+        }
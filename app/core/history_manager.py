@@ -11,6 +11,8 @@ from langchain_core.messages import (
 )
 
 from app.config.settings import settings  # Import your AppConfig instance
+from app.core.shared_state import SharedStateBackend, shared_state
+from app.core.lifecycle import lifecycle
 
 
 class InMemoryChatHistory(BaseChatMessageHistory):
@@ -45,6 +47,39 @@ class InMemoryChatHistory(BaseChatMessageHistory):
         self.add_message(AIMessage(content=message))
 
 
+class SharedChatHistory(InMemoryChatHistory):
+    """
+    Chat message history stored in the shared state backend, so that a client
+    reconnecting to a different worker keeps its conversation.
+    """
+
+    NAMESPACE = "chat_histories"
+
+    def __init__(self, client_id: str, backend: SharedStateBackend, max_entries: int = 100):
+        self.client_id = client_id
+        self.backend = backend
+        self.max_entries = max_entries
+
+    @property
+    def messages(self) -> List[BaseMessage]:
+        return messages_from_dict(self.backend.get(self.NAMESPACE, self.client_id, []))
+
+    @messages.setter
+    def messages(self, messages: List[BaseMessage]) -> None:
+        self.backend.set(self.NAMESPACE, self.client_id, messages_to_dict(messages))
+
+    def add_message(self, message: BaseMessage) -> None:
+        """Add a message to the history."""
+        stored = self.backend.get(self.NAMESPACE, self.client_id, [])
+        stored.extend(messages_to_dict([message]))
+        # Trim old messages if history exceeds max_entries
+        self.backend.set(self.NAMESPACE, self.client_id, stored[-self.max_entries :])
+
+    def clear(self) -> None:
+        """Clear the history."""
+        self.backend.delete(self.NAMESPACE, self.client_id)
+
+
 class ChatHistoryManager:
     """
     Manages chat histories for different clients.
@@ -55,7 +90,7 @@ class ChatHistoryManager:
 
     def __init__(self):
         self.config = settings.chat_history
-        if self.config.provider != "in_memory":
+        if self.config.provider not in ("in_memory", "shared"):
             # In a real application, you'd initialize other providers here
             # e.g., RedisChatMessageHistory, FileChatMessageHistory, SQLChatMessageHistory
             raise NotImplementedError(
@@ -68,9 +103,16 @@ class ChatHistoryManager:
         Retrieves or creates a chat history for a given client_id.
         """
         if client_id not in self._histories:
-            self._histories[client_id] = InMemoryChatHistory(
-                client_id=client_id, max_entries=self.max_entries_per_client
-            )
+            if self.config.provider == "shared":
+                self._histories[client_id] = SharedChatHistory(
+                    client_id=client_id,
+                    backend=shared_state,
+                    max_entries=self.max_entries_per_client,
+                )
+            else:
+                self._histories[client_id] = InMemoryChatHistory(
+                    client_id=client_id, max_entries=self.max_entries_per_client
+                )
         return self._histories[client_id]
 
     def add_message(self, client_id: str, message: BaseMessage):
@@ -89,6 +131,31 @@ class ChatHistoryManager:
         history = self.get_history(client_id)
         history.clear()
 
+    def remove_history(self, client_id: str):
+        """Clears a client's history and forgets the client."""
+        history = self._histories.pop(client_id, None)
+        if history is not None:
+            history.clear()
+
+    def export_histories(self) -> Dict[str, List[Dict[str, Any]]]:
+        """Returns every in-memory history as serializable messages."""
+        return {
+            client_id: messages_to_dict(history.messages)
+            for client_id, history in list(self._histories.items())
+            if history is not None
+        }
+
+    def import_histories(self, histories: Dict[str, List[Dict[str, Any]]]):
+        """Loads histories produced by export_histories."""
+        for client_id, messages in histories.items():
+            self.get_history(client_id).messages = messages_from_dict(messages)
+
 
 # Global instance of the history manager
 chat_history_manager = ChatHistoryManager()
+
+# Shared histories already live in the shared state backend
+if chat_history_manager.config.provider == "in_memory":
+    lifecycle.register_snapshot(
+        "chat_histories", chat_history_manager.export_histories, chat_history_manager.import_histories
+    )
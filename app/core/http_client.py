@@ -0,0 +1,252 @@
+from typing import Any, Dict, Optional
+import asyncio
+import logging
+import time
+import httpx
+from urllib.parse import urlsplit
+from app.config.settings import settings, HTTPClientConfig
+from app.core.resilience import (
+    Bulkhead, CircuitBreaker, DeadlineExceeded, backoff_delay, bounded_timeout, remaining
+)
+
+logger = logging.getLogger(__name__)
+
+
+# Methods that are safe to resend after the upstream may have seen them
+IDEMPOTENT_METHODS = frozenset({"GET", "HEAD", "OPTIONS", "PUT", "DELETE"})
+# Statuses that mean "try again later" rather than "this request is wrong"
+RETRYABLE_STATUSES = frozenset({502, 503, 504})
+
+
+class Upstream:
+    """Request counters, circuit breaker and bulkhead for one upstream host."""
+
+    def __init__(self, origin: str, config: HTTPClientConfig):
+        self.origin = origin
+        self.requests = 0
+        self.errors = 0
+        self.retries = 0
+        self.total_seconds = 0.0
+        self.breaker = CircuitBreaker(origin, config.breaker_failure_threshold, config.breaker_reset_seconds)
+        self.bulkhead = Bulkhead(origin, config.bulkhead_max_concurrent, config.bulkhead_max_wait_seconds)
+
+    def record(self, elapsed: float, ok: Optional[bool]):
+        """Counts a finished call; ``ok=None`` leaves the breaker untouched."""
+        self.requests += 1
+        self.total_seconds += elapsed
+        if ok is None:
+            self.breaker.cancel_trial()
+        elif ok:
+            self.breaker.record_success()
+        else:
+            self.errors += 1
+            self.breaker.record_failure()
+
+    def snapshot(self) -> Dict[str, Any]:
+        return {
+            "requests": self.requests,
+            "errors": self.errors,
+            "retries": self.retries,
+            "avg_ms": round(self.total_seconds / self.requests * 1000, 1) if self.requests else None,
+            "breaker": self.breaker.snapshot(),
+            "bulkhead": self.bulkhead.snapshot(),
+        }
+
+
+class HTTPClientPool:
+    """
+    Shared HTTP clients for every upstream the service talks to (Beckn BAP/BPP
+    endpoints, Strapi, the meter and DER simulators).
+
+    Each upstream host gets its own pooled ``httpx.AsyncClient`` with its own
+    connection limits, so keep-alive connections are reused across requests
+    and a slow host cannot take the connections another host needs. Async
+    clients are created lazily inside the running event loop; synchronous
+    clients exist only for the ``_run`` path of LangChain tools and are never
+    used from async code.
+    """
+
+    def __init__(self, config: Optional[HTTPClientConfig] = None):
+        self.config = config or settings.http_client
+        self._clients: Dict[str, httpx.AsyncClient] = {}  # origin -> async client
+        self._sync_clients: Dict[str, httpx.Client] = {}  # origin -> sync client
+        self._upstreams: Dict[str, Upstream] = {}  # origin -> breaker, bulkhead and counters
+        # Loading CA certificates takes tens of milliseconds; do it once here
+        # rather than blocking the event loop whenever a new host is first used
+        self._ssl_context = httpx.create_ssl_context()
+
+    @staticmethod
+    def origin(url: str) -> str:
+        """Returns the scheme://host[:port] part of a URL, the key for its pool."""
+        parts = urlsplit(url)
+        return f"{parts.scheme}://{parts.netloc}"
+
+    def _client_options(self) -> Dict[str, Any]:
+        return {
+            "verify": self._ssl_context,
+            "timeout": httpx.Timeout(
+                self.config.timeout_seconds, connect=self.config.connect_timeout_seconds
+            ),
+            "limits": httpx.Limits(
+                max_connections=self.config.max_connections_per_host,
+                max_keepalive_connections=self.config.max_keepalive_per_host,
+                keepalive_expiry=self.config.keepalive_expiry_seconds,
+            ),
+        }
+
+    def client(self, url: str) -> httpx.AsyncClient:
+        """Gets the pooled async client for the host of a URL."""
+        origin = self.origin(url)
+        client = self._clients.get(origin)
+        if client is None or client.is_closed:
+            client = httpx.AsyncClient(**self._client_options())
+            self._clients[origin] = client
+            logger.info(f"Opened HTTP connection pool for {origin}")
+        return client
+
+    def sync_client(self, url: str) -> httpx.Client:
+        """Gets the pooled blocking client for the host of a URL (sync callers only)."""
+        origin = self.origin(url)
+        client = self._sync_clients.get(origin)
+        if client is None or client.is_closed:
+            client = httpx.Client(**self._client_options())
+            self._sync_clients[origin] = client
+        return client
+
+    def upstream(self, url: str) -> Upstream:
+        """Gets the breaker, bulkhead and counters for the host of a URL."""
+        origin = self.origin(url)
+        upstream = self._upstreams.get(origin)
+        if upstream is None:
+            upstream = self._upstreams[origin] = Upstream(origin, self.config)
+        return upstream
+
+    async def request(
+        self,
+        method: str,
+        url: str,
+        *,
+        timeout: Optional[float] = None,
+        idempotent: Optional[bool] = None,
+        **kwargs: Any,
+    ) -> httpx.Response:
+        """
+        Sends a request through the pool for the URL's host.
+
+        Each attempt must get past the host's bulkhead and circuit breaker
+        and is bounded by ``timeout`` and by the deadline of the query it
+        runs under. Connection failures are retried with jittered backoff;
+        read timeouts and 502/503/504 responses are retried only for
+        idempotent requests (GET/PUT/DELETE unless ``idempotent`` says
+        otherwise). Retries never run past the deadline.
+
+        Keyword arguments are passed to ``httpx.AsyncClient.request``
+        (``json``, ``content``, ``headers`` ...). Failures are raised as
+        ``httpx.HTTPError`` (see ``app.core.resilience`` for the locally
+        refused calls); HTTP error statuses are returned.
+        """
+        upstream = self.upstream(url)
+        if idempotent is None:
+            idempotent = method.upper() in IDEMPOTENT_METHODS
+        timeout = timeout or self.config.timeout_seconds
+        attempts = self.config.retry_attempts + 1
+
+        for attempt in range(attempts):
+            await upstream.bulkhead.acquire()
+            try:
+                attempt_timeout = bounded_timeout(timeout)
+                upstream.breaker.before_call()
+                start = time.perf_counter()
+                error: Optional[httpx.HTTPError] = None
+                response: Optional[httpx.Response] = None
+                try:
+                    async with asyncio.timeout(attempt_timeout):
+                        response = await self.client(url).request(method, url, timeout=attempt_timeout, **kwargs)
+                except (TimeoutError, httpx.TimeoutException) as e:
+                    if attempt_timeout < timeout:
+                        # Cut short by the query's deadline, not by the upstream's own timeout
+                        error = DeadlineExceeded(f"Deadline exceeded during {method} {url}")
+                    elif isinstance(e, httpx.TimeoutException):
+                        error = e
+                    else:
+                        error = httpx.TimeoutException(f"{method} {url} took longer than {attempt_timeout:.1f}s")
+                except httpx.HTTPError as e:
+                    error = e
+                except BaseException:
+                    # Cancelled by the caller; the upstream is not to blame
+                    upstream.breaker.cancel_trial()
+                    raise
+                if isinstance(error, DeadlineExceeded):
+                    upstream.record(time.perf_counter() - start, None)
+                else:
+                    upstream.record(time.perf_counter() - start, error is None and response.status_code < 500)
+            finally:
+                upstream.bulkhead.release()
+
+            if error is None:
+                retryable = idempotent and response.status_code in RETRYABLE_STATUSES
+            else:
+                retryable = isinstance(error, (httpx.ConnectError, httpx.ConnectTimeout)) or (
+                    idempotent and isinstance(error, httpx.TransportError)
+                )
+
+            delay = backoff_delay(attempt, self.config.retry_base_delay_ms / 1000, self.config.retry_max_delay_ms / 1000)
+            left = remaining()
+            if not retryable or attempt == attempts - 1 or (left is not None and left <= delay):
+                if error is not None:
+                    raise error
+                return response
+
+            upstream.retries += 1
+            reason = repr(error) if error is not None else f"status {response.status_code}"
+            logger.warning(f"Retrying {method} {url} in {delay * 1000:.0f}ms after {reason}")
+            await asyncio.sleep(delay)
+
+    def request_sync(self, method: str, url: str, *, timeout: Optional[float] = None, **kwargs: Any) -> httpx.Response:
+        """
+        Blocking single-attempt version of ``request`` for synchronous
+        callers. Goes through the host's circuit breaker and deadline but
+        not its bulkhead, which only limits the event loop.
+        """
+        upstream = self.upstream(url)
+        attempt_timeout = bounded_timeout(timeout or self.config.timeout_seconds)
+        upstream.breaker.before_call()
+        start = time.perf_counter()
+        try:
+            response = self.sync_client(url).request(method, url, timeout=attempt_timeout, **kwargs)
+        except httpx.HTTPError:
+            upstream.record(time.perf_counter() - start, False)
+            raise
+        except BaseException:
+            upstream.breaker.cancel_trial()
+            raise
+        upstream.record(time.perf_counter() - start, response.status_code < 500)
+        return response
+
+    async def get(self, url: str, **kwargs: Any) -> httpx.Response:
+        return await self.request("GET", url, **kwargs)
+
+    async def post(self, url: str, **kwargs: Any) -> httpx.Response:
+        return await self.request("POST", url, **kwargs)
+
+    async def put(self, url: str, **kwargs: Any) -> httpx.Response:
+        return await self.request("PUT", url, **kwargs)
+
+    def get_metrics(self) -> Dict[str, Any]:
+        """
+        Per-host request counts, errors (transport failures and 5xx), retries,
+        average latency, circuit breaker state and bulkhead usage.
+        """
+        return {origin: upstream.snapshot() for origin, upstream in self._upstreams.items()}
+
+    async def aclose(self):
+        """Closes every pooled client. Called on application shutdown."""
+        for client in self._clients.values():
+            await client.aclose()
+        for client in self._sync_clients.values():
+            client.close()
+        self._clients.clear()
+        self._sync_clients.clear()
+
+# Create a singleton instance
+http_clients = HTTPClientPool()
@@ -0,0 +1,211 @@
+from typing import Any, Callable, Dict, Optional, Tuple
+from contextlib import asynccontextmanager
+import asyncio
+import glob
+import logging
+import os
+import random
+import time
+from app.config.settings import LifecycleConfig, settings
+from app.core.resilience import deadline
+from app.core.shared_state import dumps, loads, shared_state
+from app.core.websocket_manager import connection_manager
+
+logger = logging.getLogger(__name__)
+
+
+class Lifecycle:
+    """
+    Graceful drain and restart support.
+
+    Draining stops new connections, waits for in-flight queries up to a
+    deadline, tells every connected client to reconnect after a jittered
+    delay and closes the sockets. In-memory state registered with
+    register_snapshot() is written to disk and restored on the next startup,
+    so a deploy does not log everyone out or forget their conversations.
+
+    Each worker writes its own file (``snapshot_path`` with the worker id
+    before the extension), so workers never overwrite each other's state.
+    On startup every recent snapshot is restored, oldest first.
+    """
+
+    def __init__(self, config: Optional[LifecycleConfig] = None):
+        self.config = config or settings.lifecycle
+        self.accepting = True
+        self.in_flight = 0
+        self._idle = asyncio.Event()
+        self._idle.set()
+        self._drain_task: Optional[asyncio.Task] = None
+        # name -> (export, restore)
+        self._providers: Dict[str, Tuple[Callable[[], Any], Callable[[Any], None]]] = {}
+        # Restored state for providers that have not registered yet
+        self._pending: Dict[str, Any] = {}
+
+    def register_snapshot(self, name: str, export: Callable[[], Any], restore: Callable[[Any], None]):
+        """
+        Registers state to include in restart snapshots.
+
+        Args:
+            name: Unique name of the state in the snapshot
+            export: Returns the state as JSON-serializable data (datetimes allowed)
+            restore: Loads state produced by export
+        """
+        self._providers[name] = (export, restore)
+        if name in self._pending:
+            self._restore_one(name, self._pending.pop(name))
+
+    @asynccontextmanager
+    async def track_query(self):
+        """
+        Marks a query as in flight so draining waits for it. Upstream calls
+        made while handling the query share its deadline.
+        """
+        self.in_flight += 1
+        self._idle.clear()
+        try:
+            with deadline(settings.http_client.query_deadline_seconds):
+                yield
+        finally:
+            self.in_flight -= 1
+            if self.in_flight == 0:
+                self._idle.set()
+
+    async def drain(self) -> Dict[str, Any]:
+        """
+        Stops accepting connections, waits for in-flight queries and asks
+        clients to reconnect later. Concurrent calls share one drain.
+        """
+        if self._drain_task is None:
+            self._drain_task = asyncio.create_task(self._drain())
+        return await asyncio.shield(self._drain_task)
+
+    async def _drain(self) -> Dict[str, Any]:
+        self.accepting = False
+        started = time.monotonic()
+        logger.info(f"Draining: waiting for {self.in_flight} in-flight queries")
+
+        try:
+            await asyncio.wait_for(self._idle.wait(), timeout=self.config.drain_timeout_seconds)
+        except asyncio.TimeoutError:
+            logger.warning(f"Drain deadline reached with {self.in_flight} queries still in flight")
+        abandoned = self.in_flight
+
+        # Spread reconnects out so the meter API and LLM are not stampeded
+        for connection_id in connection_manager.get_all_connections():
+            await connection_manager.send_message(connection_id, {
+                "type": "reconnect",
+                "status": "success",
+                "reason": "server_restart",
+                "retry_after_ms": random.randint(self.config.reconnect_min_delay_ms, self.config.reconnect_max_delay_ms),
+                "resume": True
+            })
+        closed = await connection_manager.close_all(code=1012)
+
+        summary = {
+            "closed_connections": closed,
+            "abandoned_queries": abandoned,
+            "drain_seconds": round(time.monotonic() - started, 3),
+        }
+        logger.info(f"Drain complete: {summary}")
+        return summary
+
+    def _worker_snapshot_path(self) -> str:
+        root, extension = os.path.splitext(self.config.snapshot_path)
+        return f"{root}.{shared_state.worker_id}{extension}"
+
+    def _snapshot_paths(self):
+        """Snapshot files of every worker, and the single file older versions wrote."""
+        path = self.config.snapshot_path
+        root, extension = os.path.splitext(path)
+        paths = glob.glob(f"{glob.escape(root)}.*{extension}")
+        return ([path] if os.path.exists(path) else []) + sorted(paths)
+
+    def snapshot(self) -> Optional[str]:
+        """
+        Writes the registered state to this worker's snapshot file and
+        removes snapshots too old to be restored.
+
+        Returns:
+            The snapshot path, or None if snapshots are disabled
+        """
+        if not self.config.snapshot_enabled:
+            return None
+
+        state = {}
+        for name, (export, _) in self._providers.items():
+            try:
+                state[name] = export()
+            except Exception as e:
+                logger.error(f"Error exporting {name} for snapshot: {str(e)}", exc_info=True)
+
+        # Write to a temporary file first so a crash never leaves a partial snapshot
+        path = self._worker_snapshot_path()
+        temp_path = f"{path}.tmp"
+        with open(temp_path, "w", encoding="utf-8") as f:
+            f.write(dumps({"created_at": time.time(), "state": state}))
+        os.replace(temp_path, path)
+        logger.info(f"Saved snapshot of {sorted(state)} to {path}")
+
+        for stale_path in self._snapshot_paths():
+            try:
+                if time.time() - os.path.getmtime(stale_path) > self.config.snapshot_max_age_seconds:
+                    os.remove(stale_path)
+            except OSError:
+                pass
+        return path
+
+    def restore(self) -> bool:
+        """
+        Restores state from the recent snapshots of every worker, oldest
+        first so the newest value of a key wins.
+
+        Returns:
+            True if a snapshot was restored
+        """
+        if not self.config.snapshot_enabled:
+            return False
+
+        snapshots = []
+        for path in self._snapshot_paths():
+            try:
+                with open(path, encoding="utf-8") as f:
+                    snapshot = loads(f.read())
+            except Exception as e:
+                logger.error(f"Could not read snapshot {path}: {str(e)}")
+                continue
+            age = time.time() - snapshot.get("created_at", 0)
+            if age > self.config.snapshot_max_age_seconds:
+                logger.info(f"Ignoring snapshot {path}, it is {age:.0f}s old")
+                continue
+            snapshots.append((snapshot.get("created_at", 0), path, snapshot))
+
+        for created_at, path, snapshot in sorted(snapshots, key=lambda entry: entry[0]):
+            for name, state in snapshot.get("state", {}).items():
+                if name in self._providers:
+                    self._restore_one(name, state)
+                else:
+                    # Providers registering later get the newest state
+                    self._pending[name] = state
+            logger.info(f"Restored snapshot from {path} ({time.time() - created_at:.0f}s old)")
+        return bool(snapshots)
+
+    def _restore_one(self, name: str, state: Any):
+        try:
+            self._providers[name][1](state)
+        except Exception as e:
+            logger.error(f"Error restoring {name} from snapshot: {str(e)}", exc_info=True)
+
+    async def shutdown(self):
+        """Drains (if not already done) and snapshots state. Called on application shutdown."""
+        await self.drain()
+        try:
+            self.snapshot()
+        except Exception as e:
+            logger.error(f"Error saving snapshot: {str(e)}", exc_info=True)
+
+# Create a singleton instance
+lifecycle = Lifecycle()
+
+# State in a persistent backend already survives restarts
+if not shared_state.persistent:
+    lifecycle.register_snapshot("shared_state", shared_state.export_state, shared_state.import_state)
@@ -1,8 +1,10 @@
 from typing import Dict, Any, Optional, Tuple
+import asyncio
 import logging
-import httpx
 import os
+from cachetools import TTLCache
 from dotenv import load_dotenv
+from app.core.http_client import http_clients
 
 # Load environment variables
 load_dotenv()
@@ -12,13 +14,59 @@ logger = logging.getLogger(__name__)
 # Get API URL from environment variables
 METER_API_BASE_URL = os.getenv("METER_API_BASE_URL", "https://playground.becknprotocol.io/meter-data-simulator/meters")
 
+# How long validated meters (and meters that were not found) are remembered
+METER_CACHE_TTL_SECONDS = int(os.getenv("METER_CACHE_TTL_SECONDS", "600"))
+METER_NEGATIVE_CACHE_TTL_SECONDS = int(os.getenv("METER_NEGATIVE_CACHE_TTL_SECONDS", "30"))
+
+# Positive results: meter_id -> meter_data
+_valid_meters: TTLCache = TTLCache(maxsize=10000, ttl=METER_CACHE_TTL_SECONDS)
+# Negative results for meters the API reported as not found (404)
+_invalid_meters: TTLCache = TTLCache(maxsize=10000, ttl=METER_NEGATIVE_CACHE_TTL_SECONDS)
+# Lookups currently in flight, so concurrent requests for a meter share one call
+_inflight: Dict[str, "asyncio.Task[Tuple[bool, Optional[Dict[str, Any]]]]"] = {}
+
+def get_cached_meter_data(meter_id: str) -> Optional[Dict[str, Any]]:
+    """
+    Gets meter data from a previous successful validation, if still cached.
+    """
+    return _valid_meters.get(meter_id)
+
+
+async def _fetch_meter(meter_id: str) -> Tuple[bool, Optional[Dict[str, Any]]]:
+    try:
+        # Make API call to validate meter ID
+        response = await http_clients.get(f"{METER_API_BASE_URL}/{meter_id}")
+
+        # Check if request was successful
+        if response.status_code == 200:
+            meter_data = response.json()
+            _valid_meters[meter_id] = meter_data
+            logger.info(f"Validated meter ID: {meter_id}")
+            return True, meter_data
+        elif response.status_code == 404:
+            _invalid_meters[meter_id] = True
+            logger.warning(f"Meter ID not found: {meter_id}")
+            return False, None
+        else:
+            logger.error(f"Error validating meter ID {meter_id}: {response.status_code} - {response.text}")
+            return False, None
+
+    except Exception as e:
+        logger.error(f"Exception during meter ID validation: {e}")
+        return False, None
+
+
 async def validate_meter_id(meter_id: str) -> Tuple[bool, Optional[Dict[str, Any]]]:
     """
     Validates a meter ID by making an API call to the meter data service.
-    
+
+    Results are cached (found meters for METER_CACHE_TTL_SECONDS, unknown
+    meters for METER_NEGATIVE_CACHE_TTL_SECONDS) and concurrent lookups for
+    the same meter are coalesced into a single upstream call.
+
     Args:
         meter_id: The meter ID to validate
-        
+
     Returns:
         Tuple of (is_valid, meter_data)
     """
@@ -26,24 +74,21 @@ async def validate_meter_id(meter_id: str) -> Tuple[bool, Optional[Dict[str, Any
     if not meter_id or not isinstance(meter_id, str):
         logger.warning(f"Invalid meter ID format: {meter_id}")
         return False, None
-    
-    try:
-        # Make API call to validate meter ID
-        async with httpx.AsyncClient() as client:
-            response = await client.get(f"{METER_API_BASE_URL}/{meter_id}")
-            
-            # Check if request was successful
-            if response.status_code == 200:
-                meter_data = response.json()
-                logger.info(f"Validated meter ID: {meter_id}")
-                return True, meter_data
-            elif response.status_code == 404:
-                logger.warning(f"Meter ID not found: {meter_id}")
-                return False, None
-            else:
-                logger.error(f"Error validating meter ID {meter_id}: {response.status_code} - {response.text}")
-                return False, None
-                
-    except Exception as e:
-        logger.error(f"Exception during meter ID validation: {e}")
-        return False, None 
\ No newline at end of file
+
+    meter_data = _valid_meters.get(meter_id)
+    if meter_data is not None:
+        logger.debug(f"Meter ID {meter_id} validated from cache")
+        return True, meter_data
+
+    if meter_id in _invalid_meters:
+        logger.debug(f"Meter ID {meter_id} rejected from negative cache")
+        return False, None
+
+    task = _inflight.get(meter_id)
+    if task is None:
+        task = asyncio.create_task(_fetch_meter(meter_id))
+        _inflight[meter_id] = task
+        task.add_done_callback(lambda _: _inflight.pop(meter_id, None))
+
+    # Shield so that a cancelled caller does not cancel the shared lookup
+    return await asyncio.shield(task)
@@ -0,0 +1,195 @@
+from typing import Any, Dict, Optional
+from contextlib import contextmanager
+from contextvars import ContextVar
+import asyncio
+import logging
+import random
+import time
+import httpx
+
+logger = logging.getLogger(__name__)
+
+
+class UpstreamUnavailable(httpx.HTTPError):
+    """
+    A call was refused locally without reaching the upstream. Subclasses
+    ``httpx.HTTPError`` so callers' existing fallbacks handle it like any
+    other failed request.
+    """
+
+
+class CircuitOpenError(UpstreamUnavailable):
+    """The upstream's circuit breaker is open."""
+
+
+class BulkheadFullError(UpstreamUnavailable):
+    """Too many calls to the upstream are already in flight."""
+
+
+class DeadlineExceeded(UpstreamUnavailable):
+    """The query this call belongs to has run out of time."""
+
+
+# Absolute time.monotonic() by which the current query must finish, if any
+_deadline: ContextVar[Optional[float]] = ContextVar("deadline", default=None)
+
+
+@contextmanager
+def deadline(seconds: float):
+    """
+    Bounds every upstream call made inside the block (including tasks it
+    starts) to finish within ``seconds``. Nested deadlines can only shorten
+    the one already in effect.
+    """
+    at = time.monotonic() + seconds
+    current = _deadline.get()
+    token = _deadline.set(at if current is None else min(at, current))
+    try:
+        yield
+    finally:
+        _deadline.reset(token)
+
+
+def remaining() -> Optional[float]:
+    """Seconds left before the current deadline, or None when there is none."""
+    at = _deadline.get()
+    return None if at is None else at - time.monotonic()
+
+
+def bounded_timeout(timeout: Optional[float]) -> Optional[float]:
+    """
+    Caps a per-call timeout by the current deadline.
+
+    Raises:
+        DeadlineExceeded: If the deadline has already passed
+    """
+    left = remaining()
+    if left is None:
+        return timeout
+    if left <= 0:
+        raise DeadlineExceeded("Deadline exceeded before the request was sent")
+    return left if timeout is None else min(timeout, left)
+
+
+def backoff_delay(attempt: int, base: float, cap: float) -> float:
+    """Full-jitter exponential backoff: a random delay up to base * 2^attempt, capped."""
+    return random.uniform(0, min(cap, base * (2 ** attempt)))
+
+
+class CircuitBreaker:
+    """
+    Consecutive-failure circuit breaker for one upstream.
+
+    After ``failure_threshold`` failures in a row the circuit opens and calls
+    fail immediately. Once ``reset_timeout`` has passed a single trial call is
+    let through (half-open): success closes the circuit, failure opens it
+    again for another ``reset_timeout``.
+    """
+
+    CLOSED = "closed"
+    OPEN = "open"
+    HALF_OPEN = "half_open"
+
+    def __init__(self, name: str, failure_threshold: int, reset_timeout: float):
+        self.name = name
+        self.failure_threshold = failure_threshold
+        self.reset_timeout = reset_timeout
+        self.state = self.CLOSED
+        self.failures = 0
+        self.opened_at = 0.0
+        self.trial_in_flight = False
+        self.times_opened = 0
+        self.rejected = 0
+
+    def before_call(self):
+        """
+        Raises:
+            CircuitOpenError: If the call must not be made
+        """
+        if self.state == self.CLOSED:
+            return
+        if self.state == self.OPEN and time.monotonic() - self.opened_at >= self.reset_timeout:
+            self.state = self.HALF_OPEN
+            self.trial_in_flight = False
+        if self.state == self.HALF_OPEN and not self.trial_in_flight:
+            self.trial_in_flight = True
+            return
+        self.rejected += 1
+        raise CircuitOpenError(f"Circuit open for {self.name}")
+
+    def cancel_trial(self):
+        """Frees the half-open trial slot when the trial call was abandoned."""
+        self.trial_in_flight = False
+
+    def record_success(self):
+        if self.state != self.CLOSED:
+            logger.info(f"Circuit closed for {self.name}")
+        self.state = self.CLOSED
+        self.failures = 0
+        self.trial_in_flight = False
+
+    def record_failure(self):
+        self.failures += 1
+        if self.state == self.HALF_OPEN or self.failures >= self.failure_threshold:
+            if self.state != self.OPEN:
+                self.times_opened += 1
+                logger.warning(f"Circuit opened for {self.name} after {self.failures} consecutive failures")
+            self.state = self.OPEN
+            self.opened_at = time.monotonic()
+            self.trial_in_flight = False
+
+    def snapshot(self) -> Dict[str, Any]:
+        return {
+            "state": self.state,
+            "consecutive_failures": self.failures,
+            "times_opened": self.times_opened,
+            "rejected": self.rejected,
+        }
+
+
+class Bulkhead:
+    """
+    Caps concurrent calls to one upstream. Callers wait up to ``max_wait``
+    for a slot and are rejected after that, so a slow host holds at most
+    ``max_concurrent`` tasks instead of every query in the worker.
+    """
+
+    def __init__(self, name: str, max_concurrent: int, max_wait: float):
+        self.name = name
+        self.max_concurrent = max_concurrent
+        self.max_wait = max_wait
+        self.in_flight = 0
+        self.rejected = 0
+        self._semaphore = asyncio.Semaphore(max_concurrent)
+
+    async def acquire(self):
+        """
+        Raises:
+            BulkheadFullError: If no slot frees up in time
+            DeadlineExceeded: If the current deadline passes while waiting
+        """
+        if not self._semaphore.locked():
+            await self._semaphore.acquire()
+            self.in_flight += 1
+            return
+        wait = bounded_timeout(self.max_wait)
+        try:
+            await asyncio.wait_for(self._semaphore.acquire(), wait)
+        except asyncio.TimeoutError:
+            self.rejected += 1
+            left = remaining()
+            if left is not None and left <= 0:
+                raise DeadlineExceeded(f"Deadline exceeded waiting for {self.name}")
+            raise BulkheadFullError(f"{self.max_concurrent} calls to {self.name} already in flight")
+        self.in_flight += 1
+
+    def release(self):
+        self.in_flight -= 1
+        self._semaphore.release()
+
+    def snapshot(self) -> Dict[str, Any]:
+        return {
+            "in_flight": self.in_flight,
+            "max_concurrent": self.max_concurrent,
+            "rejected": self.rejected,
+        }
@@ -1,36 +1,129 @@
-from typing import Dict, Any, Optional
+from typing import Dict, Any, Optional, Tuple
+import base64
+import hashlib
+import hmac
+import os
+import secrets
 import time
-import uuid
 import logging
-from datetime import datetime, timedelta
+from datetime import datetime
+from dotenv import load_dotenv
+from app.core.shared_state import SharedStateBackend, shared_state
+
+# Load environment variables
+load_dotenv()
 
 logger = logging.getLogger(__name__)
 
+# Shared secret used to sign session tokens. Every worker must use the same
+# value, otherwise tokens issued by one worker are rejected by the others.
+SESSION_SECRET = os.getenv("SESSION_SECRET")
+
+
+def _b64encode(raw: bytes) -> str:
+    return base64.urlsafe_b64encode(raw).rstrip(b"=").decode("ascii")
+
+
+def _b64decode(data: str) -> bytes:
+    return base64.urlsafe_b64decode(data + "=" * (-len(data) % 4))
+
+
 class SessionManager:
     """
     Manages user sessions based on meter IDs.
     Handles token generation, validation, and session data storage.
+
+    Tokens are stateless and HMAC-signed: ``<payload>.<signature>`` where the
+    payload carries the meter ID, issue time and expiry. Any worker holding
+    the shared secret can validate a token without a session lookup; only
+    revoked (logged out) tokens are tracked until they expire.
+
+    Session data and revocations live in the shared state backend so that
+    every worker sees logouts and session updates.
     """
-    
-    def __init__(self):
-        self.sessions: Dict[str, Dict[str, Any]] = {}
-        self.token_to_meter_id: Dict[str, str] = {}
+
+    def __init__(self, secret: Optional[str] = None, state: Optional[SharedStateBackend] = None):
+        state = state or shared_state
+        self.sessions = state.namespace("sessions")  # meter_id -> session data
+        self.revoked_tokens = state.namespace("revoked_tokens")  # canonical base64 signature -> expiry (epoch seconds)
         self.session_timeout = 3600  # 1 hour in seconds
-    
+
+        secret = secret or SESSION_SECRET
+        if not secret:
+            logger.warning(
+                "SESSION_SECRET is not set, using a per-process secret. "
+                "Tokens will not be valid across workers or restarts."
+            )
+            secret = secrets.token_hex(32)
+        self._secret = secret.encode("utf-8")
+
+    def _sign(self, payload: bytes) -> bytes:
+        return hmac.new(self._secret, payload, hashlib.sha256).digest()
+
+    def _issue_token(self, meter_id: str) -> str:
+        issued_at = int(time.time())
+        expires_at = issued_at + self.session_timeout
+        payload = f"{meter_id}|{issued_at}|{expires_at}".encode("utf-8")
+        return f"{_b64encode(payload)}.{_b64encode(self._sign(payload))}"
+
+    def decode_token(self, token: str) -> Optional[Tuple[str, int, int]]:
+        """
+        Verifies a token's signature, expiry and revocation status.
+
+        Args:
+            token: The session token
+
+        Returns:
+            Tuple of (meter_id, issued_at, expires_at) or None if the token is invalid
+        """
+        if not token or token.count(".") != 1:
+            return None
+
+        payload_part, signature_part = token.split(".")
+        try:
+            payload = _b64decode(payload_part)
+            signature = _b64decode(signature_part)
+        except (ValueError, TypeError):
+            return None
+
+        # base64 ignores the unused bits of the last character, so several
+        # strings decode to the same bytes; only the canonical one is valid
+        if _b64encode(payload) != payload_part or _b64encode(signature) != signature_part:
+            return None
+
+        if not hmac.compare_digest(signature, self._sign(payload)):
+            return None
+
+        try:
+            meter_id, issued_at, expires_at = payload.decode("utf-8").rsplit("|", 2)
+            issued_at, expires_at = int(issued_at), int(expires_at)
+        except ValueError:
+            return None
+
+        if expires_at <= time.time():
+            logger.info(f"Token expired for meter ID: {meter_id}")
+            return None
+
+        if _b64encode(signature) in self.revoked_tokens:
+            logger.info(f"Token revoked for meter ID: {meter_id}")
+            return None
+
+        return meter_id, issued_at, expires_at
+
     def create_session(self, meter_id: str, meter_data: Dict[str, Any]) -> str:
         """
         Creates a new session for a meter ID and returns a token.
-        
+
         Args:
             meter_id: The meter ID for the user
             meter_data: Data associated with the meter
-            
+
         Returns:
             A session token
         """
-        # Generate a unique token
-        token = f"{meter_id}_{uuid.uuid4().hex[:10]}"
-        
+        # Generate a signed token
+        token = self._issue_token(meter_id)
+
         # Create session data
         session_data = {
             "meter_id": meter_id,
@@ -39,141 +132,171 @@ class SessionManager:
             "last_active": datetime.now(),
             "authenticated": True
         }
-        
-        # Store session
+
+        # Store session data; the token itself carries everything needed
+        # for validation
         self.sessions[meter_id] = session_data
-        self.token_to_meter_id[token] = meter_id
-        
+
         logger.info(f"Created session for meter ID: {meter_id}")
         return token
-    
+
     def validate_token(self, token: str) -> bool:
         """
         Validates a session token.
-        
+
         Args:
             token: The session token
-            
+
         Returns:
             True if valid, False otherwise
         """
-        logger.info(f"Validating token: {token}")
-        logger.info(f"Current tokens: {list(self.token_to_meter_id.keys())}")
-        
-        if not token or token not in self.token_to_meter_id:
-            logger.warning(f"Invalid token: {token}")
-            return False
-        
-        meter_id = self.token_to_meter_id[token]
-        
-        if meter_id not in self.sessions:
-            logger.warning(f"No session for meter ID: {meter_id}")
+        decoded = self.decode_token(token)
+        if not decoded:
+            logger.warning("Invalid token")
             return False
-        
-        # Update last active time
-        self.sessions[meter_id]["last_active"] = datetime.now()
-        
+
+        meter_id = decoded[0]
+
+        # Update last active time if a session is stored for this meter
+        self._touch(meter_id)
+
         logger.info(f"Token validated successfully for meter ID: {meter_id}")
         return True
-    
+
     def get_session_data(self, token: str) -> Optional[Dict[str, Any]]:
         """
         Gets session data for a token.
-        
+
         Args:
             token: The session token
-            
+
         Returns:
             Session data or None if token is invalid
         """
-        if not self.validate_token(token):
+        decoded = self.decode_token(token)
+        if not decoded:
             return None
-        
-        meter_id = self.token_to_meter_id[token]
-        return self.sessions[meter_id]
-    
+
+        meter_id, issued_at, _ = decoded
+        session = self.sessions.get(meter_id)
+        if session is None:
+            # Token was issued by another worker (or before a restart);
+            # rebuild the session from the token claims
+            session = {
+                "meter_id": meter_id,
+                "meter_data": None,
+                "created_at": datetime.fromtimestamp(issued_at),
+                "last_active": datetime.now(),
+                "authenticated": True
+            }
+            self.sessions[meter_id] = session
+        else:
+            session["last_active"] = datetime.now()
+            self.sessions[meter_id] = session
+        return session
+
     def update_session_data(self, token: str, data_updates: Dict[str, Any]) -> bool:
         """
         Updates session data for a token.
-        
+
         Args:
             token: The session token
             data_updates: Data to update in the session
-            
+
         Returns:
             True if update was successful, False otherwise
         """
-        if not self.validate_token(token):
+        session = self.get_session_data(token)
+        if session is None:
             return False
-        
-        meter_id = self.token_to_meter_id[token]
-        session = self.sessions[meter_id]
-        
+
         # Update session data
         for key, value in data_updates.items():
             if key != "meter_id" and key != "created_at":  # Protect critical fields
                 session[key] = value
-        
+
+        # Write back so other workers see the update
+        self.sessions[session["meter_id"]] = session
         return True
-    
+
     def end_session(self, token: str) -> bool:
         """
         Ends a session for a token.
-        
+
         Args:
             token: The session token
-            
+
         Returns:
             True if session was ended, False if token was invalid
         """
-        if token not in self.token_to_meter_id:
+        decoded = self.decode_token(token)
+        if not decoded:
             return False
-        
-        meter_id = self.token_to_meter_id[token]
-        
+
+        meter_id, _, expires_at = decoded
+
+        # Revoke the token until it would have expired anyway, keyed on the
+        # re-encoded signature bytes rather than the string as presented
+        signature = _b64decode(token.split(".")[1])
+        self.revoked_tokens[_b64encode(signature)] = expires_at
+
         # Clean up
         if meter_id in self.sessions:
             del self.sessions[meter_id]
-        
-        del self.token_to_meter_id[token]
-        
+
         logger.info(f"Ended session for meter ID: {meter_id}")
         return True
-    
+
     def get_meter_id_from_token(self, token: str) -> Optional[str]:
         """
         Gets the meter ID associated with a token.
-        
+
         Args:
             token: The session token
-            
+
         Returns:
             Meter ID or None if token is invalid
         """
-        if not self.validate_token(token):
+        decoded = self.decode_token(token)
+        if not decoded:
             return None
-        
-        return self.token_to_meter_id[token]
-    
+
+        return decoded[0]
+
+    def _touch(self, meter_id: str):
+        session = self.sessions.get(meter_id)
+        if session is not None:
+            session["last_active"] = datetime.now()
+            self.sessions[meter_id] = session
+
     def cleanup_expired_sessions(self):
         """
-        Cleans up expired sessions.
+        Cleans up expired sessions and revocations of expired tokens.
         """
         current_time = datetime.now()
-        tokens_to_remove = []
-        
-        for token, meter_id in self.token_to_meter_id.items():
-            if meter_id in self.sessions:
-                session = self.sessions[meter_id]
-                last_active = session["last_active"]
-                
-                if (current_time - last_active).total_seconds() > self.session_timeout:
-                    tokens_to_remove.append(token)
-        
-        for token in tokens_to_remove:
-            self.end_session(token)
-        
-        logger.info(f"Cleaned up {len(tokens_to_remove)} expired sessions")
+        now = time.time()
+
+        expired_meter_ids = [
+            meter_id
+            for meter_id, session in list(self.sessions.items())
+            if (current_time - session["last_active"]).total_seconds() > self.session_timeout
+        ]
+        for meter_id in expired_meter_ids:
+            del self.sessions[meter_id]
+
+        # A revoked token only needs tracking until it expires
+        expired_revocations = [
+            signature
+            for signature, expires_at in list(self.revoked_tokens.items())
+            if expires_at <= now
+        ]
+        for signature in expired_revocations:
+            del self.revoked_tokens[signature]
+
+        logger.info(
+            f"Cleaned up {len(expired_meter_ids)} expired sessions and "
+            f"{len(expired_revocations)} expired revocations"
+        )
 
 # Create a singleton instance
-session_manager = SessionManager() 
\ No newline at end of file
+session_manager = SessionManager()
@@ -0,0 +1,422 @@
+import asyncio
+import json
+import logging
+import os
+import sqlite3
+import threading
+import time
+import uuid
+from abc import ABC, abstractmethod
+from collections.abc import MutableMapping
+from datetime import datetime
+from typing import Any, Awaitable, Callable, Dict, Iterator, List, Optional, Tuple
+
+from cachetools import LRUCache
+
+from app.config.settings import SharedStateConfig, settings
+
+logger = logging.getLogger(__name__)
+
+# Subscriber callback: receives the published message and the worker_id of the publisher
+MessageHandler = Callable[[Dict[str, Any], str], Awaitable[None]]
+
+# Cached marker for a key that does not exist
+_MISSING = object()
+
+
+def _encode_default(value: Any) -> Any:
+    if isinstance(value, datetime):
+        return {"__datetime__": value.isoformat()}
+    raise TypeError(f"Object of type {type(value).__name__} is not JSON serializable")
+
+
+def _decode_hook(value: Dict[str, Any]) -> Any:
+    if len(value) == 1 and "__datetime__" in value:
+        return datetime.fromisoformat(value["__datetime__"])
+    return value
+
+
+def dumps(value: Any) -> str:
+    """Serializes a state value; datetimes survive the round trip."""
+    return json.dumps(value, default=_encode_default, separators=(",", ":"))
+
+
+def loads(data: str) -> Any:
+    """Deserializes a value produced by dumps."""
+    return json.loads(data, object_hook=_decode_hook)
+
+
+class SharedStateBackend(ABC):
+    """
+    Key/value state plus pub/sub shared by every worker process.
+
+    State is organised in namespaces (e.g. "sessions", "dfp_conversation_state").
+    Values are returned as snapshots: callers that mutate a value must write it
+    back with set() for other workers to see the change.
+    """
+
+    # True if state outlives the process (no restart snapshot needed)
+    persistent = False
+
+    def __init__(self):
+        # Identifies this worker process on the pub/sub bus
+        self.worker_id = f"{os.getpid()}-{uuid.uuid4().hex[:8]}"
+        self._subscribers: Dict[str, List[MessageHandler]] = {}
+
+    @abstractmethod
+    def get(self, namespace: str, key: str, default: Any = None) -> Any:
+        """Gets a value, or default if the key does not exist."""
+
+    @abstractmethod
+    def set(self, namespace: str, key: str, value: Any) -> None:
+        """Sets a value."""
+
+    @abstractmethod
+    def delete(self, namespace: str, key: str) -> bool:
+        """Deletes a key. Returns True if it existed."""
+
+    @abstractmethod
+    def items(self, namespace: str) -> List[Tuple[str, Any]]:
+        """Returns all (key, value) pairs in a namespace."""
+
+    @abstractmethod
+    def namespaces(self) -> List[str]:
+        """Returns the names of all non-empty namespaces."""
+
+    def export_state(self) -> Dict[str, Dict[str, Any]]:
+        """Returns every namespace as a plain dict, e.g. for a restart snapshot."""
+        return {name: dict(self.items(name)) for name in self.namespaces()}
+
+    def import_state(self, state: Dict[str, Dict[str, Any]]) -> None:
+        """Loads namespaces produced by export_state."""
+        for name, values in state.items():
+            for key, value in values.items():
+                self.set(name, key, value)
+
+    def contains(self, namespace: str, key: str) -> bool:
+        """Checks if a key exists in a namespace."""
+        sentinel = object()
+        return self.get(namespace, key, sentinel) is not sentinel
+
+    def clear(self, namespace: str) -> None:
+        """Removes every key in a namespace."""
+        for key, _ in self.items(namespace):
+            self.delete(namespace, key)
+
+    def namespace(self, name: str) -> "SharedNamespace":
+        """Returns a dict-like view over a namespace."""
+        return SharedNamespace(self, name)
+
+    def subscribe(self, channel: str, handler: MessageHandler) -> None:
+        """
+        Registers a handler for messages published on a channel by any worker,
+        including this one.
+        """
+        self._subscribers.setdefault(channel, []).append(handler)
+
+    @abstractmethod
+    async def publish(self, channel: str, message: Dict[str, Any]) -> None:
+        """Publishes a message to the subscribers of a channel on every worker."""
+
+    async def start(self) -> None:
+        """Starts background work (e.g. polling for published messages)."""
+
+    async def stop(self) -> None:
+        """Stops background work."""
+
+    def cache_info(self) -> Dict[str, Any]:
+        """Read cache statistics of this worker, if the backend caches reads."""
+        return {}
+
+    async def _dispatch(self, channel: str, message: Dict[str, Any], origin: str) -> None:
+        for handler in self._subscribers.get(channel, []):
+            try:
+                await handler(message, origin)
+            except Exception as e:
+                logger.error(f"Error handling message on channel {channel}: {str(e)}", exc_info=True)
+
+
+class SharedNamespace(MutableMapping):
+    """
+    Dict-like view over a shared state namespace, so module-level dicts can be
+    swapped for shared state without changing their call sites.
+    """
+
+    def __init__(self, backend: SharedStateBackend, name: str):
+        self.backend = backend
+        self.name = name
+
+    def __getitem__(self, key: str) -> Any:
+        sentinel = object()
+        value = self.backend.get(self.name, key, sentinel)
+        if value is sentinel:
+            raise KeyError(key)
+        return value
+
+    def __setitem__(self, key: str, value: Any) -> None:
+        self.backend.set(self.name, key, value)
+
+    def __delitem__(self, key: str) -> None:
+        if not self.backend.delete(self.name, key):
+            raise KeyError(key)
+
+    def __contains__(self, key: object) -> bool:
+        return isinstance(key, str) and self.backend.contains(self.name, key)
+
+    def __iter__(self) -> Iterator[str]:
+        return iter([key for key, _ in self.backend.items(self.name)])
+
+    def __len__(self) -> int:
+        return len(self.backend.items(self.name))
+
+    def get(self, key: str, default: Any = None) -> Any:
+        return self.backend.get(self.name, key, default)
+
+    def clear(self) -> None:
+        self.backend.clear(self.name)
+
+
+class InMemoryStateBackend(SharedStateBackend):
+    """
+    In-process backend. Values are stored by reference, which matches the
+    behaviour of the plain dicts it replaces. Only suitable for a single worker.
+    """
+
+    def __init__(self):
+        super().__init__()
+        self._data: Dict[str, Dict[str, Any]] = {}
+
+    def get(self, namespace: str, key: str, default: Any = None) -> Any:
+        return self._data.get(namespace, {}).get(key, default)
+
+    def set(self, namespace: str, key: str, value: Any) -> None:
+        self._data.setdefault(namespace, {})[key] = value
+
+    def delete(self, namespace: str, key: str) -> bool:
+        values = self._data.get(namespace, {})
+        if key not in values:
+            return False
+        del values[key]
+        return True
+
+    def items(self, namespace: str) -> List[Tuple[str, Any]]:
+        return list(self._data.get(namespace, {}).items())
+
+    def namespaces(self) -> List[str]:
+        return [name for name, values in self._data.items() if values]
+
+    def contains(self, namespace: str, key: str) -> bool:
+        return key in self._data.get(namespace, {})
+
+    def clear(self, namespace: str) -> None:
+        self._data.pop(namespace, None)
+
+    async def publish(self, channel: str, message: Dict[str, Any]) -> None:
+        await self._dispatch(channel, message, self.worker_id)
+
+
+class SQLiteStateBackend(SharedStateBackend):
+    """
+    Multi-process backend over a shared SQLite database (WAL mode), for running
+    several workers on one host. Published messages are appended to an events
+    table that every worker polls.
+
+    Reads are served from a per-worker cache while the poller runs, so hot
+    keys (sessions, revocations, conversation state) do not hit the database
+    on the event loop. Triggers log every write to a changes table; the
+    poller drops the changed keys from the cache off the loop, so another
+    worker's write becomes visible within one poll interval.
+    """
+
+    persistent = True
+
+    def __init__(
+        self,
+        path: str,
+        poll_interval: float = 0.05,
+        event_retention: float = 60.0,
+        cache_size: int = 10000,
+    ):
+        super().__init__()
+        self.path = path
+        self.poll_interval = poll_interval
+        self.event_retention = event_retention
+        self._cache: LRUCache = LRUCache(maxsize=cache_size)  # (namespace, key) -> encoded value or _MISSING
+        self.cache_hits = 0
+        self.cache_misses = 0
+        self._lock = threading.Lock()
+        self._conn = sqlite3.connect(path, check_same_thread=False, isolation_level=None, timeout=5.0)
+        self._conn.execute("PRAGMA journal_mode=WAL")
+        self._conn.execute("PRAGMA synchronous=NORMAL")
+        self._conn.execute(
+            "CREATE TABLE IF NOT EXISTS kv ("
+            "namespace TEXT NOT NULL, key TEXT NOT NULL, value TEXT NOT NULL, "
+            "PRIMARY KEY (namespace, key))"
+        )
+        self._conn.execute(
+            "CREATE TABLE IF NOT EXISTS events ("
+            "id INTEGER PRIMARY KEY AUTOINCREMENT, channel TEXT NOT NULL, "
+            "origin TEXT NOT NULL, payload TEXT NOT NULL, created_at REAL NOT NULL)"
+        )
+        self._conn.execute(
+            "CREATE TABLE IF NOT EXISTS changes ("
+            "id INTEGER PRIMARY KEY AUTOINCREMENT, namespace TEXT NOT NULL, "
+            "key TEXT NOT NULL, created_at REAL NOT NULL)"
+        )
+        for event, row in (("INSERT", "NEW"), ("UPDATE", "NEW"), ("DELETE", "OLD")):
+            self._conn.execute(
+                f"CREATE TRIGGER IF NOT EXISTS kv_{event.lower()}_log AFTER {event} ON kv BEGIN "
+                f"INSERT INTO changes (namespace, key, created_at) "
+                f"VALUES ({row}.namespace, {row}.key, (julianday('now') - 2440587.5) * 86400.0); END"
+            )
+        self._last_event_id = self._execute("SELECT COALESCE(MAX(id), 0) FROM events")[0][0]
+        self._last_change_id = self._execute("SELECT COALESCE(MAX(id), 0) FROM changes")[0][0]
+        self._poll_task: Optional[asyncio.Task] = None
+
+    def _execute(self, sql: str, params: Tuple = ()) -> List[Tuple]:
+        with self._lock:
+            return self._conn.execute(sql, params).fetchall()
+
+    def _read(self, namespace: str, key: str) -> Any:
+        """The encoded value of a key, or _MISSING; cached only while changes are polled."""
+        caching = self._poll_task is not None
+        if caching:
+            encoded = self._cache.get((namespace, key))
+            if encoded is not None:
+                self.cache_hits += 1
+                return encoded
+            self.cache_misses += 1
+        rows = self._execute("SELECT value FROM kv WHERE namespace = ? AND key = ?", (namespace, key))
+        encoded = rows[0][0] if rows else _MISSING
+        if caching:
+            self._cache[(namespace, key)] = encoded
+        return encoded
+
+    def get(self, namespace: str, key: str, default: Any = None) -> Any:
+        encoded = self._read(namespace, key)
+        # Decode on every read so callers get their own snapshot
+        return default if encoded is _MISSING else loads(encoded)
+
+    def set(self, namespace: str, key: str, value: Any) -> None:
+        encoded = dumps(value)
+        self._execute(
+            "INSERT INTO kv (namespace, key, value) VALUES (?, ?, ?) "
+            "ON CONFLICT (namespace, key) DO UPDATE SET value = excluded.value",
+            (namespace, key, encoded),
+        )
+        if self._poll_task is not None:
+            self._cache[(namespace, key)] = encoded
+
+    def delete(self, namespace: str, key: str) -> bool:
+        with self._lock:
+            cursor = self._conn.execute("DELETE FROM kv WHERE namespace = ? AND key = ?", (namespace, key))
+        if self._poll_task is not None:
+            self._cache[(namespace, key)] = _MISSING
+        return cursor.rowcount > 0
+
+    def items(self, namespace: str) -> List[Tuple[str, Any]]:
+        rows = self._execute("SELECT key, value FROM kv WHERE namespace = ?", (namespace,))
+        return [(key, loads(value)) for key, value in rows]
+
+    def namespaces(self) -> List[str]:
+        return [row[0] for row in self._execute("SELECT DISTINCT namespace FROM kv")]
+
+    def contains(self, namespace: str, key: str) -> bool:
+        return self._read(namespace, key) is not _MISSING
+
+    def clear(self, namespace: str) -> None:
+        self._execute("DELETE FROM kv WHERE namespace = ?", (namespace,))
+        for cached in [cached for cached in self._cache if cached[0] == namespace]:
+            del self._cache[cached]
+
+    async def publish(self, channel: str, message: Dict[str, Any]) -> None:
+        await asyncio.to_thread(
+            self._execute,
+            "INSERT INTO events (channel, origin, payload, created_at) VALUES (?, ?, ?, ?)",
+            (channel, self.worker_id, dumps(message), time.time()),
+        )
+
+    async def start(self) -> None:
+        if self._poll_task is None:
+            self._poll_task = asyncio.create_task(self._poll_events())
+            logger.info(f"SQLite shared state started at {self.path} (worker {self.worker_id})")
+
+    async def stop(self) -> None:
+        if self._poll_task is not None:
+            self._poll_task.cancel()
+            self._poll_task = None
+            self._cache.clear()
+
+    def cache_info(self) -> Dict[str, Any]:
+        """Read cache size and hit counts of this worker."""
+        return {
+            "size": len(self._cache),
+            "maxsize": self._cache.maxsize,
+            "hits": self.cache_hits,
+            "misses": self.cache_misses,
+        }
+
+    def _forget_changes(self, rows: List[Tuple]) -> None:
+        """Drops keys written by any worker from the read cache."""
+        for change_id, namespace, key in rows:
+            self._last_change_id = change_id
+            self._cache.pop((namespace, key), None)
+
+    async def _poll_events(self):
+        """Delivers events published by any worker to local subscribers."""
+        last_prune = time.time()
+        while True:
+            try:
+                rows = await asyncio.to_thread(
+                    self._execute,
+                    "SELECT id, channel, origin, payload FROM events WHERE id > ? ORDER BY id",
+                    (self._last_event_id,),
+                )
+                for event_id, channel, origin, payload in rows:
+                    self._last_event_id = event_id
+                    await self._dispatch(channel, loads(payload), origin)
+
+                changes = await asyncio.to_thread(
+                    self._execute,
+                    "SELECT id, namespace, key FROM changes WHERE id > ? ORDER BY id",
+                    (self._last_change_id,),
+                )
+                self._forget_changes(changes)
+
+                now = time.time()
+                if now - last_prune > self.event_retention:
+                    await asyncio.to_thread(
+                        self._execute,
+                        "DELETE FROM events WHERE created_at < ?",
+                        (now - self.event_retention,),
+                    )
+                    await asyncio.to_thread(
+                        self._execute,
+                        "DELETE FROM changes WHERE created_at < ?",
+                        (now - self.event_retention,),
+                    )
+                    last_prune = now
+
+                await asyncio.sleep(self.poll_interval)
+            except asyncio.CancelledError:
+                raise
+            except Exception as e:
+                logger.error(f"Error polling shared state events: {str(e)}")
+                await asyncio.sleep(1)
+
+
+def create_backend(config: SharedStateConfig) -> SharedStateBackend:
+    """Creates the shared state backend selected in the configuration."""
+    if config.provider == "in_memory":
+        return InMemoryStateBackend()
+    if config.provider == "sqlite":
+        return SQLiteStateBackend(
+            path=config.sqlite_path,
+            poll_interval=config.poll_interval_seconds,
+            cache_size=config.cache_size,
+        )
+    raise NotImplementedError(f"Shared state provider '{config.provider}' is not yet implemented.")
+
+
+# Global shared state backend
+shared_state = create_backend(settings.shared_state)
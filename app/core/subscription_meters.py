@@ -0,0 +1,106 @@
+from typing import Any, Dict, List, Optional
+import asyncio
+import logging
+import os
+from cachetools import TTLCache
+from dotenv import load_dotenv
+from app.config.settings import settings
+from app.core.http_client import http_clients
+from app.core.shared_state import shared_state
+
+# Load environment variables
+load_dotenv()
+
+logger = logging.getLogger(__name__)
+
+SUBSCRIPTION_METERS_API_URL = os.getenv(
+    "SUBSCRIPTION_METERS_API_URL", "https://playground.becknprotocol.io/meter-data-simulator/meters/subscription"
+)
+
+# Pub/sub channel telling every worker to drop a cached subscription
+INVALIDATE_CHANNEL = "subscription_meters.invalidate"
+
+# subscription_id -> meter IDs, remembered for consumer_alerts.subscription_meters_ttl_seconds
+_meters: TTLCache = TTLCache(maxsize=10000, ttl=settings.consumer_alerts.subscription_meters_ttl_seconds)
+# Lookups currently in flight, so concurrent alerts for a subscription share one call
+_inflight: Dict[str, "asyncio.Task[Optional[List[int]]]"] = {}
+_hits = 0
+_misses = 0
+
+
+async def _fetch_meter_ids(subscription_id: str) -> Optional[List[int]]:
+    try:
+        response = await http_clients.get(f"{SUBSCRIPTION_METERS_API_URL}/{subscription_id}", timeout=10)
+        if response.status_code != 200:
+            logger.error(f"API request failed with status code {response.status_code}: {response.text}")
+            return None
+
+        data = response.json()
+        meter_ids = [meter["id"] for meter in data.get("data") or [] if isinstance(meter, dict) and "id" in meter]
+        logger.info(f"Found {len(meter_ids)} meters for subscription ID {subscription_id}")
+        # An empty subscription may still be filling up; look it up again next time
+        if meter_ids:
+            _meters[subscription_id] = meter_ids
+        return meter_ids
+    except Exception as e:
+        logger.error(f"Error fetching meters by subscription: {str(e)}")
+        return None
+
+
+async def get_meter_ids(subscription_id: str) -> List[int]:
+    """
+    Gets the meter IDs enrolled under a subscription (a DFP order).
+
+    Results are cached for subscription_meters_ttl_seconds and concurrent
+    lookups for the same subscription are coalesced into a single upstream
+    call. Failed lookups return an empty list and are not cached.
+    """
+    global _hits, _misses
+    subscription_id = str(subscription_id)
+    meter_ids = _meters.get(subscription_id)
+    if meter_ids is not None:
+        _hits += 1
+        return meter_ids
+
+    _misses += 1
+    task = _inflight.get(subscription_id)
+    if task is None:
+        task = asyncio.create_task(_fetch_meter_ids(subscription_id))
+        _inflight[subscription_id] = task
+        task.add_done_callback(lambda _: _inflight.pop(subscription_id, None))
+    return await asyncio.shield(task) or []
+
+
+def _drop(subscription_id: Optional[str]):
+    if subscription_id is None:
+        _meters.clear()
+    else:
+        _meters.pop(str(subscription_id), None)
+
+
+async def invalidate(subscription_id: Optional[str] = None):
+    """
+    Drops a cached subscription (or every one) on all workers, e.g. after
+    enrollment in the order changed.
+    """
+    _drop(subscription_id)
+    await shared_state.publish(INVALIDATE_CHANNEL, {"subscription_id": subscription_id})
+
+
+async def _on_invalidate(message: Dict[str, Any], origin: str):
+    """Drops a subscription invalidated on another worker."""
+    if origin != shared_state.worker_id:
+        _drop(message.get("subscription_id"))
+
+
+def get_metrics() -> Dict[str, Any]:
+    """Cached subscriptions and lookup hit counts on this worker."""
+    return {
+        "subscriptions": len(_meters),
+        "hits": _hits,
+        "misses": _misses,
+        "ttl_seconds": _meters.ttl,
+    }
+
+
+shared_state.subscribe(INVALIDATE_CHANNEL, _on_invalidate)
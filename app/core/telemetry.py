@@ -0,0 +1,254 @@
+from typing import Any, Dict, Iterable, List, Optional, Tuple
+import logging
+import math
+import os
+import time
+from collections import deque
+from datetime import datetime
+import numpy as np
+
+logger = logging.getLogger(__name__)
+
+# Load samples kept per transformer (a day at 5-minute resolution)
+TELEMETRY_BUFFER_SIZE = int(os.getenv("TELEMETRY_BUFFER_SIZE", "288"))
+# Weight of the newest sample in the load EWMA
+TELEMETRY_EWMA_ALPHA = float(os.getenv("TELEMETRY_EWMA_ALPHA", "0.2"))
+# Most recent samples the load slope is fitted over
+TELEMETRY_SLOPE_WINDOW = int(os.getenv("TELEMETRY_SLOPE_WINDOW", "12"))
+
+# Rows are added to the sample arrays in chunks of this many transformers
+_GROWTH = 64
+
+
+class TelemetryStore:
+    """
+    Load time series per transformer in fixed-size ring buffers.
+
+    Every transformer owns one row of two ``(transformers, size)`` NumPy
+    arrays (timestamps and loads) and a write position, so the series of the
+    whole fleet can be read as matrices. Rolling statistics are updated as
+    each sample arrives, in O(1):
+
+    - EWMA of the load
+    - least-squares slope over the last ``slope_window`` samples, from
+      running sums of t, y, t² and t·y (rebased once per buffer length to
+      keep rounding error from accumulating)
+    - peak over the buffer, from a monotonic deque
+
+    Readers get the maintained values and never rescan the samples.
+    Samples not newer than a transformer's last one are dropped.
+    """
+
+    def __init__(
+        self,
+        size: int = TELEMETRY_BUFFER_SIZE,
+        alpha: float = TELEMETRY_EWMA_ALPHA,
+        slope_window: int = TELEMETRY_SLOPE_WINDOW,
+    ):
+        self.size = size
+        self.alpha = alpha
+        self.slope_window = min(slope_window, size)
+        self._rows: Dict[str, int] = {}  # transformer_id -> row
+        self._ids: List[str] = []  # row -> transformer_id
+        self._peaks: List[deque] = []  # row -> (sequence, load) with decreasing loads
+        self.times = np.zeros((0, size))
+        self.loads = np.zeros((0, size))
+        self.appended = np.zeros(0, dtype=np.int64)  # samples ever written per row
+        self.ewma = np.zeros(0)
+        self.last_at = np.zeros(0)
+        self.capacity = np.zeros(0)  # kW, NaN when unknown
+        # Running least-squares sums over the slope window, with t relative to origin
+        self._origin = np.zeros(0)
+        self._sums = np.zeros((0, 4))  # sum t, sum y, sum t², sum t·y
+        self.slope = np.zeros(0)  # kW per minute
+        self.ingested = 0
+        self.dropped = 0
+
+    def __len__(self) -> int:
+        return len(self._ids)
+
+    @property
+    def transformer_ids(self) -> List[str]:
+        return list(self._ids)
+
+    def _row(self, transformer_id: str) -> int:
+        row = self._rows.get(transformer_id)
+        if row is not None:
+            return row
+        row = len(self._ids)
+        if row == self.times.shape[0]:
+            self._grow(row + _GROWTH)
+        self._rows[transformer_id] = row
+        self._ids.append(transformer_id)
+        self._peaks.append(deque())
+        return row
+
+    def _grow(self, rows: int):
+        extra = rows - self.times.shape[0]
+        self.times = np.vstack([self.times, np.zeros((extra, self.size))])
+        self.loads = np.vstack([self.loads, np.zeros((extra, self.size))])
+        self._sums = np.vstack([self._sums, np.zeros((extra, 4))])
+        self.appended = np.concatenate([self.appended, np.zeros(extra, dtype=np.int64)])
+        self.capacity = np.concatenate([self.capacity, np.full(extra, np.nan)])
+        for name in ("ewma", "last_at", "_origin", "slope"):
+            setattr(self, name, np.concatenate([getattr(self, name), np.zeros(extra)]))
+
+    def append(self, transformer_id: str, timestamp: float, load: float, capacity_kw: Optional[float] = None) -> bool:
+        """
+        Adds one sample and updates the transformer's statistics.
+
+        Returns:
+            False if the sample was dropped for not being newer than the
+            last one, or for a non-finite time or load
+        """
+        if not (math.isfinite(timestamp) and math.isfinite(load)):
+            self.dropped += 1
+            return False
+        transformer_id = str(transformer_id)
+        row = self._row(transformer_id)
+        if capacity_kw and math.isfinite(capacity_kw):
+            self.capacity[row] = capacity_kw
+        n = int(self.appended[row])
+        if n and timestamp <= self.last_at[row]:
+            self.dropped += 1
+            return False
+
+        position = n % self.size
+        sums = self._sums[row]
+        if n == 0:
+            self._origin[row] = timestamp
+        elif n % self.size == 0:
+            self._rebase(row, n)
+        if n >= self.slope_window:
+            # The oldest sample in the slope window leaves it (read before it may be overwritten)
+            leaving = (n - self.slope_window) % self.size
+            t = self.times[row, leaving] - self._origin[row]
+            y = self.loads[row, leaving]
+            sums -= (t, y, t * t, t * y)
+        t = timestamp - self._origin[row]
+        sums += (t, load, t * t, t * load)
+
+        self.times[row, position] = timestamp
+        self.loads[row, position] = load
+        self.appended[row] = n + 1
+        self.last_at[row] = timestamp
+        self.ewma[row] = load if n == 0 else self.alpha * load + (1 - self.alpha) * self.ewma[row]
+
+        peaks = self._peaks[row]
+        while peaks and peaks[-1][1] <= load:
+            peaks.pop()
+        peaks.append((n, load))
+        while peaks[0][0] <= n - self.size:
+            peaks.popleft()
+
+        m = min(n + 1, self.slope_window)
+        sum_t, sum_y, sum_tt, sum_ty = sums
+        denominator = m * sum_tt - sum_t * sum_t
+        self.slope[row] = (m * sum_ty - sum_t * sum_y) / denominator * 60 if m > 1 and denominator > 0 else 0.0
+        self.ingested += 1
+        return True
+
+    def _rebase(self, row: int, n: int):
+        """Recomputes the slope sums from the buffer with a fresh origin."""
+        m = min(n, self.slope_window)
+        positions = np.arange(n - m, n) % self.size
+        self._origin[row] = self.times[row, positions[0]]
+        t = self.times[row, positions] - self._origin[row]
+        y = self.loads[row, positions]
+        self._sums[row] = (t.sum(), y.sum(), (t * t).sum(), (t * y).sum())
+
+    def ingest(self, samples: Iterable[Tuple[str, float, float, Optional[float]]]) -> int:
+        """
+        Adds (transformer_id, timestamp, load_kw, capacity_kw) samples.
+
+        Returns:
+            The number of samples accepted
+        """
+        return sum(self.append(*sample) for sample in samples)
+
+    def series(self, transformer_id: str) -> Optional[Tuple[np.ndarray, np.ndarray]]:
+        """A transformer's buffered (timestamps, loads), oldest first."""
+        row = self._rows.get(str(transformer_id))
+        if row is None:
+            return None
+        n = int(self.appended[row])
+        positions = np.arange(max(0, n - self.size), n) % self.size
+        return self.times[row, positions], self.loads[row, positions]
+
+    def window(self, samples: int, rows: Optional[np.ndarray] = None) -> Tuple[np.ndarray, np.ndarray, np.ndarray]:
+        """
+        The last ``samples`` samples of every transformer (or of ``rows``)
+        as aligned matrices, oldest first, gathered in one vectorized pass.
+
+        Returns:
+            (timestamps, loads, valid) of shape (transformers, samples);
+            ``valid`` is False where a transformer has fewer samples
+        """
+        samples = min(samples, self.size)
+        # A slice is a view; indexing with rows would copy whole buffers
+        rows = slice(0, len(self._ids)) if rows is None else rows
+        sequence = self.appended[rows, None] - samples + np.arange(samples)
+        positions = sequence % self.size
+        times = np.take_along_axis(self.times[rows], positions, axis=1)
+        loads = np.take_along_axis(self.loads[rows], positions, axis=1)
+        return times, loads, sequence >= 0
+
+    def rows(self, transformer_ids: Iterable[str]) -> np.ndarray:
+        """Row indices of known transformers."""
+        return np.array([self._rows[str(transformer_id)] for transformer_id in transformer_ids if str(transformer_id) in self._rows], dtype=np.int64)
+
+    def stats(self, transformer_id: str) -> Optional[Dict[str, Any]]:
+        """The rolling statistics of a transformer, or None if it never reported."""
+        row = self._rows.get(str(transformer_id))
+        if row is None:
+            return None
+        peak_sequence, peak = self._peaks[row][0]
+        position = (int(self.appended[row]) - 1) % self.size
+        ewma = float(self.ewma[row])
+        slope = float(self.slope[row])
+        capacity = float(self.capacity[row])
+        stats = {
+            "transformer_id": self._ids[row],
+            "samples": int(min(self.appended[row], self.size)),
+            "last_kw": float(self.loads[row, position]),
+            "last_at": float(self.last_at[row]),
+            "ewma_kw": round(ewma, 3),
+            "slope_kw_per_min": round(slope, 4),
+            "peak_kw": float(peak),
+            "peak_at": float(self.times[row, peak_sequence % self.size]),
+            "capacity_kw": None if math.isnan(capacity) else capacity,
+            "load_percentage": None,
+            "minutes_to_capacity": None,
+        }
+        if stats["capacity_kw"]:
+            stats["load_percentage"] = round(ewma / capacity * 100, 1)
+            if slope > 0 and ewma < capacity:
+                stats["minutes_to_capacity"] = round((capacity - ewma) / slope, 1)
+        return stats
+
+    def all_stats(self) -> List[Dict[str, Any]]:
+        return [self.stats(transformer_id) for transformer_id in self._ids]
+
+    def get_metrics(self) -> Dict[str, Any]:
+        """Transformers tracked, samples accepted and dropped, and buffer memory."""
+        return {
+            "transformers": len(self._ids),
+            "ingested": self.ingested,
+            "dropped": self.dropped,
+            "buffer_size": self.size,
+            "buffer_bytes": self.times.nbytes + self.loads.nbytes,
+        }
+
+
+def sample_time(value: Any) -> float:
+    """Epoch seconds from an epoch number or ISO 8601 string; now if missing."""
+    if value is None:
+        return time.time()
+    if isinstance(value, (int, float)):
+        if not math.isfinite(value):
+            raise ValueError(f"{value} is not a finite number")
+        return float(value)
+    return datetime.fromisoformat(str(value).replace("Z", "+00:00")).timestamp()
+
+# Create a singleton instance
+telemetry_store = TelemetryStore()
@@ -0,0 +1,148 @@
+from typing import Any, Dict, Optional
+import asyncio
+import logging
+import os
+import time
+import uuid
+from app.core.shared_state import SharedStateBackend, shared_state
+from app.core.websocket_manager import LatencyHistogram
+
+logger = logging.getLogger(__name__)
+
+# Transactions not updated for this long are dropped
+BECKN_TRANSACTION_TTL_SECONDS = int(os.getenv("BECKN_TRANSACTION_TTL_SECONDS", "86400"))
+# How often expired transactions are looked for
+BECKN_TRANSACTION_EVICT_INTERVAL_SECONDS = float(os.getenv("BECKN_TRANSACTION_EVICT_INTERVAL_SECONDS", "600"))
+
+
+class TransactionStore:
+    """
+    Beckn transactions in progress, keyed by ``transaction_id``.
+
+    Each entry holds the ids one Beckn step needs from the previous one
+    (provider, item, fulfillment, order) and the stage reached, so a
+    multi-step flow such as checkout can run server-side instead of the
+    agent copying ids between tool calls. The full Beckn response of each
+    step is kept alongside, so the agent only needs a compact projection of
+    it. Entries live in the shared state backend, so every worker sees them
+    and they survive restarts. Expired entries are dropped by a background
+    task rather than on every new transaction.
+    """
+
+    def __init__(
+        self,
+        state: Optional[SharedStateBackend] = None,
+        ttl: int = BECKN_TRANSACTION_TTL_SECONDS,
+        evict_interval: float = BECKN_TRANSACTION_EVICT_INTERVAL_SECONDS,
+    ):
+        state = state or shared_state
+        self.transactions = state.namespace("beckn_transactions")  # transaction_id -> transaction
+        self.payloads = state.namespace("beckn_payloads")  # transaction_id -> {action: raw response}
+        self.ttl = ttl
+        self.evict_interval = evict_interval
+        self.checkouts = 0
+        self.failed_checkouts = 0
+        self.checkout_latency = LatencyHistogram()
+        self._evict_task: Optional[asyncio.Task] = None
+
+    def begin(self, domain: str, **fields: Any) -> str:
+        """
+        Starts a transaction.
+
+        Args:
+            domain: The Beckn domain, e.g. "deg:retail"
+            **fields: Initial ids, e.g. provider_id and item_id
+
+        Returns:
+            The new transaction_id
+        """
+        transaction_id = str(uuid.uuid4())
+        now = time.time()
+        self.transactions[transaction_id] = {
+            "domain": domain,
+            "stage": "started",
+            "created_at": now,
+            "updated_at": now,
+            **fields,
+        }
+        return transaction_id
+
+    def update(self, transaction_id: str, **fields: Any) -> Dict[str, Any]:
+        """Merges fields into a transaction and returns it."""
+        transaction = self.transactions.get(transaction_id) or {}
+        transaction.update(fields, updated_at=time.time())
+        # Write back so other workers see the change
+        self.transactions[transaction_id] = transaction
+        return transaction
+
+    def get(self, transaction_id: str) -> Optional[Dict[str, Any]]:
+        return self.transactions.get(transaction_id)
+
+    def save_payload(self, transaction_id: str, action: str, raw: str):
+        """Keeps the full response of a Beckn step, replacing an earlier one for the same action."""
+        if transaction_id not in self.transactions:
+            self.transactions[transaction_id] = {"stage": action, "created_at": time.time(), "updated_at": time.time()}
+        self.payloads[transaction_id] = {**self.payloads.get(transaction_id, {}), action: raw}
+
+    def get_payloads(self, transaction_id: str) -> Dict[str, str]:
+        """Full responses of a transaction's steps, by action."""
+        return self.payloads.get(transaction_id, {})
+
+    def evict_expired(self) -> int:
+        """
+        Drops transactions not updated within the TTL, with their payloads.
+
+        Returns:
+            The number of transactions dropped
+        """
+        cutoff = time.time() - self.ttl
+        expired = [
+            transaction_id
+            for transaction_id, transaction in list(self.transactions.items())
+            if transaction.get("updated_at", 0) < cutoff
+        ]
+        for transaction_id in expired:
+            self.transactions.pop(transaction_id, None)
+            self.payloads.pop(transaction_id, None)
+        return len(expired)
+
+    async def start(self):
+        """Starts the background task that drops expired transactions."""
+        if self._evict_task is None:
+            self._evict_task = asyncio.create_task(self._evict_loop())
+
+    async def stop(self):
+        """Stops the eviction task."""
+        if self._evict_task is not None:
+            self._evict_task.cancel()
+            self._evict_task = None
+
+    async def _evict_loop(self):
+        while True:
+            await asyncio.sleep(self.evict_interval)
+            try:
+                evicted = self.evict_expired()
+                if evicted:
+                    logger.info(f"Dropped {evicted} expired Beckn transactions")
+            except Exception as e:
+                logger.error(f"Error dropping expired Beckn transactions: {str(e)}")
+
+    def record_checkout(self, elapsed: float, ok: bool):
+        """Counts a finished composite checkout."""
+        self.checkouts += 1
+        if ok:
+            self.checkout_latency.observe(elapsed)
+        else:
+            self.failed_checkouts += 1
+
+    def get_metrics(self) -> Dict[str, Any]:
+        """Open transactions and end-to-end latency of composite checkouts."""
+        return {
+            "open_transactions": len(self.transactions),
+            "checkouts": self.checkouts,
+            "failed_checkouts": self.failed_checkouts,
+            "checkout_latency": self.checkout_latency.snapshot(),
+        }
+
+# Create a singleton instance
+transaction_store = TransactionStore()
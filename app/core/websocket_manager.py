@@ -1,237 +1,1168 @@
 import logging
-from typing import Dict, Any, List, Optional
+from typing import Dict, Any, Awaitable, Callable, Iterable, List, Optional, Set, Tuple, Union
 from fastapi import WebSocket
 import uuid
 import asyncio
+import json
 import time
+from collections import deque
+from app.config.settings import WebSocketConfig, settings
+
+try:
+    import orjson
+except ImportError:  # Optional dependency, falls back to the standard library
+    orjson = None
+
+try:
+    import msgpack
+except ImportError:  # Optional dependency, only needed for encoding=msgpack streams
+    msgpack = None
 
 logger = logging.getLogger(__name__)
 
+SLOW_CONSUMER_POLICIES = ("drop_oldest", "disconnect")
+STREAM_ENCODINGS = ("json", "msgpack")
+
+_JSON_BATCH_PREFIX = '{"type":"batch","frames":['
+# Accept what json.dumps accepts (non-str keys) plus NumPy values from the forecasts
+_ORJSON_OPTIONS = (orjson.OPT_NON_STR_KEYS | orjson.OPT_SERIALIZE_NUMPY) if orjson is not None else 0
+# fixmap(2) "type" "batch" "frames", followed by the frames array
+_MSGPACK_BATCH_PREFIX = b"\x82\xa4type\xa5batch\xa6frames"
+
+
+def _json_default(value: Any) -> Any:
+    """Converts NumPy scalars and arrays, which the json module cannot encode."""
+    if hasattr(value, "tolist"):
+        return value.tolist()
+    raise TypeError(f"Object of type {type(value).__name__} is not JSON serializable")
+
+
+def _msgpack_array_header(length: int) -> bytes:
+    if length < 16:
+        return bytes([0x90 | length])
+    if length < 0x10000:
+        return b"\xdc" + length.to_bytes(2, "big")
+    return b"\xdd" + length.to_bytes(4, "big")
+
+
+class ConnectionRegistry:
+    """
+    Forward and reverse indexes over active connections.
+
+    Every lookup (by connection, client, meter, type, token or topic) is a
+    dict access, and register/unregister update all indexes together so no
+    entry outlives its connection. The methods never await, so each call is
+    atomic with respect to the event loop.
+
+    A meter may be connected from several devices, so meters map to an
+    insertion-ordered set of connections. Topics (e.g. "transformer:5" or
+    "order:abc") are free-form subscription keys used for targeted fan-out.
+    """
+
+    def __init__(self):
+        self.sockets: Dict[str, WebSocket] = {}               # connection_id -> WebSocket
+        self.client_by_connection: Dict[str, str] = {}        # connection_id -> client_id
+        self.connection_by_client: Dict[str, str] = {}        # client_id -> connection_id
+        self.meter_by_connection: Dict[str, str] = {}         # connection_id -> meter_id
+        self.connections_by_meter: Dict[str, Dict[str, None]] = {}  # meter_id -> ordered connection_ids
+        self.type_by_connection: Dict[str, str] = {}          # connection_id -> client_type
+        self.connections_by_type: Dict[str, Set[str]] = {}   # client_type -> connection_ids
+        self.token_by_connection: Dict[str, str] = {}         # connection_id -> token
+        self.connection_by_token: Dict[str, str] = {}         # token -> connection_id
+        self.topics_by_connection: Dict[str, Set[str]] = {}  # connection_id -> topics
+        self.connections_by_topic: Dict[str, Set[str]] = {}  # topic -> connection_ids
+
+    def __len__(self) -> int:
+        return len(self.sockets)
+
+    def __contains__(self, connection_id: str) -> bool:
+        return connection_id in self.sockets
+
+    def register(self, connection_id: str, websocket: WebSocket):
+        """Adds a connection."""
+        self.sockets[connection_id] = websocket
+
+    def unregister(self, connection_id: str) -> bool:
+        """
+        Removes a connection from every index.
+
+        Returns:
+            True if the connection was registered
+        """
+        websocket = self.sockets.pop(connection_id, None)
+
+        client_id = self.client_by_connection.pop(connection_id, None)
+        if client_id is not None and self.connection_by_client.get(client_id) == connection_id:
+            del self.connection_by_client[client_id]
+
+        meter_id = self.meter_by_connection.pop(connection_id, None)
+        if meter_id is not None:
+            self._discard_meter(meter_id, connection_id)
+
+        client_type = self.type_by_connection.pop(connection_id, None)
+        if client_type is not None:
+            self._discard_type(client_type, connection_id)
+
+        token = self.token_by_connection.pop(connection_id, None)
+        if token is not None and self.connection_by_token.get(token) == connection_id:
+            del self.connection_by_token[token]
+
+        for topic in self.topics_by_connection.pop(connection_id, ()):
+            self._discard_topic(topic, connection_id)
+
+        return websocket is not None
+
+    def bind_client(self, connection_id: str, client_id: str):
+        """Associates a client ID with a connection (a client has one connection)."""
+        self._rebind(self.client_by_connection, self.connection_by_client, connection_id, client_id)
+
+    def bind_meter(self, connection_id: str, meter_id: str):
+        """Associates a meter ID with a connection (a meter may have several connections)."""
+        previous = self.meter_by_connection.get(connection_id)
+        if previous is not None and previous != meter_id:
+            self._discard_meter(previous, connection_id)
+        self.meter_by_connection[connection_id] = meter_id
+        connections = self.connections_by_meter.setdefault(meter_id, {})
+        # Re-insert so the most recently bound connection comes last
+        connections.pop(connection_id, None)
+        connections[connection_id] = None
+
+    def bind_token(self, connection_id: str, token: str):
+        """Associates an authentication token with a connection."""
+        self._rebind(self.token_by_connection, self.connection_by_token, connection_id, token)
+
+    def bind_type(self, connection_id: str, client_type: str):
+        """Sets the client type of a connection."""
+        previous = self.type_by_connection.get(connection_id)
+        if previous is not None:
+            self._discard_type(previous, connection_id)
+        self.type_by_connection[connection_id] = client_type
+        self.connections_by_type.setdefault(client_type, set()).add(connection_id)
+
+    def get_connections_by_type(self, client_type: str) -> Set[str]:
+        """Gets the connection IDs of a client type."""
+        return self.connections_by_type.get(client_type, set())
+
+    def get_connections_by_meter(self, meter_id: str) -> List[str]:
+        """Gets the connection IDs of a meter, most recently bound last."""
+        return list(self.connections_by_meter.get(meter_id, ()))
+
+    def subscribe(self, connection_id: str, topic: str):
+        """Subscribes a registered connection to a topic."""
+        if connection_id not in self.sockets:
+            return
+        self.topics_by_connection.setdefault(connection_id, set()).add(topic)
+        self.connections_by_topic.setdefault(topic, set()).add(connection_id)
+
+    def unsubscribe(self, connection_id: str, topic: str):
+        """Unsubscribes a connection from a topic."""
+        topics = self.topics_by_connection.get(connection_id)
+        if topics is None or topic not in topics:
+            return
+        topics.discard(topic)
+        if not topics:
+            del self.topics_by_connection[connection_id]
+        self._discard_topic(topic, connection_id)
+
+    def get_connections_by_topic(self, topic: str) -> Set[str]:
+        """Gets the connection IDs subscribed to a topic."""
+        return self.connections_by_topic.get(topic, set())
+
+    def _discard_meter(self, meter_id: str, connection_id: str):
+        connections = self.connections_by_meter.get(meter_id)
+        if connections is not None:
+            connections.pop(connection_id, None)
+            if not connections:
+                del self.connections_by_meter[meter_id]
+
+    def _discard_topic(self, topic: str, connection_id: str):
+        connections = self.connections_by_topic.get(topic)
+        if connections is not None:
+            connections.discard(connection_id)
+            if not connections:
+                del self.connections_by_topic[topic]
+
+    def _discard_type(self, client_type: str, connection_id: str):
+        connections = self.connections_by_type.get(client_type)
+        if connections is not None:
+            connections.discard(connection_id)
+            if not connections:
+                del self.connections_by_type[client_type]
+
+    @staticmethod
+    def _rebind(forward: Dict[str, str], reverse: Dict[str, str], connection_id: str, key: str):
+        # Drop the connection's previous key and the key's previous connection,
+        # so both directions stay one-to-one
+        previous_key = forward.get(connection_id)
+        if previous_key is not None and previous_key != key and reverse.get(previous_key) == connection_id:
+            del reverse[previous_key]
+
+        previous_connection = reverse.get(key)
+        if previous_connection is not None and previous_connection != connection_id:
+            forward.pop(previous_connection, None)
+
+        forward[connection_id] = key
+        reverse[key] = connection_id
+
+    def index_sizes(self) -> Dict[str, int]:
+        """Gets the number of entries in each index (useful to spot leaks)."""
+        return {
+            "sockets": len(self.sockets),
+            "client_by_connection": len(self.client_by_connection),
+            "connection_by_client": len(self.connection_by_client),
+            "meter_by_connection": len(self.meter_by_connection),
+            "connections_by_meter": sum(len(c) for c in self.connections_by_meter.values()),
+            "type_by_connection": len(self.type_by_connection),
+            "connections_by_type": sum(len(c) for c in self.connections_by_type.values()),
+            "token_by_connection": len(self.token_by_connection),
+            "connection_by_token": len(self.connection_by_token),
+            "topics_by_connection": sum(len(t) for t in self.topics_by_connection.values()),
+            "connections_by_topic": sum(len(c) for c in self.connections_by_topic.values()),
+        }
+
+
+class Frame:
+    """
+    An immutable, pre-encoded JSON text frame.
+
+    Encoding once and queueing the same frame for every recipient avoids
+    re-serializing a broadcast payload per socket. The UTF-8 size and the
+    MessagePack encoding are computed on first use and cached.
+    """
+
+    __slots__ = ("text", "_size", "_packed")
+
+    def __init__(self, text: str, size: Optional[int] = None):
+        object.__setattr__(self, "text", text)
+        object.__setattr__(self, "_size", size)
+        object.__setattr__(self, "_packed", None)
+
+    def __setattr__(self, name: str, value: Any):
+        raise AttributeError("Frame is immutable")
+
+    @classmethod
+    def encode(cls, message: Dict[str, Any]) -> "Frame":
+        """
+        Encodes a message as compact JSON, using orjson when installed.
+
+        Raises:
+            TypeError: If the message contains a value neither encoder supports
+        """
+        if orjson is not None:
+            try:
+                encoded = orjson.dumps(message, option=_ORJSON_OPTIONS)
+                return cls(encoded.decode("utf-8"), len(encoded))
+            except TypeError:
+                pass  # e.g. integers above 64 bits; the json module handles more
+        return cls(json.dumps(message, ensure_ascii=False, separators=(",", ":"), default=_json_default))
+
+    @property
+    def size(self) -> int:
+        """Size of the JSON text in bytes."""
+        if self._size is None:
+            object.__setattr__(self, "_size", len(self.text.encode("utf-8")))
+        return self._size
+
+    def packed(self) -> bytes:
+        """The frame encoded as MessagePack (requires the msgpack package)."""
+        if self._packed is None:
+            message = orjson.loads(self.text) if orjson is not None else json.loads(self.text)
+            object.__setattr__(self, "_packed", msgpack.packb(message))
+        return self._packed
+
+
+class StreamOptions:
+    """
+    Per-connection stream settings, negotiated from the connect URL.
+
+    Clients opt in with query parameters, e.g. ``/grid-utility/ws?batch_ms=50&encoding=msgpack``:
+    batch_ms coalesces frames sent within that window into one "batch"
+    frame, and encoding=msgpack sends binary MessagePack frames instead of
+    JSON text. permessage-deflate is negotiated by the server itself and
+    only recorded here.
+    """
+
+    __slots__ = ("batch_window", "encoding", "deflate")
+
+    def __init__(self, batch_window: float = 0.0, encoding: str = "json", deflate: bool = False):
+        self.batch_window = batch_window
+        self.encoding = encoding
+        self.deflate = deflate
+
+    @classmethod
+    def from_websocket(cls, websocket: WebSocket, config: WebSocketConfig) -> "StreamOptions":
+        params = websocket.query_params
+
+        try:
+            batch_ms = float(params.get("batch_ms", 0))
+        except ValueError:
+            batch_ms = 0.0
+        batch_ms = min(max(batch_ms, 0.0), config.batch_max_window_ms)
+
+        encoding = params.get("encoding", "json")
+        if encoding not in STREAM_ENCODINGS:
+            logger.warning(f"Unknown stream encoding '{encoding}', using json")
+            encoding = "json"
+        elif encoding == "msgpack" and msgpack is None:
+            logger.warning("msgpack encoding requested but msgpack is not installed, using json")
+            encoding = "json"
+
+        deflate = "permessage-deflate" in websocket.headers.get("sec-websocket-extensions", "")
+        return cls(batch_window=batch_ms / 1000, encoding=encoding, deflate=deflate)
+
+    def as_dict(self) -> Dict[str, Any]:
+        return {
+            "batch_ms": round(self.batch_window * 1000, 3),
+            "encoding": self.encoding,
+            "permessage_deflate": self.deflate,
+        }
+
+
+def topic(kind: str, key: Any) -> str:
+    """Builds a subscription topic name, e.g. topic("transformer", 5) -> "transformer:5"."""
+    return f"{kind}:{key}"
+
+
+def _with_default_status(message: Dict[str, Any]) -> Dict[str, Any]:
+    # Grid alerts always carry a status; add it on a copy, never on the caller's dict
+    if "status" not in message and message.get("type") == "grid_alert":
+        return {**message, "status": "success"}
+    return message
+
+
+# Plain JSON, unbatched; shared by every connection that did not opt in
+DEFAULT_STREAM_OPTIONS = StreamOptions()
+
+
+class ConnectionWriter:
+    """
+    Bounded outbound queue for one connection, drained by its own task.
+
+    Enqueueing never awaits I/O, so a slow socket only delays its own frames.
+    When the queue is full the slow-consumer policy applies: "drop_oldest"
+    sheds the oldest queued frame, "disconnect" evicts the connection.
+    """
+
+    def __init__(
+        self,
+        connection_id: str,
+        websocket: WebSocket,
+        config: WebSocketConfig,
+        on_evict: Callable[[str, str], None],
+        options: Optional[StreamOptions] = None,
+    ):
+        self.connection_id = connection_id
+        self.websocket = websocket
+        self.policy = config.slow_consumer_policy
+        self.send_timeout = config.send_timeout_seconds
+        self.max_batch_frames = config.batch_max_frames
+        self.options = options or DEFAULT_STREAM_OPTIONS
+        self.on_evict = on_evict
+        self.queue: asyncio.Queue = asyncio.Queue(maxsize=config.send_queue_size)
+
+        # Metrics
+        self.sent = 0
+        self.dropped = 0
+        self.messages = 0  # WebSocket messages written (a batch counts once)
+        self.raw_bytes = 0  # Bytes the frames would take as separate JSON messages
+        self.sent_bytes = 0  # Bytes actually written, before permessage-deflate
+        self.last_latency = 0.0
+        self.max_latency = 0.0
+        self.total_latency = 0.0
+
+        self.task = asyncio.create_task(self._drain())
+
+    def enqueue(self, frame: Frame) -> bool:
+        """
+        Queues a frame for sending.
+
+        Returns:
+            False if the connection was evicted instead
+        """
+        item = (time.perf_counter(), frame)
+        try:
+            self.queue.put_nowait(item)
+            return True
+        except asyncio.QueueFull:
+            pass
+
+        if self.policy == "disconnect":
+            self.on_evict(self.connection_id, "send queue full")
+            return False
+
+        # drop_oldest: the newest frame is the most relevant one
+        self.queue.get_nowait()
+        self.dropped += 1
+        self.queue.put_nowait(item)
+        return True
+
+    async def _drain(self):
+        batching = self.options.batch_window > 0
+        while True:
+            enqueued_at, frame = await self.queue.get()
+            if batching:
+                # Coalesce whatever arrives within the window into one message
+                items = [(enqueued_at, frame)]
+                await asyncio.sleep(self.options.batch_window)
+                while len(items) < self.max_batch_frames and not self.queue.empty():
+                    items.append(self.queue.get_nowait())
+            else:
+                items = None
+
+            try:
+                # Encoding a frame for this stream can fail as well as the send
+                send = self._write(frame) if items is None else self._write_batch([frame for _, frame in items])
+                await asyncio.wait_for(send, timeout=self.send_timeout)
+            except asyncio.TimeoutError:
+                self.on_evict(self.connection_id, f"send blocked for more than {self.send_timeout}s")
+                return
+            except Exception as e:
+                self.on_evict(self.connection_id, f"send failed: {str(e)}")
+                return
+
+            now = time.perf_counter()
+            self.messages += 1
+            if items is None:
+                self._record_latency(now - enqueued_at)
+            else:
+                for enqueued_at, _ in items:
+                    self._record_latency(now - enqueued_at)
+
+    def _record_latency(self, latency: float):
+        self.sent += 1
+        self.last_latency = latency
+        self.total_latency += latency
+        if latency > self.max_latency:
+            self.max_latency = latency
+
+    def _write(self, frame: Frame) -> Awaitable[None]:
+        """Returns the send call for a single frame."""
+        size = frame.size
+        if self.options.encoding == "msgpack":
+            data = frame.packed()
+            self.raw_bytes += size
+            self.sent_bytes += len(data)
+            return self.websocket.send_bytes(data)
+        self.raw_bytes += size
+        self.sent_bytes += size
+        return self.websocket.send_text(frame.text)
+
+    def _write_batch(self, frames: List[Frame]) -> Awaitable[None]:
+        """Encodes the frames as one "batch" message and returns the send call."""
+        if len(frames) == 1:
+            return self._write(frames[0])
+
+        self.raw_bytes += sum(frame.size for frame in frames)
+
+        if self.options.encoding == "msgpack":
+            # Splice the cached per-frame encodings into {"type": "batch", "frames": [...]}
+            data = _MSGPACK_BATCH_PREFIX + _msgpack_array_header(len(frames)) + b"".join(
+                frame.packed() for frame in frames
+            )
+            self.sent_bytes += len(data)
+            return self.websocket.send_bytes(data)
+
+        text = f'{_JSON_BATCH_PREFIX}{",".join(frame.text for frame in frames)}]}}'
+        self.sent_bytes += sum(frame.size for frame in frames) + len(frames) + len(_JSON_BATCH_PREFIX) + 1
+        return self.websocket.send_text(text)
+
+    def close(self):
+        """Stops the writer task; queued frames are discarded."""
+        if not self.task.done() and self.task is not asyncio.current_task():
+            self.task.cancel()
+
+    def metrics(self) -> Dict[str, Any]:
+        return {
+            "queue_depth": self.queue.qsize(),
+            "sent": self.sent,
+            "dropped": self.dropped,
+            "messages": self.messages,
+            "raw_bytes": self.raw_bytes,
+            "sent_bytes": self.sent_bytes,
+            "stream": self.options.as_dict(),
+            "send_latency_last_ms": round(self.last_latency * 1000, 3),
+            "send_latency_avg_ms": round(self.total_latency / self.sent * 1000, 3) if self.sent else 0.0,
+            "send_latency_max_ms": round(self.max_latency * 1000, 3),
+        }
+
+
+class ReplaySession:
+    """
+    Sequencing and replay state for one client, kept across reconnects.
+
+    Every frame sent to the client is stamped with the next sequence number
+    and kept in a bounded buffer, so a client that reconnects within the
+    resume window can ask for everything after the last seq it saw.
+    """
+
+    def __init__(self, client_id: str, buffer_size: int):
+        self.client_id = client_id
+        self.seq = 0
+        self.buffer: deque = deque(maxlen=buffer_size)  # (seq, Frame)
+        self.meter_id: Optional[str] = None
+        self.detached_at: Optional[float] = None  # monotonic time the client disconnected
+
+    def stamp(self, frame: Frame) -> Frame:
+        """Returns a copy of the frame carrying the next sequence number."""
+        self.seq += 1
+        # Splice the seq into the pre-encoded object instead of re-encoding it
+        body = frame.text[1:].lstrip()
+        head = f'{{"seq":{self.seq}' + ("" if body.startswith("}") else ",")
+        stamped = Frame(head + body, frame.size - (len(frame.text) - len(body)) + len(head))
+        self.buffer.append((self.seq, stamped))
+        return stamped
+
+    def since(self, last_seq: int) -> Tuple[List[Frame], bool]:
+        """
+        Gets the buffered frames after last_seq.
+
+        Returns:
+            Tuple of (frames, complete) where complete is False if some
+            frames were already dropped from the buffer
+        """
+        frames = [frame for seq, frame in self.buffer if seq > last_seq]
+        oldest = self.buffer[0][0] if self.buffer else self.seq + 1
+        complete = last_seq >= self.seq or oldest <= last_seq + 1
+        return frames, complete
+
+
+class LatencyHistogram:
+    """
+    Cumulative latency histogram with fixed millisecond buckets.
+    """
+
+    BUCKETS_MS = (5, 10, 25, 50, 100, 250, 500, 1000, 2500, 5000)
+
+    def __init__(self):
+        self.counts = [0] * (len(self.BUCKETS_MS) + 1)
+        self.count = 0
+        self.total = 0.0
+
+    def observe(self, seconds: float):
+        milliseconds = seconds * 1000
+        for index, bound in enumerate(self.BUCKETS_MS):
+            if milliseconds <= bound:
+                break
+        else:
+            index = len(self.BUCKETS_MS)
+        self.counts[index] += 1
+        self.count += 1
+        self.total += milliseconds
+
+    def snapshot(self) -> Dict[str, Any]:
+        buckets = {}
+        cumulative = 0
+        for bound, count in zip(self.BUCKETS_MS, self.counts):
+            cumulative += count
+            buckets[f"le_{bound}ms"] = cumulative
+        buckets["le_inf"] = self.count
+        return {
+            "count": self.count,
+            "avg_ms": self.total / self.count if self.count else 0.0,
+            "buckets": buckets,
+        }
+
+
+class HeartbeatMonitor:
+    """
+    Pings every connection on an interval and evicts the ones that went silent.
+
+    Any inbound message counts as activity, and a {"type": "pong"} reply
+    also records the round-trip time of the latest ping. Connections with no
+    inbound traffic for heartbeat_timeout_seconds are evicted once they have
+    answered a ping, so clients that cannot pong are kept. Setting
+    heartbeat_require_pong to true evicts those as well.
+    """
+
+    def __init__(self, manager: "WebSocketManager", config: WebSocketConfig):
+        self.manager = manager
+        self.interval = config.heartbeat_interval_seconds
+        self.timeout = config.heartbeat_timeout_seconds
+        self.batch_size = max(1, config.heartbeat_concurrency)
+        self.require_pong = config.heartbeat_require_pong
+
+        self.last_seen: Dict[str, float] = {}        # connection_id -> monotonic time of last activity
+        self.pending: Dict[str, Tuple[int, float]] = {}  # connection_id -> (latest ping_id, sent at)
+        self.answers_pings: Set[str] = set()         # connections that have sent a pong
+        self.ping_id = 0
+        self.rtt = LatencyHistogram()
+        self.evictions = 0
+        self._task: Optional[asyncio.Task] = None
+
+    def track(self, connection_id: str):
+        self.last_seen[connection_id] = time.monotonic()
+
+    def forget(self, connection_id: str):
+        self.last_seen.pop(connection_id, None)
+        self.pending.pop(connection_id, None)
+        self.answers_pings.discard(connection_id)
+
+    def touch(self, connection_id: str):
+        """Records inbound activity on a connection."""
+        if connection_id in self.last_seen:
+            self.last_seen[connection_id] = time.monotonic()
+
+    def record_pong(self, connection_id: str, ping_id: Optional[int] = None):
+        """Records a pong reply, and its round-trip time if it answers the latest ping."""
+        if connection_id not in self.last_seen:
+            return
+        now = time.monotonic()
+        self.last_seen[connection_id] = now
+        self.answers_pings.add(connection_id)
+
+        pending = self.pending.get(connection_id)
+        if pending is not None and (ping_id is None or ping_id == pending[0]):
+            del self.pending[connection_id]
+            self.rtt.observe(now - pending[1])
+
+    async def sweep(self):
+        """Evicts silent connections and pings the rest."""
+        self.ping_id += 1
+        now = time.monotonic()
+        # One frame for every connection in this sweep
+        frame = Frame.encode({
+            "type": "ping",
+            "status": "success",
+            "ping_id": self.ping_id,
+            "timestamp": time.time()
+        })
+
+        connection_ids = list(self.last_seen)
+        for start in range(0, len(connection_ids), self.batch_size):
+            for connection_id in connection_ids[start:start + self.batch_size]:
+                last_seen = self.last_seen.get(connection_id)
+                if last_seen is None:
+                    continue  # Disconnected during the sweep
+
+                if now - last_seen > self.timeout and (self.require_pong or connection_id in self.answers_pings):
+                    self.evictions += 1
+                    self.manager._evict(connection_id, f"no heartbeat for {now - last_seen:.0f}s")
+                    continue
+
+                writer = self.manager.writers.get(connection_id)
+                if writer is not None and writer.enqueue(frame):
+                    # Only the latest ping is awaited; a missed pong must not stop RTTs being recorded
+                    self.pending[connection_id] = (self.ping_id, now)
+            # Bound the work done per event-loop turn
+            await asyncio.sleep(0)
+
+    def start(self):
+        if self._task is None:
+            self._task = asyncio.create_task(self._run())
+
+    def stop(self):
+        if self._task is not None:
+            self._task.cancel()
+            self._task = None
+
+    async def _run(self):
+        while True:
+            try:
+                await asyncio.sleep(self.interval)
+                await self.sweep()
+                self.manager.expire_sessions()
+            except asyncio.CancelledError:
+                raise
+            except Exception as e:
+                logger.error(f"Error in heartbeat task: {str(e)}")
+
+    def metrics(self) -> Dict[str, Any]:
+        return {
+            "interval_seconds": self.interval,
+            "timeout_seconds": self.timeout,
+            "evictions": self.evictions,
+            "awaiting_pong": len(self.pending),
+            "answering_pings": len(self.answers_pings),
+            "rtt": self.rtt.snapshot(),
+        }
+
+
 class WebSocketManager:
     """
     Manages WebSocket connections.
     """
-    
-    def __init__(self):
-        self.active_connections = {}  # connection_id -> WebSocket
-        self.client_connections = {}  # client_id -> connection_id
-        self.connection_tokens = {}   # connection_id -> token
-        self.meter_connections = {}   # meter_id -> connection_id
-        self.client_types = {}        # connection_id -> client_type
-    
-    async def connect(self, websocket: WebSocket) -> str:
+
+    def __init__(self, config: Optional[WebSocketConfig] = None):
+        self.config = config or settings.websocket
+        if self.config.slow_consumer_policy not in SLOW_CONSUMER_POLICIES:
+            raise ValueError(
+                f"Unknown slow consumer policy '{self.config.slow_consumer_policy}', "
+                f"expected one of {SLOW_CONSUMER_POLICIES}"
+            )
+        self.registry = ConnectionRegistry()
+        self.writers: Dict[str, ConnectionWriter] = {}  # connection_id -> ConnectionWriter
+        self.evicted_connections = 0
+        self.closed_stream_stats: Dict[str, Dict[str, Any]] = {}  # client_type -> totals of closed connections
+        self.heartbeat = HeartbeatMonitor(self, self.config)
+        self.sessions: Dict[str, ReplaySession] = {}  # client_id -> ReplaySession
+        self.detached_by_meter: Dict[str, Set[str]] = {}  # meter_id -> client_ids waiting to resume
+
+    async def connect(self, websocket: WebSocket, options: Optional[StreamOptions] = None) -> str:
         """
         Connect a new WebSocket and return a unique connection ID.
+
+        Args:
+            websocket: The WebSocket to accept
+            options: Stream settings negotiated with the client, see StreamOptions
         """
         await websocket.accept()
         connection_id = str(uuid.uuid4())
-        self.active_connections[connection_id] = websocket
+        self.registry.register(connection_id, websocket)
+        self.writers[connection_id] = ConnectionWriter(connection_id, websocket, self.config, self._evict, options)
+        self.heartbeat.track(connection_id)
         logger.info(f"New WebSocket connection: {connection_id}")
         return connection_id
-    
+
     def set_client(self, connection_id: str, client_id: str):
         """
         Associate a client ID with a connection ID.
         """
-        self.client_connections[client_id] = connection_id
+        previous = self.registry.client_by_connection.get(connection_id)
+        if previous == client_id:
+            return
+        self.registry.bind_client(connection_id, client_id)
+        if previous is not None and previous not in self.registry.connection_by_client:
+            self._detach(previous, self.registry.meter_by_connection.get(connection_id))
+
+        session = self.sessions.get(client_id)
+        if session is None:
+            self.sessions[client_id] = ReplaySession(client_id, self.config.resume_buffer_size)
+        elif session.detached_at is not None:
+            self._clear_detached(session)
         logger.info(f"Client ID {client_id} set for connection {connection_id}")
-    
+
     def get_client(self, connection_id: str) -> Optional[str]:
         """
         Get the client ID associated with a connection ID.
         """
-        for client_id, conn_id in self.client_connections.items():
-            if conn_id == connection_id:
-                return client_id
-        return None
-    
+        return self.registry.client_by_connection.get(connection_id)
+
     def get_connection(self, client_id: str) -> Optional[str]:
         """
         Get the connection ID for a client ID.
         """
-        return self.client_connections.get(client_id)
-    
+        return self.registry.connection_by_client.get(client_id)
+
     async def disconnect(self, connection_id: str):
         """
         Disconnect a client and clean up resources.
         """
-        # Find and remove any meter ID mappings for this connection
-        meter_ids_to_remove = []
-        for meter_id, conn_id in self.meter_connections.items():
-            if conn_id == connection_id:
-                meter_ids_to_remove.append(meter_id)
-        
-        for meter_id in meter_ids_to_remove:
-            del self.meter_connections[meter_id]
-        
-        # Existing disconnect logic
-        if connection_id in self.active_connections:
-            del self.active_connections[connection_id]
-        if connection_id in self.client_connections:
-            del self.client_connections[connection_id]
-        if connection_id in self.connection_tokens:
-            del self.connection_tokens[connection_id]
+        if connection_id is None:
+            return
+        self._unregister(connection_id)
         logger.info(f"Client disconnected: {connection_id}")
-    
-    async def send_message(self, connection_id: str, message: Dict[str, Any]) -> bool:
+
+    def _unregister(self, connection_id: str):
+        client_id = self.registry.client_by_connection.get(connection_id)
+        meter_id = self.registry.meter_by_connection.get(connection_id)
+        client_type = self.registry.type_by_connection.get(connection_id)
+        self.registry.unregister(connection_id)
+        if client_id is not None and client_id not in self.registry.connection_by_client:
+            self._detach(client_id, meter_id)
+        self.heartbeat.forget(connection_id)
+        writer = self.writers.pop(connection_id, None)
+        if writer is not None:
+            writer.close()
+            # Keep the traffic of closed connections in the per-type totals
+            self._add_stream_stats(self.closed_stream_stats, client_type, writer)
+
+    @staticmethod
+    def _add_stream_stats(totals: Dict[str, Dict[str, Any]], client_type: Optional[str], writer: ConnectionWriter):
+        stats = totals.setdefault(client_type or "unknown", {
+            "connections": 0, "batched": 0, "msgpack": 0, "permessage_deflate": 0,
+            "frames": 0, "messages": 0, "raw_bytes": 0, "sent_bytes": 0,
+        })
+        stats["connections"] += 1
+        stats["batched"] += writer.options.batch_window > 0
+        stats["msgpack"] += writer.options.encoding == "msgpack"
+        stats["permessage_deflate"] += writer.options.deflate
+        stats["frames"] += writer.sent
+        stats["messages"] += writer.messages
+        stats["raw_bytes"] += writer.raw_bytes
+        stats["sent_bytes"] += writer.sent_bytes
+
+    def get_stream_stats(self) -> Dict[str, Dict[str, Any]]:
+        """
+        Get frames, messages and bytes saved by batching and compact encoding,
+        per client type (bytes are measured before permessage-deflate).
+        """
+        totals = {client_type: dict(stats) for client_type, stats in self.closed_stream_stats.items()}
+        for connection_id, writer in self.writers.items():
+            self._add_stream_stats(totals, self.get_client_type(connection_id), writer)
+        for stats in totals.values():
+            stats["saved_bytes"] = stats["raw_bytes"] - stats["sent_bytes"]
+        return totals
+
+    def get_stream_options(self, connection_id: str) -> Optional[Dict[str, Any]]:
+        """
+        Get the stream settings negotiated for a connection.
+        """
+        writer = self.writers.get(connection_id)
+        return writer.options.as_dict() if writer is not None else None
+
+    def _evict(self, connection_id: str, reason: str):
+        """Drops a connection that cannot keep up or whose socket failed."""
+        websocket = self.registry.sockets.get(connection_id)
+        if websocket is None:
+            return
+        logger.info(f"Evicting connection {connection_id}: {reason}")
+        self.evicted_connections += 1
+        self._unregister(connection_id)
+        asyncio.create_task(self._close_quietly(websocket))
+
+    async def _close_quietly(self, websocket: WebSocket, code: int = 1013):
+        try:
+            # 1013: try again later
+            await asyncio.wait_for(websocket.close(code=code), timeout=self.config.send_timeout_seconds)
+        except Exception:
+            pass
+
+    async def close_all(self, code: int = 1012, flush_timeout: float = 2.0) -> int:
+        """
+        Closes every connection after giving writers a chance to flush their queues.
+
+        Args:
+            code: WebSocket close code (1012: service restart)
+            flush_timeout: How long to wait for queued frames to be sent
+
+        Returns:
+            Number of connections closed
+        """
+        deadline = time.monotonic() + flush_timeout
+        while time.monotonic() < deadline and any(not writer.queue.empty() for writer in self.writers.values()):
+            await asyncio.sleep(0.05)
+
+        sockets = list(self.registry.sockets.items())
+        for connection_id, _ in sockets:
+            self._unregister(connection_id)
+        await asyncio.gather(*(self._close_quietly(websocket, code) for _, websocket in sockets))
+        logger.info(f"Closed {len(sockets)} WebSocket connections with code {code}")
+        return len(sockets)
+
+    @staticmethod
+    def encode(message: Union[Dict[str, Any], Frame]) -> Frame:
+        """
+        Encodes a message into a frame that can be sent to any number of connections.
+        """
+        if isinstance(message, Frame):
+            return message
+        return Frame.encode(_with_default_status(message))
+
+    def _encode_or_log(self, message: Union[Dict[str, Any], Frame]) -> Optional[Frame]:
+        """Encodes a message for sending, or logs why it cannot be sent."""
+        try:
+            return self.encode(message)
+        except (TypeError, ValueError) as e:
+            logger.error(f"Error encoding message of type {message.get('type')}: {str(e)}")
+            return None
+
+    async def send_message(self, connection_id: str, message: Union[Dict[str, Any], Frame]) -> bool:
         """
         Send a message to a specific connection.
-        
+
+        The message is queued on the connection's writer and sent in order by
+        its own task, so this never waits on a slow socket. The caller's dict
+        is never modified.
+
         Args:
             connection_id: The connection ID
-            message: The message to send
-            
+            message: The message to send, or a pre-encoded Frame
+
         Returns:
-            True if the message was sent successfully, False otherwise
+            True if the message was queued for sending, False otherwise
         """
-        if connection_id not in self.active_connections:
+        writer = self.writers.get(connection_id)
+        if writer is None:
             logger.warning(f"Connection {connection_id} not found")
             return False
-        
-        websocket = self.active_connections[connection_id]
-        
-        try:
-            # Make sure the message has a status field if it doesn't already
-            if "status" not in message and message.get("type") == "grid_alert":
-                message["status"] = "success"
-                
-            await websocket.send_json(message)
-            logger.debug(f"Message sent to connection {connection_id}")
-            return True
-        except RuntimeError as e:
-            if "Cannot call 'send' once a close message has been sent" in str(e):
-                logger.info(f"Connection {connection_id} is closed, removing from active connections")
-                # Remove the closed connection from the active connections
-                if connection_id in self.active_connections:
-                    del self.active_connections[connection_id]
-                # Also remove any client association
-                for client_id, conn_id in list(self.client_connections.items()):
-                    if conn_id == connection_id:
-                        del self.client_connections[client_id]
-            else:
-                logger.error(f"Error sending message to connection {connection_id}: {str(e)}")
+
+        frame = self._encode_or_log(message)
+        return frame is not None and self._enqueue(connection_id, frame)
+
+    def send_to_connections(
+        self, connection_ids: Iterable[str], message: Union[Dict[str, Any], Frame]
+    ) -> Set[str]:
+        """
+        Send one message to many connections, encoding it only once.
+
+        Returns:
+            The connection IDs the message was queued for
+        """
+        frame = self._encode_or_log(message)
+        if frame is None:
+            return set()
+        queued = set()
+        for connection_id in connection_ids:
+            if self._enqueue(connection_id, frame):
+                queued.add(connection_id)
+        return queued
+
+    def _enqueue(self, connection_id: str, frame: Frame) -> bool:
+        writer = self.writers.get(connection_id)
+        if writer is None:
             return False
-        except Exception as e:
-            logger.error(f"Error sending message to connection {connection_id}: {str(e)}")
+        client_id = self.registry.client_by_connection.get(connection_id)
+        session = self.sessions.get(client_id) if client_id is not None else None
+        if session is not None:
+            frame = session.stamp(frame)
+        return writer.enqueue(frame)
+
+    def _detach(self, client_id: str, meter_id: Optional[str]):
+        # Keep the client's sequence and replay buffer for the resume window
+        session = self.sessions.get(client_id)
+        if session is None:
+            return
+        session.detached_at = time.monotonic()
+        session.meter_id = meter_id or session.meter_id
+        if session.meter_id is not None:
+            self.detached_by_meter.setdefault(session.meter_id, set()).add(client_id)
+
+    def _clear_detached(self, session: ReplaySession):
+        session.detached_at = None
+        if session.meter_id is not None:
+            clients = self.detached_by_meter.get(session.meter_id)
+            if clients is not None:
+                clients.discard(session.client_id)
+                if not clients:
+                    del self.detached_by_meter[session.meter_id]
+
+    def can_resume(self, client_id: str, meter_id: str) -> bool:
+        """
+        Checks that a client may be resumed by a connection authenticated for a meter.
+
+        Only a detached session of this worker that was bound to the same
+        meter can be resumed; any other client_id has to start afresh.
+        """
+        session = self.sessions.get(client_id)
+        if session is None or session.meter_id is None:
             return False
-    
+        if self.registry.connection_by_client.get(client_id) is not None:
+            return False  # Still attached to a live connection
+        return session.meter_id == meter_id
+
+    def resume(self, connection_id: str, client_id: str, last_seq: int) -> int:
+        """
+        Attaches a reconnecting client to a connection and sends the frames it
+        missed since last_seq as a single "replay" frame.
+
+        Returns:
+            Number of frames replayed
+        """
+        self.set_client(connection_id, client_id)
+        session = self.sessions[client_id]
+        frames, complete = session.since(last_seq)
+        seq = session.seq
+
+        writer = self.writers.get(connection_id)
+        if writer is not None:
+            # Embed the already encoded frames instead of decoding them
+            writer.enqueue(Frame(
+                f'{{"type":"replay","status":"success","client_id":{json.dumps(client_id)},'
+                f'"last_seq":{seq},"complete":{"true" if complete else "false"},'
+                f'"frames":[{",".join(frame.text for frame in frames)}]}}'
+            ))
+        logger.info(f"Resumed client {client_id} on connection {connection_id}, replayed {len(frames)} frames")
+        return len(frames)
+
+    def expire_sessions(self):
+        """Drops replay state of clients that did not come back within the resume window."""
+        cutoff = time.monotonic() - self.config.resume_window_seconds
+        expired = [
+            client_id
+            for client_id, session in self.sessions.items()
+            if session.detached_at is not None and session.detached_at < cutoff
+        ]
+        for client_id in expired:
+            self._clear_detached(self.sessions.pop(client_id))
+
     async def broadcast(self, message: Any):
         """
         Broadcast a message to all connected clients.
         """
-        for connection_id in list(self.active_connections.keys()):
-            await self.send_message(connection_id, message)
-    
+        self.send_to_connections(self.get_all_connections(), message)
+
+    def get_metrics(self) -> Dict[str, Any]:
+        """
+        Get per-connection queue depth and send latency.
+        """
+        connections = {}
+        for connection_id, writer in self.writers.items():
+            connections[connection_id] = {
+                "client_type": self.get_client_type(connection_id),
+                **writer.metrics(),
+            }
+        return {
+            "active_connections": len(self.registry),
+            "evicted_connections": self.evicted_connections,
+            "slow_consumer_policy": self.config.slow_consumer_policy,
+            "heartbeat": self.heartbeat.metrics(),
+            "streams": self.get_stream_stats(),
+            "connections": connections,
+        }
+
     async def send_to_client(self, client_id: str, message: Any) -> bool:
         """
         Send a message to a specific client.
-        
+
         Returns:
             True if the message was sent, False otherwise
         """
-        connection_id = self.client_connections.get(client_id)
+        connection_id = self.registry.connection_by_client.get(client_id)
         if not connection_id:
             logger.warning(f"No connection found for client {client_id}")
             return False
-        
+
         return await self.send_message(connection_id, message)
-    
+
     def get_all_connections(self) -> List[str]:
         """
         Get all active connection IDs.
         """
-        return list(self.active_connections.keys())
-    
+        return list(self.registry.sockets.keys())
+
     async def start_cleanup_task(self):
-        """Start a background task to clean up stale connections."""
-        asyncio.create_task(self._cleanup_stale_connections())
-    
-    async def _cleanup_stale_connections(self):
-        """Periodically clean up stale connections."""
-        while True:
-            try:
-                # Sleep for 5 minutes
-                await asyncio.sleep(300)
-                
-                # Check each connection
-                for connection_id in list(self.active_connections.keys()):
-                    # Try to ping the connection
-                    try:
-                        websocket = self.active_connections[connection_id]
-                        # Send a ping message
-                        await websocket.send_json({
-                            "type": "ping",
-                            "status": "success",
-                            "timestamp": time.time()
-                        })
-                    except Exception:
-                        # If there's an error, remove the connection
-                        logger.info(f"Removing stale connection {connection_id}")
-                        if connection_id in self.active_connections:
-                            del self.active_connections[connection_id]
-                        # Also remove any client association
-                        for client_id, conn_id in list(self.client_connections.items()):
-                            if conn_id == connection_id:
-                                del self.client_connections[client_id]
-            except Exception as e:
-                logger.error(f"Error in cleanup task: {str(e)}")
+        """Start the heartbeat task that pings connections and evicts stale ones."""
+        self.heartbeat.start()
+
+    async def stop_cleanup_task(self):
+        """Stop the heartbeat task."""
+        self.heartbeat.stop()
+
+    def touch(self, connection_id: str):
+        """
+        Record that a message was received on a connection.
+        """
+        self.heartbeat.touch(connection_id)
+
+    def record_pong(self, connection_id: str, ping_id: Optional[int] = None):
+        """
+        Record a pong reply to a heartbeat ping.
+        """
+        self.heartbeat.record_pong(connection_id, ping_id)
 
     def set_token(self, connection_id: str, token: str):
         """
         Associates an authentication token with a connection.
         """
-        self.connection_tokens[connection_id] = token
+        self.registry.bind_token(connection_id, token)
         logger.info(f"Token set for connection {connection_id}")
 
     def get_token(self, connection_id: str) -> Optional[str]:
         """
         Gets the authentication token for a connection.
         """
-        return self.connection_tokens.get(connection_id)
+        return self.registry.token_by_connection.get(connection_id)
+
+    def get_connection_by_token(self, token: str) -> Optional[str]:
+        """
+        Gets the connection ID that authenticated with a token.
+        """
+        return self.registry.connection_by_token.get(token)
 
     def is_authenticated(self, connection_id: str) -> bool:
         """
         Checks if a connection is authenticated.
         """
-        return connection_id in self.connection_tokens
+        return connection_id in self.registry.token_by_connection
 
     def set_meter_id(self, connection_id: str, meter_id: str):
         """
         Associate a meter ID with a connection ID.
         """
-        self.meter_connections[meter_id] = connection_id
+        self.registry.bind_meter(connection_id, meter_id)
         logger.info(f"Associated meter ID {meter_id} with connection ID {connection_id}")
 
     def get_connection_by_meter_id(self, meter_id: str) -> Optional[str]:
         """
-        Get the connection ID associated with a meter ID.
+        Get the most recent connection ID associated with a meter ID.
+        """
+        connections = self.registry.connections_by_meter.get(meter_id)
+        if not connections:
+            return None
+        return next(reversed(connections))
+
+    def get_connections_by_meter_id(self, meter_id: str) -> List[str]:
+        """
+        Get every connection ID associated with a meter ID (one per device).
+        """
+        return self.registry.get_connections_by_meter(meter_id)
+
+    def subscribe(self, connection_id: str, topic: str):
+        """
+        Subscribe a connection to a topic, e.g. topic("transformer", 5).
+        Subscriptions are dropped when the connection disconnects.
+        """
+        self.registry.subscribe(connection_id, topic)
+
+    def unsubscribe(self, connection_id: str, topic: str):
+        """Unsubscribe a connection from a topic."""
+        self.registry.unsubscribe(connection_id, topic)
+
+    def get_connections_by_topic(self, topic: str) -> List[str]:
+        """Get all connection IDs subscribed to a topic."""
+        return list(self.registry.get_connections_by_topic(topic))
+
+    def send_to_meters(self, meter_ids: Iterable[Any], message: Union[Dict[str, Any], Frame]) -> Set[str]:
         """
-        return self.meter_connections.get(meter_id)
+        Send a message to every connection of the given meters.
+
+        Returns:
+            The connection IDs the message was queued for
+        """
+        frame = self._encode_or_log(message)
+        if frame is None:
+            return set()
+        connection_ids = set()
+        for meter_id in meter_ids:
+            meter_id = str(meter_id)
+            connection_ids.update(self.registry.connections_by_meter.get(meter_id, ()))
+            # Buffer for clients of this meter that are reconnecting
+            for client_id in self.detached_by_meter.get(meter_id, ()):
+                self.sessions[client_id].stamp(frame)
+        return self.send_to_connections(connection_ids, frame)
+
+    def send_to_topic(self, topic: str, message: Union[Dict[str, Any], Frame]) -> Set[str]:
+        """
+        Send a message to every connection subscribed to a topic.
+
+        Returns:
+            The connection IDs the message was queued for
+        """
+        return self.send_to_connections(list(self.registry.get_connections_by_topic(topic)), message)
+
+    def send_to_client_type(self, client_type: str, message: Union[Dict[str, Any], Frame]) -> Set[str]:
+        """
+        Send a message to every connection of a client type.
+
+        Returns:
+            The connection IDs the message was queued for
+        """
+        return self.send_to_connections(list(self.registry.get_connections_by_type(client_type)), message)
 
     def set_client_type(self, connection_id: str, client_type: str):
         """Set the client type for a connection."""
-        if connection_id in self.active_connections:
-            self.client_types[connection_id] = client_type
+        if connection_id in self.registry:
+            self.registry.bind_type(connection_id, client_type)
 
     def get_client_type(self, connection_id: str) -> Optional[str]:
         """Get the client type for a connection."""
-        return self.client_types.get(connection_id)
+        return self.registry.type_by_connection.get(connection_id)
+
+    def get_connections_by_client_type(self, client_type: str) -> List[str]:
+        """Get all connection IDs of a client type."""
+        return list(self.registry.get_connections_by_type(client_type))
 
     def get_meter_id_by_connection(self, connection_id: str) -> Optional[str]:
         """
         Get the meter ID associated with a connection ID.
-        
+
         Args:
             connection_id: The connection ID
-            
+
         Returns:
             The meter ID, or None if no meter ID is associated with this connection
         """
-        # Reverse lookup in meter_connections
-        for meter_id, conn_id in self.meter_connections.items():
-            if conn_id == connection_id:
-                return meter_id
-        return None
+        return self.registry.meter_by_connection.get(connection_id)
 
 # Create a singleton instance
-connection_manager = WebSocketManager() 
\ No newline at end of file
+connection_manager = WebSocketManager()
@@ -5,17 +5,37 @@ from langchain_core.messages import BaseMessage
 import random
 import re
 from app.core.orchestrator import ClientOrchestrator
-from app.tools.specific_tools.grid_tools.dfp_search import DFPSearchTool, cache
+from app.core.shared_state import shared_state
+from app.core.http_client import http_clients
+from app.tools.specific_tools.grid_tools.dfp_search import DFPSearchTool, dfp_options
 
 logger = logging.getLogger(__name__)
 
+# Transformer details used when an option is activated without a stored recommendation
+DEFAULT_TRANSFORMER = {
+    "name": "Transformer_0",
+    "id": "TX160",
+    "current_load": "0.5",
+    "load_percentage": "0.4",
+    "time_estimate": "30"
+}
+
+def format_dfp_recommendation(option_index: int, transformer_name: str, current_load: Any, load_percentage: Any) -> str:
+    """
+    Markdown recommendation of the built-in DDR (index 0) or EDR (index 1) option.
+    """
+    if option_index == 0:
+        return f"### 🔎 Recommendation\n\n**Option 1 – Dynamic Demand Response (DDR)** is recommended for immediate grid relief.\n\n> The current situation at {transformer_name} shows a load of **{current_load} kWh ({load_percentage}% of capacity)**, which requires a rapid but moderate response. DDR is ideal for this scenario as it can be quickly activated and provides immediate relief without excessive disruption.\n\n\n**Would you like to proceed?**"
+    return f"### 🔎 Recommendation\n\n**Option 2 – Emergency Demand Reduction (EDR)** is recommended for immediate grid relief.\n\n> The current situation at {transformer_name} shows a load of **{current_load} kWh ({load_percentage}% of capacity)**, which requires a significant and immediate response. EDR is designed for critical situations like this and can provide the necessary load reduction quickly.\n\n\n**Would you like to proceed?**"
+
 class GridUtilityQueryHandler(BaseQueryHandler):
     """Handler for grid and utility-related queries."""
     
     def __init__(self, *args, **kwargs):
         super().__init__(*args, **kwargs)
-        # Store the last recommended DFP option for each client
-        self.client_dfp_recommendations = {}
+        # Store the last recommended DFP option for each client (shared across
+        # workers and kept in restart snapshots)
+        self.client_dfp_recommendations = shared_state.namespace("client_dfp_recommendations")
     
     def _setup_tools(self):
         """Set up the tools for this handler."""
@@ -139,161 +159,65 @@ class GridUtilityQueryHandler(BaseQueryHandler):
         if query.lower().strip() in ["yes", "yes, proceed", "proceed", "activate", "yes, activate"]:
             logger.info("Detected DFP activation request")
             
-            # Get the options from the cache
-            dfp_options = cache.get("dfp_options", [])
+            # Read the options once; a background refresh may swap in a new version meanwhile
+            snapshot = dfp_options.current
             
-            # Log the current state of the options
-            logger.info(f"DFP options exists: {bool(dfp_options)}")
-            logger.info(f"DFP options type: {type(dfp_options)}")
-            logger.info(f"Number of options: {len(dfp_options)}")
-            for i, option in enumerate(dfp_options):
-                logger.info(f"Option {i+1}: {option.get('name', 'Unknown')} ({option.get('id', 'Unknown')})")
-                # Log all keys in the option
-                logger.info(f"Option {i+1} keys: {list(option.keys())}")
-                # Log all values in the option
-                for key, value in option.items():
-                    logger.info(f"Option {i+1} {key}: {value}")
-            
-            # Use the first option if available
-            if dfp_options:
-                logger.info("Using first option from DFP options")
-                option_data = dfp_options[0]
-                
-                # Create a recommendation with the option data
-                recommendation = {
-                    "option": option_data,
-                    "transformer": {
-                        "name": "Transformer_0",
-                        "id": "TX160",
-                        "current_load": "0.5",
-                        "load_percentage": "0.4",
-                        "time_estimate": "30"
-                    }
-                }
-                
-                logger.info(f"Using option: {option_data.get('name', 'Unknown')} ({option_data.get('id', 'Unknown')})")
-                
-                # Call the activation API with the option data
-                return self._activate_dfp_option(client_id, recommendation)
+            # Activate the option recommended for this client if it was made
+            # from the same options version, otherwise the first option
+            stored = self.client_dfp_recommendations.get(client_id) if client_id else None
+            if stored and stored.get("dfp_version") == snapshot.version:
+                recommendation = stored
             else:
-                # Fall back to hardcoded data if no options are available
-                logger.info("No options found in cache, using hardcoded recommendation")
-                
-                # Create a hardcoded recommendation
-                hardcoded_recommendation = {
-                    "option": {
-                        "id": "DDR",
-                        "name": "Dynamic Demand Response",
-                        "description": "Dynamic Demand Response (DDR) rewards participants who can rapidly shift or curtail electricity usage during frequent, short-notice events.",
-                        "reward": "$3–4.5 per kWh shifted",
-                        "bonus": "15% extra if >90% compliance monthly",
-                        "penalty": "15% reduction in incentives if compliance <75%",
-                        "category": "Residential",
-                        "minimum_load": "5 kW"
-                    },
-                    "transformer": {
-                        "name": "Transformer_0",
-                        "id": "TX160",
-                        "current_load": "0.5",
-                        "load_percentage": "0.4",
-                        "time_estimate": "30"
-                    }
+                if stored:
+                    logger.info(f"DFP options changed since the recommendation (version {stored.get('dfp_version')} -> {snapshot.version}), using the first option")
+                recommendation = {
+                    "option": snapshot.options[0],
+                    "transformer": stored["transformer"] if stored else DEFAULT_TRANSFORMER,
+                    "dfp_version": snapshot.version
                 }
-                
-                # Call the activation API with the hardcoded data
-                return self._activate_dfp_option(client_id, hardcoded_recommendation)
+            
+            option_data = recommendation["option"]
+            logger.info(f"Using option: {option_data.get('name', 'Unknown')} ({option_data.get('id', 'Unknown')}) from DFP options version {snapshot.version}")
+            
+            # Call the activation API with the option data
+            return await self._activate_dfp_option(client_id, recommendation)
         
         # Check if this is a DFP rejection response (user wants the alternative option)
         elif query.lower().strip() in ["no", "no, try the other one", "try the other one", "use the other option", "alternative", "try alternative"]:
             logger.info("Detected DFP rejection request - user wants the alternative option")
             
-            # Get the options from the cache
-            dfp_options = cache.get("dfp_options", [])
-            
-            # Log the current state of the options
-            logger.info(f"DFP options exists: {bool(dfp_options)}")
-            logger.info(f"DFP options type: {type(dfp_options)}")
-            logger.info(f"Number of options: {len(dfp_options)}")
-            for i, option in enumerate(dfp_options):
-                logger.info(f"Option {i+1}: {option.get('name', 'Unknown')} ({option.get('id', 'Unknown')})")
+            snapshot = dfp_options.current
             
             # Use the second option if available, otherwise use the first option
-            if dfp_options and len(dfp_options) > 1:
+            if len(snapshot.options) > 1:
                 logger.info("Using second option from DFP options")
-                option_data = dfp_options[1]  # Use the second option
-            elif dfp_options:
-                logger.info("Only one option available, using the first option")
-                option_data = dfp_options[0]  # Fall back to the first option if only one is available
+                option_data = snapshot.options[1]  # Use the second option
             else:
-                logger.info("No options found in cache, using hardcoded recommendation")
-                # Create a hardcoded recommendation for the second option
-                option_data = {
-                    "id": "EDR",
-                    "name": "Emergency Demand Reduction",
-                    "description": "Emergency Demand Reduction (EDR) is designed for consumers who can rapidly curtail significant energy use during critical, rare grid emergencies.",
-                    "reward": "$250/year per kW available",
-                    "bonus": "$10.00 per kWh curtailed during events",
-                    "penalty": "50% annual availability fee reduction per missed event",
-                    "category": "Residential",
-                    "minimum_load": "5 kW"
-                }
+                logger.info("Only one option available, using the first option")
+                option_data = snapshot.options[0]  # Fall back to the first option if only one is available
             
             # Create a recommendation with the option data
+            stored = self.client_dfp_recommendations.get(client_id) if client_id else None
             recommendation = {
                 "option": option_data,
-                "transformer": {
-                    "name": "Transformer_0",
-                    "id": "TX160",
-                    "current_load": "0.5",
-                    "load_percentage": "0.4",
-                    "time_estimate": "30"
-                }
+                "transformer": stored["transformer"] if stored else DEFAULT_TRANSFORMER,
+                "dfp_version": snapshot.version
             }
             
             logger.info(f"Using alternative option: {option_data.get('name', 'Unknown')} ({option_data.get('id', 'Unknown')})")
             
             # Call the activation API with the option data
-            return self._activate_dfp_option(client_id, recommendation)
+            return await self._activate_dfp_option(client_id, recommendation)
         
         # Check if this is a DFP recommendation request
         if "grid stress alert" in query.lower():
-            logger.info("Detected DFP recommendation request, using DFP search tool directly")
+            logger.info("Detected DFP recommendation request, using the DFP options snapshot")
             
             try:
-                # Use the DFP search tool directly instead of through the agent
-                from app.tools.specific_tools.grid_tools.dfp_search import DFPSearchTool
-                
-                # Create the tool
-                dfp_tool = DFPSearchTool()
-                
-                # Call the tool directly
-                logger.info("Calling DFP search tool directly...")
-                dfp_options = dfp_tool._run("demand flexibility programs")
-                logger.info(f"DFP search tool returned: {dfp_options[:100]}...")
-                
-                # Check if the response indicates no options were found
-                if "No DFP options found" in dfp_options:
-                    logger.warning("No DFP options found in API response, using fallback options")
-                    # Use a hardcoded fallback response
-                    dfp_options = """
-Here are the available Demand Flexibility Program (DFP) options:
-
-Option 1: Dynamic Demand Response (DDR)
-Dynamic Demand Response (DDR) rewards participants who can rapidly shift or curtail electricity usage during frequent, short-notice events. Participants receive moderately high per-event compensation due to their ability to reliably and promptly adjust energy consumption patterns, significantly aiding grid stability and renewable energy integration.
-Reward: $3–4.5 per kWh shifted
-Bonus: 15% extra if >90% compliance monthly
-Penalty: 15% reduction in incentives if compliance <75%
-Category: Residential
-Minimum Load: 5 kW
-
-Option 2: Emergency Demand Reduction (EDR)
-Emergency Demand Reduction (EDR) is designed for consumers who can rapidly curtail significant energy use during critical, rare grid emergencies. These are infrequent but urgent events requiring immediate action. Participants are compensated significantly for availability but face substantial penalties for non-compliance due to critical grid dependence.
-Reward: $250/year per kW available
-Bonus: $10.00 per kWh curtailed during events
-Penalty: 50% annual availability fee reduction per missed event
-Category: Residential
-Minimum Load: 5 kW
-"""
+                # Take the options from the current snapshot; this never waits on the DFP API
+                snapshot = dfp_options.current
+                dfp_text = snapshot.text
+                logger.info(f"Using DFP options version {snapshot.version}")
                 
                 # Extract transformer details from the query
                 transformer_name_match = re.search(r"transformer (.*?) \[", query)
@@ -314,50 +238,43 @@ Minimum Load: 5 kW
                 # Randomly select which DFP option to recommend
                 recommended_option = random.choice(["DDR", "EDR"])
                 
+                # Index in the options array (0-based)
+                option_index = 0 if recommended_option == "DDR" else 1
+                
                 # Format the recommendation text with Markdown
-                if recommended_option == "DDR":
-                    recommendation_text = f"### 🔎 Recommendation\n\n**Option 1 – Dynamic Demand Response (DDR)** is recommended for immediate grid relief.\n\n> The current situation at {transformer_name} shows a load of **{current_load} kWh ({load_percentage}% of capacity)**, which requires a rapid but moderate response. DDR is ideal for this scenario as it can be quickly activated and provides immediate relief without excessive disruption.\n\n\n**Would you like to proceed?**"
-                    option_index = 0  # Index in the options array (0-based)
-                else:
-                    recommendation_text = f"### 🔎 Recommendation\n\n**Option 2 – Emergency Demand Reduction (EDR)** is recommended for immediate grid relief.\n\n> The current situation at {transformer_name} shows a load of **{current_load} kWh ({load_percentage}% of capacity)**, which requires a significant and immediate response. EDR is designed for critical situations like this and can provide the necessary load reduction quickly.\n\n\n**Would you like to proceed?**"
-                    option_index = 1  # Index in the options array (0-based)
+                recommendation_text = format_dfp_recommendation(option_index, transformer_name, current_load, load_percentage)
                 
                 # Store the recommendation data for later use
                 if client_id:
                     logger.info(f"Storing DFP recommendation for client {client_id}")
                     
-                    # Get the recommended option data
-                    if hasattr(DFPSearchTool, '_last_api_response') and DFPSearchTool._last_api_response and "options" in DFPSearchTool._last_api_response:
-                        options = DFPSearchTool._last_api_response["options"]
-                        if options and len(options) > option_index:
-                            recommended_option_data = options[option_index]
-                            
-                            # Store the recommendation with transformer data
-                            self.client_dfp_recommendations[client_id] = {
-                                "option": recommended_option_data,
-                                "transformer": {
-                                    "name": transformer_name,
-                                    "id": transformer_id,
-                                    "current_load": current_load,
-                                    "load_percentage": load_percentage,
-                                    "time_estimate": time_estimate
-                                }
-                            }
-                            
-                            logger.info(f"Stored DFP recommendation for client {client_id}: {recommended_option}")
-                        else:
-                            logger.warning(f"No options found at index {option_index} for client {client_id}")
+                    # Store the recommendation with transformer data, keyed on the
+                    # options version it was made from
+                    if len(snapshot.options) > option_index:
+                        self.client_dfp_recommendations[client_id] = {
+                            "option": snapshot.options[option_index],
+                            "transformer": {
+                                "name": transformer_name,
+                                "id": transformer_id,
+                                "current_load": current_load,
+                                "load_percentage": load_percentage,
+                                "time_estimate": time_estimate
+                            },
+                            "dfp_version": snapshot.version
+                        }
+                        
+                        logger.info(f"Stored DFP recommendation for client {client_id}: {recommended_option}")
                     else:
-                        logger.warning(f"No options found in _last_api_response for client {client_id}")
+                        logger.warning(f"No options found at index {option_index} for client {client_id}")
                 else:
                     logger.warning("No client_id found, cannot store DFP recommendation")
                 
                 # Format the complete response with Markdown
-                response = f"## ⚠️ Grid Stress Alert for {transformer_name} [{transformer_id}]\n\n{dfp_options}{recommendation_text}"
+                response = f"## ⚠️ Grid Stress Alert for {transformer_name} [{transformer_id}]\n\n{dfp_text.rstrip()}\n\n{recommendation_text}"
                 
                 return response
             except Exception as e:
-                logger.error(f"Error using DFP search tool directly: {str(e)}", exc_info=True)
+                logger.error(f"Error building DFP recommendation: {str(e)}", exc_info=True)
                 # Fall back to the agent if direct tool use fails
         
         # For non-DFP queries or if direct tool use fails, use the agent
@@ -423,7 +340,7 @@ Minimum Load: 5 kW
         # If no internal monologue detected, return the original response
         return response 
 
-    def _activate_dfp_option(self, client_id: str, recommendation: Dict[str, Any]) -> str:
+    async def _activate_dfp_option(self, client_id: str, recommendation: Dict[str, Any]) -> str:
         """
         Activate a DFP option.
         
@@ -460,8 +377,7 @@ Minimum Load: 5 kW
             logger.info(f"API payload: {payload}")
             
             # Make the API call
-            import requests
-            response = requests.post(
+            response = await http_clients.post(
                 activation_url,
                 headers={"Content-Type": "application/json"},
                 json=payload,
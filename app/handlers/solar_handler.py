@@ -15,6 +15,8 @@ class SolarQueryHandler(BaseQueryHandler):
                     "You are a specialized assistant for solar panel installations and information. "
                     "Focus on answering questions related to solar energy, panel calculations, "
                     "installation processes, and benefits. Use your tools when appropriate. "
+                    "To buy an item, search the catalog, ask the user which item they want and for their "
+                    "name, phone and email, then place the order with a single solar_retail_checkout call. "
                     "If the question is unrelated to solar energy, politely state your specialization.",
                 ),
                 MessagesPlaceholder(variable_name="chat_history", optional=True),
@@ -1,10 +1,22 @@
 from fastapi import FastAPI
+from fastapi.responses import JSONResponse
 from fastapi.middleware.cors import CORSMiddleware
 import uvicorn
 import logging
-from app.routers import chat, websocket, grid_utility_ws, grid_alerts
+from app.routers import chat, websocket, grid_utility_ws, grid_alerts, metrics, admin, beckn_callbacks, telemetry
 from app.middleware.auth_middleware import auth_middleware
+from app.middleware.lifecycle_middleware import lifecycle_middleware
 from app.core.websocket_manager import connection_manager
+from app.core.shared_state import shared_state
+from app.core.http_client import http_clients
+from app.core.der_inventory import der_inventory
+from app.core.der_dispatch import der_dispatcher
+from app.core.breach_forecast import breach_forecaster
+from app.core.lifecycle import lifecycle
+from app.core.transaction_store import transaction_store
+from app.core.alert_deliveries import alert_deliveries
+from app.tools.specific_tools.solar_tools.retail_search import solar_catalog
+from app.tools.specific_tools.grid_tools.dfp_search import dfp_options
 
 # Configure logging
 logging.basicConfig(
@@ -27,18 +39,28 @@ app.add_middleware(
 # Add authentication middleware
 app.middleware("http")(auth_middleware)
 
+# Reject new chat queries while draining for a restart
+app.middleware("http")(lifecycle_middleware)
+
 # Include routers
 app.include_router(chat.router)
 app.include_router(websocket.router)
 app.include_router(grid_utility_ws.router)
 app.include_router(grid_alerts.router)
+app.include_router(metrics.router)
+app.include_router(admin.router)
+app.include_router(beckn_callbacks.router)
+app.include_router(telemetry.router)
 
 # Health check endpoint
 @app.get("/health", tags=["health"])
 async def health_check():
     """
-    Health check endpoint.
+    Health check endpoint. Reports 503 while draining so load balancers
+    stop routing new clients to this worker.
     """
+    if not lifecycle.accepting:
+        return JSONResponse(status_code=503, content={"status": "draining"})
     return {"status": "healthy"}
 
 @app.on_event("startup")
@@ -46,8 +68,45 @@ async def startup_event():
     """
     Initialize components on application startup.
     """
+    # Restore sessions, histories and DFP state saved by the previous process
+    lifecycle.restore()
+    
+    # Start receiving alerts published by other workers
+    await shared_state.start()
+    
     # Start the WebSocket cleanup task
     await connection_manager.start_cleanup_task()
+    
+    # Keep prefetched DER inventories fresh
+    await der_inventory.start_refresh_task()
+    
+    # Drop abandoned Beckn transactions and old consumer alert stats
+    await transaction_store.start()
+    await alert_deliveries.start()
+    
+    # Load the solar catalog so the first search does not wait on the BAP
+    solar_catalog.prefetch()
+    
+    # Keep the DFP options snapshot current so alerts never wait on the DFP API
+    await dfp_options.start()
+    await breach_forecaster.start()
+
+@app.on_event("shutdown")
+async def shutdown_event():
+    """
+    Release resources on application shutdown.
+    """
+    # Ask remaining clients to reconnect later and save in-memory state
+    await lifecycle.shutdown()
+    await connection_manager.stop_cleanup_task()
+    await shared_state.stop()
+    await der_inventory.stop()
+    await transaction_store.stop()
+    await alert_deliveries.stop()
+    await der_dispatcher.stop()
+    await dfp_options.stop()
+    await breach_forecaster.stop()
+    await http_clients.aclose()
 
 if __name__ == "__main__":
     uvicorn.run("app.main:app", host="0.0.0.0", port=8000, reload=True)
@@ -0,0 +1,29 @@
+from fastapi import Request
+from fastapi.responses import JSONResponse
+from typing import Callable, Awaitable
+import logging
+from app.core.lifecycle import lifecycle
+
+logger = logging.getLogger(__name__)
+
+async def lifecycle_middleware(
+    request: Request,
+    call_next: Callable[[Request], Awaitable[JSONResponse]]
+) -> JSONResponse:
+    """
+    Middleware that rejects new chat queries while the server drains and
+    tracks the ones in flight so draining can wait for them.
+    """
+    if not request.url.path.startswith("/chat") or request.method == "OPTIONS":
+        return await call_next(request)
+
+    if not lifecycle.accepting:
+        retry_after = max(1, lifecycle.config.reconnect_min_delay_ms // 1000)
+        return JSONResponse(
+            status_code=503,
+            content={"status": "error", "message": "Server is restarting, please retry shortly."},
+            headers={"Retry-After": str(retry_after)},
+        )
+
+    async with lifecycle.track_query():
+        return await call_next(request)
@@ -0,0 +1,14 @@
+from pydantic import BaseModel
+from typing import List, Optional, Union
+
+
+class LoadSample(BaseModel):
+    transformer_id: str
+    load_kw: float
+    # Epoch seconds or ISO 8601; the time of receipt when omitted
+    timestamp: Optional[Union[float, str]] = None
+    max_capacity_kw: Optional[float] = None
+
+
+class LoadSamples(BaseModel):
+    samples: List[LoadSample]
@@ -0,0 +1,37 @@
+from fastapi import APIRouter, Depends, Header, HTTPException
+from typing import Optional
+import logging
+import os
+import secrets
+from dotenv import load_dotenv
+from app.core.lifecycle import lifecycle
+
+# Load environment variables
+load_dotenv()
+
+logger = logging.getLogger(__name__)
+
+router = APIRouter(prefix="/admin", tags=["admin"])
+
+# Admin endpoints require a matching X-Admin-Token header; they are disabled while it is unset
+ADMIN_TOKEN = os.getenv("ADMIN_TOKEN")
+
+
+def require_admin_token(x_admin_token: Optional[str] = Header(None)):
+    """Dependency that refuses requests without the admin token."""
+    if not ADMIN_TOKEN:
+        raise HTTPException(status_code=403, detail="Admin endpoints are disabled; set ADMIN_TOKEN to enable them")
+    if not secrets.compare_digest(x_admin_token or "", ADMIN_TOKEN):
+        raise HTTPException(status_code=403, detail="Invalid admin token")
+
+
+@router.post("/drain", dependencies=[Depends(require_admin_token)])
+async def drain():
+    """
+    Drains this worker ahead of a restart: stops accepting connections, waits
+    for in-flight queries, asks clients to reconnect later and snapshots state.
+    Call it before stopping the process (e.g. from a preStop hook).
+    """
+    summary = await lifecycle.drain()
+    summary["snapshot"] = lifecycle.snapshot()
+    return {"status": "success", **summary}
@@ -0,0 +1,76 @@
+from fastapi import APIRouter, Body, Depends, HTTPException
+from fastapi.responses import JSONResponse, Response, StreamingResponse
+from typing import Any, AsyncIterator, Dict
+import json
+import logging
+from app.core.beckn_callbacks import ACK, correlator, nack
+from app.core.transaction_store import transaction_store
+from app.routers.admin import require_admin_token
+
+logger = logging.getLogger(__name__)
+
+router = APIRouter(prefix="/beckn", tags=["beckn"])
+
+# Callbacks a BPP may post in answer to our requests
+CALLBACK_ACTIONS = frozenset({"on_search", "on_select", "on_init", "on_confirm", "on_status", "on_update", "on_cancel"})
+
+
+@router.post("/{action}")
+async def receive_callback(action: str, body: Dict[str, Any] = Body(...)):
+    """
+    Receives an asynchronous Beckn response from a BPP and acknowledges it.
+    Responses to a request sent by another worker are forwarded to it.
+    Responses that no request is waiting for (unknown or expired
+    message_id) are refused with a NACK.
+    """
+    if action not in CALLBACK_ACTIONS:
+        return JSONResponse(status_code=404, content=nack("UNKNOWN_ACTION", f"Unsupported callback {action}"))
+    if not await correlator.route(action, body):
+        return nack("NO_PENDING_REQUEST", "No request is waiting for this response")
+    return ACK
+
+
+@router.get("/transactions/{transaction_id}/stream", dependencies=[Depends(require_admin_token)])
+async def stream_transaction(transaction_id: str):
+    """
+    Streams the callbacks of a transaction's in-progress requests as
+    newline-delimited JSON, one line per BPP response as it arrives.
+    Requests the transaction sends while the stream is open are followed too.
+    Responses include customer details, so this requires the admin token.
+    """
+    calls = correlator.calls_for(transaction_id)
+    if not calls:
+        raise HTTPException(status_code=404, detail="No requests in progress for this transaction")
+
+    async def lines() -> AsyncIterator[str]:
+        streamed = []
+        pending = calls
+        while pending:
+            for call in pending:
+                streamed.append(call)
+                async for response in call.stream():
+                    context = response.get("context") or {}
+                    yield json.dumps({
+                        "action": context.get("action"),
+                        "bpp_id": context.get("bpp_id"),
+                        "message_id": context.get("message_id"),
+                        "response": response,
+                    }) + "\n"
+            pending = [call for call in correlator.calls_for(transaction_id) if call not in streamed]
+
+    return StreamingResponse(lines(), media_type="application/x-ndjson")
+
+
+@router.get("/transactions/{transaction_id}/payloads", dependencies=[Depends(require_admin_token)])
+async def transaction_payloads(transaction_id: str):
+    """
+    Full Beckn responses of a transaction's steps, by action. Agents only
+    see a compact projection of these. Responses include customer details,
+    so this requires the admin token.
+    """
+    payloads = transaction_store.get_payloads(transaction_id)
+    if not payloads:
+        raise HTTPException(status_code=404, detail="No responses stored for this transaction")
+    # The payloads are stored as received; splice them in without re-encoding
+    body = ",".join(f"{json.dumps(action)}:{raw}" for action, raw in payloads.items())
+    return Response(content="{" + body + "}", media_type="application/json")
@@ -7,6 +7,7 @@ from app.core.history_manager import chat_history_manager
 from app.core.auth import authenticate_user, is_authenticated, get_user_data
 from app.core.meter_validator import validate_meter_id
 from app.core.otp_service import otp_service
+from app.core.der_inventory import der_inventory
 
 logger = logging.getLogger(__name__)
 
@@ -62,6 +63,7 @@ async def chat(
                     is_auth, token = await authenticate_user(meter_id, request.query)
                     if is_auth:
                         logger.info(f"Client {request.client_id} - Authentication successful, token generated")
+                        der_inventory.prefetch(meter_id)
                         return ChatResponse(
                             status="auth_success",
                             query=request.query,
@@ -187,6 +189,7 @@ async def authenticate(request: AuthRequest):
     if request.otp:
         is_auth, token = await authenticate_user(request.meter_id, request.otp)
         if is_auth:
+            der_inventory.prefetch(request.meter_id)
             return AuthResponse(
                 status="success",
                 message="Authentication successful.",
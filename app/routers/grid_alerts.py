@@ -1,12 +1,22 @@
 from fastapi import APIRouter, BackgroundTasks, HTTPException, Body
-from typing import Dict, Any, List, Set, Optional
+from typing import Dict, Any, List, Set, Optional, Tuple
 import logging
 import random
 import asyncio
-import requests
-import json
-from app.core.websocket_manager import connection_manager
+import time
+from app.core.websocket_manager import connection_manager, topic
 from app.core.orchestrator import ClientOrchestrator
+from app.core.history_manager import chat_history_manager
+from app.core.shared_state import shared_state
+from app.core.der_dispatch import der_dispatcher
+from app.core.alert_deliveries import alert_deliveries
+from app.core import subscription_meters
+from app.core.telemetry import telemetry_store
+from app.routers.telemetry import LOAD_SAMPLES_CHANNEL
+from app.core.breach_forecast import breach_forecaster
+from app.core.breach_scanner import breach_scanner
+from app.handlers.grid_utility_handler import format_dfp_recommendation
+from app.tools.specific_tools.grid_tools.dfp_search import dfp_options
 import uuid
 from datetime import datetime
 from pydantic import BaseModel
@@ -15,23 +25,38 @@ logger = logging.getLogger(__name__)
 
 router = APIRouter(tags=["grid_alerts"])
 
+# Pub/sub channels used to fan alerts out to every worker process
+CONSUMER_ALERT_CHANNEL = "grid_alerts.consumer"
+TRANSFORMER_ALERT_CHANNEL = "grid_alerts.transformer_stress"
+TRANSFORMER_RECOMMENDATION_CHANNEL = "grid_alerts.transformer_recommendation"
+
+# Prefix of the one-off conversations the agent recommends DFP options in
+GRID_ALERT_AGENT_CLIENT_PREFIX = "grid_alert_"
+
 class SimpleGridAlertRequest(BaseModel):
     # No required fields
     pass
 
+# Name, location and capacity of transformers seen in posted alerts, used
+# for alerts the breach scanner raises from telemetry alone
+transformer_details: Dict[str, Dict[str, Any]] = {}
+
+# Last recommended DFP option per client, read by the grid utility handler on "yes"
+client_dfp_recommendations = shared_state.namespace("client_dfp_recommendations")
+
+# Text of the consumer alert sent for a DFP order
+CONSUMER_ALERT_TEXT = "⚠️ Attention! We have detected a grid overload in your area. To help stabilize the grid, we are activating our Demand Flexibility Program.\n\nWould you like to participate?\n✅ Incentives: Earn $3–4.5 per kWh of reduced consumption\n✅ Incentives: 15% bonus if you maintain >90% participation this month."
+TRANSFORMER_NOTICE_TEXT = "⚠️ The transformer serving your home is under heavy load. Reducing your consumption for the next hour helps keep power on in your area."
+
 @router.post("/grid-alerts/consumer")
-async def simple_grid_alert(request: Dict[str, Any] = Body(...)):
+async def simple_grid_alert(background_tasks: BackgroundTasks, request: Dict[str, Any] = Body(...)):
     """
     Endpoint to receive Beckn protocol grid alerts and send to connected clients.
+
+    Returns as soon as delivery is queued; the enrolled meters are looked up
+    and alerted in the background. Delivery stats are available at
+    ``GET /grid-alerts/consumer/{alert_id}``.
     """
-    logger.info(f"Received grid alert request payload")
-    
-    # Track successful sends
-    successful_sends = 0
-    
-    # Log the request payload
-    logger.info(f"Request payload: {json.dumps(request, indent=2)}")
-    
     try:
         # Extract order_id from the Beckn protocol request
         order_id = None
@@ -47,120 +72,184 @@ async def simple_grid_alert(request: Dict[str, Any] = Body(...)):
             logger.error("Could not extract order_id from request")
             return {"status": "error", "message": "Could not extract order_id from request"}
         
-        logger.info(f"Extracted order_id: {order_id}")
-        
-        # Fetch meter IDs associated with the order_id
-        meter_ids = await fetch_meter_ids_by_subscription(order_id)
-        
-        if not meter_ids:
-            logger.warning(f"No meters found for order_id: {order_id}")
-            return {"status": "warning", "message": f"No meters found for order_id: {order_id}"}
-        
-        logger.info(f"Found meter IDs: {meter_ids}")
-        
-        # Create a grid alert message
-        alert_message = {
-            "type": "grid_alert",
-            "status": "success",
-            "message": "⚠️ Attention! We have detected a grid overload in your area. To help stabilize the grid, we are activating our Demand Flexibility Program.\n\nWould you like to participate?\n✅ Incentives: Earn $3–4.5 per kWh of reduced consumption\n✅ Incentives: 15% bonus if you maintain >90% participation this month.",
-            "order_id": order_id
-        }
+        alert_id = alert_deliveries.begin(str(order_id))
+        logger.info(f"Received grid alert {alert_id} for order_id: {order_id}")
+        logger.debug(f"Grid alert payload: {request}")
         
-        # Send alert to users with matching meter IDs
-        for meter_id in meter_ids:
-            # Get connection ID for this meter ID
-            connection_id = connection_manager.get_connection_by_meter_id(str(meter_id))
-            
-            if connection_id:
-                # Send the alert
-                success = await connection_manager.send_message(connection_id, alert_message)
-                if success:
-                    successful_sends += 1
-                    logger.info(f"Alert sent successfully to meter ID: {meter_id}, connection ID: {connection_id}")
-                else:
-                    logger.warning(f"Failed to send alert to meter ID: {meter_id}, connection ID: {connection_id}")
-            else:
-                logger.warning(f"No active connection found for meter ID: {meter_id}")
+        background_tasks.add_task(process_consumer_alert, alert_id, str(order_id))
         
         return {
-            "status": "success", 
-            "message": f"Alert sent to {successful_sends} clients with matching meter IDs",
+            "status": "success",
+            "message": "Alert queued for delivery to the meters enrolled in the order",
             "order_id": order_id,
-            "meters_count": len(meter_ids),
-            "successful_sends": successful_sends
+            "alert_id": alert_id,
         }
         
     except Exception as e:
         logger.error(f"Error processing grid alert: {str(e)}", exc_info=True)
         return {"status": "error", "message": f"Error processing grid alert: {str(e)}"}
 
-async def fetch_meter_ids_by_subscription(subscription_id: str) -> List[int]:
+
+@router.get("/grid-alerts/consumer/{alert_id}")
+async def consumer_alert_status(alert_id: str):
     """
-    Fetch meter IDs associated with a subscription ID.
+    Delivery stats of a consumer alert: its status, the number of enrolled
+    meters, and the connections and meters each worker queued it for.
+    """
+    stats = alert_deliveries.get(alert_id)
+    if stats is None:
+        raise HTTPException(status_code=404, detail="Unknown or expired alert")
+    return stats
+
+
+@router.delete("/grid-alerts/subscriptions/{subscription_id}/meters")
+async def invalidate_subscription_meters(subscription_id: str):
+    """
+    Drops the cached meters of a subscription on every worker, e.g. after
+    households joined or left the order.
+    """
+    await subscription_meters.invalidate(subscription_id)
+    return {"status": "success", "subscription_id": subscription_id}
+
+
+async def process_consumer_alert(alert_id: str, order_id: str):
+    """
+    Looks up the meters enrolled in an order and queues the alert for them
+    on every worker.
     """
-    # API URL for fetching meters by subscription ID
-    api_url = f"https://playground.becknprotocol.io/meter-data-simulator/meters/subscription/{subscription_id}"
-    
     try:
-        # Make the API request
-        response = requests.get(api_url, timeout=10)
+        meter_ids = await subscription_meters.get_meter_ids(order_id)
+        if not meter_ids:
+            logger.warning(f"No meters found for order_id: {order_id}")
+            alert_deliveries.update(alert_id, status="no_meters", meters_count=0)
+            return
+        alert_deliveries.update(alert_id, status="dispatched", meters_count=len(meter_ids))
+
+        alert_message = {
+            "type": "grid_alert",
+            "status": "success",
+            "message": CONSUMER_ALERT_TEXT,
+            "order_id": order_id
+        }
         
-        # Check if the request was successful
-        if response.status_code == 200:
-            # Parse the response
-            data = response.json()
-            
-            # Extract meter IDs from the response
-            meter_ids = []
-            if "data" in data and isinstance(data["data"], list):
-                for meter in data["data"]:
-                    if "id" in meter:
-                        meter_ids.append(meter["id"])
-            
-            logger.info(f"Found {len(meter_ids)} meters for subscription ID {subscription_id}: {meter_ids}")
-            return meter_ids
-        else:
-            logger.error(f"API request failed with status code {response.status_code}: {response.text}")
-            return []
+        # Send alert to users with matching meter IDs connected to this worker
+        await deliver_consumer_alert(meter_ids, alert_message, alert_id)
+        
+        # Let the other workers deliver to the meters connected to them
+        await shared_state.publish(
+            CONSUMER_ALERT_CHANNEL,
+            {"meter_ids": meter_ids, "alert_message": alert_message, "alert_id": alert_id}
+        )
     except Exception as e:
-        logger.error(f"Error fetching meters by subscription: {str(e)}")
-        return []
+        logger.error(f"Error delivering grid alert {alert_id}: {str(e)}", exc_info=True)
+        alert_deliveries.update(alert_id, status="failed", error=str(e))
 
-@router.post("/grid-alerts/transformer-stress")
-async def transformer_stress_alert(data: Dict[str, Any], background_tasks: BackgroundTasks):
+
+async def deliver_consumer_alert(meter_ids: List[Any], alert_message: Dict[str, Any], alert_id: Optional[str] = None) -> int:
     """
-    Endpoint to receive transformer stress alerts and broadcast to connected clients.
+    Sends a consumer alert to the meters connected to this worker.
+    
+    Returns:
+        Number of connections the alert was sent to
     """
-    logger.info(f"Received transformer stress alert: {data}")
+    # One lookup per meter; a household connected from several devices
+    # gets the alert on all of them. Each connection has its own send
+    # queue, so no meter waits for another's socket.
+    queued = connection_manager.send_to_meters(meter_ids, alert_message)
     
-    # Extract transformer details
-    transformer = data.get("transformer", {})
-    transformer_id = transformer.get("id")
-    transformer_name = transformer.get("name", "Unknown")
-    city = transformer.get("city", "Unknown")
-    state = transformer.get("state", "Unknown")
-    max_capacity_kw = transformer.get("max_capacity_KW", 0)
-    current_load_kwh = data.get("totalBaseKWh", 0)
+    successful_sends = len(queued)
+    if alert_id:
+        meters_reached = {connection_manager.get_meter_id_by_connection(connection_id) for connection_id in queued}
+        meters_reached.discard(None)
+        alert_deliveries.record_delivery(alert_id, shared_state.worker_id, successful_sends, len(meters_reached))
+    logger.info(f"Alert queued for {successful_sends} connections of {len(meter_ids)} meters")
     
-    # Extract substation details
-    substation = transformer.get("substation", {})
-    substation_name = substation.get("name", "Unknown")
+    return successful_sends
+
+
+async def _on_consumer_alert(message: Dict[str, Any], origin: str):
+    """Delivers a consumer alert published by another worker."""
+    if origin == shared_state.worker_id:
+        # Already delivered by the worker that received the request
+        return
+    await deliver_consumer_alert(message["meter_ids"], message["alert_message"], message.get("alert_id"))
+
+
+async def _on_transformer_alert(message: Dict[str, Any], origin: str):
+    """Broadcasts a transformer stress alert posted to another worker."""
+    if origin == shared_state.worker_id:
+        return
+    remember_posted_alert(message["transformer_data"])
+    await broadcast_grid_alert(message["alert_message"], message["transformer_data"])
+
+
+async def _on_transformer_recommendation(message: Dict[str, Any], origin: str):
+    """Forwards the DFP recommendation another worker made for an alert."""
+    if origin == shared_state.worker_id:
+        return
+    deliver_dfp_recommendation(
+        message["alert_message"], message["transformer_data"], message["agent_response"], message.get("recommendation")
+    )
+
+
+shared_state.subscribe(CONSUMER_ALERT_CHANNEL, _on_consumer_alert)
+shared_state.subscribe(TRANSFORMER_ALERT_CHANNEL, _on_transformer_alert)
+shared_state.subscribe(TRANSFORMER_RECOMMENDATION_CHANNEL, _on_transformer_recommendation)
+
+def breach_headline(breach: Optional[Dict[str, Any]]) -> str:
+    """Summarizes a breach forecast for the alert text."""
+    if breach is None:
+        return "Capacity Breach Risk (not enough load history to estimate when)."
+    minutes = breach["minutes_to_breach"]
+    if minutes is None:
+        return "Load Is Not Trending Toward a Capacity Breach."
+    if minutes == 0:
+        return "Capacity Exceeded."
+    upper = breach["upper_minutes"]
+    band = f"{breach['lower_minutes']:.0f}–{upper:.0f}" if upper is not None else f"at least {breach['lower_minutes']:.0f}"
+    return f"Capacity Breach Likely in {minutes:.0f} Minutes ({band} min)."
+
+def display_transformer_id(transformer_id: Any) -> str:
+    """Formats a transformer ID for display (e.g., TX005)."""
+    if transformer_id is None or transformer_id == "":
+        return "Unknown"
+    if isinstance(transformer_id, int) or str(transformer_id).isdigit():
+        return f"TX{int(transformer_id):03d}"
+    return str(transformer_id)
+
+def build_transformer_alert(
+    transformer_id: Any,
+    details: Dict[str, Any],
+    current_load_kwh: float,
+    breach: Optional[Dict[str, Any]],
+    source: str,
+) -> Tuple[str, Dict[str, Any]]:
+    """
+    Builds the alert text and the transformer data sent to dashboards.
+
+    Args:
+        details: The transformer's name, city, state, substation_name and max_capacity_kw
+        breach: The transformer's breach forecast, if any
+        source: "alert" for posted alerts, "forecast" for alerts raised by the breach scanner
+
+    Returns:
+        (alert_message, transformer_data)
+    """
+    transformer_name = details.get("name", "Unknown")
+    max_capacity_kw = details.get("max_capacity_kw") or 0
     
     # Calculate load percentage
     load_percentage = (current_load_kwh / max_capacity_kw) * 100 if max_capacity_kw else 0
     
-    # Format the transformer ID for display (e.g., TX005)
-    display_id = f"TX{transformer_id:03d}" if transformer_id else "Unknown"
-    
-    # Generate a random time estimate between 25-35 minutes
-    time_estimate = random.randint(25, 35)
+    display_id = display_transformer_id(transformer_id)
+    time_estimate = round(breach["minutes_to_breach"]) if breach and breach["minutes_to_breach"] is not None else None
     
     # Format the alert message with more details
     alert_message = (
-        f"⚠️ Grid Stress Detected at {transformer_name} [{display_id}] – "
-        f"Capacity Breach Likely in {time_estimate} Minutes.\n\n"
-        f"Location: {city}, {state}\n"
-        f"Substation: {substation_name}\n"
+        f"⚠️ Grid Stress {'Forecast' if source == 'forecast' else 'Detected'} at {transformer_name} [{display_id}] – "
+        f"{breach_headline(breach)}\n\n"
+        f"Location: {details.get('city', 'Unknown')}, {details.get('state', 'Unknown')}\n"
+        f"Substation: {details.get('substation_name', 'Unknown')}\n"
         f"Current Load: {current_load_kwh:.2f} kWh ({load_percentage:.1f}% of capacity)\n"
         f"Maximum Capacity: {max_capacity_kw} kW"
     )
@@ -170,107 +259,322 @@ async def transformer_stress_alert(data: Dict[str, Any], background_tasks: Backg
         "transformer_id": transformer_id,
         "display_id": display_id,
         "name": transformer_name,
-        "city": city,
-        "state": state,
+        "city": details.get("city", "Unknown"),
+        "state": details.get("state", "Unknown"),
         "max_capacity_kw": max_capacity_kw,
         "current_load_kwh": current_load_kwh,
         "load_percentage": load_percentage,
         "time_estimate": time_estimate,
-        "substation_name": substation_name
+        "breach_forecast": breach,
+        "substation_name": details.get("substation_name", "Unknown"),
+        # EWMA, slope and peak kept up to date as samples arrive
+        "load_trend": telemetry_store.stats(transformer_id) if transformer_id is not None else None,
+        "source": source
+    }
+    return alert_message, transformer_data
+
+@router.post("/grid-alerts/transformer-stress")
+async def transformer_stress_alert(data: Dict[str, Any], background_tasks: BackgroundTasks):
+    """
+    Endpoint to receive transformer stress alerts and broadcast to connected clients.
+    """
+    logger.info(f"Received transformer stress alert: {data}")
+    
+    # Extract transformer details
+    transformer = data.get("transformer", {})
+    transformer_id = transformer.get("id")
+    details = {
+        "name": transformer.get("name", "Unknown"),
+        "city": transformer.get("city", "Unknown"),
+        "state": transformer.get("state", "Unknown"),
+        "substation_name": transformer.get("substation", {}).get("name", "Unknown"),
+        "max_capacity_kw": transformer.get("max_capacity_KW", 0),
     }
+    current_load_kwh = data.get("totalBaseKWh", 0)
     
-    # Broadcast the alert in the background to avoid blocking the response
-    background_tasks.add_task(process_grid_alert, alert_message, transformer_data)
+    # Add the snapshot to the transformer's load history, on every worker
+    if transformer_id is not None:
+        sample = (str(transformer_id), time.time(), current_load_kwh, details["max_capacity_kw"])
+        telemetry_store.append(*sample)
+        await shared_state.publish(LOAD_SAMPLES_CHANNEL, {"samples": [sample]})
+    
+    # Forecast the breach from the load history, including this snapshot
+    breach = breach_forecaster.forecast_one(transformer_id) if transformer_id is not None else None
+    
+    alert_message, transformer_data = build_transformer_alert(transformer_id, details, current_load_kwh, breach, "alert")
+    
+    # Broadcast the alert and recommend an option in the background to avoid
+    # blocking the response; the recommendation is published once it is made
+    background_tasks.add_task(process_grid_alert, alert_message, transformer_data, publish=True)
+    
+    # Dashboards connected to other workers get the alert from those workers
+    await shared_state.publish(
+        TRANSFORMER_ALERT_CHANNEL,
+        {"alert_message": alert_message, "transformer_data": transformer_data}
+    )
     
     return {"status": "success", "message": "Alert broadcasted to connected clients"}
 
 
-async def process_grid_alert(alert_message: str, transformer_data: Dict[str, Any]):
+async def raise_forecast_alert(breach: Dict[str, Any], recommendation: Dict[str, Any]):
+    """
+    Raises a transformer stress alert for a breach forecast by the breach
+    scanner, with the recommendation it prepared.
+
+    Every worker runs its own scanner over the same replicated telemetry, so
+    the alert only goes to this worker's dashboards and is not published.
+    """
+    transformer_id = breach["transformer_id"]
+    stats = telemetry_store.stats(transformer_id)
+    if stats is None:
+        return
+    details = dict(transformer_details.get(transformer_id, {}))
+    details.setdefault("name", f"Transformer {display_transformer_id(transformer_id)}")
+    details["max_capacity_kw"] = stats["capacity_kw"] or details.get("max_capacity_kw", 0)
+    
+    # Posted alerts carry numeric IDs; keep the same type on the dashboard
+    alert_transformer_id = int(transformer_id) if transformer_id.isdigit() else transformer_id
+    alert_message, transformer_data = build_transformer_alert(alert_transformer_id, details, stats["last_kw"], breach, "forecast")
+    await process_grid_alert(alert_message, transformer_data, recommendation)
+
+
+@router.post("/grid-alerts/der-dispatch", status_code=202)
+async def dispatch_ders(request: Dict[str, Any] = Body(...)):
+    """
+    Switches off the DERs of the households enrolled in a DFP event.
+
+    Accepts the ``event_id`` (the DFP order) and either ``households`` (a
+    list of ``{"meter_id", "der_ids"}``) or ``meter_ids``, whose switchable
+    devices are picked from their DER inventories. Only meters enrolled in
+    the order, i.e. that gave consent, are switched off; the others are
+    returned as ``not_enrolled``. Returns as soon as the commands are
+    queued; progress is streamed to the utility dashboards and can be
+    polled at ``GET /grid-alerts/der-dispatch/{job_id}``.
+    """
+    event_id = request.get("event_id")
+    if not event_id:
+        raise HTTPException(status_code=400, detail="Provide the event_id of the DFP order")
+    if request.get("households"):
+        try:
+            households = [(household["meter_id"], household["der_ids"]) for household in request["households"]]
+        except (KeyError, TypeError):
+            raise HTTPException(status_code=400, detail="Each household needs a meter_id and der_ids")
+    elif request.get("meter_ids"):
+        households = [(meter_id, None) for meter_id in request["meter_ids"]]
+    else:
+        raise HTTPException(status_code=400, detail="Provide households or meter_ids")
+
+    enrolled = {str(meter_id) for meter_id in await subscription_meters.get_meter_ids(str(event_id))}
+    not_enrolled = [meter_id for meter_id, _ in households if str(meter_id) not in enrolled]
+    households = [(meter_id, der_ids) for meter_id, der_ids in households if str(meter_id) in enrolled]
+    if not households:
+        raise HTTPException(status_code=403, detail="None of the meters are enrolled in this event")
+    if not_enrolled:
+        logger.warning(f"Not dispatching DERs of meters not enrolled in event {event_id}: {not_enrolled}")
+
+    if request.get("households"):
+        job = der_dispatcher.dispatch(households, str(event_id))
+    else:
+        job = await der_dispatcher.dispatch_meters([meter_id for meter_id, _ in households], str(event_id))
+    return {**job.snapshot(), "not_enrolled": not_enrolled}
+
+
+@router.get("/grid-alerts/der-dispatch/{job_id}")
+async def der_dispatch_status(job_id: str):
+    """
+    Progress of a DER dispatch, with the acknowledgement state of every device.
+    """
+    job = der_dispatcher.get_job(job_id)
+    if job is None:
+        raise HTTPException(status_code=404, detail="Unknown or expired dispatch")
+    return job.snapshot(include_ders=True)
+
+async def process_grid_alert(
+    alert_message: str,
+    transformer_data: Dict[str, Any],
+    recommendation: Optional[Dict[str, Any]] = None,
+    publish: bool = False,
+):
     """
     Process a grid alert using the agent.
+
+    When a recommendation is given, or the breach scanner prepared one for
+    the transformer from the current DFP options, it is sent right away
+    instead of asking the agent.
+
+    With publish, the recommendation is made once here and published, so
+    the other workers only forward it to their dashboards; posted alerts
+    reach this worker only.
     """
     try:
+        transformer_id = transformer_data.get("transformer_id")
+        remember_posted_alert(transformer_data)
+        if transformer_id is not None and recommendation is None:
+            recommendation = breach_scanner.recommendation_for(transformer_id)
+        
         # Step 1: Broadcast the alert
         logger.info("Broadcasting grid alert...")
         client_connections = await broadcast_grid_alert(alert_message, transformer_data)
         
-        if not client_connections:
+        if not client_connections and not publish:
             logger.warning("No client connections found, skipping DFP recommendations")
             return
         
-        logger.info(f"Found {len(client_connections)} client connections")
-        
-        # Step 2: For each client, get agent recommendations
-        for connection_id in client_connections:
+        # Step 2: Get the recommendation once for every dashboard
+        if recommendation is not None:
+            logger.info("Using the DFP recommendation prepared by the breach scanner...")
+            agent_response, stored_recommendation = prepared_dfp_recommendation(transformer_data, recommendation)
+        else:
+            # Wait a moment before sending agent request (for better UX)
+            logger.info("Waiting before sending agent request...")
+            await asyncio.sleep(2)
+            
+            # Each alert gets its own conversation with the agent, so alerts
+            # in flight at the same time never read each other's recommendation
+            logger.info("Getting DFP recommendations from agent...")
+            agent_client_id = f"{GRID_ALERT_AGENT_CLIENT_PREFIX}{uuid.uuid4()}"
             try:
-                client_id = connection_manager.get_client(connection_id)
-                if not client_id:
-                    # Generate a default client ID if none exists
-                    client_id = f"grid_client_{str(uuid.uuid4())[:8]}"
-                    logger.info(f"No client ID found for connection {connection_id}, generating default: {client_id}")
-                    connection_manager.set_client(connection_id, client_id)
-                
-                logger.info(f"Processing for client {client_id}, connection {connection_id}")
-                
-                # Add alert to chat history as a "system" user message instead of using add_system_message
-                orchestrator = ClientOrchestrator.get_instance(client_id)
-                # Use add_user_message with a special prefix instead of add_system_message
-                orchestrator.history_manager.add_user_message(
-                    client_id, 
-                    f"[SYSTEM ALERT] {alert_message}"
-                )
-                
-                # Wait a moment before sending agent request (for better UX)
-                logger.info("Waiting before sending agent request...")
-                await asyncio.sleep(2)
-                
-                # Get DFP recommendations from agent
-                logger.info("Getting DFP recommendations from agent...")
-                agent_response = await get_agent_dfp_recommendation(client_id, transformer_data)
-                
-                # Store transformer data for this client
-                logger.info("Storing transformer data for client...")
-                from app.routers.grid_utility_ws import transformer_data_store
-                transformer_data_store[client_id] = transformer_data
-                
-                # Before sending the agent's response, check the client type
-                logger.info("Checking client type before sending agent response...")
-                client_type = connection_manager.get_client_type(connection_id)
-
-                logger.info(f"Client type for connection {connection_id}: {client_type}")
-
-                # Only send the alert to utility dashboard clients
-                if client_type == "utility_dashboard":
-                    logger.info("Sending agent response to utility dashboard client...")
-                    await connection_manager.send_message(
-                        connection_id,
-                        {
-                            "type": "dfp_options_and_recommendation",
-                            "status": "success",
-                            "message": agent_response,
-                            "transformer_data": transformer_data
-                        }
-                    )
-                else:
-                    logger.info(f"Skipping alert for non-utility client (type: {client_type})")
-            except Exception as e:
-                logger.error(f"Error processing client {connection_id}: {str(e)}", exc_info=True)
+                agent_response = await get_agent_dfp_recommendation(agent_client_id, transformer_data)
+                stored_recommendation = client_dfp_recommendations.get(agent_client_id)
+            finally:
+                client_dfp_recommendations.pop(agent_client_id, None)
+                chat_history_manager.remove_history(agent_client_id)
+                ClientOrchestrator.clear_client_instance(agent_client_id)
+        
+        # Step 3: Send it to this worker's dashboards, and the other workers'
+        deliver_dfp_recommendation(alert_message, transformer_data, agent_response, stored_recommendation)
+        if publish:
+            await shared_state.publish(
+                TRANSFORMER_RECOMMENDATION_CHANNEL,
+                {
+                    "alert_message": alert_message,
+                    "transformer_data": transformer_data,
+                    "agent_response": agent_response,
+                    "recommendation": stored_recommendation
+                }
+            )
     except Exception as e:
         logger.error(f"Error in process_grid_alert: {str(e)}", exc_info=True)
 
 
+def remember_posted_alert(transformer_data: Dict[str, Any]):
+    """
+    Keeps the details of a transformer from a posted alert for forecast
+    alerts, and stops the breach scanner from alerting it again.
+    """
+    transformer_id = transformer_data.get("transformer_id")
+    if transformer_id is None or transformer_data.get("source") != "alert":
+        return
+    transformer_details[str(transformer_id)] = {
+        key: transformer_data[key] for key in ("name", "city", "state", "substation_name", "max_capacity_kw")
+    }
+    breach_scanner.mark_alerted(transformer_id)
+
+
+def deliver_dfp_recommendation(
+    alert_message: str,
+    transformer_data: Dict[str, Any],
+    agent_response: str,
+    recommendation: Optional[Dict[str, Any]] = None,
+) -> Set[str]:
+    """
+    Sends a DFP recommendation to the utility dashboards connected to this
+    worker, and records the alert and the recommendation in each
+    dashboard's chat history so that "yes" activates it.
+
+    Returns:
+        Set of connection IDs that received the recommendation
+    """
+    from app.routers.grid_utility_ws import transformer_data_store
+    
+    connection_ids = connection_manager.get_connections_by_client_type("utility_dashboard")
+    for connection_id in connection_ids:
+        try:
+            client_id = connection_manager.get_client(connection_id)
+            if not client_id:
+                # Generate a default client ID if none exists
+                client_id = f"grid_client_{str(uuid.uuid4())[:8]}"
+                logger.info(f"No client ID found for connection {connection_id}, generating default: {client_id}")
+                connection_manager.set_client(connection_id, client_id)
+            
+            # Add alert to chat history as a "system" user message instead of using add_system_message
+            chat_history_manager.add_user_message(client_id, f"[SYSTEM ALERT] {alert_message}")
+            chat_history_manager.add_ai_message(client_id, agent_response)
+            transformer_data_store[client_id] = transformer_data
+            if recommendation is not None:
+                client_dfp_recommendations[client_id] = recommendation
+        except Exception as e:
+            logger.error(f"Error processing client {connection_id}: {str(e)}", exc_info=True)
+    
+    # Encode the recommendation once and queue the same frame for every dashboard
+    sent = connection_manager.send_to_client_type(
+        "utility_dashboard",
+        {
+            "type": "dfp_options_and_recommendation",
+            "status": "success",
+            "message": agent_response,
+            "transformer_data": transformer_data
+        }
+    )
+    logger.info(f"DFP recommendation sent to {len(sent)} utility dashboard clients")
+    return sent
+
+
+def prepared_dfp_recommendation(transformer_data: Dict[str, Any], recommendation: Dict[str, Any]) -> Tuple[str, Dict[str, Any]]:
+    """
+    Formats a prepared recommendation like the grid utility handler does.
+
+    Returns:
+        (text, the recommendation to store for each dashboard so "yes" activates it)
+    """
+    snapshot = dfp_options.current
+    current_load = f"{transformer_data['current_load_kwh']:.2f}"
+    load_percentage = f"{transformer_data['load_percentage']:.1f}"
+    stored = {
+        "option": recommendation["option"],
+        "transformer": {
+            "name": transformer_data["name"],
+            "id": transformer_data["display_id"],
+            "current_load": current_load,
+            "load_percentage": load_percentage,
+            "time_estimate": transformer_data["time_estimate"]
+        },
+        "dfp_version": recommendation["dfp_version"]
+    }
+    option_index = 1 if recommendation["option"].get("id") == "EDR" else 0
+    recommendation_text = format_dfp_recommendation(option_index, transformer_data["name"], current_load, load_percentage)
+    text = f"## ⚠️ Grid Stress Alert for {transformer_data['name']} [{transformer_data['display_id']}]\n\n{snapshot.text.rstrip()}\n\n{recommendation_text}"
+    return text, stored
+
+
 async def broadcast_grid_alert(alert_message: str, transformer_data: Dict[str, Any]) -> Set[str]:
     """
-    Broadcasts a grid alert to all connected WebSocket clients.
+    Broadcasts a grid alert to all connected utility dashboard clients.
+
+    Households fed by the transformer get a short notice through their
+    transformer topic.
     
     Returns:
-        Set of connection IDs that received the alert
+        Set of connection IDs of the dashboards that received the alert
     """
-    # Get all client connections
-    client_connections = connection_manager.get_all_connections()
+    transformer_id = transformer_data.get("transformer_id")
+    if transformer_id is not None:
+        notified = connection_manager.send_to_topic(
+            topic("transformer", transformer_id),
+            {
+                "type": "transformer_alert",
+                "status": "success",
+                "message": TRANSFORMER_NOTICE_TEXT,
+                "transformer_id": transformer_id,
+                "time_estimate": transformer_data.get("time_estimate"),
+                "timestamp": datetime.now().isoformat()
+            }
+        )
+        logger.info(f"Transformer notice sent to {len(notified)} households on transformer {transformer_id}")
     
-    if not client_connections:
-        logger.warning("No connected clients to broadcast alert to")
+    # Only utility dashboards receive the full transformer stress alert
+    if not connection_manager.get_connections_by_client_type("utility_dashboard"):
+        logger.warning("No connected utility dashboards to broadcast alert to")
         return set()
     
     # Prepare the message with status "success"
@@ -282,22 +586,8 @@ async def broadcast_grid_alert(alert_message: str, transformer_data: Dict[str, A
         "timestamp": datetime.now().isoformat()
     }
     
-    # Track successful sends
-    successful_connections = set()
-    
-    # Broadcast to all clients, but only to utility dashboard clients
-    for connection_id in client_connections:
-        # Check client type
-        client_type = connection_manager.get_client_type(connection_id)
-        
-        # Only send to utility dashboard clients
-        if client_type == "utility_dashboard":
-            logger.info(f"Sending grid alert to utility dashboard client: {connection_id}")
-            success = await connection_manager.send_message(connection_id, message)
-            if success:
-                successful_connections.add(connection_id)
-        else:
-            logger.info(f"Skipping grid alert for non-utility client (type: {client_type}): {connection_id}")
+    # Encode the alert once and queue the same frame for every dashboard
+    successful_connections = connection_manager.send_to_client_type("utility_dashboard", message)
     
     logger.info(f"Grid alert broadcasted to {len(successful_connections)} utility dashboard clients")
     
@@ -322,11 +612,14 @@ async def get_agent_dfp_recommendation(client_id: str, transformer_data: Dict[st
         orchestrator = ClientOrchestrator.get_instance(client_id)
         
         # Create a prompt for the agent
+        if transformer_data.get("time_estimate") is not None:
+            breach_text = f"capacity breach is likely in {transformer_data['time_estimate']} minutes"
+        else:
+            breach_text = "the time to a capacity breach could not be estimated"
         prompt = (
             f"A grid stress alert has been detected for transformer {transformer_data['name']} "
             f"[{transformer_data['display_id']}]. The current load is {transformer_data['current_load_kwh']:.2f} kWh "
-            f"({transformer_data['load_percentage']:.1f}% of capacity), and capacity breach is likely in "
-            f"{transformer_data['time_estimate']} minutes.\n\n"
+            f"({transformer_data['load_percentage']:.1f}% of capacity), and {breach_text}.\n\n"
             f"Please use the dfp_search tool to get available Demand Flexibility Program (DFP) options. "
             f"Then analyze the options and recommend the best one for this specific situation. "
             f"Format your response as follows:\n\n"
@@ -384,48 +677,40 @@ async def get_agent_dfp_recommendation(client_id: str, transformer_data: Dict[st
         return get_fallback_dfp_recommendation(transformer_data)
 
 
+# Why each built-in option suits a stressed transformer, used in fallback recommendations
+FALLBACK_DFP_REASONS = {
+    "DDR": "which requires a rapid but moderate response. DDR is ideal for this scenario as it can be quickly activated and provides immediate relief without excessive disruption.",
+    "EDR": "which requires a significant and immediate response. EDR is designed for critical situations like this and can provide the necessary load reduction quickly.",
+}
+
+
 def get_fallback_dfp_recommendation(transformer_data: Dict[str, Any]) -> str:
     """
-    Get a fallback DFP recommendation with random selection between options.
+    Get a fallback DFP recommendation with random selection between the
+    options in the current DFP snapshot. Never calls the DFP API.
     
     Args:
         transformer_data: Data about the transformer with stress
         
     Returns:
-        A hardcoded DFP recommendation
+        A DFP recommendation built from the current options
     """
-    logger.info("Using fallback DFP recommendation")
+    snapshot = dfp_options.current
+    logger.info(f"Using fallback DFP recommendation from DFP options version {snapshot.version}")
     
     # Randomly select which DFP option to recommend
-    recommended_option = random.choice(["DDR", "EDR"])
+    option_number, option = random.choice(list(enumerate(snapshot.options, 1)))
+    option_name = f"{option.get('name', 'Unknown')} ({option.get('id', 'Unknown')})"
+    reason = FALLBACK_DFP_REASONS.get(option.get("id"), "which requires a prompt reduction in demand.")
+    recommendation_text = f"I recommend Option {option_number} – {option_name} for immediate grid relief. The current situation at {transformer_data['name']} shows a load of {transformer_data['current_load_kwh']:.2f} kWh ({transformer_data['load_percentage']:.1f}% of capacity), {reason}"
     
-    if recommended_option == "DDR":
-        recommendation_text = f"I recommend Option 1 – Dynamic Demand Response (DDR) for immediate grid relief. The current situation at {transformer_data['name']} shows a load of {transformer_data['current_load_kwh']:.2f} kWh ({transformer_data['load_percentage']:.1f}% of capacity), which requires a rapid but moderate response. DDR is ideal for this scenario as it can be quickly activated and provides immediate relief without excessive disruption."
-        option_number = "1"
-        option_name = "Dynamic Demand Response (DDR)"
-    else:
-        recommendation_text = f"I recommend Option 2 – Emergency Demand Reduction (EDR) for immediate grid relief. The current situation at {transformer_data['name']} shows a load of {transformer_data['current_load_kwh']:.2f} kWh ({transformer_data['load_percentage']:.1f}% of capacity), which requires a significant and immediate response. EDR is designed for critical situations like this and can provide the necessary load reduction quickly."
-        option_number = "2"
-        option_name = "Emergency Demand Reduction (EDR)"
-    
-    return f"""Based on the grid stress alert for {transformer_data['name']} [{transformer_data['display_id']}], here are the available Demand Flexibility Program (DFP) options:
-
-Option 1: Dynamic Demand Response (DDR)
-Dynamic Demand Response (DDR) rewards participants who can rapidly shift or curtail electricity usage during frequent, short-notice events. Participants receive moderately high per-event compensation due to their ability to reliably and promptly adjust energy consumption patterns, significantly aiding grid stability and renewable energy integration.
-Reward: $3–4.5 per kWh shifted
-Bonus: 15% extra if >90% compliance monthly
-Penalty: 15% reduction in incentives if compliance <75%
-Category: Residential
-Minimum Load: 5 kW
-
-Option 2: Emergency Demand Reduction (EDR)
-Emergency Demand Reduction (EDR) is designed for consumers who can rapidly curtail significant energy use during critical, rare grid emergencies. These are infrequent but urgent events requiring immediate action. Participants are compensated significantly for availability but face substantial penalties for non-compliance due to critical grid dependence.
-Reward: $250/year per kW available
-Bonus: $10.00 per kWh curtailed during events
-Penalty: 50% annual availability fee reduction per missed event
-Category: Residential
-Minimum Load: 5 kW
+    return f"""Based on the grid stress alert for {transformer_data['name']} [{transformer_data['display_id']}]:
+
+{snapshot.text.rstrip()}
 
 🔎{recommendation_text}
 
-Would you like to proceed with activating the {option_name} program?""" 
\ No newline at end of file
+Would you like to proceed with activating the {option_name} program?"""
+
+
+breach_scanner.on_alert(raise_forecast_alert)
@@ -5,17 +5,19 @@ import json
 import uuid
 import asyncio
 import random
-from app.core.websocket_manager import connection_manager
+from app.core.websocket_manager import connection_manager, StreamOptions
+from app.core.lifecycle import lifecycle
 from app.core.orchestrator import ClientOrchestrator
 from app.core.history_manager import chat_history_manager
+from app.core.shared_state import shared_state
 from app.utils.model_warmer import warm_up_model
 
 logger = logging.getLogger(__name__)
 
 router = APIRouter(tags=["grid_utility"])
 
-# Add a dictionary to store transformer data for each client
-transformer_data_store: Dict[str, Dict[str, Any]] = {}
+# Store transformer data for each client (shared across workers)
+transformer_data_store = shared_state.namespace("transformer_data_store")
 
 @router.websocket("/grid-utility/ws")
 async def grid_utility_websocket_endpoint(websocket: WebSocket, background_tasks: BackgroundTasks):
@@ -23,13 +25,20 @@ async def grid_utility_websocket_endpoint(websocket: WebSocket, background_tasks
     WebSocket endpoint for grid-utility chat.
     No authentication required.
     """
+    if not lifecycle.accepting:
+        # Draining for a restart; the client retries after its backoff
+        await websocket.close(code=1013)
+        return
+    
     connection_id = None
     try:
         # Start model warming in the background
         background_tasks.add_task(warm_up_model)
         
         # Let the connection manager accept the connection
-        connection_id = await connection_manager.connect(websocket)
+        connection_id = await connection_manager.connect(
+            websocket, StreamOptions.from_websocket(websocket, connection_manager.config)
+        )
         
         # Generate a unique client_id for this connection if needed
         default_client_id = f"grid_client_{str(uuid.uuid4())[:8]}"
@@ -49,18 +58,25 @@ async def grid_utility_websocket_endpoint(websocket: WebSocket, background_tasks
                 "status": "connected",
                 "connection_id": connection_id,
                 "client_id": default_client_id,  # Include client ID in the response
-                "message": "Grid-Utility connection established. Model warming up in background."
+                "message": "Grid-Utility connection established. Model warming up in background.",
+                "stream": connection_manager.get_stream_options(connection_id)
             }
         )
         
         while True:
             # Receive message from client
             data = await websocket.receive_text()
+            connection_manager.touch(connection_id)
             
             try:
                 # Parse message
                 message_data = json.loads(data)
                 
+                # Heartbeat replies carry no query
+                if message_data.get("type") == "pong":
+                    connection_manager.record_pong(connection_id, message_data.get("ping_id"))
+                    continue
+                
                 # Extract client_id and query
                 client_id = message_data.get("client_id", default_client_id)
                 query = message_data.get("query")
@@ -76,11 +92,13 @@ async def grid_utility_websocket_endpoint(websocket: WebSocket, background_tasks
                 connection_manager.set_client(connection_id, client_id)
                 
                 # Check if this is a DFP activation request
-                if query.lower().strip() in ["yes", "yes, proceed", "proceed", "activate", "yes, activate"]:
-                    await handle_dfp_activation(connection_id, client_id, query)
-                else:
-                    # Process the query directly without authentication
-                    await process_grid_utility_query(connection_id, client_id, query)
+                # Draining waits for queries in flight
+                async with lifecycle.track_query():
+                    if query.lower().strip() in ["yes", "yes, proceed", "proceed", "activate", "yes, activate"]:
+                        await handle_dfp_activation(connection_id, client_id, query)
+                    else:
+                        # Process the query directly without authentication
+                        await process_grid_utility_query(connection_id, client_id, query)
                 
             except json.JSONDecodeError:
                 await connection_manager.send_message(
@@ -95,7 +113,7 @@ async def grid_utility_websocket_endpoint(websocket: WebSocket, background_tasks
                 )
     
     except WebSocketDisconnect:
-        connection_manager.disconnect(connection_id)
+        await connection_manager.disconnect(connection_id)
 
 
 async def process_grid_utility_query(connection_id: str, client_id: str, query: str):
@@ -0,0 +1,94 @@
+from fastapi import APIRouter
+from app.core.websocket_manager import connection_manager
+from app.core.http_client import http_clients
+from app.core import beckn_callbacks, beckn_projection, catalog_cache, subscription_meters
+from app.core.shared_state import shared_state
+from app.core.transaction_store import transaction_store
+from app.core.der_dispatch import der_dispatcher
+from app.core.telemetry import telemetry_store
+from app.core.breach_forecast import breach_forecaster
+from app.core.breach_scanner import breach_scanner
+from app.tools.specific_tools.grid_tools.dfp_search import dfp_options
+
+router = APIRouter(prefix="/metrics", tags=["metrics"])
+
+
+@router.get("/websockets")
+async def websocket_metrics():
+    """
+    Per-connection outbound queue depth and send latency
+    """
+    return connection_manager.get_metrics()
+
+
+@router.get("/upstreams")
+async def upstream_metrics():
+    """
+    Per-host outbound HTTP counters, circuit breaker state and bulkhead usage
+    """
+    return http_clients.get_metrics()
+
+
+@router.get("/caches")
+async def cache_metrics():
+    """
+    Age, hit counts and refresh outcomes of the catalog caches, the DFP
+    options snapshot, the subscription to meter mapping and the shared
+    state read cache
+    """
+    return {
+        **catalog_cache.get_metrics(),
+        "dfp_options": dfp_options.snapshot(),
+        "subscription_meters": subscription_meters.get_metrics(),
+        "shared_state": shared_state.cache_info(),
+    }
+
+
+@router.get("/checkouts")
+async def checkout_metrics():
+    """
+    Open Beckn transactions and composite checkout counts and latency
+    """
+    return transaction_store.get_metrics()
+
+
+@router.get("/beckn-callbacks")
+async def beckn_callback_metrics():
+    """
+    Beckn requests waiting for on_* callbacks, and callbacks delivered, unmatched or timed out
+    """
+    return beckn_callbacks.correlator.get_metrics()
+
+
+@router.get("/beckn-projection")
+async def beckn_projection_metrics():
+    """
+    Estimated tokens of Beckn tool observations before and after projection
+    """
+    return beckn_projection.get_metrics()
+
+
+@router.get("/der-dispatch")
+async def der_dispatch_metrics():
+    """
+    DER switch-off throughput, batch and acknowledgement latency, and dispatches in progress
+    """
+    return der_dispatcher.get_metrics()
+
+
+@router.get("/telemetry")
+async def telemetry_metrics():
+    """
+    Transformers with load time series, samples accepted and dropped, buffer
+    memory, and the duration of breach forecast ticks
+    """
+    return {**telemetry_store.get_metrics(), "breach_forecast": breach_forecaster.get_metrics()}
+
+
+@router.get("/breach-scanner")
+async def breach_scanner_metrics():
+    """
+    Alerts raised from the breach forecast, their lead time, recommendations
+    prepared and DFP option prefetches
+    """
+    return breach_scanner.get_metrics()
@@ -0,0 +1,91 @@
+from fastapi import APIRouter, HTTPException
+from typing import Any, Dict
+import logging
+from app.core.shared_state import shared_state
+from app.core.breach_forecast import breach_forecaster
+from app.core.telemetry import sample_time, telemetry_store
+from app.models.telemetry import LoadSamples
+
+logger = logging.getLogger(__name__)
+
+router = APIRouter(prefix="/telemetry", tags=["telemetry"])
+
+# Pub/sub channel that copies ingested samples to every worker's store
+LOAD_SAMPLES_CHANNEL = "telemetry.transformer_load"
+
+
+@router.post("/transformer-load")
+async def ingest_transformer_load(request: LoadSamples):
+    """
+    Ingests transformer load samples. Samples not newer than the
+    transformer's last one, or with a NaN or infinite load, are dropped.
+    """
+    try:
+        samples = [
+            (sample.transformer_id, sample_time(sample.timestamp), sample.load_kw, sample.max_capacity_kw)
+            for sample in request.samples
+        ]
+    except ValueError as e:
+        raise HTTPException(status_code=400, detail=f"Invalid timestamp: {e}")
+
+    accepted = telemetry_store.ingest(samples)
+
+    # Keep the stores of the other workers in step
+    await shared_state.publish(LOAD_SAMPLES_CHANNEL, {"samples": samples})
+
+    return {"status": "success", "accepted": accepted, "dropped": len(samples) - accepted}
+
+
+@router.get("/transformers")
+async def transformer_load_stats():
+    """
+    Rolling load statistics (EWMA, slope, peak) of every transformer
+    """
+    return telemetry_store.all_stats()
+
+
+@router.get("/transformers/{transformer_id}")
+async def transformer_load(transformer_id: str, include_samples: bool = False):
+    """
+    Rolling load statistics of one transformer, optionally with its buffered samples
+    """
+    stats = telemetry_store.stats(transformer_id)
+    if stats is None:
+        raise HTTPException(status_code=404, detail="No load samples for this transformer")
+    if include_samples:
+        timestamps, loads = telemetry_store.series(transformer_id)
+        stats["series"] = {"timestamps": timestamps.tolist(), "load_kw": loads.tolist()}
+    return stats
+
+
+@router.get("/breach-forecast")
+async def breach_forecast(within_minutes: float = 60):
+    """
+    Transformers forecast to breach capacity within the given minutes,
+    soonest first, from the latest scheduled forecast
+    """
+    current = breach_forecaster.current
+    if current is None:
+        return {"forecast": None, "at_risk": []}
+    return {"forecast": current.snapshot(), "at_risk": current.at_risk(within_minutes)}
+
+
+@router.get("/transformers/{transformer_id}/breach-forecast")
+async def transformer_breach_forecast(transformer_id: str):
+    """
+    Time to a capacity breach of one transformer, with its confidence band
+    """
+    forecast = breach_forecaster.forecast_one(transformer_id)
+    if forecast is None:
+        raise HTTPException(status_code=404, detail="Not enough load samples or no known capacity for this transformer")
+    return forecast
+
+
+async def _on_load_samples(message: Dict[str, Any], origin: str):
+    """Adds samples ingested by another worker."""
+    if origin == shared_state.worker_id:
+        return
+    telemetry_store.ingest(tuple(sample) for sample in message["samples"])
+
+
+shared_state.subscribe(LOAD_SAMPLES_CHANNEL, _on_load_samples)
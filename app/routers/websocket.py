@@ -2,17 +2,22 @@ from fastapi import APIRouter, WebSocket, WebSocketDisconnect, BackgroundTasks
 from typing import Dict, Any, Optional
 import logging
 import json
-from app.core.websocket_manager import connection_manager
+from app.core.websocket_manager import connection_manager, topic, StreamOptions
+from app.core.lifecycle import lifecycle
 from app.core.orchestrator import ClientOrchestrator
 from app.core.history_manager import chat_history_manager
-from app.core.auth import authenticate_user, is_authenticated, get_user_data
-from app.core.meter_validator import validate_meter_id
+from app.core.auth import authenticate_user, is_authenticated, get_user_data, get_meter_id
+from app.core.meter_validator import validate_meter_id, get_cached_meter_data
 from app.core.otp_service import otp_service
+from app.core.shared_state import shared_state
+from app.core.der_inventory import der_inventory
+from app.core.der_dispatch import der_dispatcher
+from app.core import subscription_meters
+from app.core.http_client import http_clients
 from app.models.chat import ChatRequest, ChatResponse
 from app.utils.model_warmer import warm_up_model
 import asyncio
 import uuid
-import requests
 import os
 
 from dotenv import load_dotenv
@@ -24,24 +29,53 @@ logger = logging.getLogger(__name__)
 
 router = APIRouter(tags=["websocket"])
 
-# Add a dictionary to store the state of conversations
-dfp_conversation_state = {}
+# Store the state of conversations (shared across workers)
+dfp_conversation_state = shared_state.namespace("dfp_conversation_state")
 
-# Add a dictionary to store DER IDs for each client
-client_der_ids = {}  # client_id -> list of DER IDs
+# Store DER IDs for each client (shared across workers)
+client_der_ids = shared_state.namespace("client_der_ids")  # client_id -> list of DER IDs
+
+def subscribe_grid_topics(connection_id: str, meter_data: Optional[Dict[str, Any]]):
+    """
+    Subscribes a consumer connection to the transformer and substation its
+    meter is fed from, so alerts for that part of the grid reach it directly.
+    """
+    if not isinstance(meter_data, dict):
+        return
+
+    transformer = meter_data.get("transformer")
+    if isinstance(transformer, dict):
+        transformer_id = transformer.get("id")
+        substation = transformer.get("substation") or meter_data.get("substation")
+    else:
+        transformer_id = transformer if transformer is not None else meter_data.get("transformer_id")
+        substation = meter_data.get("substation")
+    substation_id = substation.get("id") if isinstance(substation, dict) else substation
+
+    if transformer_id is not None:
+        connection_manager.subscribe(connection_id, topic("transformer", transformer_id))
+    if substation_id is not None:
+        connection_manager.subscribe(connection_id, topic("substation", substation_id))
 
 @router.websocket("/ws")
 async def websocket_endpoint(websocket: WebSocket, background_tasks: BackgroundTasks):
     """
     WebSocket endpoint for real-time chat.
     """
+    if not lifecycle.accepting:
+        # Draining for a restart; the client retries after its backoff
+        await websocket.close(code=1013)
+        return
+    
     connection_id = None
     try:
         # Start model warming in the background
         background_tasks.add_task(warm_up_model)
         
         # Let the connection manager accept the connection
-        connection_id = await connection_manager.connect(websocket)
+        connection_id = await connection_manager.connect(
+            websocket, StreamOptions.from_websocket(websocket, connection_manager.config)
+        )
         
         # Set client type to residential_user
         connection_manager.set_client_type(connection_id, "residential_user")
@@ -57,18 +91,30 @@ async def websocket_endpoint(websocket: WebSocket, background_tasks: BackgroundT
             {
                 "status": "connected",
                 "connection_id": connection_id,
-                "message": "Connection established. Model warming up in background."
+                "message": "Connection established. Model warming up in background.",
+                "stream": connection_manager.get_stream_options(connection_id)
             }
         )
         
         while True:
             # Receive message from client
             data = await websocket.receive_text()
+            connection_manager.touch(connection_id)
             
             try:
                 # Parse message
                 message_data = json.loads(data)
                 
+                # Heartbeat replies carry no query
+                if message_data.get("type") == "pong":
+                    connection_manager.record_pong(connection_id, message_data.get("ping_id"))
+                    continue
+                
+                # Reconnecting client picking up where it left off
+                if message_data.get("type") == "resume":
+                    await handle_resume(connection_id, message_data)
+                    continue
+                
                 # Extract client_id and query
                 client_id = message_data.get("client_id", default_client_id)
                 query = message_data.get("query")
@@ -89,12 +135,14 @@ async def websocket_endpoint(websocket: WebSocket, background_tasks: BackgroundT
                 # Check authentication
                 token = connection_manager.get_token(connection_id)
                 
-                if not token or not is_authenticated(token):
-                    # Process authentication flow
-                    await process_authentication(connection_id, client_id, query, history)
-                else:
-                    # User is authenticated, process the query
-                    await process_authenticated_query(connection_id, client_id, query, token)
+                # Draining waits for queries in flight
+                async with lifecycle.track_query():
+                    if not token or not is_authenticated(token):
+                        # Process authentication flow
+                        await process_authentication(connection_id, client_id, query, history)
+                    else:
+                        # User is authenticated, process the query
+                        await process_authenticated_query(connection_id, client_id, query, token)
                 
             except json.JSONDecodeError:
                 await connection_manager.send_message(
@@ -109,7 +157,42 @@ async def websocket_endpoint(websocket: WebSocket, background_tasks: BackgroundT
                 )
     
     except WebSocketDisconnect:
-        connection_manager.disconnect(connection_id)
+        await connection_manager.disconnect(connection_id)
+
+
+async def handle_resume(connection_id: str, message_data: Dict[str, Any]):
+    """
+    Resumes a client session on a new connection without re-authentication.
+
+    The client sends its client_id, session token and the last seq it
+    received; the frames it missed are replayed in one "replay" frame.
+    """
+    client_id = message_data.get("client_id")
+    token = message_data.get("token")
+    try:
+        last_seq = int(message_data.get("last_seq", 0))
+    except (TypeError, ValueError):
+        last_seq = -1
+
+    meter_id = get_meter_id(token) if token else None
+    if not client_id or last_seq < 0 or not meter_id or not connection_manager.can_resume(client_id, meter_id):
+        logger.warning(f"Rejected resume for client {client_id} on connection {connection_id}")
+        await connection_manager.send_message(
+            connection_id,
+            {
+                "type": "resume_failed",
+                "status": "error",
+                "client_id": client_id,
+                "message": "Session could not be resumed. Please sign in again with a new client_id."
+            }
+        )
+        return
+
+    # Restore what the old connection carried
+    connection_manager.set_token(connection_id, token)
+    connection_manager.set_meter_id(connection_id, meter_id)
+    subscribe_grid_topics(connection_id, get_cached_meter_data(meter_id))
+    connection_manager.resume(connection_id, client_id, last_seq)
 
 
 async def process_authentication(connection_id: str, client_id: str, query: str, history):
@@ -144,6 +227,10 @@ async def process_authentication(connection_id: str, client_id: str, query: str,
                     # Store token with connection
                     connection_manager.set_token(connection_id, token)
                     
+                    # Warm the DER inventory so a DFP participation reply
+                    # can be computed from memory
+                    der_inventory.prefetch(meter_id)
+                    
                     # Send success response
                     await connection_manager.send_message(
                         connection_id,
@@ -188,6 +275,7 @@ async def process_authentication(connection_id: str, client_id: str, query: str,
             
             # Associate meter ID with connection in connection manager
             connection_manager.set_meter_id(connection_id, query)
+            subscribe_grid_topics(connection_id, meter_data)
             
             # Generate OTP
             otp = otp_service.generate_otp(query)
@@ -364,19 +452,14 @@ async def handle_dfp_participation(connection_id: str, client_id: str, query: st
     has_der_data = False
     
     if meter_id:
-        logger.info(f"Fetching DER data for meter ID: {meter_id}")
+        logger.info(f"Getting DER data for meter ID: {meter_id}")
         
-        # Make API call to get DER data
+        # Served from the inventory prefetched at login; only fetched here
+        # if the prefetch has not completed
         try:
-            url = f"https://playground.becknprotocol.io/meter-data-simulator/der/{meter_id}"
-            headers = {'Content-Type': 'application/json'}
-            
-            response = requests.get(url, headers=headers)
+            der_data = await der_inventory.get(meter_id)
             
-            if response.status_code == 200:
-                der_data = response.json()
-                logger.info(f"DER data for meter ID {meter_id}: {der_data}")
-                
+            if der_data is not None:
                 # Process the DER data
                 if der_data and isinstance(der_data, list):
                     # Filter for devices that are switched on and have significant power
@@ -416,9 +499,9 @@ async def handle_dfp_participation(connection_id: str, client_id: str, query: st
                         client_der_ids[client_id] = top_der_ids
                         logger.info(f"Stored DER IDs for client {client_id}: {client_der_ids[client_id]}")
             else:
-                logger.error(f"Failed to fetch DER data: {response.status_code} - {response.text}")
+                logger.error(f"No DER data available for meter ID {meter_id}")
         except Exception as e:
-            logger.error(f"Error fetching DER data: {str(e)}")
+            logger.error(f"Error getting DER data: {str(e)}")
     else:
         logger.warning(f"No meter ID found for connection {connection_id}")
     
@@ -494,9 +577,6 @@ async def handle_control_permission(connection_id: str, client_id: str, query: s
         }
     )
     
-    # Add a delay to simulate processing time
-    await asyncio.sleep(2)
-    
     # Make the API call to record consent
     try:
         # Use the client_id as the meter_id for now
@@ -516,7 +596,7 @@ async def handle_control_permission(connection_id: str, client_id: str, query: s
         logger.info(f"Making API call to record consent: {payload}")
         
         # Make the API call
-        response = requests.post(
+        response = await http_clients.post(
             api_url,
             headers={"Content-Type": "application/json"},
             json=payload,
@@ -527,67 +607,28 @@ async def handle_control_permission(connection_id: str, client_id: str, query: s
         logger.info(f"API response status code: {response.status_code}")
         logger.info(f"API response: {response.text}")
 
+        # The household is now enrolled; alerts for the order must include it
+        await subscription_meters.invalidate(str(order_id))
 
-
-        # Get the DER IDs for this client
+        # Queue the switch-off of this household's devices; the dispatcher
+        # batches it with any other household's and tracks each device's ack
         der_ids = client_der_ids.get(client_id, [])
-
-        
-        # Make API call to activate DER schedules if we have DER IDs
+        dispatch = None
         if der_ids:
-            try:
-                # Prepare the API request for DER activation
-                der_api_url = f"https://playground.becknprotocol.io/meter-data-simulator/ders/switch-off"
-
-                der_response = requests.put(
-                    der_api_url,
-                    headers={"Content-Type": "application/json"},
-                    json={"der_ids": der_ids},
-                    timeout=10
-                )
-                
-                # Log the response
-                logger.info(f"DER switch off API response status code: {der_response.status_code}")
-                logger.info(f"DER switch off API response: {der_response.text}")
-                
-                # Check for success
-                if der_response.status_code != 200:
-                    logger.error(f"Failed to switch off DER for DER ID {der_ids}")
-                    raise Exception(f"DER switch off failed for ID {der_ids}")
-
-
-                
-                # Make an API call for each DER ID
-                # for der_id in der_ids:
-                #     der_payload = {
-                #         "itemId": str(der_id)  # Ensure DER ID is string
-                #     }
-                    
-                #     logger.info(f"Making API call to switch off DER for DER ID {der_id}")
-                    
-                #     # Make the API call
-                #     der_response = requests.put(
-                #         der_api_url,
-                #         headers={"Content-Type": "application/json"},
-                #         json=der_ids,
-                #         timeout=10
-                #     )
-                    
-                #     # Log the response
-                #     logger.info(f"DER switch off API response status code: {der_response.status_code}")
-                #     logger.info(f"DER switch off API response: {der_response.text}")
-                    
-                #     # Check for success
-                #     if der_response.status_code != 200:
-                #         logger.error(f"Failed to switch off DER for DER ID {der_id}")
-                #         raise Exception(f"DER switch off failed for ID {der_id}")
-                        
-            except Exception as e:
-                logger.error(f"Error switching off DER devices: {str(e)}", exc_info=True)
-                raise Exception("Failed to switch off one or more DER devices")
+            consumer_meter_id = connection_manager.get_meter_id_by_connection(connection_id) or str(meter_id)
+            dispatch = der_dispatcher.dispatch([(consumer_meter_id, der_ids)], event_id=str(order_id))
         else:
             logger.warning(f"No DER IDs found for client {client_id} during DER switch off")
 
+        # Only report the household as participating once its devices are off
+        if dispatch is not None:
+            try:
+                await dispatch.wait(timeout=30)
+            except asyncio.TimeoutError:
+                raise Exception(f"DER switch off not acknowledged in time for ID {der_ids}")
+            if dispatch.failed_ders():
+                logger.error(f"Failed to switch off DER for DER ID {dispatch.failed_ders()}")
+                raise Exception("Failed to switch off one or more DER devices")
 
         # Make API call to update order status
         try:
@@ -622,7 +663,7 @@ async def handle_control_permission(connection_id: str, client_id: str, query: s
             
             logger.info("Making API call to update order status")
             
-            update_response = requests.post(
+            update_response = await http_clients.post(
                 update_api_url,
                 headers={"Content-Type": "application/json"},
                 json=update_payload,
@@ -1,23 +1,18 @@
-import json
-import time
-import uuid
 import logging
-from typing import Any, Type, Dict, Optional, List, ClassVar, Tuple
+import os
+from typing import Any, Type, Dict, Optional
 
-import requests
 from langchain.tools import BaseTool
 from pydantic import BaseModel, Field
-from cachetools import TTLCache
+from app.core import beckn
+from app.core.beckn import BecknContext
+from app.core.dfp_options import DFPOptionsStore, FetchResult
 
 # Get the logger
 logger = logging.getLogger(__name__)
 
-# Create a cache with a TTL of 1 hour and a maximum size of 100 items
-# The key is a string (e.g., "dfp_options") and the value is any Python object
-cache = TTLCache(maxsize=100, ttl=3600)
-
-# Initialize the cache with default DFP options
-cache["dfp_options"] = [
+# Built-in DFP options, served until the first successful search
+DEFAULT_DFP_OPTIONS = [
     {
         "id": "DDR",
         "name": "Dynamic Demand Response",
@@ -40,11 +35,23 @@ cache["dfp_options"] = [
     }
 ]
 
-# Log the initial state of the cache
-logger.info("Initializing DFP options cache with default values")
-logger.info(f"Initial cache contains {len(cache['dfp_options'])} options")
-for i, option in enumerate(cache["dfp_options"]):
-    logger.info(f"Initial Option {i+1}: {option.get('name', 'Unknown')} ({option.get('id', 'Unknown')})")
+DEFAULT_DFP_OPTIONS_TEXT = """Here are the available Demand Flexibility Program (DFP) options:
+
+Option 1: Dynamic Demand Response (DDR)
+Dynamic Demand Response (DDR) rewards participants who can rapidly shift or curtail electricity usage during frequent, short-notice events. Participants receive moderately high per-event compensation due to their ability to reliably and promptly adjust energy consumption patterns, significantly aiding grid stability and renewable energy integration.
+Reward: $3–4.5 per kWh shifted
+Bonus: 15% extra if >90% compliance monthly
+Penalty: 15% reduction in incentives if compliance <75%
+Category: Residential
+Minimum Load: 5 kW
+
+Option 2: Emergency Demand Reduction (EDR)
+Emergency Demand Reduction (EDR) is designed for consumers who can rapidly curtail significant energy use during critical, rare grid emergencies. These are infrequent but urgent events requiring immediate action. Participants are compensated significantly for availability but face substantial penalties for non-compliance due to critical grid dependence.
+Reward: $250/year per kW available
+Bonus: $10.00 per kWh curtailed during events
+Penalty: 50% annual availability fee reduction per missed event
+Category: Residential
+Minimum Load: 5 kW"""
 
 # Constants for the DFP search API
 BASE_URL = "https://bap-ps-client-deg.becknprotocol.io/search"
@@ -57,6 +64,58 @@ CONTEXT_BAP_ID = "bap-ps-network-deg.becknprotocol.io"
 CONTEXT_BAP_URI = "https://bap-ps-network-deg.becknprotocol.io"
 CONTEXT_BPP_ID = "bpp-ps-network-deg.becknprotocol.io"
 CONTEXT_BPP_URI = "https://bpp-ps-network-deg.becknprotocol.io"
+# Prebuilt context and intent; only the ids and timestamp change per search
+DFP_SEARCH_CONTEXT = BecknContext(
+    CONTEXT_DOMAIN,
+    CONTEXT_ACTION,
+    country_code=CONTEXT_LOCATION_COUNTRY_CODE,
+    city_code=CONTEXT_LOCATION_CITY_CODE,
+    version=CONTEXT_VERSION,
+    bap_id=CONTEXT_BAP_ID,
+    bap_uri=CONTEXT_BAP_URI,
+    bpp_id=CONTEXT_BPP_ID,
+    bpp_uri=CONTEXT_BPP_URI,
+)
+DFP_SEARCH_MESSAGE = {
+    "intent": {
+        "provider": {
+            "descriptor": {
+                "name": "GridSmart Energy Solutions"
+            }
+        }
+    }
+}
+# Upper bound for a DFP search; the BAP aggregates BPP responses and can be slow
+DFP_API_TIMEOUT_SECONDS = 30
+# How often the background task checks the DFP catalog for changes
+DFP_REFRESH_INTERVAL_SECONDS = int(os.getenv("DFP_REFRESH_INTERVAL_SECONDS", "300"))
+
+
+async def _fetch_options(etag: Optional[str]) -> FetchResult:
+    """
+    Searches the DFP catalog, conditionally when the previous search
+    returned an ETag.
+
+    Returns:
+        None if the catalog is unchanged, otherwise (options, formatted text, ETag)
+    """
+    request = DFP_SEARCH_CONTEXT.request(DFP_SEARCH_MESSAGE)
+    headers = {"If-None-Match": etag} if etag else None
+    response = await beckn.send(BASE_URL, request, timeout=DFP_API_TIMEOUT_SECONDS, headers=headers)
+    if response.status_code == 304:
+        return None
+    if response.status_code != 200:
+        raise Exception(f"API call failed with status code {response.status_code}: {beckn.preview(response.content)}")
+
+    response_data = response.json()
+    options = DFPSearchTool._extract_raw_data(response_data)["options"]
+    return options, DFPSearchTool._format_dfp_api_response(response_data), response.headers.get("ETag")
+
+
+# Read by the tool, the grid utility handler and the alert fallback
+dfp_options = DFPOptionsStore(
+    _fetch_options, DEFAULT_DFP_OPTIONS, DEFAULT_DFP_OPTIONS_TEXT, DFP_REFRESH_INTERVAL_SECONDS
+)
 
 
 class DFPSearchInput(BaseModel):
@@ -78,133 +137,25 @@ class DFPSearchTool(BaseTool):
         Returns:
             The DFP options as a formatted string
         """
-        logger.info(f"DFPSearchTool running with query: {query}")
-        # logger.info(f"Before API call, cache contains {len(cache['dfp_options'])} options")
-        
-        try:
-            # Try to call the actual API
-            logger.info("Attempting to call DFP API...")
-            response, raw_data = self._call_dfp_api(query)
-            if response:
-                # Store the options in the cache
-                api_options = raw_data.get("options", [])
-                logger.info(f"API options: {api_options}")
-                if api_options:
-                    cache["dfp_options"] = api_options
-                    logger.info(f"API call successful, updated cache with {len(cache['dfp_options'])} options from API")
-                    for i, option in enumerate(cache["dfp_options"]):
-                        logger.info(f"Updated Option {i+1}: {option.get('name', 'Unknown')} ({option.get('id', 'Unknown')})")
-                else:
-                    logger.warning("API returned no options, keeping existing cache")
-                return response
-        except Exception as e:
-            logger.error(f"Error calling DFP API: {str(e)}", exc_info=True)
-            logger.info("Keeping existing cache due to API error")
-            # Fall back to hardcoded response
-        
-        # Return hardcoded response as fallback
-        logger.info("Using hardcoded fallback response")
-        logger.info(f"After API call (or error), cache contains {len(cache['dfp_options'])} options")
-        for i, option in enumerate(cache["dfp_options"]):
-            logger.info(f"Current Option {i+1}: {option.get('name', 'Unknown')} ({option.get('id', 'Unknown')})")
-        
-        # Return the formatted fallback response
-        fallback_response = """
-Here are the available Demand Flexibility Program (DFP) options:
-
-Option 1: Dynamic Demand Response (DDR)
-Dynamic Demand Response (DDR) rewards participants who can rapidly shift or curtail electricity usage during frequent, short-notice events. Participants receive moderately high per-event compensation due to their ability to reliably and promptly adjust energy consumption patterns, significantly aiding grid stability and renewable energy integration.
-Reward: $3–4.5 per kWh shifted
-Bonus: 15% extra if >90% compliance monthly
-Penalty: 15% reduction in incentives if compliance <75%
-Category: Residential
-Minimum Load: 5 kW
-
-Option 2: Emergency Demand Reduction (EDR)
-Emergency Demand Reduction (EDR) is designed for consumers who can rapidly curtail significant energy use during critical, rare grid emergencies. These are infrequent but urgent events requiring immediate action. Participants are compensated significantly for availability but face substantial penalties for non-compliance due to critical grid dependence.
-Reward: $250/year per kW available
-Bonus: $10.00 per kWh curtailed during events
-Penalty: 50% annual availability fee reduction per missed event
-Category: Residential
-Minimum Load: 5 kW
-"""
-        logger.info(f"Returning fallback response: {fallback_response[:100]}...")
-        return fallback_response.strip()
+        # Answered from the background-refreshed snapshot; never waits on the API
+        snapshot = dfp_options.current
+        logger.info(f"DFPSearchTool returning DFP options version {snapshot.version} for query: {query}")
+        return snapshot.text
     
-    def _call_dfp_api(self, query: str) -> Tuple[str, Dict[str, Any]]:
+    async def _arun(self, query: str) -> str:
         """
-        Call the DFP API to get DFP options.
+        Async version of _run.
         
         Args:
             query: The query to search for DFP options
             
         Returns:
-            A tuple of (formatted_response, raw_data)
+            The DFP options as a formatted string
         """
-        # Generate a transaction ID
-        transaction_id = str(uuid.uuid4())
-        message_id = str(uuid.uuid4())
-        current_timestamp = str(int(time.time()))
-        
-        # Prepare the payload
-        payload = {
-            "context": {
-                "domain": CONTEXT_DOMAIN,
-                "action": CONTEXT_ACTION,
-                "location": {
-                    "country": {
-                        "code": CONTEXT_LOCATION_COUNTRY_CODE
-                    },
-                    "city": {
-                        "code": CONTEXT_LOCATION_CITY_CODE
-                    }
-                },
-                "version": CONTEXT_VERSION,
-                "transaction_id": transaction_id,
-                "message_id": message_id,
-                "timestamp": current_timestamp,
-                "bap_id": CONTEXT_BAP_ID,
-                "bap_uri": CONTEXT_BAP_URI,
-                "bpp_id": CONTEXT_BPP_ID,
-                "bpp_uri": CONTEXT_BPP_URI
-            },
-            "message": {
-                "intent": {
-                    "provider": {
-                        "descriptor": {
-                            "name": "GridSmart Energy Solutions"
-                        }
-                    }
-                }
-            }
-        }
-        
-        logger.info(f"Sending API request to {BASE_URL} with payload: {json.dumps(payload)}")
-        
-        # Make the API call
-        response = requests.post(BASE_URL, json=payload)
-        
-        # Check if the call was successful
-        if response.status_code == 200:
-            # Parse the response
-            response_data = response.json()
-            logger.info(f"API response status code: 200")
-            logger.info(f"API response: {json.dumps(response_data)}")
-            
-            # Extract and structure the raw data for later use
-            raw_data = self._extract_raw_data(response_data)
-            # logger.info(f"Extracted raw data: {json.dumps(raw_data)}")
-            
-            # Format the response for the agent
-            formatted_response = self._format_dfp_api_response(response_data)
-            logger.info(f"Formatted response: {formatted_response[:200]}...")
-            
-            return formatted_response, raw_data
-        else:
-            logger.error(f"API call failed with status code {response.status_code}: {response.text}")
-            raise Exception(f"API call failed with status code {response.status_code}: {response.text}")
+        return self._run(query)
     
-    def _extract_raw_data(self, response_data: Dict[str, Any]) -> Dict[str, Any]:
+    @staticmethod
+    def _extract_raw_data(response_data: Dict[str, Any]) -> Dict[str, Any]:
         """
         Extract and structure the raw data from the API response for later use.
         
@@ -299,8 +250,6 @@ Minimum Load: 5 kW
                         "minimum_load": minimum_load,
                         "raw_item": item  # Store the raw item for complete data
                     })
-                    
-                    logger.info(f"Extracted option: {item_name}")
             
             logger.info(f"Extracted {len(options)} options from API response")
         except Exception as e:
@@ -308,7 +257,8 @@ Minimum Load: 5 kW
         
         return {"options": options}
     
-    def _format_dfp_api_response(self, response_data: Dict[str, Any]) -> str:
+    @staticmethod
+    def _format_dfp_api_response(response_data: Dict[str, Any]) -> str:
         """
         Format the DFP API response for the agent using Markdown.
         
@@ -402,15 +352,3 @@ Minimum Load: 5 kW
             logger.error(f"Error formatting DFP API response: {str(e)}", exc_info=True)
             # Return a generic message if formatting fails
             return "Error formatting DFP options. Please try again."
-    
-    async def _arun(self, query: str) -> str:
-        """
-        Async version of _run.
-        
-        Args:
-            query: The query to search for DFP options
-            
-        Returns:
-            The DFP options
-        """
-        return self._run(query) 
\ No newline at end of file
@@ -1,3 +1,5 @@
+from app.core.beckn import BecknContext
+
 # API Endpoint for retail search
 BASE_URL = "https://bap-ps-client-deg.becknprotocol.io/search"
 
@@ -33,3 +35,20 @@ CONFIRM_BASE_URL = "https://bap-ps-client-deg.becknprotocol.io/confirm"
 
 # Context action for confirm
 CONTEXT_ACTION_CONFIRM = "confirm"
+
+# Prebuilt Beckn contexts; only transaction_id, message_id and timestamp
+# are filled in per request
+SEARCH_CONTEXT = BecknContext(
+    CONTEXT_DOMAIN,
+    CONTEXT_ACTION,
+    country_code=CONTEXT_LOCATION_COUNTRY_CODE,
+    city_code=CONTEXT_LOCATION_CITY_CODE,
+    version=CONTEXT_VERSION,
+    bap_id=CONTEXT_BAP_ID,
+    bap_uri=CONTEXT_BAP_URI,
+    bpp_id=CONTEXT_BPP_ID,
+    bpp_uri=CONTEXT_BPP_URI,
+)
+SELECT_CONTEXT = SEARCH_CONTEXT.with_action(CONTEXT_ACTION_SELECT)
+INIT_CONTEXT = SEARCH_CONTEXT.with_action(CONTEXT_ACTION_INIT)
+CONFIRM_CONTEXT = SEARCH_CONTEXT.with_action(CONTEXT_ACTION_CONFIRM)
@@ -0,0 +1,179 @@
+import json
+import time
+from typing import Any, Dict, Optional, Tuple, Type
+
+import httpx
+from langchain.tools import BaseTool
+from pydantic import BaseModel, Field
+
+from app.config.settings import settings
+from app.core import beckn, beckn_callbacks
+from app.core.transaction_store import transaction_store
+
+# Assuming constants.py is in the same directory (package)
+from . import constants
+from .retail_confirm import CustomerDetails, SolarRetailConfirmTool
+from .retail_init import SolarRetailInitTool
+from .retail_select import SolarRetailSelectTool
+
+# Beckn steps run by one checkout; each used to be a separate agent iteration
+CHECKOUT_STEPS = ("select", "init", "confirm")
+STEP_URLS = {
+    "select": constants.SELECT_BASE_URL,
+    "init": constants.INIT_BASE_URL,
+    "confirm": constants.CONFIRM_BASE_URL,
+}
+STEP_CONTEXTS = {
+    "select": constants.SELECT_CONTEXT,
+    "init": constants.INIT_CONTEXT,
+    "confirm": constants.CONFIRM_CONTEXT,
+}
+
+_select_tool = SolarRetailSelectTool()
+_init_tool = SolarRetailInitTool()
+_confirm_tool = SolarRetailConfirmTool()
+
+
+def _order(action: str, body: Dict[str, Any]) -> Dict[str, Any]:
+    """Gets the order from a BAP client response body."""
+    responses = body.get("responses") or []
+    if not responses:
+        raise ValueError(f"no provider answered the {action} request")
+    return responses[0].get("message", {}).get("order", {})
+
+
+class SolarRetailCheckoutInput(BaseModel):
+    """Input for SolarRetailCheckoutTool."""
+
+    provider_id: str = Field(description="ID of the provider of the chosen item, from the search results")
+    item_id: str = Field(description="ID of the chosen item, from the search results")
+    customer: CustomerDetails = Field(description="Details of the customer placing the order")
+
+
+class SolarRetailCheckoutTool(BaseTool):
+    name: str = "solar_retail_checkout"
+    description: str = (
+        "Buys a solar retail item in one step: runs select, init and confirm on the Beckn network "
+        "and keeps the transaction, fulfillment and order IDs server-side. "
+        "Requires the provider_id and item_id from the search results and the customer's name, phone and email. "
+        "Returns a short order summary."
+    )
+    args_schema: Type[BaseModel] = SolarRetailCheckoutInput
+
+    def _request(
+        self, action: str, transaction_id: str, context: Optional[beckn.BecknContext] = None
+    ) -> Tuple[str, beckn.BecknRequest]:
+        """Builds the request for one step from the ids stored so far."""
+        transaction = transaction_store.get(transaction_id)
+        provider_id, item_id = transaction["provider_id"], transaction["item_id"]
+        if action == "select":
+            request = _select_tool._build_request(provider_id, item_id, transaction_id, context)
+        elif action == "init":
+            request = _init_tool._build_request(provider_id, item_id, transaction_id, context)
+        else:
+            fulfillment = {"id": transaction["fulfillment_id"], "customer": transaction["customer"]}
+            request = _confirm_tool._build_request(provider_id, item_id, transaction_id, [fulfillment], context)
+        return STEP_URLS[action], request
+
+    def _send_sync(self, action: str, transaction_id: str) -> Dict[str, Any]:
+        url, request = self._request(action, transaction_id)
+        response = beckn.send_sync(url, request, timeout=30)
+        response.raise_for_status()
+        return response.json()
+
+    async def _send(self, action: str, transaction_id: str) -> Dict[str, Any]:
+        """Runs one step, through on_* callbacks when they are enabled."""
+        if beckn_callbacks.enabled():
+            context = beckn_callbacks.callback_context(STEP_CONTEXTS[action])
+            _, request = self._request(action, transaction_id, context)
+            call = await beckn_callbacks.request(request, settings.beckn.callback_timeout_seconds, expected=1)
+            return {"responses": [await call.first()]}
+        url, request = self._request(action, transaction_id)
+        response = await beckn.send(url, request, timeout=30)
+        response.raise_for_status()
+        return response.json()
+
+    def _advance(self, action: str, transaction_id: str, body: Dict[str, Any], elapsed: float) -> Dict[str, Any]:
+        """Stores what a step returned and the ids the next step needs."""
+        order = _order(action, body)
+        transaction_store.save_payload(transaction_id, action, json.dumps(body))
+        transaction = transaction_store.get(transaction_id)
+        fields: Dict[str, Any] = {
+            "stage": action,
+            "timings_ms": {**transaction.get("timings_ms", {}), action: round(elapsed * 1000)},
+        }
+        fulfillments = order.get("fulfillments") or []
+        if fulfillments and fulfillments[0].get("id"):
+            fields["fulfillment_id"] = fulfillments[0]["id"]
+        elif action == "init" and not transaction.get("fulfillment_id"):
+            raise ValueError("the provider returned no fulfillment for the order")
+        if order.get("quote"):
+            fields["quote"] = order["quote"]
+        if action == "confirm":
+            fields["order_id"] = order.get("id")
+            fields["status"] = order.get("status") or (
+                (fulfillments[0].get("state") or {}).get("descriptor", {}).get("code") if fulfillments else None
+            )
+        if order.get("items"):
+            fields["item_name"] = order["items"][0].get("descriptor", {}).get("name")
+        return transaction_store.update(transaction_id, **fields)
+
+    def _begin(self, provider_id: str, item_id: str, customer: Any) -> str:
+        if isinstance(customer, BaseModel):
+            customer = customer.model_dump()
+        return transaction_store.begin(
+            constants.CONTEXT_DOMAIN, provider_id=provider_id, item_id=item_id, customer=customer
+        )
+
+    def _fail(self, transaction_id: str, elapsed: float, action: str, error: Exception) -> str:
+        """Records a failed step and reports it to the agent."""
+        transaction_store.record_checkout(elapsed, False)
+        transaction_store.update(transaction_id, stage=f"{action}_failed", error=str(error))
+        if isinstance(error, httpx.HTTPError):
+            return f"Error calling Beckn {action} API during checkout: {error}. Transaction ID: {transaction_id}"
+        return f"Checkout failed at the {action} step: {error}. Transaction ID: {transaction_id}"
+
+    def _finish(self, transaction_id: str, elapsed: float) -> str:
+        """Records a completed checkout and summarizes the order for the agent."""
+        transaction_store.record_checkout(elapsed, True)
+        transaction = transaction_store.get(transaction_id)
+        price = (transaction.get("quote") or {}).get("price") or {}
+        timings = ", ".join(f"{action} {ms} ms" for action, ms in transaction["timings_ms"].items())
+        lines = [
+            "Order confirmed.",
+            f"Order ID: {transaction.get('order_id') or 'not provided'}",
+            f"Item: {transaction.get('item_name') or transaction['item_id']} from provider {transaction['provider_id']}",
+        ]
+        if price:
+            lines.append(f"Total: {price.get('value')} {price.get('currency', '')}".rstrip())
+        if transaction.get("status"):
+            lines.append(f"Status: {transaction['status']}")
+        lines.append(f"Transaction ID: {transaction_id}")
+        lines.append(f"Checkout took {elapsed * 1000:.0f} ms ({timings}).")
+        return "\n".join(lines)
+
+    def _run(self, provider_id: str, item_id: str, customer: Any, **kwargs: Any) -> str:
+        """Executes the checkout pipeline."""
+        transaction_id = self._begin(provider_id, item_id, customer)
+        start = time.perf_counter()
+        try:
+            for action in CHECKOUT_STEPS:
+                step_start = time.perf_counter()
+                body = self._send_sync(action, transaction_id)
+                self._advance(action, transaction_id, body, time.perf_counter() - step_start)
+        except Exception as e:
+            return self._fail(transaction_id, time.perf_counter() - start, action, e)
+        return self._finish(transaction_id, time.perf_counter() - start)
+
+    async def _arun(self, provider_id: str, item_id: str, customer: Any, **kwargs: Any) -> str:
+        """Asynchronously executes the checkout pipeline without blocking the event loop."""
+        transaction_id = self._begin(provider_id, item_id, customer)
+        start = time.perf_counter()
+        try:
+            for action in CHECKOUT_STEPS:
+                step_start = time.perf_counter()
+                body = await self._send(action, transaction_id)
+                self._advance(action, transaction_id, body, time.perf_counter() - step_start)
+        except Exception as e:
+            return self._fail(transaction_id, time.perf_counter() - start, action, e)
+        return self._finish(transaction_id, time.perf_counter() - start)
@@ -1,12 +1,11 @@
-import json
-import time
-import uuid
-from typing import Any, Dict, List, Type
+from typing import Any, Dict, List, Optional, Type
 
-import requests  # Ensure 'requests' library is installed
+import httpx
 from langchain.tools import BaseTool
 from pydantic import BaseModel, Field
 
+from app.core import beckn, beckn_projection
+
 # Assuming constants.py is in the same directory (package)
 from . import constants
 
@@ -44,10 +43,42 @@ class SolarRetailConfirmTool(BaseTool):
     description: str = (
         "Confirms a solar retail item order with provider, item, transaction, and fulfillment details. "
         "Requires provider_id, item_id, transaction_id, and fulfillment information (including customer details)."
-        "Returns the raw JSON response as a string."
+        "Returns the provider, item, quote and fulfillment details as compact JSON."
     )
     args_schema: Type[BaseModel] = SolarRetailConfirmInput
 
+    def _build_request(
+        self,
+        provider_id: str,
+        item_id: str,
+        transaction_id: str,
+        fulfillments: List[Dict[str, Any]],
+        context: Optional[beckn.BecknContext] = None,
+    ) -> beckn.BecknRequest:
+        """Builds the Beckn confirm request (from ``context`` if given)."""
+        message = {
+            "order": {
+                "provider": {"id": provider_id},
+                "items": [{"id": item_id}],
+                "fulfillments": [
+                    {
+                        "id": ful[
+                            "id"
+                        ],  # Accessing dict keys after Pydantic validation
+                        "customer": {
+                            "person": {"name": ful["customer"]["name"]},
+                            "contact": {
+                                "phone": ful["customer"]["phone"],
+                                "email": ful["customer"]["email"],
+                            },
+                        },
+                    }
+                    for ful in fulfillments
+                ],
+            }
+        }
+        return (context or constants.CONFIRM_CONTEXT).request(message, transaction_id=transaction_id)
+
     def _run(
         self,
         provider_id: str,
@@ -57,61 +88,13 @@ class SolarRetailConfirmTool(BaseTool):
         **kwargs: Any,
     ) -> str:
         """Executes the confirm tool."""
-        message_id = str(uuid.uuid4())
-        current_timestamp = str(int(time.time()))
-
-        payload = {
-            "context": {
-                "domain": constants.CONTEXT_DOMAIN,
-                "action": constants.CONTEXT_ACTION_CONFIRM,  # Use confirm action
-                "location": {
-                    "country": {"code": constants.CONTEXT_LOCATION_COUNTRY_CODE},
-                    "city": {"code": constants.CONTEXT_LOCATION_CITY_CODE},
-                },
-                "version": constants.CONTEXT_VERSION,
-                "bap_id": constants.CONTEXT_BAP_ID,
-                "bap_uri": constants.CONTEXT_BAP_URI,
-                "bpp_id": constants.CONTEXT_BPP_ID,
-                "bpp_uri": constants.CONTEXT_BPP_URI,
-                "transaction_id": transaction_id,
-                "message_id": message_id,
-                "timestamp": current_timestamp,
-            },
-            "message": {
-                "order": {
-                    "provider": {"id": provider_id},
-                    "items": [{"id": item_id}],
-                    "fulfillments": [
-                        {
-                            "id": ful[
-                                "id"
-                            ],  # Accessing dict keys after Pydantic validation
-                            "customer": {
-                                "person": {"name": ful["customer"]["name"]},
-                                "contact": {
-                                    "phone": ful["customer"]["phone"],
-                                    "email": ful["customer"]["email"],
-                                },
-                            },
-                        }
-                        for ful in fulfillments
-                    ],
-                }
-            },
-        }
-
-        headers = {"Content-Type": "application/json"}
+        request = self._build_request(provider_id, item_id, transaction_id, fulfillments)
 
         try:
-            response = requests.post(
-                constants.CONFIRM_BASE_URL,  # Use confirm base URL
-                headers=headers,
-                data=json.dumps(payload),
-                timeout=30,
-            )
-            response.raise_for_status()
-            return response.text
-        except requests.exceptions.RequestException as e:
+            response = beckn.send_sync(constants.CONFIRM_BASE_URL, request, timeout=30)
+            response.raise_for_status()  # Raise an exception for HTTP errors (4xx or 5xx)
+            return beckn_projection.observe("confirm", response.text, request.transaction_id)
+        except httpx.HTTPError as e:
             return f"Error calling Beckn confirm API: {e}"
         except Exception as e:
             return f"An unexpected error occurred: {e}"
@@ -124,11 +107,14 @@ class SolarRetailConfirmTool(BaseTool):
         fulfillments: List[Dict[str, Any]],
         **kwargs: Any,
     ) -> str:
-        """Asynchronously executes the confirm tool."""
-        return self._run(
-            provider_id=provider_id,
-            item_id=item_id,
-            transaction_id=transaction_id,
-            fulfillments=fulfillments,
-            **kwargs,
-        )
+        """Asynchronously executes the confirm tool without blocking the event loop."""
+        request = self._build_request(provider_id, item_id, transaction_id, fulfillments)
+
+        try:
+            response = await beckn.send(constants.CONFIRM_BASE_URL, request, timeout=30)
+            response.raise_for_status()
+            return beckn_projection.observe("confirm", response.text, request.transaction_id)
+        except httpx.HTTPError as e:
+            return f"Error calling Beckn confirm API: {e}"
+        except Exception as e:
+            return f"An unexpected error occurred: {e}"
@@ -1,12 +1,11 @@
-import json
-import time
-import uuid
-from typing import Any, Type
+from typing import Any, Optional, Type
 
-import requests  # Ensure 'requests' library is installed
+import httpx
 from langchain.tools import BaseTool
 from pydantic import BaseModel, Field
 
+from app.core import beckn, beckn_projection
+
 # Assuming constants.py is in the same directory (package)
 from . import constants
 
@@ -28,54 +27,37 @@ class SolarRetailInitTool(BaseTool):
     description: str = (
         "Initializes a solar retail item order with a specific provider using their IDs and a transaction ID. "
         "Requires provider_id, item_id, and transaction_id from a previous interaction (e.g., select)."
-        "Returns the raw JSON response as a string."
+        "Returns the provider, item, quote and fulfillment details as compact JSON."
     )
     args_schema: Type[BaseModel] = SolarRetailInitInput
 
+    def _build_request(
+        self,
+        provider_id: str,
+        item_id: str,
+        transaction_id: str,
+        context: Optional[beckn.BecknContext] = None,
+    ) -> beckn.BecknRequest:
+        """Builds the Beckn init request (from ``context`` if given)."""
+        message = {
+            "order": {
+                "provider": {"id": provider_id},
+                "items": [{"id": item_id}],
+            }
+        }
+        return (context or constants.INIT_CONTEXT).request(message, transaction_id=transaction_id)
+
     def _run(
         self, provider_id: str, item_id: str, transaction_id: str, **kwargs: Any
     ) -> str:
         """Executes the init tool."""
-        message_id = str(uuid.uuid4())
-        current_timestamp = str(int(time.time()))
-
-        payload = {
-            "context": {
-                "domain": constants.CONTEXT_DOMAIN,
-                "action": constants.CONTEXT_ACTION_INIT,  # Use init action
-                "location": {
-                    "country": {"code": constants.CONTEXT_LOCATION_COUNTRY_CODE},
-                    "city": {"code": constants.CONTEXT_LOCATION_CITY_CODE},
-                },
-                "version": constants.CONTEXT_VERSION,
-                "bap_id": constants.CONTEXT_BAP_ID,
-                "bap_uri": constants.CONTEXT_BAP_URI,
-                "bpp_id": constants.CONTEXT_BPP_ID,
-                "bpp_uri": constants.CONTEXT_BPP_URI,
-                "transaction_id": transaction_id,  # Use provided transaction_id
-                "message_id": message_id,
-                "timestamp": current_timestamp,
-            },
-            "message": {
-                "order": {
-                    "provider": {"id": provider_id},
-                    "items": [{"id": item_id}],
-                }
-            },
-        }
-
-        headers = {"Content-Type": "application/json"}
+        request = self._build_request(provider_id, item_id, transaction_id)
 
         try:
-            response = requests.post(
-                constants.INIT_BASE_URL,  # Use init base URL
-                headers=headers,
-                data=json.dumps(payload),
-                timeout=30,
-            )
+            response = beckn.send_sync(constants.INIT_BASE_URL, request, timeout=30)
             response.raise_for_status()  # Raise an exception for HTTP errors (4xx or 5xx)
-            return response.text  # Return the raw response text (JSON string)
-        except requests.exceptions.RequestException as e:
+            return beckn_projection.observe("init", response.text, request.transaction_id)
+        except httpx.HTTPError as e:
             return f"Error calling Beckn init API: {e}"
         except Exception as e:
             return f"An unexpected error occurred: {e}"
@@ -83,13 +65,14 @@ class SolarRetailInitTool(BaseTool):
     async def _arun(
         self, provider_id: str, item_id: str, transaction_id: str, **kwargs: Any
     ) -> str:
-        """Asynchronously executes the init tool.
-        Note: This requires an async HTTP client like httpx.
-        For simplicity, this example uses a blocking call within the async method.
-        """
-        return self._run(
-            provider_id=provider_id,
-            item_id=item_id,
-            transaction_id=transaction_id,
-            **kwargs,
-        )
+        """Asynchronously executes the init tool without blocking the event loop."""
+        request = self._build_request(provider_id, item_id, transaction_id)
+
+        try:
+            response = await beckn.send(constants.INIT_BASE_URL, request, timeout=30)
+            response.raise_for_status()
+            return beckn_projection.observe("init", response.text, request.transaction_id)
+        except httpx.HTTPError as e:
+            return f"Error calling Beckn init API: {e}"
+        except Exception as e:
+            return f"An unexpected error occurred: {e}"
@@ -1,15 +1,77 @@
 import json
-import time
-import uuid
+import os
 from typing import Any, Type
 
-import requests  # Ensure 'requests' library is installed
+import httpx
 from langchain.tools import BaseTool
 from pydantic import BaseModel, Field
 
+from app.config.settings import settings
+from app.core import beckn, beckn_callbacks, beckn_projection
+from app.core.catalog_cache import CatalogCache
+
 # Assuming constants.py is in the same directory (package)
 from . import constants
 
+# Every search uses the same parameters, so one cached catalog serves every
+# user; it is refreshed in the background once older than this
+SOLAR_CATALOG_TTL_SECONDS = int(os.getenv("SOLAR_CATALOG_TTL_SECONDS", "300"))
+
+SEARCH_MESSAGE = {
+    "intent": {
+        "item": {
+            "descriptor": {
+                "name": constants.MESSAGE_INTENT_ITEM_DESCRIPTOR_NAME
+            }
+        }
+    }
+}
+
+
+def _check_catalog(response: httpx.Response) -> str:
+    response.raise_for_status()  # Raise an exception for HTTP errors (4xx or 5xx)
+    # An empty result usually means no BPP answered in time; do not cache it
+    if not json.loads(response.text).get("responses"):
+        raise ValueError("the search returned no catalogs")
+    return response.text  # The raw response text (JSON string)
+
+
+async def _search_callbacks() -> str:
+    """
+    Searches through on_search callbacks, collecting BPP catalogs for the
+    search window (or until enough BPPs answered) instead of waiting for
+    the slowest one. Returns them in the BAP client wrapper's format.
+    """
+    config = settings.beckn
+    request = beckn_callbacks.callback_context(constants.SEARCH_CONTEXT).request(SEARCH_MESSAGE)
+    call = await beckn_callbacks.request(request, config.search_window_seconds, config.search_max_responses or None)
+    responses = await call.collect()
+    if not responses:
+        raise ValueError("no BPP answered the search in time")
+    return json.dumps({"responses": responses})
+
+
+# The cache holds the compact projection the agent sees. It is shared by
+# every user, so it carries no transaction_id: each order starts its own
+# transaction at select (or checkout)
+async def _fetch_catalog() -> str:
+    if beckn_callbacks.enabled():
+        return beckn_projection.observe("search", await _search_callbacks())
+    request = constants.SEARCH_CONTEXT.request(SEARCH_MESSAGE)
+    raw = _check_catalog(await beckn.send(constants.BASE_URL, request, timeout=30))
+    return beckn_projection.observe("search", raw)
+
+
+def _fetch_catalog_sync() -> str:
+    request = constants.SEARCH_CONTEXT.request(SEARCH_MESSAGE)
+    raw = _check_catalog(beckn.send_sync(constants.BASE_URL, request, timeout=30))
+    return beckn_projection.observe("search", raw)
+
+
+solar_catalog = CatalogCache(
+    "solar_retail_search", _fetch_catalog, SOLAR_CATALOG_TTL_SECONDS, fetch_sync=_fetch_catalog_sync
+)
+
 
 class SolarRetailSearchInput(BaseModel):
     """Input for SolarRetailSearchTool. Currently empty as all parameters are from constants."""
@@ -21,71 +83,29 @@ class SolarRetailSearchTool(BaseTool):
     name: str = "solar_retail_item_search"
     description: str = (
         "Searches for solar retail items using predefined parameters (item: solar, "
-        "location: USA/NANP:628) via a Beckn endpoint. Returns the raw JSON response as a string."
+        "location: USA/NANP:628) via a Beckn endpoint. Returns each provider's "
+        "ID, name and items (ID, name, price) as compact JSON, preceded by a line giving the age of the catalog."
     )
     args_schema: Type[BaseModel] = SolarRetailSearchInput
 
+    @staticmethod
+    def _format(catalog: str, age: float) -> str:
+        return f"Catalog age: {age:.0f} seconds\n{catalog}"
+
     def _run(self, **kwargs: Any) -> str:
         """Executes the search tool."""
-        transaction_id = str(uuid.uuid4())
-        message_id = str(uuid.uuid4())
-        current_timestamp = str(int(time.time()))
-
-        payload = {
-            "context": {
-                "domain": constants.CONTEXT_DOMAIN,
-                "action": constants.CONTEXT_ACTION,
-                "location": {
-                    "country": {"code": constants.CONTEXT_LOCATION_COUNTRY_CODE},
-                    "city": {"code": constants.CONTEXT_LOCATION_CITY_CODE},
-                },
-                "version": constants.CONTEXT_VERSION,
-                "bap_id": constants.CONTEXT_BAP_ID,
-                "bap_uri": constants.CONTEXT_BAP_URI,
-                "bpp_id": constants.CONTEXT_BPP_ID,
-                "bpp_uri": constants.CONTEXT_BPP_URI,
-                "transaction_id": transaction_id,
-                "message_id": message_id,
-                "timestamp": current_timestamp,
-            },
-            "message": {
-                "intent": {
-                    "item": {
-                        "descriptor": {
-                            "name": constants.MESSAGE_INTENT_ITEM_DESCRIPTOR_NAME
-                        }
-                    }
-                }
-            },
-        }
-
-        headers = {"Content-Type": "application/json"}
-
         try:
-            response = requests.post(
-                constants.BASE_URL,
-                headers=headers,
-                data=json.dumps(payload),
-                timeout=30,
-            )
-            response.raise_for_status()  # Raise an exception for HTTP errors (4xx or 5xx)
-            return response.text  # Return the raw response text (JSON string)
-        except requests.exceptions.RequestException as e:
+            return self._format(*solar_catalog.get_sync())
+        except httpx.HTTPError as e:
             return f"Error calling Beckn search API: {e}"
         except Exception as e:
             return f"An unexpected error occurred: {e}"
 
     async def _arun(self, **kwargs: Any) -> str:
-        """Asynchronously executes the search tool.
-        Note: This requires an async HTTP client like httpx.
-        For simplicity, this example uses a blocking call within the async method.
-        In a production scenario, use httpx.AsyncClient.
-        """
-        # This is a simplified async version. For true async, use an async library.
-        # For now, it will call the synchronous version.
-        # To implement fully async:
-        # import httpx
-        # async with httpx.AsyncClient() as client:
-        #     response = await client.post(...)
-        #     return response.text
-        return self._run(**kwargs)
+        """Asynchronously executes the search tool, answering from the catalog cache."""
+        try:
+            return self._format(*await solar_catalog.get())
+        except httpx.HTTPError as e:
+            return f"Error calling Beckn search API: {e}"
+        except Exception as e:
+            return f"An unexpected error occurred: {e}"
@@ -0,0 +1,121 @@
+"""
+Stub BPP for trying out and testing asynchronous Beckn callbacks locally.
+
+Acknowledges every request immediately and posts the matching on_* callback
+to the request's ``bap_uri`` afterwards. A search is answered by several
+simulated BPPs, each after its own delay, so callers can check that results
+are used as they arrive rather than after the slowest BPP.
+
+Run from the project root:
+    python -m app.utils.stub_bpp --port 9000 --delays 0.2,1,3
+
+then point ``beckn.network_url`` in config.yaml at http://localhost:9000 and
+``beckn.callback_base_url`` at the agents service.
+"""
+import argparse
+import asyncio
+import logging
+import uuid
+from typing import Any, Dict, Sequence, Set
+
+import httpx
+import uvicorn
+from fastapi import Body, FastAPI
+from fastapi.responses import JSONResponse
+
+from app.core.beckn_callbacks import ACK, nack
+
+logger = logging.getLogger(__name__)
+
+ACTIONS = frozenset({"search", "select", "init", "confirm"})
+
+
+def _catalog(index: int) -> Dict[str, Any]:
+    return {
+        "catalog": {
+            "descriptor": {"name": f"Stub Solar Retailer {index}"},
+            "providers": [
+                {
+                    "id": f"provider-{index}",
+                    "descriptor": {"name": f"Stub Solar Retailer {index}"},
+                    "items": [
+                        {
+                            "id": f"item-{index}-1",
+                            "descriptor": {"name": "Solar panel 400W"},
+                            "price": {"value": str(250 + 10 * index), "currency": "USD"},
+                        }
+                    ],
+                }
+            ],
+        }
+    }
+
+
+def _order(action: str, order: Dict[str, Any]) -> Dict[str, Any]:
+    items = order.get("items") or [{"id": "item-0-1"}]
+    answer = {
+        "provider": order.get("provider", {}),
+        "items": [{**item, "descriptor": {"name": "Solar panel 400W"}} for item in items],
+        "quote": {"price": {"value": str(250 * len(items)), "currency": "USD"}},
+        "fulfillments": order.get("fulfillments") or [{"id": "fulfillment-1"}],
+    }
+    if action == "confirm":
+        answer["id"] = f"order-{uuid.uuid4().hex[:8]}"
+        answer["status"] = "ACTIVE"
+        answer["fulfillments"] = [
+            {**fulfillment, "state": {"descriptor": {"code": "CREATED"}}} for fulfillment in answer["fulfillments"]
+        ]
+    return {"order": answer}
+
+
+def create_app(delays: Sequence[float]) -> FastAPI:
+    """
+    Builds the stub. A search gets one on_search per entry in ``delays``;
+    other actions are answered once, after the first delay.
+    """
+    app = FastAPI(title="Stub BPP")
+    client = httpx.AsyncClient(timeout=10)
+    tasks: Set[asyncio.Task] = set()
+
+    async def answer(action: str, body: Dict[str, Any], index: int, delay: float):
+        await asyncio.sleep(delay)
+        context = {
+            **body["context"],
+            "action": f"on_{action}",
+            "bpp_id": f"stub-bpp-{index}",
+            "bpp_uri": f"http://stub-bpp-{index}.local",
+        }
+        message = _catalog(index) if action == "search" else _order(action, body.get("message", {}).get("order", {}))
+        url = f"{context['bap_uri'].rstrip('/')}/on_{action}"
+        try:
+            response = await client.post(url, json={"context": context, "message": message})
+            logger.info(f"stub-bpp-{index} posted on_{action} to {url}: {response.status_code}")
+        except httpx.HTTPError as e:
+            logger.warning(f"stub-bpp-{index} could not post on_{action} to {url}: {e}")
+
+    @app.post("/{action}")
+    async def receive(action: str, body: Dict[str, Any] = Body(...)):
+        if action not in ACTIONS:
+            return JSONResponse(status_code=404, content=nack("UNKNOWN_ACTION", f"Unsupported action {action}"))
+        responders = range(len(delays)) if action == "search" else range(1)
+        for index in responders:
+            task = asyncio.create_task(answer(action, body, index, delays[index]))
+            tasks.add(task)
+            task.add_done_callback(tasks.discard)
+        return ACK
+
+    @app.on_event("shutdown")
+    async def close_client():
+        await client.aclose()
+
+    return app
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Stub Beckn BPP that answers through on_* callbacks")
+    parser.add_argument("--host", default="127.0.0.1")
+    parser.add_argument("--port", type=int, default=9000)
+    parser.add_argument("--delays", default="0.2,1,3", help="Comma-separated on_search delays in seconds, one per simulated BPP")
+    args = parser.parse_args()
+    logging.basicConfig(level=logging.INFO)
+    uvicorn.run(create_app([float(delay) for delay in args.delays.split(",")]), host=args.host, port=args.port)
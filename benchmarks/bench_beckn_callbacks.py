@@ -0,0 +1,80 @@
+"""
+Benchmark for time-to-result of Beckn searches answered through on_* callbacks.
+
+Starts the stub BPP (three simulated BPPs answering after different delays)
+and a receiver serving the ``/beckn`` callback router, then switches the
+app to callback mode. A search is streamed to record when each BPP's
+catalog becomes available; the BAP client wrapper only returns once the
+slowest BPP has answered. Finally a composite checkout runs its select,
+init and confirm steps through callbacks.
+
+Run from the project root:
+    python -m benchmarks.bench_beckn_callbacks
+"""
+import asyncio
+import logging
+import socket
+import time
+
+import uvicorn
+from fastapi import FastAPI
+
+from app.config.settings import settings
+from app.core import beckn_callbacks
+from app.core.http_client import http_clients
+from app.routers import beckn_callbacks as callback_router
+from app.tools.specific_tools.solar_tools import constants
+from app.tools.specific_tools.solar_tools.retail_checkout import SolarRetailCheckoutTool
+from app.tools.specific_tools.solar_tools.retail_search import SEARCH_MESSAGE
+from app.utils.stub_bpp import create_app
+
+BPP_DELAYS_SECONDS = [0.1, 0.5, 2.0]
+
+
+def free_port() -> int:
+    with socket.socket() as sock:
+        sock.bind(("127.0.0.1", 0))
+        return sock.getsockname()[1]
+
+
+async def serve(app: FastAPI, port: int) -> uvicorn.Server:
+    server = uvicorn.Server(uvicorn.Config(app, host="127.0.0.1", port=port, log_level="critical"))
+    asyncio.create_task(server.serve())
+    while not server.started:
+        await asyncio.sleep(0.01)
+    return server
+
+
+async def main():
+    logging.disable(logging.CRITICAL)
+    bpp_port, receiver_port = free_port(), free_port()
+    receiver = FastAPI()
+    receiver.include_router(callback_router.router)
+    servers = [await serve(create_app(BPP_DELAYS_SECONDS), bpp_port), await serve(receiver, receiver_port)]
+    settings.beckn.network_url = f"http://127.0.0.1:{bpp_port}"
+    settings.beckn.callback_base_url = f"http://127.0.0.1:{receiver_port}"
+
+    window = max(BPP_DELAYS_SECONDS) + 1
+    request = beckn_callbacks.callback_context(constants.SEARCH_CONTEXT).request(SEARCH_MESSAGE)
+    start = time.perf_counter()
+    call = await beckn_callbacks.request(request, window, expected=len(BPP_DELAYS_SECONDS))
+    print(f"Search acknowledged after {(time.perf_counter() - start) * 1000:.0f} ms")
+    async for response in call.stream():
+        print(f"  on_search from {response['context']['bpp_id']} after {(time.perf_counter() - start) * 1000:.0f} ms")
+    print(f"A blocking wrapper would answer after the slowest BPP: {max(BPP_DELAYS_SECONDS) * 1000:.0f} ms or more")
+
+    tool = SolarRetailCheckoutTool()
+    customer = {"name": "Test Customer", "phone": "5550100", "email": "test@example.com"}
+    summary = await tool._arun(provider_id="provider-0", item_id="item-0-1", customer=customer)
+    print(f"\nCheckout through callbacks (each step answered after {BPP_DELAYS_SECONDS[0] * 1000:.0f} ms):")
+    print(summary)
+    print(beckn_callbacks.correlator.get_metrics())
+
+    await http_clients.aclose()
+    for server in servers:
+        server.should_exit = True
+    await asyncio.sleep(0.2)
+
+
+if __name__ == "__main__":
+    asyncio.run(main())
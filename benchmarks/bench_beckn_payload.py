@@ -0,0 +1,84 @@
+"""
+Benchmark for building and serializing Beckn requests.
+
+Compares assembling the whole request dict and serializing it with
+``json.dumps`` on every call (how the tools used to do it) against filling
+a prebuilt ``BecknContext`` template, for the search and confirm requests.
+
+Run from the project root:
+    python -m benchmarks.bench_beckn_payload
+"""
+import json
+import time
+import uuid
+
+from app.core import beckn
+from app.tools.specific_tools.solar_tools import constants
+from app.tools.specific_tools.solar_tools.retail_confirm import SolarRetailConfirmTool
+from app.tools.specific_tools.solar_tools.retail_search import SEARCH_MESSAGE
+
+ITERATIONS = 50_000
+
+FULFILLMENTS = [
+    {"id": "fulfillment-1", "customer": {"name": "Lisa Ray", "phone": "876756454", "email": "lisa@example.com"}}
+]
+
+
+def build_dict(action: str, message: dict, transaction_id: str = None) -> bytes:
+    payload = {
+        "context": {
+            "domain": constants.CONTEXT_DOMAIN,
+            "action": action,
+            "location": {
+                "country": {"code": constants.CONTEXT_LOCATION_COUNTRY_CODE},
+                "city": {"code": constants.CONTEXT_LOCATION_CITY_CODE},
+            },
+            "version": constants.CONTEXT_VERSION,
+            "bap_id": constants.CONTEXT_BAP_ID,
+            "bap_uri": constants.CONTEXT_BAP_URI,
+            "bpp_id": constants.CONTEXT_BPP_ID,
+            "bpp_uri": constants.CONTEXT_BPP_URI,
+            "transaction_id": transaction_id or str(uuid.uuid4()),
+            "message_id": str(uuid.uuid4()),
+            "timestamp": str(int(time.time())),
+        },
+        "message": message,
+    }
+    return json.dumps(payload).encode("utf-8")
+
+
+def time_per_call(func) -> float:
+    start = time.perf_counter()
+    for _ in range(ITERATIONS):
+        func()
+    return (time.perf_counter() - start) / ITERATIONS * 1e6
+
+
+def main():
+    confirm_tool = SolarRetailConfirmTool()
+    search_message = SEARCH_MESSAGE
+    confirm_message = json.loads(confirm_tool._build_request("prov", "item", "txn", FULFILLMENTS).body)["message"]
+
+    cases = [
+        (
+            "search",
+            lambda: build_dict("search", search_message),
+            lambda: constants.SEARCH_CONTEXT.request(search_message),
+        ),
+        (
+            "confirm",
+            lambda: build_dict("confirm", confirm_message, "txn"),
+            lambda: constants.CONFIRM_CONTEXT.request(confirm_message, transaction_id="txn"),
+        ),
+    ]
+
+    print(f"orjson: {'yes' if beckn.orjson is not None else 'no'}")
+    print(f"{'request':>8} {'dict+dumps':>11} {'template':>9} {'bytes_before':>13} {'bytes_after':>12}  (us/call)")
+    for name, before, after in cases:
+        before_us = time_per_call(before)
+        after_us = time_per_call(after)
+        print(f"{name:>8} {before_us:>11.2f} {after_us:>9.2f} {len(before()):>13} {len(after().body):>12}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,87 @@
+"""
+Benchmark for forecasting the capacity breach time of a whole fleet.
+
+Fills a telemetry store with a window of load samples for 10,000
+transformers (rising linearly, rising exponentially or flat, with noise)
+and times one forecast tick: the vectorized linear and exponential fits
+over the stacked load matrix, run off the event loop. For comparison, the
+same fits are run one transformer at a time with ``numpy.polyfit``.
+
+Run from the project root:
+    python -m benchmarks.bench_breach_forecast
+"""
+import asyncio
+import logging
+import time
+
+import numpy as np
+
+from app.config.settings import settings
+from app.core.breach_forecast import BreachForecaster
+from app.core.telemetry import TelemetryStore
+
+TRANSFORMERS = 10_000
+SAMPLE_INTERVAL_SECONDS = 300
+LOOP_COMPARISON_TRANSFORMERS = 1_000
+WINDOW = settings.breach_forecast.window
+
+
+def fill(store: TelemetryStore, now: float):
+    rng = np.random.default_rng(42)
+    steps = np.arange(WINDOW)
+    for index in range(TRANSFORMERS):
+        kind = index % 3
+        if kind == 0:
+            loads = 100 + rng.uniform(0.5, 3) * steps
+        elif kind == 1:
+            loads = 50 * rng.uniform(1.005, 1.04) ** steps
+        else:
+            loads = np.full(WINDOW, 120.0)
+        loads = loads + rng.normal(0, 1, WINDOW)
+        for step, load in zip(steps, loads):
+            store.append(f"tx-{index}", now - (WINDOW - 1 - step) * SAMPLE_INTERVAL_SECONDS, float(load), 250.0)
+
+
+def loop_forecast(store: TelemetryStore, transformers: int) -> int:
+    """Linear and exponential fits one transformer at a time."""
+    breaching = 0
+    for index in range(transformers):
+        times, loads = store.series(f"tx-{index}")
+        t = (times - times[-1]) / 60
+        slope, level = np.polyfit(t, loads, 1)
+        growth, log_level = np.polyfit(t, np.log(loads), 1)
+        linear_error = ((loads - (level + slope * t)) ** 2).sum()
+        exponential_error = ((loads - np.exp(log_level + growth * t)) ** 2).sum()
+        rate = growth if exponential_error < linear_error else slope
+        breaching += rate > 0
+    return breaching
+
+
+async def main():
+    logging.disable(logging.CRITICAL)
+    store = TelemetryStore()
+    now = time.time()
+    start = time.perf_counter()
+    fill(store, now)
+    samples = TRANSFORMERS * WINDOW
+    elapsed = time.perf_counter() - start
+    print(f"Ingested {samples} samples in {elapsed * 1000:.0f} ms ({elapsed / samples * 1e6:.1f} us per sample)")
+
+    forecaster = BreachForecaster(store)
+    await forecaster.run_once()  # warm up
+    ticks = [(await forecaster.run_once()).duration for _ in range(5)]
+    snapshot = forecaster.current.snapshot()
+    print(
+        f"Vectorized tick for {snapshot['transformers']} transformers x {WINDOW} samples: "
+        f"median {sorted(ticks)[2] * 1000:.1f} ms; {snapshot['breach_expected']} breaches expected"
+    )
+    print(f"  due within 60 min: {len(forecaster.current.at_risk(60, now))}")
+
+    start = time.perf_counter()
+    loop_forecast(store, LOOP_COMPARISON_TRANSFORMERS)
+    per_transformer = (time.perf_counter() - start) / LOOP_COMPARISON_TRANSFORMERS
+    print(f"Per-transformer polyfit loop: {per_transformer * TRANSFORMERS * 1000:.0f} ms for {TRANSFORMERS} (extrapolated)")
+
+
+if __name__ == "__main__":
+    asyncio.run(main())
@@ -0,0 +1,107 @@
+"""
+Benchmark for broadcast fan-out throughput.
+
+Compares the previous path, where every recipient re-serialized the alert
+dict through ``send_json``, with the current one, where the alert is encoded
+once into a Frame and the same frame is queued for every connection.
+
+Run from the project root:
+    python -m benchmarks.bench_broadcast_fanout
+"""
+import asyncio
+import json
+import logging
+import time
+
+from app.config.settings import WebSocketConfig
+from app.core.websocket_manager import WebSocketManager
+
+SIZES = [1_000, 5_000, 20_000]
+ROUNDS = 5
+
+ALERT = {
+    "type": "grid_alert",
+    "order_id": "order-123",
+    "message": "Grid stress detected on your transformer. Please reduce consumption between 18:00 and 20:00.",
+    "meter_ids": list(range(50)),
+    "incentive": {"currency": "USD", "value": "2.50", "per": "kWh"},
+}
+
+
+class FrameCounter:
+    def __init__(self):
+        self.count = 0
+        self.target = 0
+        self.done = asyncio.Event()
+
+    def expect(self, target: int):
+        self.count = 0
+        self.target = target
+        self.done.clear()
+
+    def add(self):
+        self.count += 1
+        if self.count >= self.target:
+            self.done.set()
+
+
+class FakeWebSocket:
+    def __init__(self, counter: FrameCounter):
+        self.counter = counter
+
+    async def accept(self):
+        pass
+
+    async def send_text(self, data: str):
+        self.counter.add()
+
+    async def send_json(self, data):
+        # What Starlette does for every call
+        await self.send_text(json.dumps(data, separators=(",", ":"), ensure_ascii=False))
+
+
+async def per_recipient(sockets) -> float:
+    start = time.perf_counter()
+    for _ in range(ROUNDS):
+        for websocket in sockets:
+            message = dict(ALERT)
+            message["status"] = "success"
+            await websocket.send_json(message)
+    return len(sockets) * ROUNDS / (time.perf_counter() - start)
+
+
+async def encode_once(manager: WebSocketManager, connection_ids, counter: FrameCounter) -> float:
+    counter.expect(len(connection_ids) * ROUNDS)
+    start = time.perf_counter()
+    for _ in range(ROUNDS):
+        manager.send_to_connections(connection_ids, ALERT)
+    # Wait until every writer has sent every frame
+    await counter.done.wait()
+    return counter.target / (time.perf_counter() - start)
+
+
+async def main():
+    logging.disable(logging.CRITICAL)
+    print(f"{'connections':>12} {'per-recipient':>15} {'encode-once':>13} {'speedup':>8}  (frames/sec)")
+    for size in SIZES:
+        # Queue deep enough to hold every round without dropping frames
+        manager = WebSocketManager(WebSocketConfig(send_queue_size=ROUNDS))
+        counter = FrameCounter()
+        sockets = [FakeWebSocket(counter) for _ in range(size)]
+        connection_ids = [await manager.connect(websocket) for websocket in sockets]
+
+        counter.expect(size * ROUNDS)
+        baseline = await per_recipient(sockets)
+        current = await encode_once(manager, connection_ids, counter)
+
+        print(f"{size:>12} {baseline:>15,.0f} {current:>13,.0f} {current / baseline:>7.2f}x")
+
+        for connection_id in connection_ids:
+            await manager.disconnect(connection_id)
+
+    assert "status" not in ALERT, "Caller's message was mutated"
+    print("Caller's message was not mutated.")
+
+
+if __name__ == "__main__":
+    asyncio.run(main())
@@ -0,0 +1,90 @@
+"""
+Benchmark for WebSocketManager lookups at increasing connection counts.
+
+Registers N fake connections (each with a client, meter, type, token and
+transformer topic), times the lookups the routers use on every message and
+alert plus a targeted send to one transformer's subscribers, then
+disconnects everything and checks that no index entry is left behind.
+
+Run from the project root:
+    python -m benchmarks.bench_connection_registry
+"""
+import asyncio
+import logging
+import time
+
+from app.core.websocket_manager import WebSocketManager, topic
+
+SIZES = [1_000, 10_000, 50_000]
+LOOKUPS = 100_000
+TARGETED_SENDS = 1_000
+# Every transformer topic has this many subscribers, whatever the total size
+SUBSCRIBERS_PER_TRANSFORMER = 10
+
+
+class FakeWebSocket:
+    async def accept(self):
+        pass
+
+    async def send_text(self, data: str):
+        pass
+
+
+async def populate(manager: WebSocketManager, size: int):
+    connection_ids = []
+    for i in range(size):
+        connection_id = await manager.connect(FakeWebSocket())
+        manager.set_client(connection_id, f"client_{i}")
+        manager.set_meter_id(connection_id, str(i))
+        manager.set_client_type(connection_id, "utility_dashboard" if i % 100 == 0 else "residential_user")
+        manager.set_token(connection_id, f"token_{i}")
+        manager.subscribe(connection_id, topic("transformer", i // SUBSCRIBERS_PER_TRANSFORMER))
+        connection_ids.append(connection_id)
+    return connection_ids
+
+
+def time_per_op(func, keys) -> float:
+    start = time.perf_counter()
+    for i in range(LOOKUPS):
+        func(keys[i % len(keys)])
+    return (time.perf_counter() - start) / LOOKUPS * 1e9
+
+
+async def main():
+    logging.disable(logging.CRITICAL)
+    print(
+        f"{'connections':>12} {'get_client':>12} {'meter_by_conn':>14} {'conn_by_meter':>14} "
+        f"{'send_to_topic':>14} {'disconnect':>12}  (ns/op)"
+    )
+    for size in SIZES:
+        manager = WebSocketManager()
+        connection_ids = await populate(manager, size)
+        meter_ids = [str(i) for i in range(size)]
+
+        get_client = time_per_op(manager.get_client, connection_ids)
+        meter_by_conn = time_per_op(manager.get_meter_id_by_connection, connection_ids)
+        conn_by_meter = time_per_op(manager.get_connection_by_meter_id, meter_ids)
+
+        message = {"type": "grid_alert", "message": "Grid stress detected"}
+        start = time.perf_counter()
+        for i in range(TARGETED_SENDS):
+            manager.send_to_topic(topic("transformer", i % (size // SUBSCRIBERS_PER_TRANSFORMER)), message)
+        send_to_topic = (time.perf_counter() - start) / TARGETED_SENDS * 1e9
+
+        start = time.perf_counter()
+        for connection_id in connection_ids:
+            await manager.disconnect(connection_id)
+        disconnect = (time.perf_counter() - start) / size * 1e9
+
+        print(
+            f"{size:>12} {get_client:>12.0f} {meter_by_conn:>14.0f} {conn_by_meter:>14.0f} "
+            f"{send_to_topic:>14.0f} {disconnect:>12.0f}"
+        )
+
+        leaked = {name: count for name, count in manager.registry.index_sizes().items() if count}
+        assert not leaked, f"Leaked index entries after disconnect: {leaked}"
+    print("No leaked index entries.")
+
+
+if __name__ == "__main__":
+    asyncio.run(main())
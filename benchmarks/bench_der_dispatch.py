@@ -0,0 +1,87 @@
+"""
+Benchmark for switching off the DERs of a whole transformer event.
+
+Starts a local switch-off endpoint that answers after a fixed delay and
+refuses a few device IDs, then switches off three devices for each of
+several hundred households twice: one request per household in turn (what
+the consent flow used to do) and through the fleet dispatcher, which
+batches commands from every household and sends batches concurrently.
+Refused devices are reported as failed without failing their batch.
+
+Run from the project root:
+    python -m benchmarks.bench_der_dispatch
+"""
+import asyncio
+import json
+import logging
+import threading
+import time
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+from app.core.der_dispatch import DERDispatcher
+from app.core.http_client import http_clients
+
+HOUSEHOLDS = 500
+DERS_PER_HOUSEHOLD = 3
+UPSTREAM_DELAY_SECONDS = 0.02
+# Devices the upstream refuses, e.g. because they are offline
+REFUSED_DERS = {f"der-{index}-0" for index in range(0, HOUSEHOLDS, 97)}
+
+
+class SwitchOffUpstream(BaseHTTPRequestHandler):
+    def do_PUT(self):
+        body = json.loads(self.rfile.read(int(self.headers.get("Content-Length", 0))))
+        time.sleep(UPSTREAM_DELAY_SECONDS)
+        status = 400 if REFUSED_DERS.intersection(body["der_ids"]) else 200
+        self.send_response(status)
+        self.send_header("Content-Type", "application/json")
+        self.send_header("Content-Length", "2")
+        self.end_headers()
+        self.wfile.write(b"{}")
+
+    def log_message(self, format, *args):
+        pass
+
+
+class UpstreamServer(ThreadingHTTPServer):
+    daemon_threads = True
+    request_queue_size = 256
+
+
+async def main():
+    logging.disable(logging.CRITICAL)
+    server = UpstreamServer(("127.0.0.1", 0), SwitchOffUpstream)
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    url = f"http://127.0.0.1:{server.server_port}/ders/switch-off"
+    households = [
+        (str(index), [f"der-{index}-{der}" for der in range(DERS_PER_HOUSEHOLD)]) for index in range(HOUSEHOLDS)
+    ]
+    print(f"{HOUSEHOLDS} households x {DERS_PER_HOUSEHOLD} DERs, upstream answers after {UPSTREAM_DELAY_SECONDS * 1000:.0f} ms")
+
+    start = time.perf_counter()
+    failed = 0
+    for _, der_ids in households:
+        response = await http_clients.put(url, json={"der_ids": der_ids}, timeout=10)
+        failed += len(der_ids) if response.status_code != 200 else 0
+    serial = time.perf_counter() - start
+    print(f"  one request per household: {serial * 1000:7.0f} ms, {HOUSEHOLDS} requests, {failed} DERs failed")
+
+    dispatcher = DERDispatcher()
+    start = time.perf_counter()
+    job = await dispatcher.dispatch(households, event_id="bench", url=url).wait()
+    dispatched = time.perf_counter() - start
+    snapshot = job.snapshot()
+    print(
+        f"  fleet dispatcher:          {dispatched * 1000:7.0f} ms, {dispatcher.requests} requests, "
+        f"{snapshot['failed']} DERs failed ({len(REFUSED_DERS)} refused), {snapshot['ders_per_second']} DERs/s"
+    )
+    metrics = dispatcher.get_metrics()
+    print(f"  batch latency avg {metrics['batch_latency']['avg_ms']:.1f} ms, ack latency avg {metrics['ack_latency']['avg_ms']:.1f} ms")
+
+    await dispatcher.stop()
+    await http_clients.aclose()
+    server.shutdown()
+
+
+if __name__ == "__main__":
+    asyncio.run(main())
@@ -0,0 +1,106 @@
+"""
+Benchmark for event loop responsiveness while tools call slow upstreams.
+
+Starts a local HTTP server that answers every request after a fixed delay,
+points the solar select tool at it and runs a burst of concurrent tool calls
+twice: once through the blocking ``_run`` (what ``_arun`` used to do) and
+once through the async ``_arun``. A ticker task measures how late the event
+loop wakes it up; with blocking calls every other client on the worker waits
+that long.
+
+Run from the project root:
+    python -m benchmarks.bench_event_loop_lag
+"""
+import asyncio
+import logging
+import threading
+import time
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+from app.core.http_client import http_clients
+from app.tools.specific_tools.solar_tools import constants
+from app.tools.specific_tools.solar_tools.retail_select import SolarRetailSelectTool
+
+CONCURRENT_CALLS = [10, 50]
+UPSTREAM_DELAY_SECONDS = 0.1
+TICK_SECONDS = 0.005
+
+
+class SlowUpstream(BaseHTTPRequestHandler):
+    def do_POST(self):
+        self.rfile.read(int(self.headers.get("Content-Length", 0)))
+        time.sleep(UPSTREAM_DELAY_SECONDS)
+        body = b'{"responses": []}'
+        self.send_response(200)
+        self.send_header("Content-Type", "application/json")
+        self.send_header("Content-Length", str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+    def log_message(self, format, *args):
+        pass
+
+
+class UpstreamServer(ThreadingHTTPServer):
+    daemon_threads = True
+    # The default backlog of 5 drops connection bursts, which then wait for a SYN retry
+    request_queue_size = 256
+
+
+async def measure_lag(stop: asyncio.Event, lags: list):
+    while not stop.is_set():
+        expected = time.perf_counter() + TICK_SECONDS
+        await asyncio.sleep(TICK_SECONDS)
+        lags.append(max(0.0, time.perf_counter() - expected))
+
+
+async def run_burst(call, calls: int):
+    stop = asyncio.Event()
+    lags = []
+    ticker = asyncio.create_task(measure_lag(stop, lags))
+    await asyncio.sleep(TICK_SECONDS * 2)
+
+    start = time.perf_counter()
+    results = await asyncio.gather(*(call() for _ in range(calls)))
+    wall = time.perf_counter() - start
+
+    stop.set()
+    await ticker
+    failed = [result for result in results if result.startswith(("Error", "An unexpected error"))]
+    assert not failed, failed[0]
+    lags.sort()
+    return wall, lags[int(len(lags) * 0.99)] * 1000, lags[-1] * 1000
+
+
+async def main():
+    logging.disable(logging.CRITICAL)
+    server = UpstreamServer(("127.0.0.1", 0), SlowUpstream)
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    constants.SELECT_BASE_URL = f"http://127.0.0.1:{server.server_port}/select"
+
+    tool = SolarRetailSelectTool()
+    args = {"provider_id": "provider", "item_id": "item"}
+
+    async def blocking_call():
+        return tool._run(**args)
+
+    async def async_call():
+        return await tool._arun(**args)
+
+    # Exclude one-time costs (first client, first connection) from the measurements
+    await blocking_call()
+    await async_call()
+
+    print(f"Upstream delay {UPSTREAM_DELAY_SECONDS * 1000:.0f} ms per request")
+    print(f"{'calls':>6} {'mode':>9} {'wall_s':>8} {'p99_lag_ms':>11} {'max_lag_ms':>11}")
+    for calls in CONCURRENT_CALLS:
+        for mode, call in (("blocking", blocking_call), ("async", async_call)):
+            wall, p99_lag, max_lag = await run_burst(call, calls)
+            print(f"{calls:>6} {mode:>9} {wall:>8.2f} {p99_lag:>11.1f} {max_lag:>11.1f}")
+
+    await http_clients.aclose()
+    server.shutdown()
+
+
+if __name__ == "__main__":
+    asyncio.run(main())
@@ -0,0 +1,42 @@
+from fastapi import FastAPI
+from fastapi.testclient import TestClient
+
+from app.routers import admin
+
+
+def make_client() -> TestClient:
+    app = FastAPI()
+    app.include_router(admin.router)
+    return TestClient(app)
+
+
+def test_drain_is_refused_without_configured_token(monkeypatch):
+    monkeypatch.setattr(admin, "ADMIN_TOKEN", None)
+    drained = []
+    monkeypatch.setattr(admin.lifecycle, "drain", lambda: drained.append(True))
+    response = make_client().post("/admin/drain")
+    assert response.status_code == 403
+    assert not drained
+
+
+def test_drain_is_refused_with_wrong_token(monkeypatch):
+    monkeypatch.setattr(admin, "ADMIN_TOKEN", "secret")
+    response = make_client().post("/admin/drain", headers={"X-Admin-Token": "guess"})
+    assert response.status_code == 403
+
+
+def test_transaction_payloads_require_admin_token(monkeypatch):
+    from app.core.transaction_store import transaction_store
+    from app.routers import beckn_callbacks
+
+    app = FastAPI()
+    app.include_router(beckn_callbacks.router)
+    client = TestClient(app)
+    monkeypatch.setattr(admin, "ADMIN_TOKEN", "secret")
+    monkeypatch.setattr(transaction_store, "get_payloads", lambda transaction_id: {"init": '{"customer":"x"}'})
+
+    assert client.get("/beckn/transactions/t1/payloads").status_code == 403
+    assert client.get("/beckn/transactions/t1/stream").status_code == 403
+    response = client.get("/beckn/transactions/t1/payloads", headers={"X-Admin-Token": "secret"})
+    assert response.status_code == 200
+    assert response.json() == {"init": {"customer": "x"}}
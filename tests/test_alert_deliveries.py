@@ -0,0 +1,35 @@
+import time
+
+from app.config.settings import ConsumerAlertsConfig
+from app.core.alert_deliveries import AlertDeliveryLog
+from app.core.shared_state import InMemoryStateBackend
+
+
+def test_status_follows_the_recorded_deliveries():
+    log = AlertDeliveryLog(InMemoryStateBackend())
+    alert_id = log.begin("3805")
+    assert log.get(alert_id)["status"] == "queued"
+
+    log.update(alert_id, status="dispatched", meters_count=2)
+    assert log.get(alert_id)["status"] == "dispatched"
+
+    log.record_delivery(alert_id, "worker-1", connections=1, meters_reached=1)
+    assert log.get(alert_id)["status"] == "partially_delivered"
+
+    log.record_delivery(alert_id, "worker-2", connections=2, meters_reached=1)
+    stats = log.get(alert_id)
+    assert stats["status"] == "delivered"
+    assert (stats["connections"], stats["meters_reached"]) == (3, 2)
+
+
+def test_expired_alerts_are_dropped_with_their_deliveries():
+    log = AlertDeliveryLog(InMemoryStateBackend(), ConsumerAlertsConfig(delivery_ttl_seconds=60))
+    stale = log.begin("1")
+    log.record_delivery(stale, "worker-1", connections=1, meters_reached=1)
+    log.alerts[stale] = {**log.alerts[stale], "received_at": time.time() - 120}
+    fresh = log.begin("2")
+
+    assert log.evict_expired() == 1
+    assert log.get(stale) is None
+    assert not log.deliveries
+    assert log.get(fresh) is not None
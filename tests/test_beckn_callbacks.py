@@ -0,0 +1,40 @@
+import asyncio
+
+from app.core import beckn
+from app.core.beckn_callbacks import CALLBACK_FORWARD_CHANNEL, CallbackCorrelator
+from app.core.shared_state import SQLiteStateBackend
+
+
+def on_select(message_id):
+    return {"context": {"action": "on_select", "message_id": message_id}, "message": {}}
+
+
+def test_callback_reaching_another_worker_is_forwarded_to_the_sender(tmp_path):
+    path = str(tmp_path / "state.db")
+
+    async def scenario():
+        sender_state = SQLiteStateBackend(path, poll_interval=0.01)
+        receiver_state = SQLiteStateBackend(path, poll_interval=0.01)
+        sender = CallbackCorrelator(sender_state)
+        receiver = CallbackCorrelator(receiver_state)
+        for state, correlator in ((sender_state, sender), (receiver_state, receiver)):
+            state.subscribe(CALLBACK_FORWARD_CHANNEL, correlator.receive_forwarded)
+            await state.start()
+        try:
+            call = sender.expect(beckn.BecknRequest("select", "txn-1", "msg-1", b"{}"), timeout=5, expected=1)
+            routed = await receiver.route("on_select", on_select("msg-1"))
+            unknown = await receiver.route("on_select", on_select("msg-2"))
+            wrong_action = await receiver.route("on_init", on_select("msg-1"))
+            response = await asyncio.wait_for(call.first(), 1)
+            return routed, unknown, wrong_action, response, sender, receiver
+        finally:
+            await sender_state.stop()
+            await receiver_state.stop()
+
+    routed, unknown, wrong_action, response, sender, receiver = asyncio.run(scenario())
+    assert routed and not unknown and not wrong_action
+    assert response["context"]["message_id"] == "msg-1"
+    assert sender.get_metrics()["delivered"] == 1
+    assert "msg-1" not in sender.owners
+    assert receiver.get_metrics()["forwarded"] == 1
+    assert receiver.get_metrics()["unmatched"] == 2
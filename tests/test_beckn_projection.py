@@ -0,0 +1,28 @@
+import json
+
+from app.core import beckn_projection
+from app.tools.specific_tools.solar_tools.retail_select import SolarRetailSelectTool
+
+
+def _search_body(transaction_id: str) -> dict:
+    return {
+        "responses": [{
+            "context": {"transaction_id": transaction_id, "bpp_id": "bpp-1"},
+            "message": {"catalog": {"providers": [{"id": "p1", "items": [{"id": "i1"}]}]}},
+        }]
+    }
+
+
+def test_search_projection_has_no_transaction_id():
+    observation = beckn_projection.observe("search", json.dumps(_search_body("shared-search")))
+    projected = json.loads(observation)
+    assert "transaction_id" not in projected
+    assert projected["providers"][0]["id"] == "p1"
+
+
+def test_select_starts_a_new_transaction_per_request():
+    tool = SolarRetailSelectTool()
+    first = tool._build_request("p1", "i1")
+    second = tool._build_request("p1", "i1")
+    assert first.transaction_id != second.transaction_id
+    assert "transaction_id" not in tool.args_schema.model_fields
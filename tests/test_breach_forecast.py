@@ -0,0 +1,99 @@
+import asyncio
+
+import numpy as np
+import pytest
+
+from app.config.settings import BreachForecastConfig, BreachScanConfig
+from app.core.breach_forecast import BreachForecast, BreachForecaster, forecast
+from app.core.breach_scanner import BreachScanner
+from app.core.telemetry import TelemetryStore
+
+NOW = 1_700_000_000.0
+STEP = 300  # seconds between samples
+
+
+def fill(store: TelemetryStore, transformer_id: str, loads, capacity: float, last_at: float = NOW):
+    for index, load in enumerate(loads):
+        store.append(transformer_id, last_at - (len(loads) - 1 - index) * STEP, float(load), capacity)
+
+
+def test_linear_trend_breach_time():
+    steps = np.arange(12)
+    times = (NOW - (11 - steps) * STEP)[None, :]
+    loads = (100 + 10 * steps)[None, :].astype(float)  # 2 kW per minute, 210 kW now
+    result = forecast(times, loads, np.ones_like(loads, dtype=bool), np.array([250.0]), now=NOW)
+    assert result["model"][0] == 0
+    assert result["minutes"][0] == pytest.approx(20.0)
+    assert result["rate"][0] == pytest.approx(2.0)
+
+
+def test_exponential_trend_is_chosen_for_compounding_load():
+    steps = np.arange(24)
+    times = (NOW - (23 - steps) * STEP)[None, :]
+    loads = (50 * 1.05 ** steps)[None, :]
+    result = forecast(times, loads, np.ones_like(loads, dtype=bool), np.array([400.0]), now=NOW)
+    assert result["model"][0] == 1
+    expected = np.log(400 / loads[0, -1]) / (np.log(1.05) / 5)
+    assert result["minutes"][0] == pytest.approx(expected, rel=1e-6)
+    assert result["lower"][0] <= result["minutes"][0] <= result["upper"][0]
+
+
+def test_flat_load_never_breaches_and_short_rows_are_unknown():
+    times = np.tile(NOW - np.arange(5)[::-1] * STEP, (2, 1))
+    loads = np.full((2, 5), 120.0)
+    valid = np.ones((2, 5), dtype=bool)
+    valid[1, :3] = False  # only 2 samples
+    result = forecast(times, loads, valid, np.array([250.0, 250.0]), now=NOW)
+    assert np.isinf(result["minutes"][0])
+    assert np.isnan(result["minutes"][1])
+
+
+def test_stale_transformer_gets_no_forecast():
+    store = TelemetryStore()
+    fill(store, "fresh", 100 + 10 * np.arange(12), 250.0, last_at=NOW)
+    fill(store, "stale", 100 + 10 * np.arange(12), 250.0, last_at=NOW - 7200)
+    times, loads, valid, capacity = BreachForecaster(store)._inputs()
+    result = forecast(times, loads, valid, capacity, now=NOW, max_age=1800)
+    latest = BreachForecast(store.transformer_ids, result, NOW, 0.0, max_age=1800)
+    assert latest.get("stale", NOW) is None
+    assert [breach["transformer_id"] for breach in latest.at_risk(45, NOW)] == ["fresh"]
+    # A forecast made while fresh expires once the transformer stops reporting
+    assert latest.get("fresh", NOW + 3600) is None
+    assert latest.at_risk(45, NOW + 3600) == []
+
+
+class FakeOptions:
+    class current:
+        version = 1
+        fetched_at = NOW
+        options = ({"id": "DDR"}, {"id": "EDR"})
+
+
+def test_scanner_does_not_realert_a_silent_transformer(monkeypatch):
+    monkeypatch.setattr("app.core.breach_scanner.time.time", lambda: clock[0])
+    monkeypatch.setattr("app.core.breach_forecast.time.time", lambda: clock[0])
+    clock = [NOW]
+    store = TelemetryStore()
+    fill(store, "7", 100 + 10 * np.arange(12), 250.0)  # breach in ~20 minutes
+    forecaster = BreachForecaster(store, BreachForecastConfig(max_age_seconds=1800))
+    config = BreachScanConfig(horizon_minutes=45, prepare_minutes=90, cooldown_seconds=600)
+    scanner = BreachScanner(forecaster, FakeOptions, config)
+    alerts = []
+
+    async def handler(breach, recommendation):
+        alerts.append((breach, recommendation))
+
+    scanner.on_alert(handler)
+
+    async def tick(at: float):
+        clock[0] = at
+        await forecaster.run_once()
+
+    asyncio.run(tick(NOW))
+    assert len(alerts) == 1
+    assert alerts[0][1]["option"]["id"] == "DDR"
+    # The transformer goes silent; past the cooldown it must not be alerted again
+    for hours in range(1, 6):
+        asyncio.run(tick(NOW + hours * 3600))
+    assert len(alerts) == 1
+    assert scanner.recommendation_for("7") is None
@@ -0,0 +1,133 @@
+import asyncio
+import json
+
+import httpx
+import pytest
+
+from app.config.settings import DERDispatchConfig
+from app.core import der_dispatch
+from app.core.der_dispatch import DERCommand, DERDispatcher, DispatchJob
+
+URL = "http://switch-off.test"
+
+
+def make_batch(count: int):
+    job = DispatchJob("event-1")
+    job.commands = [DERCommand(job, f"meter-{index}", index, 1.0, URL) for index in range(count)]
+    return job, job.commands
+
+
+def run_send(monkeypatch, batch, respond, budget=None):
+    requests = []
+
+    async def put(url, json, **kwargs):
+        requests.append(list(json["der_ids"]))
+        return httpx.Response(respond(json["der_ids"]))
+
+    monkeypatch.setattr(der_dispatch.http_clients, "put", put)
+    monkeypatch.setattr(der_dispatch.der_inventory, "mark_switched_off", lambda meter_id, der_ids: None)
+    config = DERDispatchConfig() if budget is None else DERDispatchConfig(max_split_requests=budget)
+
+    async def send():
+        await DERDispatcher(config)._send(URL, batch)
+        await asyncio.sleep(0)  # let progress publishes run
+
+    asyncio.run(send())
+    return requests
+
+
+def test_refused_devices_are_isolated(monkeypatch):
+    job, batch = make_batch(8)
+    requests = run_send(monkeypatch, batch, lambda ids: 400 if 5 in ids else 200)
+    assert job.failed_ders() == [5]
+    assert job.count("acked") == 7
+    assert len(requests) <= 1 + 2 * 3  # one bisection path of depth log2(8)
+
+
+@pytest.mark.parametrize("status", [401, 403, 429, 503])
+def test_non_per_device_rejection_fails_whole_batch_without_splitting(monkeypatch, status):
+    job, batch = make_batch(16)
+    requests = run_send(monkeypatch, batch, lambda ids: status)
+    assert len(requests) == 1
+    assert job.count("failed") == 16
+
+
+def test_blanket_rejection_is_bounded_by_split_budget(monkeypatch):
+    job, batch = make_batch(50)
+    requests = run_send(monkeypatch, batch, lambda ids: 400, budget=6)
+    assert len(requests) == 1 + 6
+    assert job.count("failed") == 50
+
+
+def test_dispatch_endpoint_only_switches_off_enrolled_meters(monkeypatch):
+    from fastapi import FastAPI
+    from fastapi.testclient import TestClient
+
+    from app.routers import grid_alerts
+
+    async def get_meter_ids(event_id):
+        return [101, 102] if event_id == "3805" else []
+
+    dispatched = []
+
+    def dispatch(households, event_id):
+        dispatched.extend(households)
+        return DispatchJob(event_id)
+
+    monkeypatch.setattr(grid_alerts.subscription_meters, "get_meter_ids", get_meter_ids)
+    monkeypatch.setattr(grid_alerts.der_dispatcher, "dispatch", dispatch)
+    app = FastAPI()
+    app.include_router(grid_alerts.router)
+    client = TestClient(app)
+
+    households = [{"meter_id": 101, "der_ids": [1]}, {"meter_id": 999, "der_ids": [2]}]
+    response = client.post("/grid-alerts/der-dispatch", json={"event_id": "3805", "households": households})
+    assert response.status_code == 202
+    assert response.json()["not_enrolled"] == [999]
+    assert dispatched == [(101, [1])]
+
+    assert client.post("/grid-alerts/der-dispatch", json={"households": households}).status_code == 400
+    response = client.post("/grid-alerts/der-dispatch", json={"event_id": "1", "meter_ids": [999]})
+    assert response.status_code == 403
+
+
+def test_completed_dispatch_notifies_only_switched_off_meters_once(monkeypatch):
+    from app.config.settings import WebSocketConfig
+    from app.core.websocket_manager import WebSocketManager
+    from tests.test_websocket_manager import connect
+
+    manager = WebSocketManager(WebSocketConfig())
+    monkeypatch.setattr(der_dispatch, "connection_manager", manager)
+    monkeypatch.setattr(der_dispatch, "_notified_meters", {})
+    published = []
+
+    async def publish(channel, message):
+        published.append(message)
+
+    monkeypatch.setattr(der_dispatch.shared_state, "publish", publish)
+
+    def finish(job, states):
+        for command, state in zip(job.commands, states):
+            command.state = state
+        job._settle()
+        DERDispatcher()._report(job, force=True)
+
+    async def scenario():
+        sockets = {}
+        for meter_id in ("meter-0", "meter-1", "meter-9"):
+            connection_id, sockets[meter_id] = await connect(manager)
+            manager.set_meter_id(connection_id, meter_id)
+        # Two consents for the same event, each dispatched on its own
+        for _ in range(2):
+            job, _ = make_batch(2)
+            finish(job, ["acked", "failed"])
+            await asyncio.sleep(0)
+            await der_dispatch._on_progress(published[-1], "worker")
+        await asyncio.sleep(0.05)
+        return sockets
+
+    sockets = asyncio.run(scenario())
+    assert published[-1]["switched_off_meters"] == ["meter-0"]
+    assert [json.loads(frame)["type"] for frame in sockets["meter-0"].sent] == ["dfp_event_update"]
+    assert sockets["meter-1"].sent == []  # its device failed
+    assert sockets["meter-9"].sent == []  # not part of the dispatch
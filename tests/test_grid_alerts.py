@@ -0,0 +1,134 @@
+import asyncio
+import json
+
+from app.config.settings import WebSocketConfig
+from app.core.websocket_manager import WebSocketManager, topic
+from app.routers import grid_alerts
+from tests.test_websocket_manager import connect
+
+
+def test_transformer_alert_notifies_households_on_that_transformer(monkeypatch):
+    manager = WebSocketManager(WebSocketConfig())
+    monkeypatch.setattr(grid_alerts, "connection_manager", manager)
+
+    async def scenario():
+        fed, fed_socket = await connect(manager)
+        elsewhere, elsewhere_socket = await connect(manager)
+        manager.subscribe(fed, topic("transformer", 5))
+        manager.subscribe(elsewhere, topic("transformer", 6))
+        dashboards = await grid_alerts.broadcast_grid_alert("stress", {"transformer_id": 5, "time_estimate": 20})
+        await asyncio.sleep(0.05)
+        return dashboards, fed_socket, elsewhere_socket
+
+    dashboards, fed_socket, elsewhere_socket = asyncio.run(scenario())
+    assert dashboards == set()
+    notice = json.loads(fed_socket.sent[-1])
+    assert notice["type"] == "transformer_alert"
+    assert notice["time_estimate"] == 20
+    assert elsewhere_socket.sent == []
+
+
+def test_posted_alert_asks_the_agent_once_and_publishes_the_recommendation(monkeypatch):
+    manager = WebSocketManager(WebSocketConfig())
+    monkeypatch.setattr(grid_alerts, "connection_manager", manager)
+    agent_calls, published = [], []
+
+    async def agent(client_id, transformer_data):
+        agent_calls.append(client_id)
+        return "Use DDR"
+
+    async def publish(channel, message):
+        published.append((channel, message))
+
+    monkeypatch.setattr(grid_alerts, "get_agent_dfp_recommendation", agent)
+    monkeypatch.setattr(grid_alerts.shared_state, "publish", publish)
+    sleep = asyncio.sleep
+    monkeypatch.setattr(asyncio, "sleep", lambda seconds: sleep(0))
+    transformer_data = {"transformer_id": "tx-test", "time_estimate": 20, "source": "forecast"}
+
+    async def scenario():
+        local, local_socket = await connect(manager)
+        manager.set_client_type(local, "utility_dashboard")
+        await grid_alerts.process_grid_alert("stress", transformer_data, publish=True)
+
+        # Another worker forwards the published recommendation without asking the agent
+        remote, remote_socket = await connect(manager)
+        manager.set_client_type(remote, "utility_dashboard")
+        channel, message = published[-1]
+        await grid_alerts._on_transformer_recommendation(message, "other-worker")
+        for _ in range(5):
+            await sleep(0)  # let the writers drain
+        return channel, local_socket, remote_socket
+
+    channel, local_socket, remote_socket = asyncio.run(scenario())
+    assert len(agent_calls) == 1
+    assert agent_calls[0].startswith(grid_alerts.GRID_ALERT_AGENT_CLIENT_PREFIX)
+    assert channel == grid_alerts.TRANSFORMER_RECOMMENDATION_CHANNEL
+    assert [json.loads(frame)["type"] for frame in remote_socket.sent] == ["dfp_options_and_recommendation"]
+    assert json.loads(remote_socket.sent[-1])["message"] == "Use DDR"
+    assert json.loads(local_socket.sent[1])["type"] == "dfp_options_and_recommendation"
+
+
+def test_posted_stress_alert_sample_is_published_to_other_workers(monkeypatch):
+    from fastapi import FastAPI
+    from fastapi.testclient import TestClient
+
+    from app.routers.telemetry import LOAD_SAMPLES_CHANNEL
+
+    published = []
+
+    async def publish(channel, message):
+        published.append((channel, message))
+
+    async def process_grid_alert(*args, **kwargs):
+        pass
+
+    monkeypatch.setattr(grid_alerts.shared_state, "publish", publish)
+    monkeypatch.setattr(grid_alerts, "process_grid_alert", process_grid_alert)
+    app = FastAPI()
+    app.include_router(grid_alerts.router)
+
+    alert = {"transformer": {"id": 4242, "name": "Feeder", "max_capacity_KW": 100}, "totalBaseKWh": 80}
+    assert TestClient(app).post("/grid-alerts/transformer-stress", json=alert).status_code == 200
+    samples = [message["samples"] for channel, message in published if channel == LOAD_SAMPLES_CHANNEL]
+    assert len(samples) == 1
+    transformer_id, _, load_kw, capacity_kw = samples[0][0]
+    assert (transformer_id, load_kw, capacity_kw) == ("4242", 80, 100)
+
+
+def test_concurrent_alerts_keep_their_own_recommendation(monkeypatch):
+    published = []
+    both_asked = asyncio.Event()
+    asked = []
+
+    async def agent(client_id, transformer_data):
+        # The handler stores the recommendation under the conversation's client_id
+        grid_alerts.client_dfp_recommendations[client_id] = {"transformer": {"id": transformer_data["transformer_id"]}}
+        asked.append(client_id)
+        if len(asked) == 2:
+            both_asked.set()
+        await both_asked.wait()
+        return f"Recommendation for {transformer_data['transformer_id']}"
+
+    async def publish(channel, message):
+        published.append(message)
+
+    monkeypatch.setattr(grid_alerts, "connection_manager", WebSocketManager(WebSocketConfig()))
+    monkeypatch.setattr(grid_alerts, "get_agent_dfp_recommendation", agent)
+    monkeypatch.setattr(grid_alerts.shared_state, "publish", publish)
+    sleep = asyncio.sleep
+    monkeypatch.setattr(asyncio, "sleep", lambda seconds: sleep(0))
+
+    async def scenario():
+        await asyncio.gather(*(
+            grid_alerts.process_grid_alert("stress", {"transformer_id": transformer_id, "source": "forecast"}, publish=True)
+            for transformer_id in ("tx-a", "tx-b")
+        ))
+
+    asyncio.run(scenario())
+    assert len(published) == 2
+    for message in published:
+        transformer_id = message["transformer_data"]["transformer_id"]
+        assert message["recommendation"]["transformer"]["id"] == transformer_id
+        assert message["agent_response"] == f"Recommendation for {transformer_id}"
+    assert not any(client_id in grid_alerts.client_dfp_recommendations for client_id in asked)
@@ -0,0 +1,26 @@
+import os
+
+from app.config.settings import LifecycleConfig
+from app.core.lifecycle import Lifecycle
+from app.core.shared_state import shared_state
+
+
+def make_lifecycle(tmp_path, store):
+    lifecycle = Lifecycle(LifecycleConfig(snapshot_path=str(tmp_path / "snapshot.json")))
+    lifecycle.register_snapshot("values", lambda: dict(store), store.update)
+    return lifecycle
+
+
+def test_workers_write_separate_snapshots(tmp_path, monkeypatch):
+    first = make_lifecycle(tmp_path, {"a": 1})
+    second = make_lifecycle(tmp_path, {"b": 2})
+    monkeypatch.setattr(shared_state, "worker_id", "worker-1")
+    first_path = first.snapshot()
+    monkeypatch.setattr(shared_state, "worker_id", "worker-2")
+    second_path = second.snapshot()
+    assert first_path != second_path
+    assert os.path.exists(first_path) and os.path.exists(second_path)
+
+    restored = {}
+    assert make_lifecycle(tmp_path, restored).restore()
+    assert restored == {"a": 1, "b": 2}
@@ -0,0 +1,51 @@
+from app.core.session_manager import SessionManager
+from app.core.shared_state import InMemoryStateBackend
+
+
+def make_manager() -> SessionManager:
+    return SessionManager(secret="test-secret", state=InMemoryStateBackend())
+
+
+def test_token_round_trip():
+    manager = make_manager()
+    token = manager.create_session("meter-1", {})
+    assert manager.get_meter_id_from_token(token) == "meter-1"
+
+
+def test_ended_session_token_is_rejected():
+    manager = make_manager()
+    token = manager.create_session("meter-1", {})
+    assert manager.end_session(token)
+    assert manager.decode_token(token) is None
+
+
+def test_non_canonical_signature_is_rejected():
+    manager = make_manager()
+    token = manager.create_session("meter-1", {})
+    payload, signature = token.split(".")
+    alphabet = "ABCDEFGHIJKLMNOPQRSTUVWXYZabcdefghijklmnopqrstuvwxyz0123456789-_"
+    # A 32-byte signature leaves 2 unused bits in its last character
+    base = alphabet.index(signature[-1]) & ~0b11
+    variants = [signature[:-1] + alphabet[base + bits] for bits in range(4)]
+    variants.remove(signature)
+    assert len(variants) == 3
+    for variant in variants:
+        assert manager.decode_token(f"{payload}.{variant}") is None
+
+
+def test_revocation_covers_non_canonical_variants():
+    manager = make_manager()
+    token = manager.create_session("meter-1", {})
+    payload, signature = token.split(".")
+    manager.end_session(token)
+    alphabet = "ABCDEFGHIJKLMNOPQRSTUVWXYZabcdefghijklmnopqrstuvwxyz0123456789-_"
+    base = alphabet.index(signature[-1]) & ~0b11
+    for bits in range(4):
+        assert manager.decode_token(f"{payload}.{signature[:-1]}{alphabet[base + bits]}") is None
+
+
+def test_tampered_payload_is_rejected():
+    manager = make_manager()
+    token = manager.create_session("meter-1", {})
+    other = manager.create_session("meter-2", {})
+    assert manager.decode_token(f"{other.split('.')[0]}.{token.split('.')[1]}") is None
@@ -0,0 +1,44 @@
+import asyncio
+
+from app.core.shared_state import SQLiteStateBackend
+
+
+def test_sqlite_reads_are_cached_and_invalidated_by_other_workers(tmp_path):
+    path = str(tmp_path / "state.db")
+
+    async def scenario():
+        worker = SQLiteStateBackend(path, poll_interval=0.01)
+        other = SQLiteStateBackend(path, poll_interval=0.01)
+        await worker.start()
+        try:
+            other.set("sessions", "meter-1", {"active": True})
+            assert worker.get("sessions", "meter-1") == {"active": True}
+            assert worker.get("sessions", "meter-1") == {"active": True}
+            assert "meter-2" not in worker.namespace("sessions")
+            hits = worker.cache_hits
+
+            other.set("sessions", "meter-1", {"active": False})
+            other.set("sessions", "meter-2", {"active": True})
+            await asyncio.sleep(0.1)
+            return worker.get("sessions", "meter-1"), "meter-2" in worker.namespace("sessions"), hits
+        finally:
+            await worker.stop()
+
+    value, meter_2_seen, hits = asyncio.run(scenario())
+    assert hits == 1
+    assert value == {"active": False}
+    assert meter_2_seen
+
+
+def test_sqlite_cached_values_are_snapshots(tmp_path):
+    async def scenario():
+        backend = SQLiteStateBackend(str(tmp_path / "state.db"))
+        await backend.start()
+        try:
+            backend.set("sessions", "meter-1", {"active": True})
+            backend.get("sessions", "meter-1")["active"] = False
+            return backend.get("sessions", "meter-1")
+        finally:
+            await backend.stop()
+
+    assert asyncio.run(scenario()) == {"active": True}
@@ -0,0 +1,44 @@
+import math
+
+from fastapi import FastAPI
+from fastapi.testclient import TestClient
+
+from app.core.telemetry import TelemetryStore
+from app.routers import telemetry
+
+
+def post_raw(client: TestClient, body: str):
+    # NaN and Infinity are not valid JSON, so they cannot be sent with json=
+    return client.post("/telemetry/transformer-load", content=body, headers={"Content-Type": "application/json"})
+
+
+def test_non_finite_load_samples_are_dropped(monkeypatch):
+    async def publish(channel, message):
+        pass
+
+    store = TelemetryStore()
+    monkeypatch.setattr(telemetry, "telemetry_store", store)
+    monkeypatch.setattr(telemetry.shared_state, "publish", publish)
+    app = FastAPI()
+    app.include_router(telemetry.router)
+    client = TestClient(app)
+
+    response = post_raw(client, (
+        '{"samples": ['
+        '{"transformer_id": "t1", "timestamp": 1700000000, "load_kw": 80, "max_capacity_kw": 100},'
+        '{"transformer_id": "t1", "timestamp": 1700000300, "load_kw": NaN},'
+        '{"transformer_id": "t1", "timestamp": 1700000600, "load_kw": Infinity},'
+        '{"transformer_id": "t1", "timestamp": 1700000900, "load_kw": 90, "max_capacity_kw": -Infinity}'
+        "]}"
+    ))
+    assert response.status_code == 200
+    assert (response.json()["accepted"], response.json()["dropped"]) == (2, 2)
+
+    response = post_raw(client, '{"samples": [{"transformer_id": "t1", "timestamp": NaN, "load_kw": 90}]}')
+    assert response.status_code == 400
+
+    assert client.get("/telemetry/transformers/t1").status_code == 200
+    assert client.get("/telemetry/transformers").status_code == 200
+    stats = store.stats("t1")
+    assert math.isfinite(stats["ewma_kw"]) and math.isfinite(stats["slope_kw_per_min"])
+    assert store.capacity[store._rows["t1"]] == 100
@@ -0,0 +1,17 @@
+import time
+
+from app.core.shared_state import InMemoryStateBackend
+from app.core.transaction_store import TransactionStore
+
+
+def test_expired_transactions_are_dropped_with_their_payloads():
+    store = TransactionStore(InMemoryStateBackend(), ttl=60)
+    stale = store.begin("deg:retail")
+    store.save_payload(stale, "select", "{}")
+    store.transactions[stale] = {**store.get(stale), "updated_at": time.time() - 120}
+    fresh = store.begin("deg:retail")
+
+    assert store.evict_expired() == 1
+    assert store.get(stale) is None
+    assert store.get_payloads(stale) == {}
+    assert store.get(fresh) is not None
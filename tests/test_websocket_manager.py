@@ -0,0 +1,218 @@
+import asyncio
+import json
+
+import pytest
+
+from app.config.settings import WebSocketConfig
+from app.core import websocket_manager
+from app.core.websocket_manager import Frame, StreamOptions, WebSocketManager
+
+
+class FakeWebSocket:
+    def __init__(self):
+        self.sent = []
+        self.closed = None
+
+    async def accept(self):
+        pass
+
+    async def send_text(self, text):
+        self.sent.append(text)
+
+    async def send_bytes(self, data):
+        self.sent.append(data)
+
+    async def close(self, code=1000):
+        self.closed = code
+
+
+def run(coroutine):
+    return asyncio.run(coroutine)
+
+
+async def connect(manager: WebSocketManager):
+    websocket = FakeWebSocket()
+    connection_id = await manager.connect(websocket)
+    return connection_id, websocket
+
+
+def test_silent_connection_is_evicted_when_pongs_are_required():
+    async def scenario():
+        manager = WebSocketManager(WebSocketConfig(heartbeat_timeout_seconds=10, heartbeat_require_pong=True))
+        silent, _ = await connect(manager)
+        active, _ = await connect(manager)
+        manager.heartbeat.last_seen[silent] -= 60
+        manager.heartbeat.last_seen[active] -= 60
+        manager.touch(active)  # any inbound message counts as activity
+        await manager.heartbeat.sweep()
+        return manager, silent, active
+
+    manager, silent, active = run(scenario())
+    assert silent not in manager.writers
+    assert active in manager.writers
+    assert manager.heartbeat.evictions == 1
+
+
+def test_silent_client_without_pong_support_is_kept_by_default():
+    async def scenario():
+        manager = WebSocketManager(WebSocketConfig(heartbeat_timeout_seconds=10))
+        connection_id, _ = await connect(manager)
+        ponged, _ = await connect(manager)
+        manager.record_pong(ponged)
+        manager.heartbeat.last_seen[connection_id] -= 60
+        manager.heartbeat.last_seen[ponged] -= 60
+        await manager.heartbeat.sweep()
+        return manager, connection_id, ponged
+
+    manager, connection_id, ponged = run(scenario())
+    assert connection_id in manager.writers
+    # A client that answered pings and then went silent is still evicted
+    assert ponged not in manager.writers
+
+
+def test_rtt_is_recorded_after_a_missed_pong():
+    async def scenario():
+        manager = WebSocketManager(WebSocketConfig())
+        connection_id, _ = await connect(manager)
+        heartbeat = manager.heartbeat
+        await heartbeat.sweep()  # ping 1 is never answered
+        await heartbeat.sweep()  # ping 2
+        assert heartbeat.pending[connection_id][0] == heartbeat.ping_id
+        manager.record_pong(connection_id, heartbeat.ping_id)
+        await heartbeat.sweep()
+        manager.record_pong(connection_id, heartbeat.ping_id)
+        return heartbeat
+
+    heartbeat = run(scenario())
+    assert heartbeat.rtt.count == 2
+    assert not heartbeat.pending
+
+
+async def detached_client(manager: WebSocketManager, client_id: str, meter_id=None):
+    connection_id, _ = await connect(manager)
+    manager.set_client(connection_id, client_id)
+    if meter_id is not None:
+        manager.set_meter_id(connection_id, meter_id)
+    await manager.disconnect(connection_id)
+
+
+def test_resume_requires_a_session_of_the_same_meter():
+    async def scenario():
+        manager = WebSocketManager(WebSocketConfig())
+        await detached_client(manager, "alice", "meter-1")
+        await detached_client(manager, "anonymous")
+        return manager
+
+    manager = run(scenario())
+    assert manager.can_resume("alice", "meter-1")
+    assert not manager.can_resume("alice", "meter-2")
+    assert not manager.can_resume("anonymous", "meter-1")
+    assert not manager.can_resume("unknown", "meter-1")
+
+
+def test_attached_client_cannot_be_resumed():
+    async def scenario():
+        manager = WebSocketManager(WebSocketConfig())
+        connection_id, _ = await connect(manager)
+        manager.set_client(connection_id, "alice")
+        manager.set_meter_id(connection_id, "meter-1")
+        await manager.disconnect(connection_id)
+        connection_id, _ = await connect(manager)
+        manager.set_client(connection_id, "alice")
+        return manager
+
+    manager = run(scenario())
+    assert not manager.can_resume("alice", "meter-1")
+
+
+def test_resume_replays_missed_frames():
+    async def scenario():
+        manager = WebSocketManager(WebSocketConfig())
+        await detached_client(manager, "alice", "meter-1")
+        manager.send_to_meters(["meter-1"], {"type": "alert"})
+        connection_id, websocket = await connect(manager)
+        replayed = manager.resume(connection_id, "alice", 0)
+        await asyncio.sleep(0.05)
+        return replayed, websocket
+
+    replayed, websocket = run(scenario())
+    assert replayed == 1
+    replay = json.loads(websocket.sent[-1])
+    assert replay["type"] == "replay"
+    assert replay["frames"][0]["type"] == "alert"
+
+
+def test_full_queue_drops_the_oldest_frame():
+    async def scenario():
+        manager = WebSocketManager(WebSocketConfig(send_queue_size=2))
+        connection_id, websocket = await connect(manager)
+        writer = manager.writers[connection_id]
+        for index in range(3):
+            assert writer.enqueue(Frame.encode({"index": index}))
+        await asyncio.sleep(0.05)
+        return writer, websocket
+
+    writer, websocket = run(scenario())
+    assert writer.dropped == 1
+    assert [json.loads(text)["index"] for text in websocket.sent] == [1, 2]
+
+
+def test_full_queue_disconnects_slow_consumer():
+    async def scenario():
+        manager = WebSocketManager(WebSocketConfig(send_queue_size=2, slow_consumer_policy="disconnect"))
+        connection_id, websocket = await connect(manager)
+        writer = manager.writers[connection_id]
+        queued = [writer.enqueue(Frame.encode({"index": index})) for index in range(3)]
+        await asyncio.sleep(0.05)
+        return manager, connection_id, websocket, queued
+
+    manager, connection_id, websocket, queued = run(scenario())
+    assert queued == [True, True, False]
+    assert connection_id not in manager.writers
+    assert websocket.closed == 1013
+
+
+class UnpackableFrame(Frame):
+    __slots__ = ()
+
+    def packed(self):
+        raise ValueError("cannot pack frame")
+
+
+def test_frame_that_fails_to_encode_evicts_the_connection():
+    async def scenario():
+        manager = WebSocketManager(WebSocketConfig())
+        websocket = FakeWebSocket()
+        connection_id = await manager.connect(websocket, StreamOptions(encoding="msgpack"))
+        manager.writers[connection_id].enqueue(UnpackableFrame('{"type":"alert"}'))
+        await asyncio.sleep(0.05)
+        return manager, connection_id, websocket
+
+    manager, connection_id, websocket = run(scenario())
+    assert connection_id not in manager.writers
+    assert manager.evicted_connections == 1
+    assert websocket.closed == 1013
+
+
+@pytest.mark.parametrize("use_orjson", [True, False])
+def test_frame_encodes_numpy_values_and_non_str_keys(monkeypatch, use_orjson):
+    import numpy as np
+
+    if not use_orjson:
+        monkeypatch.setattr(websocket_manager, "orjson", None)
+    frame = Frame.encode({"minutes": np.float64(12.5), "count": np.int64(3), "band": np.array([1, 2]), 5: "tx"})
+    assert json.loads(frame.text) == {"minutes": 12.5, "count": 3, "band": [1, 2], "5": "tx"}
+
+
+def test_unencodable_message_is_not_sent():
+    async def scenario():
+        manager = WebSocketManager(WebSocketConfig())
+        connection_id, websocket = await connect(manager)
+        sent = await manager.send_message(connection_id, {"type": "alert", "at": object()})
+        await asyncio.sleep(0.05)
+        return manager, connection_id, websocket, sent
+
+    manager, connection_id, websocket, sent = run(scenario())
+    assert sent is False
+    assert websocket.sent == []
+    assert connection_id in manager.writers